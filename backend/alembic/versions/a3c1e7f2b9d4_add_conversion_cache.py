@@ -0,0 +1,47 @@
+"""add_conversion_cache
+
+Revision ID: a3c1e7f2b9d4
+Revises: 9d5aba691653
+Create Date: 2026-10-19 10:12:31.418203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c1e7f2b9d4'
+down_revision: Union[str, None] = '9d5aba691653'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 原始文件内容哈希，用于跨文件库复用转换结果
+    op.add_column('library_files', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_library_files_content_hash', 'library_files', ['content_hash'])
+
+    op.create_table(
+        'conversion_cache',
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('method', sa.String(length=50), nullable=False),
+        sa.Column('llm_config_id', sa.String(length=36), nullable=True),
+        sa.Column('converted_bucket', sa.String(length=100), nullable=False),
+        sa.Column('converted_object_name', sa.String(length=500), nullable=False),
+        sa.Column('converted_file_size', sa.BigInteger(), nullable=True),
+        sa.Column('hit_count', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('cache_key')
+    )
+    op.create_index('ix_conversion_cache_content_hash', 'conversion_cache', ['content_hash'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversion_cache_content_hash', table_name='conversion_cache')
+    op.drop_table('conversion_cache')
+    op.drop_index('ix_library_files_content_hash', table_name='library_files')
+    op.drop_column('library_files', 'content_hash')
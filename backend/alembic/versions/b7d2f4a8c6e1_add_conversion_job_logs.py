@@ -0,0 +1,38 @@
+"""add_conversion_job_logs
+
+Revision ID: b7d2f4a8c6e1
+Revises: a3c1e7f2b9d4
+Create Date: 2026-10-19 11:04:52.730915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2f4a8c6e1'
+down_revision: Union[str, None] = 'a3c1e7f2b9d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 转换任务日志改为追加写入独立表
+    op.create_table(
+        'conversion_job_logs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('conversion_job_id', sa.String(length=36), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('level', sa.String(length=20), nullable=True),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['conversion_job_id'], ['conversion_jobs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_conversion_job_logs_conversion_job_id', 'conversion_job_logs', ['conversion_job_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversion_job_logs_conversion_job_id', table_name='conversion_job_logs')
+    op.drop_table('conversion_job_logs')
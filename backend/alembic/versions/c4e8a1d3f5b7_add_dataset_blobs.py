@@ -0,0 +1,49 @@
+"""add_dataset_blobs
+
+Revision ID: c4e8a1d3f5b7
+Revises: b7d2f4a8c6e1
+Create Date: 2026-10-19 14:26:08.315742
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1d3f5b7'
+down_revision: Union[str, None] = 'b7d2f4a8c6e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 数据集文件内容块，按内容哈希去重并引用计数
+    op.create_table(
+        'dataset_blobs',
+        sa.Column('checksum', sa.String(length=64), nullable=False),
+        sa.Column('md5', sa.String(length=32), nullable=True),
+        sa.Column('bucket', sa.String(length=100), nullable=False),
+        sa.Column('object_name', sa.String(length=500), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=True),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('orphaned_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('checksum')
+    )
+    op.create_index('ix_dataset_blobs_orphaned_at', 'dataset_blobs', ['orphaned_at'])
+
+    op.add_column('enhanced_dataset_files', sa.Column('blob_checksum', sa.String(length=64), nullable=True))
+    op.create_index('ix_enhanced_dataset_files_blob_checksum', 'enhanced_dataset_files', ['blob_checksum'])
+    op.create_foreign_key('fk_enhanced_dataset_files_blob_checksum', 'enhanced_dataset_files',
+                          'dataset_blobs', ['blob_checksum'], ['checksum'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('fk_enhanced_dataset_files_blob_checksum', 'enhanced_dataset_files', type_='foreignkey')
+    op.drop_index('ix_enhanced_dataset_files_blob_checksum', table_name='enhanced_dataset_files')
+    op.drop_column('enhanced_dataset_files', 'blob_checksum')
+    op.drop_index('ix_dataset_blobs_orphaned_at', table_name='dataset_blobs')
+    op.drop_table('dataset_blobs')
@@ -0,0 +1,68 @@
+"""add_upload_sessions
+
+Revision ID: d2f6b8e4a1c9
+Revises: c4e8a1d3f5b7
+Create Date: 2026-10-19 16:12:37.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f6b8e4a1c9'
+down_revision: Union[str, None] = 'c4e8a1d3f5b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 文件库分片上传会话及已上传分片
+    op.create_table(
+        'upload_sessions',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('library_id', sa.String(length=36), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('original_filename', sa.String(length=255), nullable=False),
+        sa.Column('file_type', sa.String(length=50), nullable=True),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('file_size', sa.BigInteger(), nullable=False),
+        sa.Column('part_size', sa.BigInteger(), nullable=False),
+        sa.Column('part_count', sa.Integer(), nullable=False),
+        sa.Column('minio_bucket', sa.String(length=100), nullable=False),
+        sa.Column('minio_object_name', sa.String(length=500), nullable=False),
+        sa.Column('minio_upload_id', sa.String(length=255), nullable=False),
+        sa.Column('status', sa.Enum('UPLOADING', 'COMPLETED', 'ABORTED', name='uploadsessionstatus'),
+                  nullable=False),
+        sa.Column('library_file_id', sa.String(length=36), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['library_id'], ['libraries.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_upload_sessions_library_id', 'upload_sessions', ['library_id'])
+    op.create_index('ix_upload_sessions_expires_at', 'upload_sessions', ['expires_at'])
+
+    op.create_table(
+        'upload_session_parts',
+        sa.Column('session_id', sa.String(length=36), nullable=False),
+        sa.Column('part_number', sa.Integer(), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('etag', sa.String(length=100), nullable=False),
+        sa.Column('md5', sa.String(length=32), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['session_id'], ['upload_sessions.id']),
+        sa.PrimaryKeyConstraint('session_id', 'part_number')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('upload_session_parts')
+    op.drop_index('ix_upload_sessions_expires_at', table_name='upload_sessions')
+    op.drop_index('ix_upload_sessions_library_id', table_name='upload_sessions')
+    op.drop_table('upload_sessions')
+    sa.Enum(name='uploadsessionstatus').drop(op.get_bind(), checkfirst=True)
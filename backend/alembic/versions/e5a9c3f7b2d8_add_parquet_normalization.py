@@ -0,0 +1,36 @@
+"""add_parquet_normalization
+
+Revision ID: e5a9c3f7b2d8
+Revises: d2f6b8e4a1c9
+Create Date: 2026-10-19 18:40:52.617304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a9c3f7b2d8'
+down_revision: Union[str, None] = 'd2f6b8e4a1c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 规整化后的 Parquet 副本（同样存放在内容块中）及版本级数据结构
+    op.add_column('enhanced_dataset_files', sa.Column('parquet_blob_checksum', sa.String(length=64), nullable=True))
+    op.create_index('ix_enhanced_dataset_files_parquet_blob_checksum', 'enhanced_dataset_files',
+                    ['parquet_blob_checksum'])
+    op.create_foreign_key('fk_enhanced_dataset_files_parquet_blob_checksum', 'enhanced_dataset_files',
+                          'dataset_blobs', ['parquet_blob_checksum'], ['checksum'])
+    op.add_column('enhanced_dataset_versions', sa.Column('data_schema', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('enhanced_dataset_versions', 'data_schema')
+    op.drop_constraint('fk_enhanced_dataset_files_parquet_blob_checksum', 'enhanced_dataset_files',
+                       type_='foreignkey')
+    op.drop_index('ix_enhanced_dataset_files_parquet_blob_checksum', table_name='enhanced_dataset_files')
+    op.drop_column('enhanced_dataset_files', 'parquet_blob_checksum')
@@ -0,0 +1,42 @@
+"""add_version_merkle_tree
+
+Revision ID: f3b7d9a2c5e1
+Revises: e5a9c3f7b2d8
+Create Date: 2026-10-19 21:15:08.402917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b7d9a2c5e1'
+down_revision: Union[str, None] = 'e5a9c3f7b2d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 版本 Merkle 树：文件按相对路径哈希前缀分桶，节点哈希逐层汇总到根
+    op.create_table(
+        'dataset_version_tree_nodes',
+        sa.Column('version_id', sa.String(length=36), nullable=False),
+        sa.Column('prefix', sa.String(length=8), nullable=False),
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('file_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_size', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['version_id'], ['enhanced_dataset_versions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('version_id', 'prefix')
+    )
+
+    op.add_column('enhanced_dataset_files', sa.Column('merkle_bucket', sa.String(length=8), nullable=True))
+    op.create_index('ix_enhanced_dataset_files_version_bucket', 'enhanced_dataset_files',
+                    ['version_id', 'merkle_bucket'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_enhanced_dataset_files_version_bucket', table_name='enhanced_dataset_files')
+    op.drop_column('enhanced_dataset_files', 'merkle_bucket')
+    op.drop_table('dataset_version_tree_nodes')
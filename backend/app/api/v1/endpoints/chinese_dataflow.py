@@ -3,16 +3,14 @@
 """
 from flask import Blueprint, request, jsonify, current_app
 from app.services.chinese_dataflow_service import chinese_dataflow_service
-from app.services.storage_service import storage_service
+from app.services.zip_stream_service import zip_stream_service
 from app.utils.response import success_response, error_response
 from app.models.task import Task, TaskStatus, TaskType
 from app.models.library_file import LibraryFile
 from app.db import db
 import logging
 import json
-import tempfile
 import os
-import zipfile
 import re
 from datetime import datetime
 
@@ -388,103 +386,43 @@ def download_task_results_zip(task_id):
             total_count = len(results)
             return error_response(f"没有可下载的结果文件。总共 {total_count} 个文件，其中 {failed_count} 个处理失败")
         
-        # 创建临时zip文件
-        import tempfile
-        import zipfile
-        import os
-        
-        temp_zip = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
-        temp_zip.close()
-        
-        try:
-            with zipfile.ZipFile(temp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for result in successful_results:
-                    # 中文DataFlow结果存储在默认bucket中
-                    minio_bucket = result.get('minio_bucket') or current_app.config.get('MINIO_DEFAULT_BUCKET', 'pindata-bucket')
-                    minio_object_name = result.get('minio_object_name')
-                    json_object_name = result.get('minio_json_object_name')  # JSON详细结果
-                    
-                    if not minio_object_name:
-                        continue
-                    
-                    try:
-                        # 下载处理后的文本文件
-                        file_content = storage_service.get_file_content(minio_bucket, minio_object_name)
-                        
-                        if file_content:
-                            # 生成zip内的文件名
-                            original_filename = result.get('original_filename', 'unknown.txt')
-                            processed_filename = result.get('filename', os.path.basename(minio_object_name))
-                            
-                            # 添加处理后的文本文件到zip
-                            zip_file.writestr(processed_filename, file_content.encode('utf-8'))
-                            logger.info(f"添加处理文件到zip: {processed_filename}")
-                            
-                        # 下载JSON详细结果文件（如果存在）
-                        if json_object_name:
-                            try:
-                                json_content = storage_service.get_file_content(minio_bucket, json_object_name)
-                                if json_content:
-                                    json_filename = f"{os.path.splitext(processed_filename)[0]}_details.json"
-                                    zip_file.writestr(json_filename, json_content.encode('utf-8'))
-                                    logger.info(f"添加详细结果到zip: {json_filename}")
-                            except Exception as json_error:
-                                logger.warning(f"下载JSON文件失败: {json_object_name}, 错误: {str(json_error)}")
-                            
-                    except Exception as file_error:
-                        logger.error(f"下载文件失败: {minio_object_name}, 错误: {str(file_error)}")
-                        continue
-            
-            # 检查zip文件是否有内容
-            if os.path.getsize(temp_zip.name) == 0:
-                return error_response("没有成功下载到任何文件")
-            
-            # 生成下载文件名 - 使用ASCII安全的文件名
-            task_name = task.name or 'chinese_dataflow_task'
-            # 移除或替换所有非ASCII字符
-            import re
-            safe_task_name = re.sub(r'[^\w\-_\s]', '', task_name)
-            safe_task_name = re.sub(r'\s+', '_', safe_task_name)   # 空格替换为下划线
-            safe_task_name = safe_task_name.encode('ascii', 'ignore').decode('ascii')  # 移除非ASCII字符
-            
-            if not safe_task_name or len(safe_task_name) < 2:  # 如果文件名太短或为空
-                safe_task_name = "chinese_dataflow_results"
-            
-            download_filename = f"{safe_task_name}_{task_id[:8]}.zip"  # 只使用任务ID的前8位
-            
-            # 读取zip文件内容并直接返回响应
-            with open(temp_zip.name, 'rb') as f:
-                zip_data = f.read()
-            
-            from flask import Response
-            
-            response = Response(
-                zip_data,
-                mimetype='application/zip',
-                headers={
-                    'Content-Disposition': f'attachment; filename="{download_filename}"',
-                    'Content-Length': str(len(zip_data))
-                }
-            )
-            
-            # 立即清理临时文件
-            try:
-                if os.path.exists(temp_zip.name):
-                    os.unlink(temp_zip.name)
-            except Exception as cleanup_error:
-                logger.warning(f"清理临时文件失败: {str(cleanup_error)}")
+        # 中文DataFlow结果存储在默认bucket中
+        default_bucket = current_app.config.get('MINIO_DEFAULT_BUCKET', 'pindata-bucket')
+        entries = []
+        for result in successful_results:
+            minio_bucket = result.get('minio_bucket') or default_bucket
+            processed_filename = result.get('filename', os.path.basename(result['minio_object_name']))
             
-            return response
+            # 处理后的文本文件
+            entries.append({
+                'bucket': minio_bucket,
+                'object_name': result['minio_object_name'],
+                'arcname': processed_filename
+            })
             
-        except Exception as zip_error:
-            logger.error(f"创建zip文件失败: {str(zip_error)}")
-            # 确保清理临时文件
-            try:
-                if os.path.exists(temp_zip.name):
-                    os.unlink(temp_zip.name)
-            except Exception as cleanup_error:
-                logger.warning(f"清理临时文件失败: {str(cleanup_error)}")
-            return error_response(f"创建压缩包失败: {str(zip_error)}")
+            # JSON详细结果文件（如果存在）
+            json_object_name = result.get('minio_json_object_name')
+            if json_object_name:
+                entries.append({
+                    'bucket': minio_bucket,
+                    'object_name': json_object_name,
+                    'arcname': f"{os.path.splitext(processed_filename)[0]}_details.json"
+                })
+        
+        # 生成下载文件名 - 使用ASCII安全的文件名
+        task_name = task.name or 'chinese_dataflow_task'
+        # 移除或替换所有非ASCII字符
+        safe_task_name = re.sub(r'[^\w\-_\s]', '', task_name)
+        safe_task_name = re.sub(r'\s+', '_', safe_task_name)   # 空格替换为下划线
+        safe_task_name = safe_task_name.encode('ascii', 'ignore').decode('ascii')  # 移除非ASCII字符
+        
+        if not safe_task_name or len(safe_task_name) < 2:  # 如果文件名太短或为空
+            safe_task_name = "chinese_dataflow_results"
+        
+        download_filename = f"{safe_task_name}_{task_id[:8]}.zip"  # 只使用任务ID的前8位
+        
+        # 流式打包，边下载边输出
+        return zip_stream_service.build_response(entries, download_filename)
         
     except Exception as e:
         logger.error(f"打包下载失败: {str(e)}")
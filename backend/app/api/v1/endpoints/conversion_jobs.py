@@ -86,7 +86,7 @@ class ConversionJobResource(Resource):
                 return error_response('转换任务不存在'), 404
             
             # 获取文件详情
-            job_dict = job.to_dict()
+            job_dict = job.to_dict(include_logs=True)
             job_dict['file_details'] = [detail.to_dict() for detail in job.file_details]
             
             return success_response(data=job_dict), 200
@@ -543,6 +543,44 @@ def get_dataset_import_status(dataset_id):
     })
 
 
+@api_v1.route('/datasets/<int:dataset_id>/reimport', methods=['POST'])
+@swag_from({
+    'tags': ['数据集'],
+    'summary': '增量重新导入数据集',
+    'description': '与上次导入的文件清单比对，只下载新增或变化的文件，生成新的默认版本',
+    'parameters': [{
+        'name': 'dataset_id',
+        'in': 'path',
+        'type': 'integer',
+        'required': True,
+        'description': '数据集ID'
+    }],
+    'responses': {
+        202: {'description': '重新导入任务已启动'},
+        400: {'description': '数据集不支持重新导入'},
+        404: {'description': '数据集不存在'}
+    }
+})
+def reimport_dataset(dataset_id):
+    """增量重新导入数据集"""
+    Dataset.query.get_or_404(dataset_id)
+    
+    try:
+        from app.services.dataset_service import DatasetService
+        
+        task = DatasetService().reimport_dataset(dataset_id)
+        
+        return jsonify({
+            'message': '重新导入任务已启动',
+            'task': task.to_dict()
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': '启动重新导入失败', 'details': str(e)}), 500
+
+
 @api_v1.route('/datasets/<int:dataset_id>/generate', methods=['POST'])
 @swag_from({
     'tags': ['数据集'],
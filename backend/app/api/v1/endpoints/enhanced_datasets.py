@@ -3,7 +3,10 @@ from flasgger import swag_from
 from marshmallow import ValidationError, Schema, fields, validate
 from app.api.v1 import api_v1
 from app.services.enhanced_dataset_service import EnhancedDatasetService
-from app.models.dataset_version import EnhancedDatasetVersion
+from app.models.dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile
+from app.services.line_index_service import line_index_service
+from app.services.dataset_sampling_service import dataset_sampling_service, SamplingNotReadyError
+from app.services.column_profile_service import column_profile_service
 from app.utils.response import success_response, error_response
 import logging
 
@@ -197,6 +200,7 @@ def get_dataset_preview(dataset_id):
 @swag_from({
     'tags': ['增强数据集'],
     'summary': '获取版本差异（类似git diff）',
+    'description': '按相对路径对齐两个版本的文件，按内容校验和判定新增/删除/修改/未变，返回汇总计数与分页明细',
     'parameters': [
         {
             'name': 'version1_id',
@@ -211,6 +215,27 @@ def get_dataset_preview(dataset_id):
             'type': 'string',
             'required': True,
             'description': '版本2 ID'
+        },
+        {
+            'name': 'status',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '明细中包含的状态，逗号分隔（added,removed,modified,unchanged），all 表示全部，默认只列出变化'
+        },
+        {
+            'name': 'page',
+            'in': 'query',
+            'type': 'integer',
+            'default': 1,
+            'description': '页码'
+        },
+        {
+            'name': 'page_size',
+            'in': 'query',
+            'type': 'integer',
+            'default': 50,
+            'description': '每页大小（最大 1000）'
         }
     ],
     'responses': {
@@ -222,7 +247,19 @@ def get_dataset_preview(dataset_id):
 def get_version_diff(version1_id, version2_id):
     """获取版本差异"""
     try:
-        diff_data = EnhancedDatasetService.get_version_diff(version1_id, version2_id)
+        status = request.args.get('status')
+        if status == 'all':
+            statuses = ['added', 'removed', 'modified', 'unchanged']
+        else:
+            statuses = [s for s in status.split(',') if s] if status else None
+        
+        diff_data = EnhancedDatasetService.get_version_diff(
+            version1_id,
+            version2_id,
+            statuses=statuses,
+            page=request.args.get('page', 1, type=int),
+            page_size=request.args.get('page_size', 50, type=int)
+        )
         
         return success_response(
             data=diff_data,
@@ -235,6 +272,146 @@ def get_version_diff(version1_id, version2_id):
         logger.error(f"获取版本差异失败: {str(e)}")
         return error_response('获取差异失败'), 500
 
+@api_v1.route('/dataset-versions/<string:version1_id>/diff/<string:version2_id>/records', methods=['GET'])
+@swag_from({
+    'tags': ['增强数据集'],
+    'summary': '获取文件记录级差异',
+    'description': '对两个版本中同一 JSONL/CSV 文件做流式哈希连接。指定 key 时按字段值对齐记录，可识别修改；否则按整行内容比较。结果按文件内容缓存',
+    'parameters': [
+        {
+            'name': 'version1_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': '版本1 ID'
+        },
+        {
+            'name': 'version2_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': '版本2 ID'
+        },
+        {
+            'name': 'path',
+            'in': 'query',
+            'type': 'string',
+            'required': True,
+            'description': '文件相对路径（版本差异明细中的 path）'
+        },
+        {
+            'name': 'key',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '对齐记录的字段名'
+        },
+        {
+            'name': 'change',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '明细中包含的变化类型，逗号分隔（removed,added,modified），默认全部'
+        },
+        {
+            'name': 'page',
+            'in': 'query',
+            'type': 'integer',
+            'default': 1,
+            'description': '页码'
+        },
+        {
+            'name': 'page_size',
+            'in': 'query',
+            'type': 'integer',
+            'default': 50,
+            'description': '每页大小（最大 1000）'
+        }
+    ],
+    'responses': {
+        200: {'description': '获取差异成功'},
+        400: {'description': '参数错误'}
+    }
+})
+def get_record_diff(version1_id, version2_id):
+    """获取文件记录级差异"""
+    try:
+        path = request.args.get('path')
+        if not path:
+            return error_response('缺少文件路径'), 400
+        change = request.args.get('change')
+        
+        diff_data = EnhancedDatasetService.get_record_diff(
+            version1_id,
+            version2_id,
+            path,
+            key=request.args.get('key') or None,
+            changes=[c for c in change.split(',') if c] if change else None,
+            page=request.args.get('page', 1, type=int),
+            page_size=request.args.get('page_size', 50, type=int)
+        )
+        
+        return success_response(
+            data=diff_data,
+            message='获取记录级差异成功'
+        )
+        
+    except ValueError as e:
+        return error_response(str(e)), 400
+    except Exception as e:
+        logger.error(f"获取记录级差异失败: {str(e)}")
+        return error_response('获取差异失败'), 500
+
+@api_v1.route('/dataset-versions/<string:version1_id>/compare/<string:version2_id>', methods=['GET'])
+@swag_from({
+    'tags': ['增强数据集'],
+    'summary': '按 Merkle 树比较两个版本',
+    'description': '根哈希相同即两个版本内容相同；否则从根向下只展开哈希不同的子树，返回变化的文件路径',
+    'parameters': [
+        {
+            'name': 'version1_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': '版本1 ID'
+        },
+        {
+            'name': 'version2_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': '版本2 ID'
+        },
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'default': 100,
+            'description': '最多返回的变化文件数（最大 1000）'
+        }
+    ],
+    'responses': {
+        200: {'description': '比较成功'},
+        400: {'description': '参数错误'}
+    }
+})
+def compare_versions(version1_id, version2_id):
+    """按 Merkle 树比较两个版本"""
+    try:
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        result = EnhancedDatasetService.compare_versions(version1_id, version2_id, limit)
+        
+        return success_response(
+            data=result,
+            message='两个版本内容相同' if result['identical'] else '比较版本成功'
+        )
+        
+    except ValueError as e:
+        return error_response(str(e)), 400
+    except Exception as e:
+        logger.error(f"比较版本失败: {str(e)}")
+        return error_response('比较版本失败'), 500
+
 @api_v1.route('/dataset-versions/<string:version_id>/set-default', methods=['POST'])
 @swag_from({
     'tags': ['增强数据集'],
@@ -327,6 +504,219 @@ def clone_version(source_version_id):
         logger.error(f"克隆版本失败: {str(e)}")
         return error_response('克隆失败'), 500
 
+@api_v1.route('/dataset-versions/<string:version_id>/normalize', methods=['POST'])
+@swag_from({
+    'tags': ['增强数据集'],
+    'summary': '将版本文件规整化为 Parquet',
+    'description': '后台把 csv/tsv/jsonl/arrow/parquet/txt 文件转换为按行组切分的 Parquet，并记录字段结构与行数',
+    'parameters': [
+        {
+            'name': 'version_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': '版本ID'
+        },
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': False,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'force': {'type': 'boolean', 'description': '重新转换已有 Parquet 副本的文件'}
+                }
+            }
+        }
+    ],
+    'responses': {
+        202: {'description': '规整化任务已启动'},
+        404: {'description': '版本不存在'}
+    }
+})
+def normalize_version(version_id):
+    """启动版本 Parquet 规整化任务"""
+    EnhancedDatasetVersion.query.get_or_404(version_id)
+    try:
+        from app.tasks.dataset_normalization_tasks import normalize_dataset_version_task
+        
+        data = request.get_json(silent=True) or {}
+        celery_task = normalize_dataset_version_task.delay(version_id, force=bool(data.get('force')))
+        
+        return success_response(
+            data={'task_id': celery_task.id, 'version_id': version_id},
+            message='规整化任务已启动'
+        ), 202
+        
+    except Exception as e:
+        logger.error(f"启动规整化任务失败: {str(e)}")
+        return error_response('启动规整化任务失败'), 500
+
+@api_v1.route('/dataset-versions/<string:version_id>/sample', methods=['GET'])
+@swag_from({
+    'tags': ['增强数据集'],
+    'summary': '对版本记录随机采样',
+    'description': '在版本全部文件上均匀随机采样，或按字段分层采样。已建立记录索引或 Parquet 副本的文件只读取抽中的记录；其余文件需顺序扫描，总量超过 DATASET_SAMPLE_MAX_SCAN_BYTES 时返回 409 并在后台建立索引；分层采样读取的分层列行数超过 DATASET_SAMPLE_MAX_STRATIFY_ROWS 时返回 409',
+    'parameters': [
+        {
+            'name': 'version_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': '版本ID'
+        },
+        {
+            'name': 'size',
+            'in': 'query',
+            'type': 'integer',
+            'default': 100,
+            'description': '样本量'
+        },
+        {
+            'name': 'seed',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': '随机种子，用于复现同一样本'
+        },
+        {
+            'name': 'stratify_by',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '分层字段，为空时均匀采样'
+        },
+        {
+            'name': 'allocation',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['equal', 'proportional'],
+            'default': 'equal',
+            'description': '分层样本分配方式'
+        },
+        {
+            'name': 'file_ids',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': '只在这些文件中采样，逗号分隔'
+        }
+    ],
+    'responses': {
+        200: {'description': '采样成功'},
+        400: {'description': '参数错误'},
+        404: {'description': '版本不存在'},
+        409: {'description': '需要读取的数据量超过同步采样上限（需顺序扫描时已在后台建立索引，稍后重试）'}
+    }
+})
+def sample_version_records(version_id):
+    """对版本记录随机采样"""
+    EnhancedDatasetVersion.query.get_or_404(version_id)
+    try:
+        file_ids = request.args.get('file_ids')
+        
+        result = dataset_sampling_service.sample_version(
+            version_id,
+            size=request.args.get('size', 100, type=int),
+            seed=request.args.get('seed', type=int),
+            stratify_by=request.args.get('stratify_by') or None,
+            allocation=request.args.get('allocation', 'equal'),
+            file_ids=[f for f in file_ids.split(',') if f] if file_ids else None
+        )
+        
+        return success_response(
+            data=result,
+            message=f'采样成功，共 {result["sample_size"]} 条'
+        )
+        
+    except SamplingNotReadyError as e:
+        return error_response(str(e)), 409
+    except ValueError as e:
+        return error_response(str(e)), 400
+    except Exception as e:
+        logger.error(f"版本采样失败: {str(e)}")
+        return error_response('采样失败'), 500
+
+@api_v1.route('/dataset-versions/<string:version_id>/analytics', methods=['GET'])
+@swag_from({
+    'tags': ['增强数据集'],
+    'summary': '获取版本文件分析统计',
+    'description': '按文件类型与大小统计版本文件，并返回表格文件的列统计（空值率、去重估计、分位数、长度分布、高频值）',
+    'parameters': [
+        {
+            'name': 'version_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': '版本ID'
+        }
+    ],
+    'responses': {
+        200: {'description': '获取成功'},
+        404: {'description': '版本不存在'}
+    }
+})
+def get_version_analytics(version_id):
+    """获取版本文件分析统计"""
+    EnhancedDatasetVersion.query.get_or_404(version_id)
+    try:
+        result = EnhancedDatasetService.get_file_analytics(version_id)
+        
+        return success_response(
+            data=result,
+            message='获取分析统计成功'
+        )
+        
+    except Exception as e:
+        logger.error(f"获取版本分析统计失败: {str(e)}")
+        return error_response('获取分析统计失败'), 500
+
+@api_v1.route('/dataset-versions/<string:version_id>/profile', methods=['POST'])
+@swag_from({
+    'tags': ['增强数据集'],
+    'summary': '统计版本表格文件的列',
+    'description': '后台单次流式扫描 csv/tsv/jsonl/arrow/parquet 文件（已规整化的文件读取 Parquet 副本），结果通过 analytics 接口查看',
+    'parameters': [
+        {
+            'name': 'version_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': '版本ID'
+        },
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': False,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'force': {'type': 'boolean', 'description': '重新统计已有结果的文件'}
+                }
+            }
+        }
+    ],
+    'responses': {
+        202: {'description': '列统计任务已启动'},
+        404: {'description': '版本不存在'}
+    }
+})
+def profile_version_columns(version_id):
+    """启动版本列统计任务"""
+    version = EnhancedDatasetVersion.query.get_or_404(version_id)
+    try:
+        data = request.get_json(silent=True) or {}
+        task_id = column_profile_service.schedule_files(version.files, force=bool(data.get('force')))
+        
+        return success_response(
+            data={'task_id': task_id, 'version_id': version_id},
+            message='列统计任务已启动' if task_id else '没有需要统计的文件'
+        ), 202
+        
+    except Exception as e:
+        logger.error(f"启动列统计任务失败: {str(e)}")
+        return error_response('启动列统计任务失败'), 500
+
 @api_v1.route('/dataset-versions/<string:version_id>/details', methods=['GET'])
 @swag_from({
     'tags': ['增强数据集'],
@@ -535,6 +925,109 @@ def download_dataset_file(file_id):
         logger.error(f"下载文件失败: {str(e)}")
         return error_response('下载文件失败'), 500
 
+@api_v1.route('/dataset-files/<string:file_id>/records', methods=['GET'])
+@swag_from({
+    'tags': ['增强数据集'],
+    'summary': '按记录分页读取文件',
+    'description': '读取 JSONL/CSV/文本文件中从 offset 开始的 limit 条记录。已建立记录索引时直接定位到最近的索引点，无需从头扫描',
+    'parameters': [
+        {
+            'name': 'file_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': '文件ID'
+        },
+        {
+            'name': 'offset',
+            'in': 'query',
+            'type': 'integer',
+            'default': 0,
+            'description': '起始记录序号（从0开始）'
+        },
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'default': 50,
+            'description': '记录数，最大1000'
+        }
+    ],
+    'responses': {
+        200: {'description': '读取成功'},
+        400: {'description': '参数错误或文件格式不支持'},
+        404: {'description': '文件不存在'}
+    }
+})
+def get_dataset_file_records(file_id):
+    """按记录分页读取文件"""
+    file = EnhancedDatasetFile.query.get_or_404(file_id)
+    try:
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+        
+        result = line_index_service.read_records(file, offset=offset, limit=limit)
+        
+        return success_response(
+            data=result,
+            message='读取记录成功'
+        )
+        
+    except ValueError as e:
+        return error_response(str(e)), 400
+    except Exception as e:
+        logger.error(f"读取文件记录失败: {str(e)}")
+        return error_response('读取文件记录失败'), 500
+
+@api_v1.route('/dataset-versions/<string:version_id>/line-index', methods=['POST'])
+@swag_from({
+    'tags': ['增强数据集'],
+    'summary': '为版本文件建立记录索引',
+    'description': '后台为版本中的 JSONL/CSV/文本文件建立记录偏移索引，通常在文件入库后自动执行',
+    'parameters': [
+        {
+            'name': 'version_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': '版本ID'
+        },
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': False,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'force': {'type': 'boolean', 'description': '重建已有索引'}
+                }
+            }
+        }
+    ],
+    'responses': {
+        202: {'description': '索引任务已启动'},
+        404: {'description': '版本不存在'}
+    }
+})
+def build_version_line_index(version_id):
+    """启动版本文件记录索引任务"""
+    version = EnhancedDatasetVersion.query.get_or_404(version_id)
+    try:
+        from app.tasks.dataset_file_tasks import build_line_indexes_task
+        
+        data = request.get_json(silent=True) or {}
+        file_ids = [f.id for f in version.files]
+        celery_task = build_line_indexes_task.delay(file_ids, force=bool(data.get('force')))
+        
+        return success_response(
+            data={'task_id': celery_task.id, 'version_id': version_id, 'file_count': len(file_ids)},
+            message='记录索引任务已启动'
+        ), 202
+        
+    except Exception as e:
+        logger.error(f"启动记录索引任务失败: {str(e)}")
+        return error_response('启动记录索引任务失败'), 500
+
 @api_v1.route('/dataset-versions/<string:version_id>/batch-operations', methods=['POST'])
 @swag_from({
     'tags': ['增强数据集'],
@@ -145,4 +145,19 @@ def liveness_check():
     """
     # 存活检查通常只检查进程是否正在运行
     # 这里我们简单返回200表示Flask应用正在运行
-    return jsonify({'status': 'alive'}), 200 
\ No newline at end of file
+    return jsonify({'status': 'alive'}), 200
+
+
+@health_bp.route('/health/storage', methods=['GET'])
+def storage_pool_stats():
+    """
+    MinIO 连接池状态接口
+    ---
+    tags:
+      - Health
+    responses:
+      200:
+        description: 连接池大小、各主机连接数及取连接等待时间统计
+    """
+    from app.services.storage_service import storage_service
+    return jsonify(storage_service.get_pool_stats()), 200
@@ -5,10 +5,12 @@ from werkzeug.utils import secure_filename
 import os
 from app.api.v1.schemas.library_schemas import (
     LibraryCreateSchema, LibraryUpdateSchema, LibraryQuerySchema,
-    LibraryFileQuerySchema, LibraryStatisticsSchema, LibraryFileUpdateSchema
+    LibraryFileQuerySchema, LibraryStatisticsSchema, LibraryFileUpdateSchema,
+    LibraryUploadInitSchema, LibraryUploadCompleteSchema
 )
 from app.services.library_service import LibraryService
 from app.services.storage_service import storage_service
+from app.services.chunked_upload_service import chunked_upload_service
 from app.utils.response import success_response, error_response, paginated_response
 import logging
 
@@ -40,7 +42,14 @@ ALLOWED_EXTENSIONS = {
     'mov': 'video/quicktime',
     'wmv': 'video/x-ms-wmv',
     'flv': 'video/x-flv',
-    'webm': 'video/webm'
+    'webm': 'video/webm',
+    
+    # 压缩包类型
+    'zip': 'application/zip',
+    'tar': 'application/x-tar',
+    'gz': 'application/gzip',
+    'tgz': 'application/gzip',
+    '7z': 'application/x-7z-compressed'
 }
 
 def allowed_file(filename):
@@ -266,8 +275,8 @@ class LibraryFilesResource(Resource):
                     file_extension = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
                     content_type = get_content_type(original_filename)
                     
-                    # 上传到 MinIO
-                    object_name, file_size = storage_service.upload_file(
+                    # 流式上传到 MinIO，同时计算内容哈希
+                    object_name, file_size, checksums = storage_service.upload_file_with_checksums(
                         file_data=file,
                         original_filename=original_filename,
                         content_type=content_type,
@@ -282,7 +291,8 @@ class LibraryFilesResource(Resource):
                         file_type=file_extension,
                         file_size=file_size,
                         minio_object_name=object_name,
-                        minio_bucket=current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data')
+                        minio_bucket=current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data'),
+                        content_hash=checksums['sha256']
                     )
                     
                     uploaded_files.append(library_file.to_dict())
@@ -313,6 +323,125 @@ class LibraryFilesResource(Resource):
             logger.error(f"文件上传失败: {str(e)}")
             return error_response(message="文件上传失败"), 500
 
+class LibraryUploadsResource(Resource):
+    """分片上传会话资源（大文件断点续传）"""
+    
+    def options(self, library_id):
+        """处理 CORS 预检请求"""
+        return {}, 200
+    
+    def post(self, library_id):
+        """创建分片上传会话，返回分片大小与分片数"""
+        try:
+            data = LibraryUploadInitSchema().load(request.get_json() or {})
+            
+            original_filename = data['filename']
+            if not allowed_file(original_filename):
+                return error_response(message=f"文件 {original_filename} 类型不支持"), 400
+            
+            session = chunked_upload_service.init_upload(
+                library_id=library_id,
+                filename=secure_filename(original_filename),
+                original_filename=original_filename,
+                file_type=original_filename.rsplit('.', 1)[1].lower(),
+                file_size=data['file_size'],
+                content_type=get_content_type(original_filename),
+                part_size=data.get('part_size')
+            )
+            
+            return success_response(data=session.to_dict(), message="上传会话创建成功"), 201
+            
+        except ValidationError as e:
+            return error_response(message="参数验证失败", errors=e.messages), 400
+        except ValueError as e:
+            return error_response(message=str(e)), 400
+        except Exception as e:
+            logger.error(f"创建上传会话失败: {str(e)}")
+            return error_response(message="创建上传会话失败"), 500
+
+class LibraryUploadResource(Resource):
+    """单个分片上传会话"""
+    
+    def options(self, library_id, session_id):
+        """处理 CORS 预检请求"""
+        return {}, 200
+    
+    def get(self, library_id, session_id):
+        """获取会话状态与已上传分片，用于断点续传"""
+        session = chunked_upload_service.get_session(library_id, session_id)
+        if not session:
+            return error_response(message="上传会话不存在"), 404
+        return success_response(data=session.to_dict())
+    
+    def delete(self, library_id, session_id):
+        """取消上传"""
+        try:
+            session = chunked_upload_service.get_session(library_id, session_id)
+            if not session:
+                return error_response(message="上传会话不存在"), 404
+            chunked_upload_service.abort_upload(session)
+            return success_response(message="上传已取消")
+        except ValueError as e:
+            return error_response(message=str(e)), 400
+        except Exception as e:
+            logger.error(f"取消上传失败: {str(e)}")
+            return error_response(message="取消上传失败"), 500
+
+class LibraryUploadPartResource(Resource):
+    """上传分片：请求体为分片原始字节，需携带 Content-MD5 或 X-Content-SHA256 头"""
+    
+    def options(self, library_id, session_id, part_number):
+        """处理 CORS 预检请求"""
+        return {}, 200
+    
+    def put(self, library_id, session_id, part_number):
+        """上传单个分片，可并行、可重传"""
+        try:
+            session = chunked_upload_service.get_session(library_id, session_id)
+            if not session:
+                return error_response(message="上传会话不存在"), 404
+            
+            part = chunked_upload_service.upload_part(
+                session,
+                part_number,
+                request.get_data(cache=False),
+                md5_base64=request.headers.get('Content-MD5'),
+                sha256=request.headers.get('X-Content-SHA256')
+            )
+            return success_response(data=part.to_dict(), message=f"分片 {part_number} 上传成功")
+            
+        except ValueError as e:
+            return error_response(message=str(e)), 400
+        except Exception as e:
+            logger.error(f"上传分片失败: {session_id}/{part_number}, 错误: {str(e)}")
+            return error_response(message="上传分片失败"), 500
+
+class LibraryUploadCompleteResource(Resource):
+    """完成分片上传"""
+    
+    def options(self, library_id, session_id):
+        """处理 CORS 预检请求"""
+        return {}, 200
+    
+    def post(self, library_id, session_id):
+        """合并分片并创建文件记录，重复调用返回同一文件"""
+        try:
+            data = LibraryUploadCompleteSchema().load(request.get_json(silent=True) or {})
+            session = chunked_upload_service.get_session(library_id, session_id)
+            if not session:
+                return error_response(message="上传会话不存在"), 404
+            
+            library_file = chunked_upload_service.complete_upload(session, data['parts'])
+            return success_response(data=library_file.to_dict(), message="文件上传成功"), 201
+            
+        except ValidationError as e:
+            return error_response(message="参数验证失败", errors=e.messages), 400
+        except ValueError as e:
+            return error_response(message=str(e)), 400
+        except Exception as e:
+            logger.error(f"完成分片上传失败: {str(e)}")
+            return error_response(message="完成分片上传失败"), 500
+
 class LibraryFileResource(Resource):
     """单个文件资源"""
     
@@ -404,4 +533,8 @@ api.add_resource(LibraryListResource, '/libraries')
 api.add_resource(LibraryDetailResource, '/libraries/<string:library_id>')
 api.add_resource(LibraryFilesResource, '/libraries/<string:library_id>/files')
 api.add_resource(LibraryFileResource, '/libraries/<string:library_id>/files/<string:file_id>')
+api.add_resource(LibraryUploadsResource, '/libraries/<string:library_id>/uploads')
+api.add_resource(LibraryUploadResource, '/libraries/<string:library_id>/uploads/<string:session_id>')
+api.add_resource(LibraryUploadPartResource, '/libraries/<string:library_id>/uploads/<string:session_id>/parts/<int:part_number>')
+api.add_resource(LibraryUploadCompleteResource, '/libraries/<string:library_id>/uploads/<string:session_id>/complete')
 api.add_resource(LibraryStatisticsResource, '/libraries/statistics') 
\ No newline at end of file
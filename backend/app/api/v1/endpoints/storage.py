@@ -1,7 +1,6 @@
-import tempfile
 import os
 import urllib.parse
-from flask import Blueprint, request, send_file, make_response, current_app
+from flask import Blueprint, request, send_file, current_app
 from flask_restful import Api, Resource
 from app.services.storage_service import storage_service
 from app.utils.response import error_response
@@ -13,21 +12,6 @@ logger = logging.getLogger(__name__)
 storage_bp = Blueprint('storage', __name__)
 api = Api(storage_bp)
 
-def safe_filename_for_disposition(filename):
-    """
-    安全地编码文件名用于 Content-Disposition 响应头
-    处理中文字符，避免 UnicodeEncodeError
-    """
-    try:
-        # 首先尝试使用 ASCII 编码
-        filename.encode('ascii')
-        # 如果成功，直接返回
-        return f'attachment; filename="{filename}"'
-    except UnicodeEncodeError:
-        # 如果包含非 ASCII 字符，使用 RFC 2231 编码
-        encoded_filename = urllib.parse.quote(filename.encode('utf-8'))
-        return f"attachment; filename*=UTF-8''{encoded_filename}"
-
 class StorageDownloadResource(Resource):
     """存储下载资源"""
     
@@ -49,36 +33,9 @@ class StorageDownloadResource(Resource):
                 current_app.config.get('MINIO_BUCKET_NAME', 'pindata-bucket')
             ]
             
-            downloaded_file = None
-            actual_bucket = None
-            
-            # 尝试从不同的bucket中下载文件
-            for bucket_name in possible_buckets:
-                try:
-                    logger.info(f"尝试从bucket '{bucket_name}' 下载文件: {object_name}")
-                    
-                    # 检查文件是否存在
-                    if storage_service.file_exists_in_bucket(bucket_name, object_name):
-                        # 创建临时文件
-                        tmp_file = tempfile.NamedTemporaryFile(delete=False)
-                        
-                        # 从MinIO下载文件
-                        storage_service.download_file(
-                            bucket_name,
-                            object_name,
-                            tmp_file.name
-                        )
-                        
-                        downloaded_file = tmp_file.name
-                        actual_bucket = bucket_name
-                        logger.info(f"文件下载成功，来源bucket: {bucket_name}")
-                        break
-                        
-                except Exception as e:
-                    logger.warning(f"从bucket '{bucket_name}' 下载失败: {str(e)}")
-                    continue
-            
-            if not downloaded_file:
+            # 通过对象->bucket索引定位，仅在索引未命中时探测
+            actual_bucket = storage_service.resolve_bucket(object_name, possible_buckets)
+            if not actual_bucket:
                 error_msg = f"文件不存在: {object_name}，已尝试的buckets: {possible_buckets}"
                 logger.error(error_msg)
                 return error_response(error_msg), 404
@@ -94,48 +51,51 @@ class StorageDownloadResource(Resource):
                 '.doc': 'application/msword',
                 '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
                 '.ppt': 'application/vnd.ms-powerpoint',
-                '.txt': 'text/plain',
+                '.txt': 'text/plain; charset=utf-8',
                 '.md': 'text/markdown; charset=utf-8',
                 '.json': 'application/json',
                 '.jsonl': 'application/json'
             }
             
-            content_type = mime_types.get(file_ext, 'application/octet-stream')
+            # 默认按 STORAGE_DOWNLOAD_MODE（stream）由API流式返回（支持Range）；
+            # 请求或配置为 redirect 且配置了 MINIO_PUBLIC_ENDPOINT 时才302跳转到预签名URL
+            return storage_service.get_download_response(
+                actual_bucket,
+                object_name,
+                filename=base_filename,
+                content_type=mime_types.get(file_ext, 'application/octet-stream'),
+                mode=request.args.get('mode')
+            )
             
-            # 如果是文本类文件，以文本形式返回
-            if file_ext in ['.md', '.json', '.jsonl', '.txt']:
-                with open(downloaded_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                os.unlink(downloaded_file)
-                
-                response = make_response(content)
-                response.headers['Content-Type'] = content_type
-                response.headers['Content-Disposition'] = safe_filename_for_disposition(base_filename)
-                return response
-            else:
-                # 其他文件以二进制形式返回
-                # 为了避免 send_file 的中文文件名问题，我们手动构建响应
-                try:
-                    with open(downloaded_file, 'rb') as f:
-                        file_data = f.read()
-                    os.unlink(downloaded_file)
-                    
-                    response = make_response(file_data)
-                    response.headers['Content-Type'] = content_type
-                    response.headers['Content-Disposition'] = safe_filename_for_disposition(base_filename)
-                    return response
-                except Exception as e:
-                    # 如果手动处理失败，回退到 send_file（不过先清理临时文件）
-                    try:
-                        os.unlink(downloaded_file)
-                    except:
-                        pass
-                    logger.error(f"手动处理文件失败，错误: {str(e)}")
-                    raise
-                
         except Exception as e:
             logger.error(f"下载文件失败: {str(e)}")
             return error_response(f'下载文件失败: {str(e)}'), 500
 
+class LocalStorageObjectResource(Resource):
+    """本地存储后端的预签名下载地址"""
+    
+    def get(self, bucket_name, object_path):
+        """校验签名后直接发送磁盘文件（sendfile，支持 Range）"""
+        object_name = urllib.parse.unquote(object_path)
+        if not storage_service.verify_local_url(bucket_name, object_name,
+                                                request.args.get('expires'),
+                                                request.args.get('signature')):
+            return error_response('链接无效或已过期'), 403
+        
+        file_path = storage_service.get_local_path(bucket_name, object_name)
+        if not file_path:
+            return error_response(f"文件不存在: {object_name}"), 404
+        
+        stat = storage_service._get_client().stat_object(bucket_name, object_name)
+        return send_file(
+            file_path,
+            mimetype=stat.content_type,
+            as_attachment=True,
+            download_name=os.path.basename(object_name),
+            conditional=True,
+            etag=stat.etag
+        )
+
 # 注册路由
-api.add_resource(StorageDownloadResource, '/storage/download/<path:object_path>') 
\ No newline at end of file
+api.add_resource(StorageDownloadResource, '/storage/download/<path:object_path>')
+api.add_resource(LocalStorageObjectResource, '/storage/local/<string:bucket_name>/<path:object_path>')
@@ -4,13 +4,11 @@
 from flask import Blueprint, request, current_app
 from app.services.dataflow_pipeline_service import DataFlowPipelineService
 from app.services.storage_service import storage_service
+from app.services.zip_stream_service import zip_stream_service
 from app.utils.response import success_response, error_response
 from app.models.task import Task, TaskStatus, TaskType
 from app.db import db
 import logging
-import tempfile
-import os
-import zipfile
 import re
 
 logger = logging.getLogger(__name__)
@@ -92,37 +90,17 @@ def _download_chinese_dataflow_zip(task):
         else:
             logger.info(f"在路径 {folder_prefix} 找到 {len(file_objects)} 个文件")
         
-        # 创建临时zip文件
-        temp_zip = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
-        temp_zip.close()
-        
-        try:
-            with zipfile.ZipFile(temp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for file_obj in file_objects:
-                    object_name = file_obj.object_name
-                    
-                    try:
-                        # 下载文件内容
-                        file_content = storage_service.get_file_content(bucket_name, object_name)
-                        
-                        if file_content:
-                            # 生成zip内的文件名（去掉路径前缀）
-                            zip_filename = object_name.replace(folder_prefix, '')
-                            
-                            # 添加文件到zip
-                            zip_file.writestr(zip_filename, file_content.encode('utf-8'))
-                            logger.info(f"添加中文DataFlow文件到zip: {zip_filename}")
-                            
-                    except Exception as file_error:
-                        logger.error(f"下载中文DataFlow文件失败: {object_name}, 错误: {str(file_error)}")
-                        continue
-            
-            return _create_zip_response(temp_zip.name, task, "chinese_dataflow_results")
-            
-        except Exception as zip_error:
-            logger.error(f"创建中文DataFlow zip文件失败: {str(zip_error)}")
-            _cleanup_temp_file(temp_zip.name)
-            return error_response(f"创建压缩包失败: {str(zip_error)}")
+        # 生成zip内的文件名（去掉路径前缀），流式打包
+        entries = [
+            {
+                'bucket': bucket_name,
+                'object_name': file_obj.object_name,
+                'arcname': file_obj.object_name.replace(folder_prefix, '')
+            }
+            for file_obj in file_objects
+            if not file_obj.is_dir
+        ]
+        return _create_zip_response(entries, task, "chinese_dataflow_results")
     
     except Exception as e:
         logger.error(f"下载中文DataFlow任务失败: {str(e)}")
@@ -170,53 +148,25 @@ def _download_original_dataflow_zip(task):
         else:
             logger.info(f"在路径 {folder_prefix} 找到 {len(file_objects)} 个文件")
         
-        # 创建临时zip文件
-        temp_zip = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
-        temp_zip.close()
-        
-        try:
-            with zipfile.ZipFile(temp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for file_obj in file_objects:
-                    object_name = file_obj.object_name
-                    
-                    try:
-                        # 从MinIO下载文件内容
-                        file_content = storage_service.get_file(
-                            object_name, 
-                            bucket_name=bucket_name
-                        )
-                        
-                        if file_content:
-                            # 生成zip内的文件名（去掉路径前缀）
-                            zip_filename = object_name.replace(folder_prefix, '')
-                            
-                            # 添加到zip文件
-                            zip_file.writestr(zip_filename, file_content)
-                            logger.info(f"添加英文DataFlow文件到zip: {zip_filename}")
-                            
-                    except Exception as file_error:
-                        logger.error(f"下载英文DataFlow文件失败: {object_name}, 错误: {str(file_error)}")
-                        continue
-            
-            return _create_zip_response(temp_zip.name, task, "dataflow_results")
-            
-        except Exception as zip_error:
-            logger.error(f"创建英文DataFlow zip文件失败: {str(zip_error)}")
-            _cleanup_temp_file(temp_zip.name)
-            return error_response(f"创建压缩包失败: {str(zip_error)}")
+        # 生成zip内的文件名（去掉路径前缀），流式打包
+        entries = [
+            {
+                'bucket': bucket_name,
+                'object_name': file_obj.object_name,
+                'arcname': file_obj.object_name.replace(folder_prefix, '')
+            }
+            for file_obj in file_objects
+            if not file_obj.is_dir
+        ]
+        return _create_zip_response(entries, task, "dataflow_results")
     
     except Exception as e:
         logger.error(f"下载英文DataFlow任务失败: {str(e)}")
         return error_response(str(e))
 
-def _create_zip_response(temp_zip_path, task, default_prefix):
-    """创建zip文件响应"""
+def _create_zip_response(entries, task, default_prefix):
+    """创建流式zip文件响应"""
     try:
-        # 检查zip文件是否有内容
-        if os.path.getsize(temp_zip_path) == 0:
-            _cleanup_temp_file(temp_zip_path)
-            return error_response("没有成功下载到任何文件")
-        
         # 生成下载文件名 - 使用ASCII安全的文件名
         task_name = task.name or default_prefix
         # 移除或替换所有非ASCII字符
@@ -229,39 +179,12 @@ def _create_zip_response(temp_zip_path, task, default_prefix):
         
         download_filename = f"{safe_task_name}_{task.id[:8]}.zip"  # 只使用任务ID的前8位
         
-        # 读取zip文件内容并直接返回响应
-        with open(temp_zip_path, 'rb') as f:
-            zip_data = f.read()
-        
-        from flask import Response
-        
-        response = Response(
-            zip_data,
-            mimetype='application/zip',
-            headers={
-                'Content-Disposition': f'attachment; filename="{download_filename}"',
-                'Content-Length': str(len(zip_data))
-            }
-        )
-        
-        # 立即清理临时文件
-        _cleanup_temp_file(temp_zip_path)
-        
-        return response
+        return zip_stream_service.build_response(entries, download_filename)
     
     except Exception as e:
         logger.error(f"创建zip响应失败: {str(e)}")
-        _cleanup_temp_file(temp_zip_path)
         return error_response(f"创建下载响应失败: {str(e)}")
 
-def _cleanup_temp_file(file_path):
-    """清理临时文件"""
-    try:
-        if os.path.exists(file_path):
-            os.unlink(file_path)
-    except Exception as cleanup_error:
-        logger.warning(f"清理临时文件失败: {str(cleanup_error)}")
-
 @unified_tasks_bp.route('/tasks/<task_id>/status', methods=['GET', 'OPTIONS'])
 def get_unified_task_status(task_id):
     """获取统一任务状态（支持DataFlow和中文DataFlow）"""
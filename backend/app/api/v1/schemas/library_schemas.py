@@ -42,6 +42,22 @@ class LibraryFileUploadSchema(Schema):
     """文件上传验证模式"""
     files = fields.List(fields.Raw(), required=True)
 
+class LibraryUploadInitSchema(Schema):
+    """分片上传初始化验证模式"""
+    filename = fields.Str(required=True, validate=validate.Length(min=1, max=255))
+    file_size = fields.Int(required=True, validate=validate.Range(min=1))
+    part_size = fields.Int(missing=None, validate=validate.Range(min=1))
+
+class LibraryUploadPartChecksumSchema(Schema):
+    """客户端记录的分片校验和"""
+    part_number = fields.Int(required=True, validate=validate.Range(min=1, max=10000))
+    md5 = fields.Str(missing=None, validate=validate.Length(equal=32))
+    sha256 = fields.Str(missing=None, validate=validate.Length(equal=64))
+
+class LibraryUploadCompleteSchema(Schema):
+    """分片上传完成验证模式"""
+    parts = fields.List(fields.Nested(LibraryUploadPartChecksumSchema), missing=[])
+
 class LibraryFileQuerySchema(Schema):
     """文件查询参数验证模式"""
     page = fields.Int(missing=1, validate=validate.Range(min=1))
@@ -35,9 +35,24 @@ def make_celery(app_name=__name__):
             'app.tasks.dataset_import_tasks', 
             'app.tasks.dataset_generation_tasks',
             'app.tasks.dataflow_tasks',  # 添加DataFlow任务
-            'app.tasks.chinese_dataflow_tasks'  # 添加中文DataFlow任务
+            'app.tasks.chinese_dataflow_tasks',  # 添加中文DataFlow任务
+            'app.tasks.storage_maintenance_tasks',  # 存储维护（blob 垃圾回收、过期上传清理）
+            'app.tasks.dataset_normalization_tasks',  # 导入后的 Parquet 规整化
+            'app.tasks.dataset_file_tasks'  # 数据集文件记录索引
             # 'app.tasks.multimodal_dataset_tasks'  # 暂时移除，功能开发中
-        ]
+        ],
+        
+        # 定时任务（由 celery beat 调度，见 start_celery_beat.sh 与 docker-compose 的 pindata-celery-beat 服务）
+        beat_schedule={
+            'collect-dataset-blobs': {
+                'task': 'tasks.collect_dataset_blobs',
+                'schedule': float(getattr(Config, 'DATASET_BLOB_GC_INTERVAL', 3600)),
+            },
+            'cleanup-upload-sessions': {
+                'task': 'tasks.cleanup_upload_sessions',
+                'schedule': float(getattr(Config, 'UPLOAD_SESSION_CLEANUP_INTERVAL', 3600)),
+            }
+        }
     )
     
     return celery
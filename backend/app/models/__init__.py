@@ -1,14 +1,18 @@
 from .dataset import Dataset, DatasetVersion, DatasetTag, DatasetLike, DatasetDownload, DatasetType, DatasetFormat
-from .dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile, VersionType
+from .dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile, VersionType, DatasetVersionTreeNode
+from .dataset_blob import DatasetBlob
 from .task import Task, TaskType, TaskStatus
 from .plugin import Plugin
 from .raw_data import RawData, FileType, ProcessingStatus
 from .library import Library, DataType
 from .library_file import LibraryFile, ProcessStatus
+from .upload_session import UploadSession, UploadSessionPart, UploadSessionStatus
 from .llm_config import LLMConfig, ProviderType, ReasoningExtractionMethod
 from .system_log import SystemLog, LogLevel
 from .conversion_job import ConversionJob, ConversionStatus
 from .conversion_file_detail import ConversionFileDetail
+from .conversion_job_log import ConversionJobLog
+from .conversion_cache import ConversionCache
 from .dataflow_result import DataFlowResult, DataFlowQualityMetrics, PipelineType
 
 # User management models
@@ -35,11 +39,12 @@ from .data_source_config import DataSourceConfig, DataSourceType as ConfigDataSo
 
 __all__ = [
     'Dataset', 'DatasetVersion', 'DatasetTag', 'DatasetLike', 'DatasetDownload', 'DatasetType', 'DatasetFormat',
-    'EnhancedDatasetVersion', 'EnhancedDatasetFile', 'VersionType',
+    'EnhancedDatasetVersion', 'EnhancedDatasetFile', 'VersionType', 'DatasetVersionTreeNode', 'DatasetBlob',
     'Task', 'TaskType', 'TaskStatus', 'Plugin', 'RawData', 'FileType', 'ProcessingStatus',
     'Library', 'LibraryFile', 'DataType', 'ProcessStatus',
+    'UploadSession', 'UploadSessionPart', 'UploadSessionStatus',
     'LLMConfig', 'ProviderType', 'ReasoningExtractionMethod', 'SystemLog', 'LogLevel',
-    'ConversionJob', 'ConversionStatus', 'ConversionFileDetail',
+    'ConversionJob', 'ConversionStatus', 'ConversionFileDetail', 'ConversionJobLog', 'ConversionCache',
     'DataFlowResult', 'DataFlowQualityMetrics', 'PipelineType',
     # User management
     'User', 'UserStatus', 'Organization', 'OrganizationStatus',
@@ -0,0 +1,36 @@
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger
+from app.db import db
+
+class ConversionCache(db.Model):
+    """文档转换结果缓存，按原始内容哈希 + 转换方法 + LLM配置 + 转换配置去重"""
+    __tablename__ = 'conversion_cache'
+
+    cache_key = Column(String(64), primary_key=True)  # 转换键的 SHA-256
+    content_hash = Column(String(64), nullable=False, index=True)  # 原始文件内容 SHA-256
+    method = Column(String(50), nullable=False)  # markitdown or vision_llm
+    llm_config_id = Column(String(36))  # 使用的LLM配置
+
+    # 转换结果
+    converted_bucket = Column(String(100), nullable=False)
+    converted_object_name = Column(String(500), nullable=False)
+    converted_file_size = Column(BigInteger)
+
+    # 命中统计
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'cache_key': self.cache_key,
+            'content_hash': self.content_hash,
+            'method': self.method,
+            'llm_config_id': self.llm_config_id,
+            'converted_bucket': self.converted_bucket,
+            'converted_object_name': self.converted_object_name,
+            'converted_file_size': self.converted_file_size,
+            'hit_count': self.hit_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_used_at': self.last_used_at.isoformat() if self.last_used_at else None
+        }
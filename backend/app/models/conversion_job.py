@@ -4,6 +4,7 @@ from sqlalchemy.orm import relationship, backref
 import enum
 import uuid
 from app.db import db
+from .conversion_job_log import ConversionJobLog
 
 class ConversionStatus(enum.Enum):
     """转换状态枚举"""
@@ -43,7 +44,7 @@ class ConversionJob(db.Model):
     error_message = Column(Text)
     
     # 处理日志（存储详细的处理过程）
-    processing_logs = Column(JSON, default=list)  # 存储处理过程的详细日志
+    processing_logs = Column(JSON, default=list)  # 历史任务的处理日志，新日志写入 conversion_job_logs 表
     
     # 时间戳
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -55,14 +56,16 @@ class ConversionJob(db.Model):
     library = relationship('Library', backref='conversion_jobs')
     task = relationship('Task', backref=backref('conversion_job', uselist=False))
     llm_config = relationship('LLMConfig', backref='conversion_jobs')
+    # 日志由数据库 ON DELETE CASCADE 删除，删除任务时不加载日志
+    logs = relationship('ConversionJobLog', cascade='all, delete-orphan', passive_deletes=True, lazy='dynamic')
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         if not self.id:
             self.id = str(uuid.uuid4())
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_logs: bool = False):
+        result = {
             'id': self.id,
             'library_id': self.library_id,
             'task_id': self.task_id,
@@ -77,12 +80,15 @@ class ConversionJob(db.Model):
             'progress_percentage': self.progress_percentage,
             'current_file_name': self.current_file_name,
             'error_message': self.error_message,
-            'processing_logs': self.processing_logs,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if include_logs:
+            # 日志只在单个任务详情中返回，列表接口不逐个查询日志
+            result['processing_logs'] = self.get_logs()
+        return result
     
     def update_progress(self):
         """更新进度百分比"""
@@ -92,17 +98,14 @@ class ConversionJob(db.Model):
             self.progress_percentage = 0
     
     def add_log(self, message: str, level: str = 'INFO'):
-        """添加处理日志"""
-        if self.processing_logs is None:
-            self.processing_logs = []
-        
-        log_entry = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'level': level,
-            'message': message
-        }
-        self.processing_logs.append(log_entry)
-        
-        # 限制日志数量，避免过多
-        if len(self.processing_logs) > 1000:
-            self.processing_logs = self.processing_logs[-1000:] 
\ No newline at end of file
+        """添加处理日志（写入追加日志表，随下一次提交落库）"""
+        db.session.add(ConversionJobLog(conversion_job_id=self.id, level=level, message=message))
+    
+    def get_logs(self, limit: int = 1000) -> list:
+        """获取最近的处理日志，按时间正序返回"""
+        logs = ConversionJobLog.query.filter_by(conversion_job_id=self.id)\
+            .order_by(ConversionJobLog.id.desc()).limit(limit).all()
+        if not logs:
+            # 兼容日志仍保存在 processing_logs 字段中的历史任务
+            return (self.processing_logs or [])[-limit:]
+        return [log.to_dict() for log in reversed(logs)] 
\ No newline at end of file
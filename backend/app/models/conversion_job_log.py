@@ -0,0 +1,30 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Text, DateTime, Integer, ForeignKey
+from app.db import db
+
+class ConversionJobLog(db.Model):
+    """文档转换任务日志（追加写入，避免反复重写任务行）"""
+    __tablename__ = 'conversion_job_logs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversion_job_id = Column(String(36), ForeignKey('conversion_jobs.id', ondelete='CASCADE'), nullable=False, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    level = Column(String(20), default='INFO')
+    message = Column(Text, nullable=False)
+
+    @staticmethod
+    def build_entry(conversion_job_id: str, message: str, level: str = 'INFO') -> dict:
+        """构造批量插入用的日志记录"""
+        return {
+            'conversion_job_id': conversion_job_id,
+            'timestamp': datetime.utcnow(),
+            'level': level,
+            'message': message
+        }
+
+    def to_dict(self):
+        return {
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'level': self.level,
+            'message': self.message
+        }
@@ -0,0 +1,35 @@
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger
+from app.db import db
+
+class DatasetBlob(db.Model):
+    """数据集文件内容块：按内容 SHA-256 去重存储，多个版本的文件记录通过引用计数共享同一对象"""
+    __tablename__ = 'dataset_blobs'
+
+    checksum = Column(String(64), primary_key=True)  # 文件内容 SHA-256
+    md5 = Column(String(32))
+
+    # 存储位置
+    bucket = Column(String(100), nullable=False)
+    object_name = Column(String(500), nullable=False)
+    size = Column(BigInteger)
+    content_type = Column(String(100))
+
+    # 引用计数，归零后记录时间，超过宽限期由垃圾回收删除
+    ref_count = Column(Integer, nullable=False, default=0)
+    orphaned_at = Column(DateTime, index=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'checksum': self.checksum,
+            'md5': self.md5,
+            'bucket': self.bucket,
+            'object_name': self.object_name,
+            'size': self.size,
+            'content_type': self.content_type,
+            'ref_count': self.ref_count,
+            'orphaned_at': self.orphaned_at.isoformat() if self.orphaned_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -33,7 +33,8 @@ class EnhancedDatasetVersion(db.Model):
     # 数据信息
     total_size = Column(BigInteger, default=0)  # 总数据大小
     file_count = Column(Integer, default=0)  # 文件数量
-    data_checksum = Column(String(64))  # 数据校验和
+    data_checksum = Column(String(64))  # 数据校验和（Merkle 树根哈希）
+    data_schema = Column(JSON)  # Parquet 规整化后各表的字段结构与行数
     
     # 配置和统计
     pipeline_config = Column(JSON)  # 数据处理管道配置
@@ -113,6 +114,7 @@ class EnhancedDatasetVersion(db.Model):
             'total_size_formatted': self._format_size(self.total_size),
             'file_count': self.file_count,
             'data_checksum': self.data_checksum,
+            'data_schema': self.data_schema,
             'pipeline_config': self.pipeline_config,
             'stats': self.stats,
             'metadata': self.version_metadata,
@@ -129,7 +131,10 @@ class EnhancedDatasetVersion(db.Model):
 class EnhancedDatasetFile(db.Model):
     """数据集文件模型"""
     __tablename__ = 'enhanced_dataset_files'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_enhanced_dataset_files_version_bucket', 'version_id', 'merkle_bucket'),
+        {'extend_existing': True}
+    )
     
     id = Column(String(36), primary_key=True)
     version_id = Column(String(36), ForeignKey('enhanced_dataset_versions.id'), nullable=False)
@@ -144,6 +149,9 @@ class EnhancedDatasetFile(db.Model):
     # MinIO存储信息
     minio_bucket = Column(String(100), default='datasets')
     minio_object_name = Column(String(500), nullable=False)
+    blob_checksum = Column(String(64), ForeignKey('dataset_blobs.checksum'), index=True)  # 引用的内容块，旧数据为空
+    parquet_blob_checksum = Column(String(64), ForeignKey('dataset_blobs.checksum'), index=True)  # 规整化后的 Parquet 副本
+    merkle_bucket = Column(String(8))  # 所在 Merkle 树叶子（相对路径哈希的前缀）
     
     # 文件元数据
     file_metadata = Column(JSON)  # 文件特定的元数据（改名避免冲突）
@@ -163,6 +171,11 @@ class EnhancedDatasetFile(db.Model):
         if not self.id:
             self.id = str(uuid.uuid4())
     
+    @property
+    def blob_checksums(self):
+        """文件引用的全部内容块（原始文件及 Parquet 副本）"""
+        return [checksum for checksum in (self.blob_checksum, self.parquet_blob_checksum) if checksum]
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -175,6 +188,8 @@ class EnhancedDatasetFile(db.Model):
             'checksum': self.checksum,
             'minio_bucket': self.minio_bucket,
             'minio_object_name': self.minio_object_name,
+            'blob_checksum': self.blob_checksum,
+            'parquet_blob_checksum': self.parquet_blob_checksum,
             'metadata': self.file_metadata,
             'preview_data': self.preview_data,
             'annotations': self.annotations,
@@ -189,4 +204,25 @@ class EnhancedDatasetFile(db.Model):
             if size_bytes < 1024.0:
                 return f"{size_bytes:.1f} {unit}"
             size_bytes /= 1024.0
-        return f"{size_bytes:.1f} PB" 
\ No newline at end of file
+        return f"{size_bytes:.1f} PB" 
+
+class DatasetVersionTreeNode(db.Model):
+    """
+    版本 Merkle 树节点。文件按相对路径哈希的十六进制前缀分桶，
+    prefix 为节点对应的前缀（空串为根，最长的为叶子桶），hash 覆盖该前缀下的全部文件
+    """
+    __tablename__ = 'dataset_version_tree_nodes'
+    
+    version_id = Column(String(36), ForeignKey('enhanced_dataset_versions.id', ondelete='CASCADE'), primary_key=True)
+    prefix = Column(String(8), primary_key=True)
+    hash = Column(String(64), nullable=False)
+    file_count = Column(Integer, nullable=False, default=0)
+    total_size = Column(BigInteger, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'prefix': self.prefix,
+            'hash': self.hash,
+            'file_count': self.file_count,
+            'total_size': self.total_size
+        }
@@ -24,6 +24,7 @@ class LibraryFile(db.Model):
     # 存储相关
     minio_object_name = Column(String(500), nullable=False)  # MinIO中的对象名
     minio_bucket = Column(String(100), default='raw-data')  # MinIO存储桶
+    content_hash = Column(String(64), index=True)  # 原始文件内容 SHA-256，用于转换去重
     
     # 转换相关
     process_status = Column(Enum(ProcessStatus), default=ProcessStatus.PENDING)
@@ -83,6 +84,7 @@ class LibraryFile(db.Model):
             'file_size_human': self.get_file_size_human(),
             'minio_object_name': self.minio_object_name,
             'minio_bucket': self.minio_bucket,
+            'content_hash': self.content_hash,
             'process_status': self.process_status.value if self.process_status else None,
             'process_status_label': self.get_status_label(),
             'converted_format': self.converted_format,
@@ -0,0 +1,102 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Enum, BigInteger, ForeignKey
+from sqlalchemy.orm import relationship
+from app.db import db
+import enum
+
+class UploadSessionStatus(enum.Enum):
+    """分片上传会话状态枚举"""
+    UPLOADING = "uploading"
+    COMPLETED = "completed"
+    ABORTED = "aborted"
+
+class UploadSession(db.Model):
+    """文件库分片上传会话，对应一次 MinIO multipart upload，支持并行上传与断点续传"""
+    __tablename__ = 'upload_sessions'
+
+    id = Column(String(36), primary_key=True)  # UUID
+    library_id = Column(String(36), ForeignKey('libraries.id'), nullable=False, index=True)
+
+    # 文件信息
+    filename = Column(String(255), nullable=False)
+    original_filename = Column(String(255), nullable=False)
+    file_type = Column(String(50))
+    content_type = Column(String(100))
+    file_size = Column(BigInteger, nullable=False)  # 声明的文件总大小（字节）
+
+    # 分片信息：除最后一片外每片大小都等于 part_size
+    part_size = Column(BigInteger, nullable=False)
+    part_count = Column(Integer, nullable=False)
+
+    # 存储相关
+    minio_bucket = Column(String(100), nullable=False)
+    minio_object_name = Column(String(500), nullable=False)
+    minio_upload_id = Column(String(255), nullable=False)
+
+    status = Column(Enum(UploadSessionStatus), nullable=False, default=UploadSessionStatus.UPLOADING)
+    library_file_id = Column(String(36))  # 完成后创建的文件记录
+
+    expires_at = Column(DateTime, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    parts = relationship('UploadSessionPart', back_populates='session',
+                         cascade='all, delete-orphan', order_by='UploadSessionPart.part_number')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if not self.id:
+            import uuid
+            self.id = str(uuid.uuid4())
+
+    def expected_part_size(self, part_number: int) -> int:
+        """指定分片应有的大小"""
+        if part_number < self.part_count:
+            return self.part_size
+        return self.file_size - self.part_size * (self.part_count - 1)
+
+    def to_dict(self, include_parts: bool = True):
+        data = {
+            'id': self.id,
+            'library_id': self.library_id,
+            'filename': self.filename,
+            'original_filename': self.original_filename,
+            'file_type': self.file_type,
+            'content_type': self.content_type,
+            'file_size': self.file_size,
+            'part_size': self.part_size,
+            'part_count': self.part_count,
+            'status': self.status.value if self.status else None,
+            'library_file_id': self.library_file_id,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+        if include_parts:
+            data['uploaded_parts'] = [part.to_dict() for part in self.parts]
+            data['uploaded_size'] = sum(part.size or 0 for part in self.parts)
+        return data
+
+class UploadSessionPart(db.Model):
+    """已上传并通过校验的分片"""
+    __tablename__ = 'upload_session_parts'
+
+    session_id = Column(String(36), ForeignKey('upload_sessions.id'), primary_key=True)
+    part_number = Column(Integer, primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    etag = Column(String(100), nullable=False)
+    md5 = Column(String(32), nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    uploaded_at = Column(DateTime, default=datetime.utcnow)
+
+    session = relationship('UploadSession', back_populates='parts')
+
+    def to_dict(self):
+        return {
+            'part_number': self.part_number,
+            'size': self.size,
+            'etag': self.etag,
+            'md5': self.md5,
+            'sha256': self.sha256,
+            'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None
+        }
@@ -7,7 +7,7 @@ from io import BytesIO
 import cv2
 import numpy as np
 from app.models import RawData, AnnotationType, LLMConfig, ProviderType
-from app.services.storage_service import StorageService
+from app.services.storage_service import storage_service
 from app.services.llm_conversion_service import LLMConversionService
 from langchain.schema import HumanMessage, SystemMessage
 try:
@@ -22,7 +22,7 @@ class AIAnnotationService:
     """AI辅助标注服务"""
     
     def __init__(self):
-        self.storage_service = StorageService()
+        self.storage_service = storage_service
         self.llm_service = LLMConversionService()
         
         # 初始化Whisper模型（本地模型，不依赖配置）
@@ -0,0 +1,287 @@
+import os
+import math
+import uuid
+import base64
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db import db
+from app.models import Library, LibraryFile
+from app.models.upload_session import UploadSession, UploadSessionPart, UploadSessionStatus
+from app.services.library_service import LibraryService
+from app.services.storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+# S3 分片上传限制
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PART_COUNT = 10000
+
+class ChunkedUploadService:
+    """
+    文件库分片上传（init / part / complete），每个会话对应一次 MinIO multipart upload。
+
+    分片可由客户端并行上传，服务端按 MD5/SHA-256 校验后写入 MinIO；
+    连接中断后通过查询会话获取已上传分片，只需重传缺失部分
+    """
+
+    def _session_expires(self) -> datetime:
+        seconds = current_app.config.get('UPLOAD_SESSION_EXPIRES', 24 * 3600)
+        return datetime.utcnow() + timedelta(seconds=seconds)
+
+    def _choose_part_size(self, file_size: int, part_size: Optional[int]) -> int:
+        """确定分片大小：不小于 5MB、不超过单次请求上限，且分片数不超过 10000"""
+        max_part_size = min(MAX_PART_SIZE, current_app.config.get('MAX_CONTENT_LENGTH') or MAX_PART_SIZE)
+        part_size = part_size or current_app.config.get('UPLOAD_PART_SIZE', 16 * 1024 * 1024)
+        # 分片数超过上限时按 MB 向上取整放大分片
+        required = math.ceil(file_size / MAX_PART_COUNT)
+        if part_size < required:
+            part_size = math.ceil(required / (1024 * 1024)) * 1024 * 1024
+        part_size = max(part_size, MIN_PART_SIZE)
+        if part_size > max_part_size:
+            raise ValueError(f"分片大小 {part_size} 超过单次请求上限 {max_part_size}")
+        return part_size
+
+    def init_upload(self, library_id: str, filename: str, original_filename: str, file_type: str,
+                    file_size: int, content_type: str = None, part_size: int = None) -> UploadSession:
+        """
+        创建分片上传会话
+
+        Args:
+            library_id: 文件库ID
+            filename: 安全化后的文件名
+            original_filename: 原始文件名
+            file_type: 文件扩展名
+            file_size: 文件总大小（字节）
+            content_type: 内容类型
+            part_size: 期望的分片大小，不满足限制时自动调整
+
+        Returns:
+            UploadSession: 新建的会话
+        """
+        if not Library.query.filter_by(id=library_id).first():
+            raise ValueError("文件库不存在")
+        if file_size <= 0:
+            raise ValueError("文件大小必须大于0")
+
+        part_size = self._choose_part_size(file_size, part_size)
+        bucket = current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data')
+        extension = os.path.splitext(original_filename)[1]
+        object_name = f"{library_id}/{uuid.uuid4().hex}{extension}"
+        upload_id = storage_service.create_multipart_upload(bucket, object_name, content_type)
+
+        session = UploadSession(
+            library_id=library_id,
+            filename=filename,
+            original_filename=original_filename,
+            file_type=file_type,
+            content_type=content_type,
+            file_size=file_size,
+            part_size=part_size,
+            part_count=math.ceil(file_size / part_size),
+            minio_bucket=bucket,
+            minio_object_name=object_name,
+            minio_upload_id=upload_id,
+            status=UploadSessionStatus.UPLOADING,
+            expires_at=self._session_expires()
+        )
+        db.session.add(session)
+        db.session.commit()
+
+        logger.info(f"创建分片上传会话: {session.id}, 文件: {original_filename}, "
+                    f"大小: {file_size}, 分片: {session.part_count} x {part_size}")
+        return session
+
+    def get_session(self, library_id: str, session_id: str) -> Optional[UploadSession]:
+        return UploadSession.query.filter_by(id=session_id, library_id=library_id).first()
+
+    def _check_active(self, session: UploadSession):
+        if session.status != UploadSessionStatus.UPLOADING:
+            raise ValueError(f"上传会话已{'完成' if session.status == UploadSessionStatus.COMPLETED else '取消'}")
+        if session.expires_at and session.expires_at < datetime.utcnow():
+            raise ValueError("上传会话已过期")
+
+    def upload_part(self, session: UploadSession, part_number: int, data: bytes,
+                    md5_base64: str = None, sha256: str = None) -> UploadSessionPart:
+        """
+        上传并校验单个分片，重复上传同一序号时覆盖
+
+        Args:
+            session: 上传会话
+            part_number: 分片序号，从1开始
+            data: 分片内容
+            md5_base64: 客户端计算的 MD5（Content-MD5，base64）
+            sha256: 客户端计算的 SHA-256（十六进制）
+
+        Returns:
+            UploadSessionPart: 分片记录
+        """
+        self._check_active(session)
+        if not 1 <= part_number <= session.part_count:
+            raise ValueError(f"分片序号必须在 1-{session.part_count} 之间")
+        expected_size = session.expected_part_size(part_number)
+        if len(data) != expected_size:
+            raise ValueError(f"分片 {part_number} 大小应为 {expected_size} 字节，实际 {len(data)} 字节")
+        if not md5_base64 and not sha256:
+            raise ValueError("缺少分片校验和（Content-MD5 或 X-Content-SHA256）")
+
+        md5_digest = hashlib.md5(data).digest()
+        sha256_hex = hashlib.sha256(data).hexdigest()
+        if md5_base64 and base64.b64encode(md5_digest).decode('ascii') != md5_base64.strip():
+            raise ValueError(f"分片 {part_number} MD5 校验失败")
+        if sha256 and sha256_hex != sha256.strip().lower():
+            raise ValueError(f"分片 {part_number} SHA-256 校验失败")
+
+        # 同时把 MD5 交给 MinIO，保证服务端到存储之间的传输也经过校验
+        etag = storage_service.upload_part(
+            session.minio_bucket, session.minio_object_name, session.minio_upload_id,
+            part_number, data, md5_base64=base64.b64encode(md5_digest).decode('ascii')
+        )
+
+        # 并行上传的分片各自写入一行，同一序号重传时覆盖
+        values = {
+            'session_id': session.id,
+            'part_number': part_number,
+            'size': len(data),
+            'etag': etag.strip('"'),
+            'md5': md5_digest.hex(),
+            'sha256': sha256_hex,
+            'uploaded_at': datetime.utcnow()
+        }
+        stmt = insert(UploadSessionPart).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UploadSessionPart.session_id, UploadSessionPart.part_number],
+            set_={key: stmt.excluded[key] for key in ('size', 'etag', 'md5', 'sha256', 'uploaded_at')}
+        )
+        db.session.execute(stmt)
+        # 有分片上传时顺延会话有效期
+        UploadSession.query.filter_by(id=session.id).update(
+            {'expires_at': self._session_expires()}, synchronize_session=False
+        )
+        db.session.commit()
+
+        return UploadSessionPart(**values)
+
+    def complete_upload(self, session: UploadSession, parts: List[Dict] = None) -> LibraryFile:
+        """
+        合并分片并创建文件库文件记录。重复调用时返回已创建的文件
+
+        Args:
+            session: 上传会话
+            parts: 可选，客户端记录的分片校验和 [{part_number, sha256 或 md5}]，与服务端记录比对
+
+        Returns:
+            LibraryFile: 文件记录
+        """
+        try:
+            return self._complete_locked(session.id, parts)
+        except Exception:
+            # 释放会话行锁
+            db.session.rollback()
+            raise
+
+    def _complete_locked(self, session_id: str, parts: List[Dict] = None) -> LibraryFile:
+        # 锁定会话，防止并发 complete
+        session = UploadSession.query.filter_by(id=session_id).with_for_update().populate_existing().first()
+        if session.status == UploadSessionStatus.COMPLETED and session.library_file_id:
+            db.session.commit()
+            return LibraryFile.query.get(session.library_file_id)
+        self._check_active(session)
+
+        uploaded = {
+            part.part_number: part
+            for part in UploadSessionPart.query.filter_by(session_id=session.id).all()
+        }
+        missing = [n for n in range(1, session.part_count + 1) if n not in uploaded]
+        if missing:
+            raise ValueError(f"缺少 {len(missing)} 个分片: {missing[:20]}")
+        total = sum(part.size for part in uploaded.values())
+        if total != session.file_size:
+            raise ValueError(f"分片总大小 {total} 与文件大小 {session.file_size} 不一致")
+
+        for client_part in parts or []:
+            server_part = uploaded.get(client_part.get('part_number'))
+            if server_part is None:
+                raise ValueError(f"分片 {client_part.get('part_number')} 不存在")
+            if client_part.get('sha256') and client_part['sha256'].lower() != server_part.sha256:
+                raise ValueError(f"分片 {server_part.part_number} SHA-256 与服务端记录不一致")
+            if client_part.get('md5') and client_part['md5'].lower() != server_part.md5:
+                raise ValueError(f"分片 {server_part.part_number} MD5 与服务端记录不一致")
+
+        storage_service.complete_multipart_upload(
+            session.minio_bucket, session.minio_object_name, session.minio_upload_id,
+            [(n, uploaded[n].etag) for n in sorted(uploaded)]
+        )
+
+        session.status = UploadSessionStatus.COMPLETED
+        # 分片上传无法得到整文件 SHA-256，content_hash 留空，由转换任务读取时计算
+        library_file = LibraryService.add_file_to_library(
+            library_id=session.library_id,
+            filename=session.filename,
+            original_filename=session.original_filename,
+            file_type=session.file_type,
+            file_size=session.file_size,
+            minio_object_name=session.minio_object_name,
+            minio_bucket=session.minio_bucket,
+            commit=False
+        )
+        session.library_file_id = library_file.id
+        # 文件记录与会话状态一起提交，提交前一直持有会话行锁
+        db.session.commit()
+
+        try:
+            library_file.library.update_statistics()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"更新文件库统计失败: {session.library_id}, 错误: {str(e)}")
+
+        logger.info(f"分片上传完成: 会话 {session.id}, 文件 {library_file.id}")
+        return library_file
+
+    def abort_upload(self, session: UploadSession) -> None:
+        """取消上传并释放 MinIO 中已上传的分片"""
+        if session.status != UploadSessionStatus.UPLOADING:
+            raise ValueError("只能取消上传中的会话")
+        storage_service.abort_multipart_upload(
+            session.minio_bucket, session.minio_object_name, session.minio_upload_id
+        )
+        session.status = UploadSessionStatus.ABORTED
+        db.session.commit()
+
+    def cleanup_expired(self, limit: int = 100) -> int:
+        """
+        清理过期会话：上传中的会话先取消 MinIO 分片上传，再删除会话与分片记录
+
+        Returns:
+            int: 清理的会话数
+        """
+        sessions = UploadSession.query.filter(
+            UploadSession.expires_at < datetime.utcnow()
+        ).order_by(UploadSession.expires_at).limit(limit).with_for_update(skip_locked=True).all()
+
+        cleaned = 0
+        for session in sessions:
+            if session.status == UploadSessionStatus.UPLOADING:
+                try:
+                    storage_service.abort_multipart_upload(
+                        session.minio_bucket, session.minio_object_name, session.minio_upload_id
+                    )
+                except Exception as e:
+                    logger.warning(f"取消过期分片上传失败: {session.id}, 错误: {str(e)}")
+                    continue
+            db.session.delete(session)
+            cleaned += 1
+        db.session.commit()
+
+        if cleaned:
+            logger.info(f"清理过期分片上传会话: {cleaned} 个")
+        return cleaned
+
+# 创建全局分片上传服务实例
+chunked_upload_service = ChunkedUploadService()
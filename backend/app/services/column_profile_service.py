@@ -0,0 +1,323 @@
+import os
+import shutil
+import tempfile
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from flask import current_app
+
+from app.models.dataset_version import EnhancedDatasetFile
+from app.services.storage_service import storage_service
+from app.services.parquet_normalization_service import parquet_normalization_service, detect_format
+from app.utils.sketches import HyperLogLog, TDigest, MisraGries
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+# 字符串长度直方图的分桶（左闭右开）
+LENGTH_BUCKETS = [0, 1, 16, 64, 256, 1024, 4096]
+
+# 高频值与最值中的长字符串截断长度
+MAX_VALUE_CHARS = 200
+
+def _column_kind(data_type) -> str:
+    import pyarrow as pa
+
+    if pa.types.is_integer(data_type) or pa.types.is_floating(data_type) or pa.types.is_decimal(data_type):
+        return 'numeric'
+    if pa.types.is_boolean(data_type):
+        return 'boolean'
+    if pa.types.is_string(data_type) or pa.types.is_large_string(data_type):
+        return 'string'
+    if pa.types.is_binary(data_type) or pa.types.is_large_binary(data_type):
+        return 'binary'
+    if pa.types.is_duration(data_type) or pa.types.is_interval(data_type):
+        # 时长/间隔不是时间点：没有 min_max 内核，Python 值也不能序列化为 ISO 字符串
+        return 'other'
+    if pa.types.is_temporal(data_type):
+        return 'temporal'
+    return 'other'
+
+def _truncate(value):
+    if isinstance(value, str) and len(value) > MAX_VALUE_CHARS:
+        return value[:MAX_VALUE_CHARS] + '…'
+    return value
+
+class _ColumnProfile:
+    """单列的流式统计累加器，内存占用固定"""
+
+    def __init__(self, name: str, data_type, settings: Dict):
+        self.name = name
+        self.type = str(data_type)
+        self.kind = _column_kind(data_type)
+        self.count = 0
+        self.null_count = 0
+        self.nan_count = 0
+        self.inf_count = 0
+        self.mixed_types = False
+        # 嵌套类型（list/struct 等）不做去重估计
+        self.hll = HyperLogLog(settings['hll_precision']) if self.kind != 'other' else None
+        self.digest = TDigest(settings['tdigest_compression']) if self.kind == 'numeric' else None
+        self.top_values = MisraGries(settings['top_k_capacity']) if self.kind == 'string' else None
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.min = None
+        self.max = None
+        self.true_count = 0
+        self.length_min = None
+        self.length_max = None
+        self.length_sum = 0
+        self.length_histogram = [0] * len(LENGTH_BUCKETS)
+
+    def _update_min_max(self, low, high) -> None:
+        if low is not None and (self.min is None or low < self.min):
+            self.min = low
+        if high is not None and (self.max is None or high > self.max):
+            self.max = high
+
+    def update(self, array) -> None:
+        import numpy as np
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        self.count += len(array)
+        self.null_count += array.null_count
+        valid = pc.drop_null(array)
+        if len(valid) == 0:
+            return
+
+        kind = _column_kind(valid.type)
+        if kind != self.kind:
+            if self.kind == 'string':
+                # JSON/CSV 分块推断的类型不一致时按字符串统计
+                valid = pc.cast(valid, pa.string())
+                kind = 'string'
+            else:
+                self.mixed_types = True
+
+        if kind == 'numeric':
+            values = valid.to_numpy(zero_copy_only=False).astype(np.float64)
+            nan = np.isnan(values)
+            self.nan_count += int(nan.sum())
+            values = values[~nan]
+            if self.hll:
+                self.hll.add_hashes(pd.util.hash_array(values))
+            if self.kind == 'numeric' and len(values):
+                self.digest.update(values)
+                finite = values[np.isfinite(values)]
+                self.inf_count += len(values) - len(finite)
+                self.sum += float(finite.sum())
+                self.sum_squares += float(np.square(finite).sum())
+                # ±inf 不计入最值：JSON 列无法保存 Infinity
+                if len(finite):
+                    self._update_min_max(float(finite.min()), float(finite.max()))
+            return
+
+        if self.hll and kind != 'other':
+            if kind == 'temporal':
+                hash_source = pc.cast(valid, pa.string())
+            else:
+                hash_source = valid
+            self.hll.add_hashes(pd.util.hash_array(hash_source.to_numpy(zero_copy_only=False).astype(object)))
+        if kind != self.kind:
+            return
+        if kind == 'boolean':
+            self.true_count += int(pc.sum(valid).as_py() or 0)
+        elif kind in ('string', 'binary'):
+            lengths = (pc.utf8_length(valid) if kind == 'string' else pc.binary_length(valid))
+            lengths = lengths.to_numpy(zero_copy_only=False)
+            self.length_sum += int(lengths.sum())
+            low, high = int(lengths.min()), int(lengths.max())
+            self.length_min = low if self.length_min is None else min(self.length_min, low)
+            self.length_max = high if self.length_max is None else max(self.length_max, high)
+            buckets = np.searchsorted(LENGTH_BUCKETS, lengths, side='right') - 1
+            for bucket, count in zip(*np.unique(buckets, return_counts=True)):
+                self.length_histogram[bucket] += int(count)
+            if kind == 'string':
+                counts = pc.value_counts(valid)
+                self.top_values.update_counts(counts.field('values').to_pylist(),
+                                              counts.field('counts').to_pylist())
+                extremes = pc.min_max(valid)
+                self._update_min_max(extremes['min'].as_py(), extremes['max'].as_py())
+        elif kind == 'temporal':
+            extremes = pc.min_max(valid)
+            self._update_min_max(extremes['min'].as_py(), extremes['max'].as_py())
+
+    def to_dict(self) -> Dict[str, Any]:
+        non_null = self.count - self.null_count
+        result = {
+            'name': self.name,
+            'type': self.type,
+            'kind': self.kind,
+            'count': self.count,
+            'null_count': self.null_count,
+            'null_rate': self.null_count / self.count if self.count else 0,
+            # 估计值不会超过非空值数
+            'distinct_estimate': min(self.hll.estimate(), non_null) if self.hll else None,
+        }
+        if self.mixed_types:
+            result['mixed_types'] = True
+        if self.kind == 'numeric':
+            finite = self.digest.count()
+            mean = self.sum / finite if finite else None
+            variance = max(self.sum_squares / finite - mean * mean, 0.0) if finite else None
+            result.update({
+                'nan_count': self.nan_count,
+                'inf_count': self.inf_count,
+                'min': self.min,
+                'max': self.max,
+                'mean': mean,
+                'std': variance ** 0.5 if variance is not None else None,
+                'quantiles': self.digest.quantiles(QUANTILES) if finite else {}
+            })
+        elif self.kind == 'boolean':
+            result.update({'true_count': self.true_count, 'false_count': non_null - self.true_count})
+        elif self.kind == 'temporal':
+            result.update({
+                'min': self.min.isoformat() if hasattr(self.min, 'isoformat') else self.min,
+                'max': self.max.isoformat() if hasattr(self.max, 'isoformat') else self.max
+            })
+        elif self.kind in ('string', 'binary'):
+            result['length'] = {
+                'min': self.length_min,
+                'max': self.length_max,
+                'mean': self.length_sum / non_null if non_null else None,
+                'histogram': [
+                    {
+                        'range': f'{low}-{LENGTH_BUCKETS[i + 1] - 1}' if i + 1 < len(LENGTH_BUCKETS) else f'{low}+',
+                        'count': count
+                    }
+                    for i, (low, count) in enumerate(zip(LENGTH_BUCKETS, self.length_histogram))
+                ]
+            }
+            if self.kind == 'string':
+                result.update({
+                    'min': _truncate(self.min),
+                    'max': _truncate(self.max),
+                    'top_values': [
+                        {'value': _truncate(item['value']), 'count': item['count']}
+                        for item in self.top_values.top(10)
+                    ],
+                    'top_values_error': self.top_values.error
+                })
+        return result
+
+class ColumnProfileService:
+    """
+    表格文件列统计：单次流式读取全部记录，按批更新每列的空值率、去重估计（HyperLogLog）、
+    最值、分位数（t-digest）、字符串长度直方图和高频值（Misra-Gries），内存占用与文件大小无关。
+    已有 Parquet 副本时直接按行组读取副本，否则下载原文件按块解析
+    """
+
+    def _settings(self) -> Dict:
+        config = current_app.config
+        return {
+            'hll_precision': config.get('COLUMN_PROFILE_HLL_PRECISION', 14),
+            'tdigest_compression': config.get('COLUMN_PROFILE_TDIGEST_COMPRESSION', 200),
+            'top_k_capacity': config.get('COLUMN_PROFILE_TOP_K_CAPACITY', 256)
+        }
+
+    @staticmethod
+    def is_profilable(file: EnhancedDatasetFile) -> bool:
+        return bool(file.parquet_blob_checksum or detect_format(file.filename)) and file.file_size != 0
+
+    def get_profile(self, file: EnhancedDatasetFile) -> Optional[Dict]:
+        return (file.file_metadata or {}).get('column_profile')
+
+    @staticmethod
+    def _iter_parquet_batches(parquet: Dict) -> Iterator:
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(storage_service.open_random_access(
+            parquet['minio_bucket'], parquet['minio_object_name'], parquet.get('size')
+        ))
+        for group in range(parquet_file.metadata.num_row_groups):
+            yield from parquet_file.read_row_group(group).to_batches()
+
+    def _profile_batches(self, batches: Iterator, settings: Dict) -> Dict:
+        columns: Dict[str, _ColumnProfile] = {}
+        num_rows = 0
+        for batch in batches:
+            num_rows += batch.num_rows
+            for name, array in zip(batch.schema.names, batch.columns):
+                profile = columns.get(name)
+                if profile is None:
+                    profile = columns[name] = _ColumnProfile(name, array.type, settings)
+                    # 后出现的列在之前的批次中视为空值
+                    profile.count = profile.null_count = num_rows - batch.num_rows
+                profile.update(array)
+            for name, profile in columns.items():
+                if name not in batch.schema.names:
+                    profile.count += batch.num_rows
+                    profile.null_count += batch.num_rows
+        return {'num_rows': num_rows, 'columns': [profile.to_dict() for profile in columns.values()]}
+
+    def profile_file(self, file: EnhancedDatasetFile, force: bool = False) -> Optional[Dict]:
+        """
+        统计文件各列并写入 file_metadata['column_profile']（不提交）
+
+        Returns:
+            Dict: 列统计，不支持的文件返回 None
+        """
+        import pyarrow as pa
+
+        if not self.is_profilable(file):
+            return None
+        existing = self.get_profile(file)
+        if existing and not force:
+            return existing
+        settings = self._settings()
+
+        parquet = (file.file_metadata or {}).get('parquet')
+        if file.parquet_blob_checksum and parquet:
+            source = 'parquet'
+            result = self._profile_batches(self._iter_parquet_batches(parquet), settings)
+        else:
+            source = 'file'
+            fmt = detect_format(file.filename)
+            work_dir = tempfile.mkdtemp(prefix='column_profile_')
+            try:
+                path = os.path.join(work_dir, 'source')
+                storage_service.download_file(file.minio_bucket, file.minio_object_name, path)
+                try:
+                    result = self._profile_batches(parquet_normalization_service.iter_file_batches(path, fmt), settings)
+                except pa.ArrowInvalid:
+                    if fmt not in ('csv', 'tsv'):
+                        raise
+                    logger.info(f"CSV 列类型不一致，按字符串重新统计: {file.filename}")
+                    result = self._profile_batches(
+                        parquet_normalization_service.iter_file_batches(path, fmt, csv_as_strings=True), settings
+                    )
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        profile = {
+            **result,
+            'source': source,
+            'hll_precision': settings['hll_precision'],
+            'tdigest_compression': settings['tdigest_compression'],
+            'profiled_at': datetime.utcnow().isoformat()
+        }
+        metadata = dict(file.file_metadata or {})
+        metadata['column_profile'] = profile
+        file.file_metadata = metadata
+        logger.info(f"列统计完成: {file.filename}, {result['num_rows']} 行, {len(result['columns'])} 列")
+        return profile
+
+    def schedule_files(self, files: List[EnhancedDatasetFile], force: bool = False) -> Optional[str]:
+        """为可统计的文件启动后台列统计任务，失败只记录日志"""
+        file_ids = [f.id for f in files if self.is_profilable(f) and (force or not self.get_profile(f))]
+        if not file_ids:
+            return None
+        try:
+            from app.tasks.dataset_file_tasks import profile_columns_task
+            return profile_columns_task.delay(file_ids, force=force).id
+        except Exception as e:
+            logger.warning(f"启动列统计任务失败: {str(e)}")
+            return None
+
+# 创建全局列统计服务实例
+column_profile_service = ColumnProfileService()
@@ -1,4 +1,6 @@
+import re
 import json
+import codecs
 import pandas as pd
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
@@ -11,9 +13,16 @@ from app.services.storage_service import storage_service
 from app.models.dataset_version import EnhancedDatasetFile
 import tempfile
 import os
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# JSON 数组元素之间的空白与逗号
+_JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+# 后台生成中的预览占位类型
+PENDING_PREVIEW_TYPE = 'pending'
+
 class DataPreviewService:
     """数据预览服务"""
     
@@ -54,61 +63,128 @@ class DataPreviewService:
             return {
                 'type': 'error',
                 'message': f'预览生成失败: {str(e)}',
-                'items': []
+                'items': [],
+                'failed_at': datetime.utcnow().isoformat()
             }
     
+    @staticmethod
+    def _bucket_name(file: EnhancedDatasetFile) -> str:
+        # 如果文件记录中没有bucket名称，使用配置的默认bucket
+        return file.minio_bucket or current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data')
+    
+    @staticmethod
+    def _read_head(file: EnhancedDatasetFile, min_lines: int) -> Tuple[bytes, bool]:
+        """
+        范围读取文件开头。完整行数不足时成倍扩大读取范围，直到 PREVIEW_MAX_HEAD_BYTES
+        
+        Returns:
+            (读取的内容, 是否已读到文件末尾)
+        """
+        length = current_app.config.get('PREVIEW_HEAD_BYTES', 256 * 1024)
+        max_length = max(length, current_app.config.get('PREVIEW_MAX_HEAD_BYTES', 4 * 1024 * 1024))
+        bucket_name = DataPreviewService._bucket_name(file)
+        
+        if file.file_size == 0:
+            return b'', True
+        data = b''
+        while True:
+            try:
+                with storage_service.open_stream(bucket_name, file.minio_object_name,
+                                                 offset=len(data), length=length - len(data)) as stream:
+                    chunk = stream.read()
+            except Exception:
+                if not data:
+                    raise
+                # 文件大小未知时，恰好读到末尾后的范围请求会失败
+                return data, True
+            data += chunk
+            if len(data) < length or (file.file_size is not None and len(data) >= file.file_size):
+                return data, True
+            if data.count(b'\n') > min_lines or length >= max_length:
+                return data, False
+            length = min(length * 4, max_length)
+    
+    @staticmethod
+    def _decode_head(data: bytes, complete: bool, encodings: List[str]) -> Tuple[str, str]:
+        """
+        依次尝试候选编码解码，未读完时允许末尾出现被截断的多字节字符
+        
+        Returns:
+            (文本, 使用的编码)
+        """
+        for encoding in encodings:
+            try:
+                return codecs.getincrementaldecoder(encoding)().decode(data, final=complete), encoding
+            except UnicodeDecodeError:
+                continue
+        raise Exception("无法解码文本文件")
+    
+    @staticmethod
+    def _complete_lines(text: str, complete: bool) -> str:
+        """去掉未读完时末尾不完整的一行"""
+        if complete:
+            return text
+        return text[:text.rfind('\n') + 1]
+    
+    @staticmethod
+    def _persisted_row_count(file: EnhancedDatasetFile) -> Optional[int]:
+        """持久化的总行数：行索引或 Parquet 规整化时记录的行数"""
+        metadata = file.file_metadata or {}
+        for key in ('line_index', 'parquet'):
+            num_rows = (metadata.get(key) or {}).get('num_rows')
+            if num_rows is not None:
+                return num_rows
+        return None
+    
+    @staticmethod
+    def _total_rows(file: EnhancedDatasetFile, sample_rows: int, sample_bytes: int,
+                    complete: bool, header_bytes: int = 0) -> Tuple[Optional[int], bool]:
+        """
+        总行数：优先使用持久化的行数；文件已读完时取实际行数；否则按样本平均行长与文件大小估算
+        
+        Returns:
+            (总行数, 是否为估算值)
+        """
+        persisted = DataPreviewService._persisted_row_count(file)
+        if persisted is not None:
+            return persisted, False
+        if complete:
+            return sample_rows, False
+        if sample_rows and sample_bytes > header_bytes and file.file_size:
+            estimated = sample_rows * (file.file_size - header_bytes) / (sample_bytes - header_bytes)
+            return max(sample_rows, int(round(estimated))), True
+        return sample_rows, True
+    
     @staticmethod
     def _preview_text_data(file: EnhancedDatasetFile, max_items: int) -> Dict[str, Any]:
-        """预览文本数据"""
+        """预览文本数据：只范围读取文件开头，不下载整个对象"""
         try:
-            # 从MinIO下载文件内容
-            with tempfile.NamedTemporaryFile() as tmp_file:
-                # 获取实际的bucket名称
-                bucket_name = file.minio_bucket
-                if not bucket_name:
-                    # 如果文件记录中没有bucket名称，使用配置的默认bucket
-                    bucket_name = current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data')
-                
-                storage_service.download_file(
-                    bucket_name,
-                    file.minio_object_name,
-                    tmp_file.name
-                )
-                
-                # 根据文件类型处理
-                file_ext = file.filename.split('.')[-1].lower()
+            # 多读一行用于 CSV 表头
+            data, complete = DataPreviewService._read_head(file, max_items + 1)
+            
+            # 根据文件类型处理
+            file_ext = file.filename.split('.')[-1].lower()
+            
+            if file_ext == 'csv':
+                return DataPreviewService._preview_csv(file, data, complete, max_items)
+            elif file_ext in ['json', 'jsonl']:
+                return DataPreviewService._preview_json(file, data, complete, max_items, file_ext)
+            else:
+                return DataPreviewService._preview_plain_text(file, data, complete, max_items)
                 
-                if file_ext == 'csv':
-                    return DataPreviewService._preview_csv(tmp_file.name, max_items)
-                elif file_ext in ['json', 'jsonl']:
-                    return DataPreviewService._preview_json(tmp_file.name, max_items)
-                else:
-                    return DataPreviewService._preview_plain_text(tmp_file.name, max_items)
-                    
         except Exception as e:
             logger.error(f"预览文本数据失败: {str(e)}")
             raise
     
     @staticmethod
-    def _preview_csv(file_path: str, max_items: int) -> Dict[str, Any]:
+    def _preview_csv(file: EnhancedDatasetFile, data: bytes, complete: bool, max_items: int) -> Dict[str, Any]:
         """预览CSV文件"""
         try:
             # 尝试不同的编码
-            encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16']
-            df = None
-            
-            for encoding in encodings:
-                try:
-                    df = pd.read_csv(file_path, encoding=encoding, nrows=max_items)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            if df is None:
-                raise Exception("无法解码CSV文件")
+            text, encoding = DataPreviewService._decode_head(data, complete, ['utf-8', 'gbk', 'gb2312', 'utf-16'])
+            text = DataPreviewService._complete_lines(text, complete)
+            df = pd.read_csv(StringIO(text), nrows=max_items)
             
-            # 获取基本信息
-            total_rows = len(df)
             columns = df.columns.tolist()
             
             # 转换数据为预览格式
@@ -119,7 +195,14 @@ class DataPreviewService:
                     'data': {col: DataPreviewService._safe_convert(row[col]) for col in columns}
                 })
             
-            # 生成统计信息
+            # 总行数不含表头，按样本平均行长估算
+            lines = text.splitlines()
+            header_bytes = len((lines[0] + '\n').encode(encoding)) if lines else 0
+            total_rows, estimated = DataPreviewService._total_rows(
+                file, max(len(lines) - 1, 0), len(text.encode(encoding)), complete, header_bytes=header_bytes
+            )
+            
+            # 生成统计信息（数据类型按预览样本推断）
             stats = {
                 'total_rows': total_rows,
                 'total_columns': len(columns),
@@ -133,6 +216,8 @@ class DataPreviewService:
                 'stats': stats,
                 'items': preview_data,
                 'total_items': total_rows,
+                'total_items_estimated': estimated,
+                'truncated': not complete,
                 'preview_count': len(preview_data)
             }
             
@@ -141,53 +226,116 @@ class DataPreviewService:
             raise
     
     @staticmethod
-    def _preview_json(file_path: str, max_items: int) -> Dict[str, Any]:
+    def _parse_json_lines(text: str, max_items: int) -> Tuple[List[Dict[str, Any]], int]:
+        """解析 JSONL 文本，返回前 max_items 条预览与非空行数"""
+        preview_data = []
+        total_items = 0
+        for line_num, line in enumerate(text.split('\n')):
+            if not line.strip():
+                continue
+            total_items += 1
+            if len(preview_data) < max_items:
+                try:
+                    preview_data.append({
+                        'index': line_num,
+                        'data': json.loads(line)
+                    })
+                except json.JSONDecodeError:
+                    continue
+        return preview_data, total_items
+    
+    @staticmethod
+    def _parse_json_array_head(text: str, max_items: int) -> Tuple[List[Dict[str, Any]], int, int]:
+        """
+        逐个解析（可能被截断的）顶层 JSON 数组中的元素
+        
+        Returns:
+            (前 max_items 条预览, 完整解析的元素数, 已解析到的字符位置)
+        """
+        decoder = json.JSONDecoder()
+        pos = text.index('[') + 1
+        preview_data = []
+        count = 0
+        while True:
+            pos = _JSON_SEPARATORS.match(text, pos).end()
+            if pos >= len(text) or text[pos] == ']':
+                break
+            try:
+                item, pos = decoder.raw_decode(text, pos)
+            except ValueError:
+                break
+            if count < max_items:
+                preview_data.append({
+                    'index': count,
+                    'data': item
+                })
+            count += 1
+        return preview_data, count, pos
+    
+    @staticmethod
+    def _preview_json(file: EnhancedDatasetFile, data: bytes, complete: bool, max_items: int,
+                      file_ext: str) -> Dict[str, Any]:
         """预览JSON/JSONL文件"""
         try:
-            preview_data = []
-            total_items = 0
+            text, encoding = DataPreviewService._decode_head(data, complete, ['utf-8-sig', 'gbk'])
+            result_format = file_ext
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                if file_path.endswith('.jsonl'):
-                    # JSONL格式：每行一个JSON对象
-                    for line_num, line in enumerate(f):
-                        if line_num >= max_items:
-                            break
-                        if line.strip():
-                            try:
-                                data = json.loads(line.strip())
-                                preview_data.append({
-                                    'index': line_num,
-                                    'data': data
-                                })
-                            except json.JSONDecodeError:
-                                continue
-                    
-                    # 计算总行数
-                    f.seek(0)
-                    total_items = sum(1 for line in f if line.strip())
-                else:
-                    # 标准JSON格式
-                    data = json.load(f)
-                    if isinstance(data, list):
-                        total_items = len(data)
-                        for i, item in enumerate(data[:max_items]):
-                            preview_data.append({
-                                'index': i,
-                                'data': item
-                            })
-                    else:
-                        total_items = 1
-                        preview_data.append({
-                            'index': 0,
-                            'data': data
-                        })
+            if file_ext == 'json':
+                stripped = text.lstrip()
+                if stripped.startswith('['):
+                    # 顶层数组：逐个解析元素，按已解析部分的平均长度估算总数
+                    preview_data, count, pos = DataPreviewService._parse_json_array_head(text, max_items)
+                    total_items, estimated = DataPreviewService._total_rows(
+                        file, count, len(text[:pos].encode(encoding)), complete
+                    )
+                    return {
+                        'type': 'json',
+                        'format': 'json',
+                        'items': preview_data,
+                        'total_items': total_items,
+                        'total_items_estimated': estimated,
+                        'truncated': not complete,
+                        'preview_count': len(preview_data)
+                    }
+                if not DataPreviewService._is_json_lines(stripped):
+                    if not complete:
+                        # 被截断的大型 JSON 对象无法增量解析，只显示开头内容
+                        return {
+                            'type': 'json',
+                            'format': 'json',
+                            'message': 'JSON 文件过大，仅显示开头内容',
+                            'items': [{'index': 0, 'content': text[:4096]}],
+                            'total_items': 1,
+                            'truncated': True,
+                            'preview_count': 1
+                        }
+                    # 标准JSON对象
+                    return {
+                        'type': 'json',
+                        'format': 'json',
+                        'items': [{'index': 0, 'data': json.loads(text)}],
+                        'total_items': 1,
+                        'total_items_estimated': False,
+                        'truncated': False,
+                        'preview_count': 1
+                    }
+                # 扩展名为 .json 的 JSON Lines
+                result_format = 'jsonl'
+            
+            # JSONL格式：每行一个JSON对象，只解析已读取的完整行
+            text = DataPreviewService._complete_lines(text, complete)
+            preview_data, sample_items = DataPreviewService._parse_json_lines(text, max_items)
+            total_items, estimated = DataPreviewService._total_rows(
+                file, sample_items, len(text.encode(encoding)), complete
+            )
             
             return {
                 'type': 'json',
-                'format': 'jsonl' if file_path.endswith('.jsonl') else 'json',
+                'format': result_format,
                 'items': preview_data,
                 'total_items': total_items,
+                'total_items_estimated': estimated,
+                'truncated': not complete,
                 'preview_count': len(preview_data)
             }
             
@@ -196,40 +344,43 @@ class DataPreviewService:
             raise
     
     @staticmethod
-    def _preview_plain_text(file_path: str, max_items: int) -> Dict[str, Any]:
+    def _is_json_lines(stripped: str) -> bool:
+        """首行本身是完整 JSON 对象且后面还有内容时视为 JSON Lines"""
+        first_line, _, rest = stripped.partition('\n')
+        if not stripped.startswith('{') or not rest.strip():
+            return False
+        try:
+            return isinstance(json.loads(first_line), dict)
+        except json.JSONDecodeError:
+            return False
+    
+    @staticmethod
+    def _preview_plain_text(file: EnhancedDatasetFile, data: bytes, complete: bool, max_items: int) -> Dict[str, Any]:
         """预览纯文本文件"""
         try:
-            preview_data = []
-            
             # 尝试不同编码
-            encodings = ['utf-8', 'gbk', 'gb2312']
-            content = None
-            
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        lines = f.readlines()
-                    content = lines
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            if content is None:
-                raise Exception("无法解码文本文件")
-            
-            total_lines = len(content)
+            text, encoding = DataPreviewService._decode_head(data, complete, ['utf-8', 'gbk', 'gb2312'])
+            text = DataPreviewService._complete_lines(text, complete)
+            lines = text.splitlines()
             
-            for i, line in enumerate(content[:max_items]):
+            preview_data = []
+            for i, line in enumerate(lines[:max_items]):
                 preview_data.append({
                     'index': i + 1,
-                    'content': line.rstrip('\n\r')
+                    'content': line
                 })
             
+            total_lines, estimated = DataPreviewService._total_rows(
+                file, len(lines), len(text.encode(encoding)), complete
+            )
+            
             return {
                 'type': 'text',
                 'format': 'plain_text',
                 'items': preview_data,
                 'total_items': total_lines,
+                'total_items_estimated': estimated,
+                'truncated': not complete,
                 'preview_count': len(preview_data)
             }
             
@@ -369,12 +520,103 @@ class DataPreviewService:
     
     @staticmethod
     def save_preview_data(file: EnhancedDatasetFile, preview_data: Dict[str, Any]) -> None:
-        """保存预览数据到文件对象"""
+        """保存预览数据到文件对象（不提交，由调用方提交）"""
+        file.preview_data = preview_data
+        logger.info(f"预览数据已保存到文件 {file.filename}")
+    
+    # ---------- 后台生成 ----------
+    
+    @staticmethod
+    def is_pending(preview_data: Optional[Dict[str, Any]]) -> bool:
+        return bool(preview_data) and preview_data.get('type') == PENDING_PREVIEW_TYPE
+    
+    @staticmethod
+    def _pending_expired(preview_data: Dict[str, Any], field: str, timeout: int = None) -> bool:
+        if timeout is None:
+            timeout = current_app.config.get('PREVIEW_PENDING_TIMEOUT', 600)
+        try:
+            since = datetime.fromisoformat(preview_data.get(field) or '')
+        except ValueError:
+            return True
+        return datetime.utcnow() - since > timedelta(seconds=timeout)
+    
+    @staticmethod
+    def _error_retryable(preview_data: Dict[str, Any]) -> bool:
+        """生成失败的预览超过 PREVIEW_ERROR_RETRY_AFTER 后可重新生成，早期没有失败时间的记录直接重试"""
+        if preview_data.get('type') != 'error':
+            return False
+        timeout = current_app.config.get('PREVIEW_ERROR_RETRY_AFTER', 3600)
+        return DataPreviewService._pending_expired(preview_data, 'failed_at', timeout)
+    
+    @staticmethod
+    def needs_generation(file: EnhancedDatasetFile) -> bool:
+        """
+        文件是否需要排队生成预览：没有预览，或占位已超时（任务丢失、进程崩溃），
+        或占位是从其他文件记录复制来的，或上次生成失败已超过重试间隔
+        """
+        preview = file.preview_data
+        if not preview:
+            return True
+        if not DataPreviewService.is_pending(preview):
+            return DataPreviewService._error_retryable(preview)
+        return preview.get('file_id') != file.id or DataPreviewService._pending_expired(preview, 'queued_at')
+    
+    @staticmethod
+    def schedule_previews(files: List[EnhancedDatasetFile], max_items: int = 10) -> List[str]:
+        """
+        为需要预览的文件写入 pending 占位并启动后台生成任务。会提交当前事务，
+        应在调用方提交文件记录之后调用；启动任务失败只记录日志
+        
+        Returns:
+            List[str]: 排队的文件ID
+        """
+        from app.db import db
+        file_ids = []
+        queued_at = datetime.utcnow().isoformat()
+        for file in files:
+            if not DataPreviewService.needs_generation(file):
+                continue
+            file.preview_data = {
+                'type': PENDING_PREVIEW_TYPE,
+                'message': '预览生成中',
+                'items': [],
+                'file_id': file.id,
+                'queued_at': queued_at
+            }
+            file_ids.append(file.id)
+        if not file_ids:
+            return []
+        db.session.commit()
         try:
-            file.preview_data = preview_data
-            from app.db import db
-            db.session.commit()
-            logger.info(f"预览数据已保存到文件 {file.filename}")
+            from app.tasks.dataset_file_tasks import generate_previews_task
+            generate_previews_task.delay(file_ids, max_items)
         except Exception as e:
-            logger.error(f"保存预览数据失败: {str(e)}")
-            raise 
\ No newline at end of file
+            logger.warning(f"启动预览生成任务失败: {str(e)}")
+        return file_ids
+    
+    @staticmethod
+    def claim(file: EnhancedDatasetFile, worker_id: str) -> bool:
+        """
+        在已锁定的文件记录上认领预览生成，同一文件同时只有一个任务生成。
+        已有预览（可重试的失败预览除外）或其他任务的认领尚未超时时返回 False
+        """
+        preview = file.preview_data
+        if preview and not DataPreviewService.is_pending(preview):
+            if not DataPreviewService._error_retryable(preview):
+                return False
+            preview = None
+        if (preview and preview.get('claimed_by') and preview.get('claimed_by') != worker_id
+                and not DataPreviewService._pending_expired(preview, 'claimed_at')):
+            return False
+        file.preview_data = {
+            **(preview or {'type': PENDING_PREVIEW_TYPE, 'message': '预览生成中', 'items': []}),
+            'file_id': file.id,
+            'queued_at': (preview or {}).get('queued_at') or datetime.utcnow().isoformat(),
+            'claimed_by': worker_id,
+            'claimed_at': datetime.utcnow().isoformat()
+        }
+        return True
+    
+    @staticmethod
+    def is_claimed_by(file: EnhancedDatasetFile, worker_id: str) -> bool:
+        return DataPreviewService.is_pending(file.preview_data) and file.preview_data.get('claimed_by') == worker_id 
\ No newline at end of file
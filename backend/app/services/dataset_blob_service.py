@@ -0,0 +1,269 @@
+import os
+import hashlib
+import tempfile
+import logging
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import BinaryIO, Dict, Iterable, List, Optional
+
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db import db
+from app.models.dataset_blob import DatasetBlob
+from app.services.storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+def _hash_stream(stream: BinaryIO) -> Dict:
+    """计算文件流的 SHA-256/MD5 与字节数"""
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    size = 0
+    while True:
+        chunk = stream.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        sha256.update(chunk)
+        md5.update(chunk)
+        size += len(chunk)
+    return {'sha256': sha256.hexdigest(), 'md5': md5.hexdigest(), 'size': size}
+
+def _hash_file(file_path: str) -> Dict:
+    with open(file_path, 'rb') as f:
+        return _hash_stream(f)
+
+class DatasetBlobService:
+    """
+    数据集文件的内容寻址存储：同一内容只在对象存储中保存一份，
+    文件记录通过 blob_checksum 引用，版本复制/克隆只增加引用计数
+    """
+
+    def _bucket(self) -> str:
+        return current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets')
+
+    @staticmethod
+    def object_name_for(checksum: str) -> str:
+        """按内容哈希生成对象名，同一内容总是落在同一对象上，重复上传是幂等的"""
+        return f"blobs/{checksum[:2]}/{checksum}"
+
+    def _reserve(self, digests: List[Dict], content_types: List[Optional[str]]) -> Dict[str, int]:
+        """
+        以 upsert 方式登记 blob 并增加引用计数（在调用方事务内，不提交）
+
+        Returns:
+            Dict[str, int]: checksum -> 登记后的引用计数
+        """
+        added = Counter(d['sha256'] for d in digests)
+        rows = {}
+        bucket = self._bucket()
+        for digest, content_type in zip(digests, content_types):
+            rows.setdefault(digest['sha256'], {
+                'checksum': digest['sha256'],
+                'md5': digest['md5'],
+                'bucket': bucket,
+                'object_name': self.object_name_for(digest['sha256']),
+                'size': digest['size'],
+                'content_type': content_type,
+                'ref_count': added[digest['sha256']],
+                'created_at': datetime.utcnow()
+            })
+        if not rows:
+            return {}
+
+        # 按主键顺序加锁，避免并发写入时死锁
+        stmt = insert(DatasetBlob).values([rows[k] for k in sorted(rows)])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DatasetBlob.checksum],
+            set_={
+                'ref_count': DatasetBlob.ref_count + stmt.excluded.ref_count,
+                'orphaned_at': None
+            }
+        ).returning(DatasetBlob.checksum, DatasetBlob.ref_count)
+        return {checksum: ref_count for checksum, ref_count in db.session.execute(stmt)}
+
+    @staticmethod
+    def _needs_upload(ref_count: int, added: int) -> bool:
+        # 引用计数恰好等于本次新增数：新建的 blob，或已归零等待回收的 blob，都需要确保对象存在
+        return ref_count <= added
+
+    @staticmethod
+    def hash_file(file_path: str) -> Dict:
+        """计算本地文件的 sha256/md5/size，可在工作线程中调用"""
+        return _hash_file(file_path)
+
+    def reserve_file(self, digest: Dict, content_type: str = None) -> bool:
+        """
+        登记已计算哈希的文件并增加引用（在调用方事务内，不提交），供流水线导入逐个登记
+
+        Returns:
+            bool: 内容是否需要上传到 object_name_for(sha256)
+        """
+        ref_counts = self._reserve([digest], [content_type])
+        return self._needs_upload(ref_counts[digest['sha256']], 1)
+
+    def store_file(self, file_path: str, content_type: str = None) -> DatasetBlob:
+        """
+        存储本地文件，内容已存在时只增加引用计数
+
+        Returns:
+            DatasetBlob: 对应的 blob 记录
+        """
+        return self.store_files([{'file_path': file_path, 'content_type': content_type}])[0]
+
+    def store_stream(self, stream: BinaryIO, content_type: str = None) -> DatasetBlob:
+        """
+        存储文件流（如上传的 FileStorage.stream），不可 seek 的流先落盘到临时文件
+
+        Returns:
+            DatasetBlob: 对应的 blob 记录
+        """
+        if hasattr(stream, 'seekable') and stream.seekable():
+            stream.seek(0)
+            digest = _hash_stream(stream)
+            ref_counts = self._reserve([digest], [content_type])
+            if self._needs_upload(ref_counts[digest['sha256']], 1):
+                stream.seek(0)
+                storage_service.upload_stream(self._bucket(), self.object_name_for(digest['sha256']),
+                                              stream, content_type, length=digest['size'])
+            return db.session.get(DatasetBlob, digest['sha256'])
+
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            while True:
+                chunk = stream.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                tmp.write(chunk)
+        try:
+            return self.store_file(tmp.name, content_type)
+        finally:
+            os.unlink(tmp.name)
+
+    def store_files(self, items: List[Dict], workers: int = None) -> List[DatasetBlob]:
+        """
+        批量存储本地文件：并行计算哈希，一次 upsert 登记引用，只上传尚不存在的内容
+
+        Args:
+            items: 每项包含 file_path，可选 content_type
+            workers: 哈希与上传并发数，默认 STORAGE_BULK_WORKERS
+
+        Returns:
+            List[DatasetBlob]: 与 items 顺序一致的 blob 记录
+        """
+        if not items:
+            return []
+        workers = workers or current_app.config.get('STORAGE_BULK_WORKERS', 16)
+        with ThreadPoolExecutor(max_workers=min(workers, len(items)),
+                                thread_name_prefix='blob-hash') as executor:
+            digests = list(executor.map(_hash_file, [item['file_path'] for item in items]))
+
+        content_types = [item.get('content_type') for item in items]
+        ref_counts = self._reserve(digests, content_types)
+        added = Counter(d['sha256'] for d in digests)
+
+        uploads = {}
+        for item, digest in zip(items, digests):
+            checksum = digest['sha256']
+            if checksum not in uploads and self._needs_upload(ref_counts[checksum], added[checksum]):
+                uploads[checksum] = {
+                    'file_path': item['file_path'],
+                    'object_name': self.object_name_for(checksum),
+                    'content_type': item.get('content_type')
+                }
+        if uploads:
+            results = storage_service.upload_many(list(uploads.values()), self._bucket(), workers)
+            failed = [r for r in results if not r['success']]
+            if failed:
+                raise Exception(f"{len(failed)} 个文件上传失败: " +
+                                '; '.join(f"{r['file_path']}: {r['error']}" for r in failed[:5]))
+        logger.info(f"登记 {len(items)} 个文件, 新上传 {len(uploads)} 个内容块")
+
+        blobs = {
+            blob.checksum: blob
+            for blob in DatasetBlob.query.filter(DatasetBlob.checksum.in_(list(added))).all()
+        }
+        return [blobs[d['sha256']] for d in digests]
+
+    def _adjust(self, checksums: Iterable[Optional[str]], sign: int) -> None:
+        counts = Counter(c for c in checksums if c)
+        by_count = defaultdict(list)
+        for checksum, count in counts.items():
+            by_count[count].append(checksum)
+        for count, group in by_count.items():
+            values = {'ref_count': DatasetBlob.ref_count + sign * count}
+            if sign > 0:
+                values['orphaned_at'] = None
+            DatasetBlob.query.filter(DatasetBlob.checksum.in_(sorted(group))).update(
+                values, synchronize_session=False
+            )
+        if sign < 0 and counts:
+            DatasetBlob.query.filter(
+                DatasetBlob.checksum.in_(list(counts)),
+                DatasetBlob.ref_count <= 0,
+                DatasetBlob.orphaned_at.is_(None)
+            ).update({'orphaned_at': datetime.utcnow()}, synchronize_session=False)
+
+    def acquire_many(self, checksums: Iterable[Optional[str]]) -> None:
+        """为已有 blob 增加引用（复制文件记录时使用，不提交事务）"""
+        self._adjust(checksums, 1)
+
+    def release_many(self, checksums: Iterable[Optional[str]]) -> None:
+        """释放 blob 引用，计数归零的 blob 标记为待回收（不提交事务）"""
+        self._adjust(checksums, -1)
+
+    def collect_garbage(self, grace_seconds: int = None, limit: int = 1000) -> Dict:
+        """
+        删除引用计数归零且超过宽限期的 blob 及其存储对象
+
+        宽限期用于覆盖"先登记后写入文件记录"的窗口，避免回收正在被重新引用的内容
+
+        Returns:
+            Dict: deleted, failed, freed_bytes
+        """
+        if grace_seconds is None:
+            grace_seconds = current_app.config.get('DATASET_BLOB_GC_GRACE_SECONDS', 3600)
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+
+        blobs = DatasetBlob.query.filter(
+            DatasetBlob.ref_count <= 0,
+            DatasetBlob.orphaned_at.isnot(None),
+            DatasetBlob.orphaned_at < cutoff
+        ).order_by(DatasetBlob.orphaned_at).limit(limit).with_for_update(skip_locked=True).all()
+
+        by_bucket = defaultdict(list)
+        for blob in blobs:
+            by_bucket[blob.bucket].append(blob)
+
+        from app.services.line_index_service import sidecar_names
+        from app.services.dataset_diff_service import diff_cache_prefix
+
+        deleted, failed, freed_bytes = 0, 0, 0
+        for bucket, group in by_bucket.items():
+            results = storage_service.delete_many([b.object_name for b in group], bucket)
+            # 记录索引文件随内容一起删除，不存在的对象不会报错
+            storage_service.delete_many([name for b in group for name in sidecar_names(b.object_name)], bucket)
+            # 以该内容为旧文件的记录级差异缓存
+            for blob in group:
+                storage_service.delete_prefix(bucket, diff_cache_prefix(blob.checksum))
+            status = {r['object_name']: r for r in results}
+            for blob in group:
+                result = status.get(blob.object_name)
+                if result and result['success']:
+                    db.session.delete(blob)
+                    deleted += 1
+                    freed_bytes += blob.size or 0
+                else:
+                    failed += 1
+                    logger.warning(f"回收 blob 失败: {blob.checksum}, "
+                                   f"错误: {result['error'] if result else '未知'}")
+        db.session.commit()
+
+        if blobs:
+            logger.info(f"blob 垃圾回收: 删除 {deleted} 个, 失败 {failed} 个, 释放 {freed_bytes} bytes")
+        return {'scanned': len(blobs), 'deleted': deleted, 'failed': failed, 'freed_bytes': freed_bytes}
+
+# 创建全局 blob 服务实例
+dataset_blob_service = DatasetBlobService()
@@ -0,0 +1,476 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import and_, case, func, or_, select
+
+from app.db import db
+from app.models.dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile
+from app.services.storage_service import storage_service
+from app.services.line_index_service import line_index_service, detect_index_format
+from app.services.version_manifest_service import VERSION_PATH_PREFIX
+
+logger = logging.getLogger(__name__)
+
+FILE_STATUSES = ('added', 'removed', 'modified', 'unchanged')
+
+# 记录级差异的类型，详情对象按此顺序分页
+RECORD_CHANGES = ('removed', 'added', 'modified')
+
+# 落盘分区中的一条记录：键哈希、内容哈希、记录序号
+_SPILL_DTYPE = np.dtype([('key', '<u8'), ('row', '<u8'), ('line', '<u8')])
+
+# 差异详情中的一条记录：旧文件记录序号、新文件记录序号（不存在时为 _NO_LINE）
+_DETAIL_DTYPE = np.dtype([('old', '<u8'), ('new', '<u8')])
+_NO_LINE = np.iinfo(np.uint64).max
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+def _canonical(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+
+class DatasetDiffService:
+    """
+    数据集版本差异。
+
+    文件级：一条 SQL 在两个版本的文件上按相对路径做全外连接，按内容校验和判定新增/删除/修改/未变，
+    汇总计数与分页明细都在数据库中完成。
+
+    记录级（JSONL/CSV）：两个文件流式读取，每条记录只保留键哈希、内容哈希和序号，
+    按键哈希分区写入临时文件，再逐个分区做哈希连接，内存占用与分区大小成正比。
+    结果按内容校验和缓存到对象存储，分页明细通过范围读取获取
+    """
+
+    def _settings(self) -> Dict:
+        config = current_app.config
+        return {
+            'partitions': config.get('DATASET_DIFF_PARTITIONS', 64),
+            'chunk_records': config.get('DATASET_DIFF_CHUNK_RECORDS', 100000)
+        }
+
+    @staticmethod
+    def _get_versions(version1_id: str, version2_id: str) -> Tuple[EnhancedDatasetVersion, EnhancedDatasetVersion]:
+        old = EnhancedDatasetVersion.query.get(version1_id)
+        new = EnhancedDatasetVersion.query.get(version2_id)
+        if not old or not new:
+            raise ValueError("版本不存在")
+        return old, new
+
+    # ---------- 文件级 ----------
+
+    @staticmethod
+    def _file_diff_cte(version1_id: str, version2_id: str):
+        def side(version_id: str, name: str):
+            F = EnhancedDatasetFile
+            return select(
+                F.id.label('file_id'),
+                func.regexp_replace(F.file_path, VERSION_PATH_PREFIX, '').label('path'),
+                F.filename.label('filename'),
+                F.file_size.label('file_size'),
+                F.checksum.label('checksum'),
+                F.blob_checksum.label('blob_checksum')
+            ).where(F.version_id == version_id).subquery(name)
+
+        old, new = side(version1_id, 'old_files'), side(version2_id, 'new_files')
+        same_content = or_(
+            and_(old.c.blob_checksum.isnot(None), old.c.blob_checksum == new.c.blob_checksum),
+            and_(old.c.checksum.isnot(None), old.c.checksum == new.c.checksum)
+        )
+        status = case(
+            (old.c.file_id.is_(None), 'added'),
+            (new.c.file_id.is_(None), 'removed'),
+            (same_content, 'unchanged'),
+            else_='modified'
+        )
+        return select(
+            func.coalesce(new.c.path, old.c.path).label('path'),
+            status.label('status'),
+            old.c.file_id.label('old_file_id'),
+            new.c.file_id.label('new_file_id'),
+            func.coalesce(new.c.filename, old.c.filename).label('filename'),
+            old.c.file_size.label('old_size'),
+            new.c.file_size.label('new_size'),
+            func.coalesce(old.c.blob_checksum, old.c.checksum).label('old_checksum'),
+            func.coalesce(new.c.blob_checksum, new.c.checksum).label('new_checksum')
+        ).select_from(
+            old.join(new, old.c.path == new.c.path, full=True)
+        ).cte('file_diff')
+
+    def get_version_diff(self, version1_id: str, version2_id: str, statuses: List[str] = None,
+                         page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+        """
+        文件级版本差异：汇总计数与分页明细
+
+        Args:
+            version1_id: 旧版本ID
+            version2_id: 新版本ID
+            statuses: 明细中包含的状态，默认只列出有变化的文件
+            page: 页码
+            page_size: 每页大小
+
+        Returns:
+            Dict: version1, version2, summary, files
+        """
+        old, new = self._get_versions(version1_id, version2_id)
+        statuses = statuses or ['added', 'removed', 'modified']
+        unknown = set(statuses) - set(FILE_STATUSES)
+        if unknown:
+            raise ValueError(f"不支持的状态: {', '.join(sorted(unknown))}")
+        page, page_size = max(page, 1), min(max(page_size, 1), 1000)
+
+        diff = self._file_diff_cte(version1_id, version2_id)
+        summary = {status: {'count': 0, 'old_size': 0, 'new_size': 0} for status in FILE_STATUSES}
+        for status, count, old_size, new_size in db.session.execute(
+            select(
+                diff.c.status,
+                func.count(),
+                func.coalesce(func.sum(diff.c.old_size), 0),
+                func.coalesce(func.sum(diff.c.new_size), 0)
+            ).group_by(diff.c.status)
+        ):
+            summary[status] = {'count': count, 'old_size': int(old_size), 'new_size': int(new_size)}
+
+        rows = db.session.execute(
+            select(diff).where(diff.c.status.in_(statuses)).order_by(diff.c.path)
+            .limit(page_size).offset((page - 1) * page_size)
+        ).mappings().all()
+
+        return {
+            'version1': old.to_dict(),
+            'version2': new.to_dict(),
+            'summary': {
+                **summary,
+                'total_changes': sum(summary[s]['count'] for s in ('added', 'removed', 'modified')),
+                'size_delta': (new.total_size or 0) - (old.total_size or 0)
+            },
+            'files': {
+                'statuses': statuses,
+                'page': page,
+                'page_size': page_size,
+                'total': sum(summary[s]['count'] for s in statuses),
+                'items': [
+                    {
+                        **dict(row),
+                        'record_diff': bool(
+                            row['status'] == 'modified'
+                            and detect_index_format(row['filename']) in ('jsonl', 'csv')
+                        )
+                    }
+                    for row in rows
+                ]
+            }
+        }
+
+    # ---------- 记录级 ----------
+
+    def _find_file_pair(self, version1_id: str, version2_id: str, path: str) -> Dict:
+        diff = self._file_diff_cte(version1_id, version2_id)
+        row = db.session.execute(select(diff).where(diff.c.path == path)).mappings().first()
+        if not row:
+            raise ValueError(f"两个版本中都不存在文件: {path}")
+        return dict(row)
+
+    @staticmethod
+    def _key_hash(value) -> int:
+        if value is None or isinstance(value, (str, int, float, bool)):
+            # repr 区分类型：'1' 与 1 是不同的键
+            return _hash64(repr(value).encode('utf-8', 'surrogatepass'))
+        return _hash64(_canonical(value))
+
+    def _iter_hashes(self, file: EnhancedDatasetFile, key: Optional[str]) -> Iterator[Tuple[int, int, int]]:
+        """
+        产出 (键哈希, 内容哈希, 记录序号)。内容哈希直接取原始字节，只有按键对齐时才解析记录；
+        未指定键，或记录没有该键（无法解析、不是对象、缺少键或键为 null）时以内容哈希作为键
+        """
+        info = line_index_service.get_index(file)
+        fmt = info['format'] if info else detect_index_format(file.filename)
+        if key is None or fmt == 'jsonl':
+            for number, record in line_index_service.scan_records(file, raw=True):
+                row_hash = _hash64(record.strip())
+                if key is None:
+                    yield row_hash, row_hash, number
+                    continue
+                try:
+                    data = json.loads(record)
+                except ValueError:
+                    data = None
+                value = data.get(key) if isinstance(data, dict) else None
+                # 没有键的记录按内容参与比较，不与其他无键记录按位置配对
+                yield (row_hash if value is None else self._key_hash(value)), row_hash, number
+            return
+        for number, record in line_index_service.scan_records(file):
+            data = record['data']
+            row_hash = _hash64('\x1f'.join(data.values()).encode('utf-8', 'surrogatepass'))
+            value = data.get(key)
+            yield (row_hash if value is None else self._key_hash(value)), row_hash, number
+
+    @staticmethod
+    def _spill(hashes: Iterator[Tuple[int, int, int]], paths: List[str], chunk_records: int) -> int:
+        """按键哈希分区追加写入临时文件，内存中只缓存一个块"""
+        partitions = len(paths)
+        files = [open(path, 'wb') for path in paths]
+        total = 0
+        try:
+            def flush(rows):
+                rows = np.array(rows, dtype=_SPILL_DTYPE)
+                part = rows['key'] % np.uint64(partitions)
+                order = np.argsort(part, kind='stable')
+                rows, part = rows[order], part[order]
+                bounds = np.searchsorted(part, np.arange(partitions + 1, dtype=np.uint64))
+                for index in range(partitions):
+                    if bounds[index] < bounds[index + 1]:
+                        files[index].write(rows[bounds[index]:bounds[index + 1]].tobytes())
+
+            buffer = []
+            for item in hashes:
+                buffer.append(item)
+                if len(buffer) == chunk_records:
+                    flush(buffer)
+                    total += len(buffer)
+                    buffer = []
+            if buffer:
+                flush(buffer)
+                total += len(buffer)
+        finally:
+            for f in files:
+                f.close()
+        return total
+
+    @staticmethod
+    def _join_partition(old_path: str, new_path: str) -> Tuple[Dict[str, List[Tuple[int, int]]], int]:
+        """
+        分区内哈希连接。同一键出现多次时按记录序号依次配对
+
+        Returns:
+            (各类变化的 (旧序号, 新序号) 列表, 未变化记录数)
+        """
+        old_rows = np.fromfile(old_path, dtype=_SPILL_DTYPE)
+        new_rows = np.fromfile(new_path, dtype=_SPILL_DTYPE)
+        by_key = defaultdict(list)
+        for key, row, line in old_rows.tolist():
+            by_key[key].append((line, row))
+
+        changes = {change: [] for change in RECORD_CHANGES}
+        unchanged = 0
+        matched = defaultdict(int)
+        for key, row, line in new_rows.tolist():
+            olds = by_key.get(key)
+            position = matched[key]
+            if olds is None or position >= len(olds):
+                changes['added'].append((_NO_LINE, line))
+                continue
+            matched[key] = position + 1
+            old_line, old_row = olds[position]
+            if old_row == row:
+                unchanged += 1
+            else:
+                changes['modified'].append((old_line, line))
+        for key, olds in by_key.items():
+            for old_line, _ in olds[matched.get(key, 0):]:
+                changes['removed'].append((old_line, _NO_LINE))
+        return changes, unchanged
+
+    def _compute_record_diff(self, old_file: EnhancedDatasetFile, new_file: EnhancedDatasetFile,
+                             key: Optional[str], work_dir: str) -> Tuple[Dict, Dict[str, str]]:
+        """计算记录级差异，返回汇总和各类变化的本地详情文件"""
+        settings = self._settings()
+        partitions = settings['partitions']
+        old_parts = [os.path.join(work_dir, f'old.{i}') for i in range(partitions)]
+        new_parts = [os.path.join(work_dir, f'new.{i}') for i in range(partitions)]
+        old_rows = self._spill(self._iter_hashes(old_file, key), old_parts, settings['chunk_records'])
+        new_rows = self._spill(self._iter_hashes(new_file, key), new_parts, settings['chunk_records'])
+
+        detail_paths = {change: os.path.join(work_dir, f'{change}.bin') for change in RECORD_CHANGES}
+        detail_files = {change: open(path, 'wb') for change, path in detail_paths.items()}
+        counts = {change: 0 for change in RECORD_CHANGES}
+        unchanged = 0
+        try:
+            for index in range(partitions):
+                changes, same = self._join_partition(old_parts[index], new_parts[index])
+                unchanged += same
+                for change, pairs in changes.items():
+                    if pairs:
+                        detail_files[change].write(np.array(pairs, dtype=_DETAIL_DTYPE).tobytes())
+                        counts[change] += len(pairs)
+                os.unlink(old_parts[index])
+                os.unlink(new_parts[index])
+        finally:
+            for f in detail_files.values():
+                f.close()
+
+        # 明细按记录序号排序（新增按新序号），在映射文件上原地排序
+        for change, count in counts.items():
+            if count:
+                details = np.memmap(detail_paths[change], dtype=_DETAIL_DTYPE, mode='r+')
+                details.sort(order=['new', 'old'] if change == 'added' else ['old', 'new'])
+                details.flush()
+                del details
+
+        summary = {
+            **counts,
+            'unchanged': unchanged,
+            'old_rows': old_rows,
+            'new_rows': new_rows,
+            'computed_at': datetime.utcnow().isoformat()
+        }
+        return summary, detail_paths
+
+    @staticmethod
+    def _cache_prefix(old_file: EnhancedDatasetFile, new_file: EnhancedDatasetFile, key: Optional[str]) -> Optional[str]:
+        """结果按两边内容缓存，内容寻址的文件才缓存"""
+        if not old_file.blob_checksum or not new_file.blob_checksum:
+            return None
+        # 无键记录的对齐方式改变过，按键模式使用新前缀，旧的缓存结果不再命中
+        mode = f"key2-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}" if key is not None else 'rows'
+        return f"{diff_cache_prefix(old_file.blob_checksum)}{new_file.blob_checksum}/{mode}/"
+
+    @staticmethod
+    def _load_cached_summary(bucket: str, prefix: str) -> Optional[Dict]:
+        try:
+            with storage_service.open_stream(bucket, f"{prefix}summary.json") as stream:
+                return json.loads(stream.read())
+        except Exception:
+            return None
+
+    def _read_details(self, read_range, summary: Dict, changes: List[str], offset: int, limit: int) -> List[Dict]:
+        """按变化类型顺序拼接分页，每类变化只做一次范围读取"""
+        items = []
+        for change in changes:
+            count = summary[change]
+            if offset >= count:
+                offset -= count
+                continue
+            take = min(limit - len(items), count - offset)
+            data = read_range(change, offset * _DETAIL_DTYPE.itemsize, take * _DETAIL_DTYPE.itemsize)
+            for old_line, new_line in np.frombuffer(data, dtype=_DETAIL_DTYPE).tolist():
+                items.append({
+                    'change': change,
+                    'old_index': None if old_line == _NO_LINE else old_line,
+                    'new_index': None if new_line == _NO_LINE else new_line
+                })
+            offset = 0
+            if len(items) >= limit:
+                break
+        return items
+
+    @staticmethod
+    def _attach_records(items: List[Dict], old_file: EnhancedDatasetFile, new_file: EnhancedDatasetFile) -> None:
+        """已建立记录索引的文件附上变化前后的记录内容"""
+        for side, file in (('old', old_file), ('new', new_file)):
+            if not line_index_service.get_index(file):
+                continue
+            wanted = [item[f'{side}_index'] for item in items if item[f'{side}_index'] is not None]
+            records = line_index_service.fetch_records(file, wanted) if wanted else {}
+            for item in items:
+                if item[f'{side}_index'] is not None:
+                    item[side] = records.get(item[f'{side}_index'])
+
+    def get_record_diff(self, version1_id: str, version2_id: str, path: str, key: str = None,
+                        changes: List[str] = None, page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+        """
+        记录级差异。指定 key 时按字段值对齐记录（可识别修改），否则按整行内容比较（只有新增/删除）
+
+        Args:
+            version1_id: 旧版本ID
+            version2_id: 新版本ID
+            path: 文件相对路径（文件级差异中的 path）
+            key: 对齐记录的字段名
+            changes: 明细中包含的变化类型，默认全部
+            page: 页码
+            page_size: 每页大小
+
+        Returns:
+            Dict: 汇总计数与分页明细
+        """
+        self._get_versions(version1_id, version2_id)
+        changes = changes or list(RECORD_CHANGES)
+        unknown = set(changes) - set(RECORD_CHANGES)
+        if unknown:
+            raise ValueError(f"不支持的变化类型: {', '.join(sorted(unknown))}")
+        page, page_size = max(page, 1), min(max(page_size, 1), 1000)
+
+        pair = self._find_file_pair(version1_id, version2_id, path)
+        if pair['status'] != 'modified':
+            raise ValueError(f"文件状态为 {pair['status']}，没有记录级差异")
+        old_file = EnhancedDatasetFile.query.get(pair['old_file_id'])
+        new_file = EnhancedDatasetFile.query.get(pair['new_file_id'])
+        formats = {detect_index_format(old_file.filename), detect_index_format(new_file.filename)}
+        if len(formats) != 1 or formats - {'jsonl', 'csv'}:
+            raise ValueError("记录级差异只支持格式相同的 JSONL/CSV 文件")
+        if key is not None and formats == {'csv'}:
+            # 键不是列名时每行都没有键，整个文件会退化为按位置比较
+            for file in (old_file, new_file):
+                if key not in line_index_service.read_csv_header(file):
+                    raise ValueError(f"CSV 文件 {file.filename} 没有列 {key}")
+
+        bucket = current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets')
+        prefix = self._cache_prefix(old_file, new_file, key)
+        summary = self._load_cached_summary(bucket, prefix) if prefix else None
+        cached = summary is not None
+        offset = (page - 1) * page_size
+
+        if cached:
+            def read_range(change, start, length):
+                with storage_service.open_stream(bucket, f"{prefix}{change}.bin", offset=start, length=length) as stream:
+                    return stream.read()
+            items = self._read_details(read_range, summary, changes, offset, page_size)
+        else:
+            work_dir = tempfile.mkdtemp(prefix='dataset_diff_')
+            try:
+                summary, detail_paths = self._compute_record_diff(old_file, new_file, key, work_dir)
+
+                def read_range(change, start, length):
+                    with open(detail_paths[change], 'rb') as f:
+                        f.seek(start)
+                        return f.read(length)
+                items = self._read_details(read_range, summary, changes, offset, page_size)
+                if prefix:
+                    try:
+                        storage_service._ensure_bucket(bucket)
+                        for change, local_path in detail_paths.items():
+                            storage_service.upload_file_from_path(
+                                local_path, f"{prefix}{change}.bin", 'application/octet-stream', bucket
+                            )
+                        # 汇总最后写入，存在即表示缓存完整
+                        storage_service.upload_content(bucket, f"{prefix}summary.json",
+                                                       json.dumps(summary).encode('utf-8'), 'application/json')
+                    except Exception as e:
+                        logger.warning(f"缓存记录级差异失败: {path}, 错误: {str(e)}")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            logger.info(f"记录级差异: {path}, 旧 {summary['old_rows']} 条, 新 {summary['new_rows']} 条, "
+                        f"新增 {summary['added']}, 删除 {summary['removed']}, 修改 {summary['modified']}")
+
+        self._attach_records(items, old_file, new_file)
+        return {
+            'version1_id': version1_id,
+            'version2_id': version2_id,
+            'path': path,
+            'old_file_id': old_file.id,
+            'new_file_id': new_file.id,
+            'mode': 'key' if key is not None else 'rows',
+            'key': key,
+            'cached': cached,
+            'summary': summary,
+            'changes': changes,
+            'page': page,
+            'page_size': page_size,
+            'total': sum(summary[change] for change in changes),
+            'items': items
+        }
+
+def diff_cache_prefix(checksum: str) -> str:
+    """以某个内容块为旧文件的记录级差异缓存前缀，内容块回收时一并删除"""
+    return f"diffs/{checksum}/"
+
+# 创建全局版本差异服务实例
+dataset_diff_service = DatasetDiffService()
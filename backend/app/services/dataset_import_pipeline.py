@@ -0,0 +1,312 @@
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+
+from flask import current_app
+
+from app.services.storage_service import storage_service
+from app.services.dataset_blob_service import dataset_blob_service
+
+logger = logging.getLogger(__name__)
+
+# 扩展名到 content_type 的映射，未列出的按二进制处理
+CONTENT_TYPES = {
+    '.txt': 'text/plain',
+    '.md': 'text/plain',
+    '.csv': 'text/plain',
+    '.json': 'application/json',
+    '.jsonl': 'application/json',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.zip': 'application/zip',
+}
+
+def guess_content_type(filename: str) -> str:
+    return CONTENT_TYPES.get(os.path.splitext(filename)[1].lower(), 'application/octet-stream')
+
+def _field(obj, name: str):
+    """兼容 dict 与属性对象两种返回格式"""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+class HuggingFaceSource:
+    """HuggingFace 数据集仓库，按文件逐个下载"""
+
+    name = 'huggingface'
+
+    def __init__(self, repo_id: str, revision: str = None):
+        self.repo_id = repo_id
+        self.revision = revision
+
+    def list_files(self) -> List[Dict]:
+        """列出仓库文件，同时固定 revision，保证后续下载的是同一提交"""
+        from huggingface_hub import HfApi
+        info = HfApi().dataset_info(self.repo_id, revision=self.revision, files_metadata=True)
+        self.revision = info.sha
+        files = []
+        for sibling in info.siblings or []:
+            lfs = _field(sibling, 'lfs')
+            files.append({
+                'path': sibling.rfilename,
+                'size': _field(sibling, 'size') or _field(lfs, 'size'),
+                'sha256': _field(lfs, 'sha256'),
+                'etag': _field(sibling, 'blob_id'),
+                'revision': info.sha
+            })
+        return files
+
+    def fetch(self, file_info: Dict, dest_dir: str) -> str:
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(
+            repo_id=self.repo_id,
+            filename=file_info['path'],
+            repo_type='dataset',
+            revision=self.revision,
+            local_dir=dest_dir,
+            # 缓存放在任务临时目录内，随任务一起清理
+            cache_dir=os.path.join(dest_dir, '.hf_cache')
+        )
+
+class ModelScopeSource:
+    """魔搭社区数据集仓库，按文件逐个下载"""
+
+    name = 'modelscope'
+
+    def __init__(self, repo_id: str, revision: str = None):
+        self.repo_id = repo_id
+        self.revision = revision or 'master'
+
+    def list_files(self) -> List[Dict]:
+        from modelscope.hub.api import HubApi
+        entries = HubApi().get_dataset_files(self.repo_id, revision=self.revision, recursive=True)
+        files = []
+        for entry in entries:
+            if _field(entry, 'Type') == 'tree':
+                continue
+            files.append({
+                'path': _field(entry, 'Path'),
+                'size': _field(entry, 'Size'),
+                'sha256': _field(entry, 'Sha256'),
+                'etag': _field(entry, 'Revision') or _field(entry, 'Id'),
+                'revision': self.revision
+            })
+        return files
+
+    def fetch(self, file_info: Dict, dest_dir: str) -> str:
+        try:
+            from modelscope.hub.file_download import dataset_file_download
+        except ImportError:
+            # 旧版本 SDK 没有单文件下载接口，退回 CLI
+            subprocess.run(
+                ['modelscope', 'download', '--dataset', self.repo_id, file_info['path'],
+                 '--revision', self.revision, '--local_dir', dest_dir],
+                capture_output=True, text=True, check=True
+            )
+            return os.path.join(dest_dir, *file_info['path'].split('/'))
+        return dataset_file_download(
+            dataset_id=self.repo_id,
+            file_path=file_info['path'],
+            revision=self.revision,
+            local_dir=dest_dir,
+            cache_dir=os.path.join(dest_dir, '.ms_cache')
+        )
+
+class LocalMirrorSource:
+    """本地目录镜像，目录结构与仓库一致，用于离线环境和测试中替代远程仓库"""
+
+    def __init__(self, root: str, name: str = 'local', revision: str = None):
+        self.root = os.path.abspath(root)
+        self.name = name
+        self.revision = revision
+
+    def list_files(self) -> List[Dict]:
+        if not os.path.isdir(self.root):
+            raise Exception(f"镜像目录不存在: {self.root}")
+        files = []
+        for dir_path, dir_names, file_names in os.walk(self.root):
+            dir_names[:] = sorted(d for d in dir_names if not d.startswith('.'))
+            for file_name in sorted(file_names):
+                full_path = os.path.join(dir_path, file_name)
+                st = os.stat(full_path)
+                files.append({
+                    'path': os.path.relpath(full_path, self.root).replace(os.sep, '/'),
+                    'size': st.st_size,
+                    'sha256': None,
+                    'etag': f"{st.st_size:x}-{st.st_mtime_ns:x}",
+                    'revision': self.revision
+                })
+        return files
+
+    def fetch(self, file_info: Dict, dest_dir: str) -> str:
+        target = os.path.join(dest_dir, *file_info['path'].split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(os.path.join(self.root, *file_info['path'].split('/')), target)
+        return target
+
+def create_import_source(source: str, repo_id: str, revision: str = None):
+    """
+    创建导入源。配置 DATASET_IMPORT_MIRROR_ROOT 时从 <root>/<source>/<repo_id> 读取本地镜像
+    """
+    mirror_root = current_app.config.get('DATASET_IMPORT_MIRROR_ROOT')
+    if mirror_root:
+        return LocalMirrorSource(os.path.join(mirror_root, source, *repo_id.split('/')),
+                                 name=source, revision=revision)
+    if source == 'huggingface':
+        return HuggingFaceSource(repo_id, revision)
+    if source == 'modelscope':
+        return ModelScopeSource(repo_id, revision)
+    raise ValueError(f"不支持的导入源: {source}")
+
+class DatasetImportPipeline:
+    """
+    流水线导入：逐个下载仓库文件，每个文件落盘后立即计算哈希并并行上传到内容寻址存储，
+    上传完成即删除本地副本。磁盘占用上限为在途文件数，下载与上传两个阶段重叠执行
+    """
+
+    def _settings(self) -> Dict:
+        config = current_app.config
+        return {
+            'download_workers': config.get('DATASET_IMPORT_DOWNLOAD_WORKERS', 4),
+            'upload_workers': config.get('DATASET_IMPORT_UPLOAD_WORKERS', 4),
+            'retries': config.get('STORAGE_BULK_RETRIES', 3)
+        }
+
+    @staticmethod
+    def _download(source, file_info: Dict, dest_dir: str, retries: int):
+        for attempt in range(retries + 1):
+            try:
+                local_path = source.fetch(file_info, dest_dir)
+                return local_path, dataset_blob_service.hash_file(local_path)
+            except Exception:
+                if attempt >= retries:
+                    raise
+                time.sleep(0.5 * (2 ** attempt))
+
+    @staticmethod
+    def _upload(local_path: str, object_name: str, content_type: str, bucket: str, retries: int):
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    # fput_object 对大文件自动分片上传
+                    storage_service.upload_file_from_path(local_path, object_name, content_type, bucket)
+                    return
+                except Exception:
+                    if attempt >= retries:
+                        raise
+                    time.sleep(0.5 * (2 ** attempt))
+        finally:
+            os.unlink(local_path)
+
+    def run(self, source, files: List[Dict] = None,
+            on_progress: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """
+        执行导入。blob 引用登记在调用方事务内，调用方在创建文件记录后统一提交，失败时应回滚
+
+        Args:
+            source: 导入源（HuggingFaceSource / ModelScopeSource / LocalMirrorSource）
+            files: 要导入的文件列表，默认导入 source.list_files() 的全部文件
+            on_progress: 进度回调，参数包含 total_bytes, downloaded_bytes, uploaded_bytes,
+                         file_count, files_done
+
+        Returns:
+            List[Dict]: 与 files 顺序一致的导入结果
+        """
+        if files is None:
+            files = source.list_files()
+        settings = self._settings()
+        bucket = current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets')
+        # 在主线程初始化客户端并确保 bucket 存在，工作线程不依赖应用上下文
+        storage_service._get_client()
+        storage_service._ensure_bucket(bucket)
+
+        progress = {
+            'total_bytes': sum(f.get('size') or 0 for f in files),
+            'downloaded_bytes': 0,
+            'uploaded_bytes': 0,
+            'file_count': len(files),
+            'files_done': 0
+        }
+        results = [None] * len(files)
+        work_dir = tempfile.mkdtemp(prefix=f'{source.name}_import_')
+        # 在途文件（下载中 + 等待/正在上传）数量上限，决定临时磁盘占用
+        max_in_flight = settings['download_workers'] + settings['upload_workers'] * 2
+        pending = iter(enumerate(files))
+        downloads, uploads = {}, {}
+
+        logger.info(f"开始流水线导入: {source.name}, {len(files)} 个文件, "
+                    f"{progress['total_bytes']} bytes")
+        try:
+            with ThreadPoolExecutor(settings['download_workers'], thread_name_prefix='import-dl') as dl_pool, \
+                    ThreadPoolExecutor(settings['upload_workers'], thread_name_prefix='import-ul') as ul_pool:
+                def fill():
+                    while len(downloads) + len(uploads) < max_in_flight:
+                        item = next(pending, None)
+                        if item is None:
+                            return
+                        index, file_info = item
+                        future = dl_pool.submit(self._download, source, file_info, work_dir,
+                                                settings['retries'])
+                        downloads[future] = index
+
+                try:
+                    fill()
+                    while downloads or uploads:
+                        done, _ = wait(list(downloads) + list(uploads), return_when=FIRST_COMPLETED)
+                        for future in done:
+                            if future in downloads:
+                                index = downloads.pop(future)
+                                local_path, digest = future.result()
+                                file_info = files[index]
+                                content_type = guess_content_type(file_info['path'])
+                                object_name = dataset_blob_service.object_name_for(digest['sha256'])
+                                progress['downloaded_bytes'] += digest['size']
+                                results[index] = {
+                                    'filename': os.path.basename(file_info['path']),
+                                    'file_path': file_info['path'],
+                                    'minio_bucket': bucket,
+                                    'minio_object_name': object_name,
+                                    'blob_checksum': digest['sha256'],
+                                    'checksum': digest['md5'],
+                                    'file_size': digest['size'],
+                                    'content_type': content_type,
+                                    'remote': file_info
+                                }
+                                if dataset_blob_service.reserve_file(digest, content_type):
+                                    uploads[ul_pool.submit(self._upload, local_path, object_name,
+                                                           content_type, bucket, settings['retries'])] = index
+                                else:
+                                    # 内容已存在，只增加引用
+                                    os.unlink(local_path)
+                                    progress['uploaded_bytes'] += digest['size']
+                                    progress['files_done'] += 1
+                            else:
+                                index = uploads.pop(future)
+                                future.result()
+                                progress['uploaded_bytes'] += results[index]['file_size']
+                                progress['files_done'] += 1
+                        fill()
+                        progress['total_bytes'] = max(progress['total_bytes'], progress['downloaded_bytes'])
+                        if on_progress:
+                            on_progress(dict(progress))
+                except Exception:
+                    for future in list(downloads) + list(uploads):
+                        future.cancel()
+                    raise
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        logger.info(f"流水线导入完成: {source.name}, {len(files)} 个文件, "
+                    f"上传 {progress['uploaded_bytes']} bytes")
+        return results
+
+# 创建全局导入流水线实例
+dataset_import_pipeline = DatasetImportPipeline()
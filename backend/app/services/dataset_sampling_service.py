@@ -0,0 +1,401 @@
+import json
+import random
+import logging
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from app.models.dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile
+from app.services.storage_service import storage_service
+from app.services.line_index_service import line_index_service, detect_index_format
+
+logger = logging.getLogger(__name__)
+
+ALLOCATIONS = ('equal', 'proportional')
+
+class SamplingNotReadyError(Exception):
+    """采样需要读取的数据量超过同步请求上限（需扫描的文件已在后台准备索引或 Parquet 副本）"""
+
+class _Reservoir:
+    """固定容量的均匀蓄水池（Algorithm R）"""
+
+    def __init__(self, capacity: int, rng: random.Random):
+        self.capacity = capacity
+        self.rng = rng
+        self.count = 0
+        self.items = []
+
+    def offer(self, item) -> None:
+        self.count += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+            return
+        j = self.rng.randrange(self.count)
+        if j < self.capacity:
+            self.items[j] = item
+
+def _stratum_key(value) -> Any:
+    """分层取值统一为可哈希、可 JSON 序列化的键"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+def _json_safe(row: Dict) -> Dict:
+    """Parquet 行中的 bytes、Decimal、时间等类型转为可序列化的值"""
+    return json.loads(json.dumps(row, ensure_ascii=False, default=_json_default))
+
+def allocate(counts: Dict[Any, int], size: int, allocation: str = 'equal') -> Dict[Any, int]:
+    """
+    把样本量分配到各层，每层不超过该层行数
+
+    equal: 各层等量，行数不足的层全取，余量分给其余层
+    proportional: 按行数比例，最大余数法取整
+    """
+    quotas = {key: 0 for key in counts}
+    total = sum(counts.values())
+    if total <= size:
+        return dict(counts)
+
+    if allocation == 'proportional':
+        exact = {key: size * count / total for key, count in counts.items()}
+        quotas = {key: int(value) for key, value in exact.items()}
+        remainder = size - sum(quotas.values())
+        for key in sorted(exact, key=lambda k: exact[k] - quotas[k], reverse=True)[:remainder]:
+            quotas[key] += 1
+        return quotas
+
+    remaining = size
+    open_keys = sorted(counts, key=lambda k: counts[k])
+    while remaining > 0 and open_keys:
+        open_keys = [key for key in open_keys if counts[key] > quotas[key]]
+        if not open_keys:
+            break
+        share = remaining // len(open_keys)
+        if share == 0:
+            # 余数分给剩余行数最多的层
+            for key in sorted(open_keys, key=lambda k: counts[k] - quotas[k], reverse=True)[:remaining]:
+                quotas[key] += 1
+            break
+        for key in open_keys:
+            take = min(share, counts[key] - quotas[key])
+            quotas[key] += take
+            remaining -= take
+    return quotas
+
+class DatasetSamplingService:
+    """
+    数据集版本采样：在版本的全部文件上做均匀随机采样或按字段分层采样。
+
+    已建立记录索引或 Parquet 副本的文件行数已知，先在全局行号上抽取样本位置，
+    再按索引块或行组读取命中的记录，读取量只与样本量有关；
+    其余文件顺序扫描并用蓄水池抽样，扫描量受 DATASET_SAMPLE_MAX_SCAN_BYTES 限制。
+    分层采样在 Parquet 副本上只读取分层列，读取的行数受 DATASET_SAMPLE_MAX_STRATIFY_ROWS 限制
+    """
+
+    def _settings(self) -> Dict:
+        config = current_app.config
+        return {
+            'max_size': config.get('DATASET_SAMPLE_MAX_SIZE', 1000),
+            'max_strata': config.get('DATASET_SAMPLE_MAX_STRATA', 100),
+            'max_scan_bytes': config.get('DATASET_SAMPLE_MAX_SCAN_BYTES', 64 * 1024 * 1024),
+            'max_stratify_rows': config.get('DATASET_SAMPLE_MAX_STRATIFY_ROWS', 5000000)
+        }
+
+    @staticmethod
+    def _prepare_sources(version_id: str, files: List[EnhancedDatasetFile], stratify_by: Optional[str]) -> None:
+        """
+        在后台为需要顺序扫描的文件准备可直接定位的读取方式：
+        均匀采样建立记录索引，分层采样需要逐行读取分层字段，改为生成 Parquet 副本
+        """
+        if not stratify_by:
+            line_index_service.schedule_files(files)
+            return
+        try:
+            from app.tasks.dataset_normalization_tasks import normalize_dataset_version_task
+            normalize_dataset_version_task.delay(version_id)
+        except Exception as e:
+            logger.warning(f"启动规整化任务失败: {str(e)}")
+
+    @staticmethod
+    def _plan_file(file: EnhancedDatasetFile, stratify_by: Optional[str]) -> Tuple[Optional[str], str]:
+        """
+        选择文件的读取方式：index（记录索引）、parquet（Parquet 副本）、scan（顺序扫描）
+
+        Returns:
+            (读取方式, 不可采样的原因)，可采样时原因为空
+        """
+        if file.file_size == 0:
+            return None, '空文件'
+        metadata = file.file_metadata or {}
+        index = metadata.get('line_index')
+        parquet = metadata.get('parquet')
+        fmt = index['format'] if index else detect_index_format(file.filename)
+
+        if stratify_by:
+            if parquet and parquet.get('num_rows') is not None:
+                fields = {field['name'] for field in parquet.get('schema') or []}
+                if stratify_by in fields:
+                    return 'parquet', ''
+                return None, f'不包含字段 {stratify_by}'
+            if fmt in ('jsonl', 'csv'):
+                return 'scan', ''
+            return None, '不支持按字段分层的文件格式'
+
+        if index:
+            return 'index', ''
+        if parquet and parquet.get('num_rows') is not None:
+            return 'parquet', ''
+        if fmt:
+            return 'scan', ''
+        return None, '不支持按记录采样的文件格式'
+
+    @staticmethod
+    def _row_count(file: EnhancedDatasetFile, access: str) -> int:
+        metadata = file.file_metadata or {}
+        if access == 'index':
+            return metadata['line_index']['num_rows']
+        return metadata['parquet']['num_rows']
+
+    @staticmethod
+    def _open_parquet(file: EnhancedDatasetFile):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("读取 Parquet 副本需要安装 pyarrow")
+        info = file.file_metadata['parquet']
+        return pq.ParquetFile(storage_service.open_random_access(
+            info['minio_bucket'], info['minio_object_name'], info.get('size')
+        ))
+
+    def _fetch_parquet_rows(self, file: EnhancedDatasetFile, rows: List[int]) -> Dict[int, Dict[str, Any]]:
+        """按行号读取 Parquet 副本，只读取命中的行组"""
+        parquet_file = self._open_parquet(file)
+        metadata = parquet_file.metadata
+        starts, position = [], 0
+        for i in range(metadata.num_row_groups):
+            starts.append(position)
+            position += metadata.row_group(i).num_rows
+
+        groups: Dict[int, List[int]] = {}
+        for row in sorted(set(rows)):
+            if 0 <= row < position:
+                groups.setdefault(bisect_right(starts, row) - 1, []).append(row)
+
+        result = {}
+        for group, wanted in groups.items():
+            table = parquet_file.read_row_group(group).take([row - starts[group] for row in wanted])
+            for row, values in zip(wanted, table.to_pylist()):
+                result[row] = {'data': _json_safe(values)}
+        return result
+
+    def _fetch(self, file: EnhancedDatasetFile, access: str, rows: List[int]) -> Dict[int, Dict[str, Any]]:
+        if access == 'index':
+            return line_index_service.fetch_records(file, rows)
+        return self._fetch_parquet_rows(file, rows)
+
+    @staticmethod
+    def _item(file: EnhancedDatasetFile, record_index: int, record: Dict[str, Any]) -> Dict[str, Any]:
+        return {'file_id': file.id, 'filename': file.filename, 'record_index': record_index, **record}
+
+    def _sample_uniform(self, sources: List[Dict], size: int, rng: random.Random) -> List[Dict]:
+        # 无法直接定位的文件先扫描，得到行数和各自的蓄水池样本
+        for source in sources:
+            if source['access'] == 'scan':
+                reservoir = _Reservoir(size, rng)
+                for number, record in line_index_service.scan_records(source['file']):
+                    reservoir.offer((number, record))
+                source['reservoir'] = reservoir
+                source['total_rows'] = reservoir.count
+
+        starts, total = [], 0
+        for source in sources:
+            starts.append(total)
+            total += source['total_rows']
+
+        picks: Dict[int, List[int]] = {}
+        for position in rng.sample(range(total), min(size, total)):
+            index = bisect_right(starts, position) - 1
+            picks.setdefault(index, []).append(position - starts[index])
+
+        items = []
+        for index, rows in picks.items():
+            source = sources[index]
+            file = source['file']
+            if source['access'] == 'scan':
+                # 蓄水池是该文件的均匀样本，从中再均匀抽取分配到的数量
+                for number, record in rng.sample(source['reservoir'].items, len(rows)):
+                    items.append(self._item(file, number, record))
+                continue
+            records = self._fetch(file, source['access'], rows)
+            items.extend(self._item(file, row, records[row]) for row in rows if row in records)
+        return items
+
+    def _sample_stratified(self, sources: List[Dict], size: int, stratify_by: str, allocation: str,
+                           rng: random.Random, max_strata: int) -> Tuple[List[Dict], List[Dict]]:
+        strata: Dict[Any, _Reservoir] = {}
+
+        def offer(value, item):
+            key = _stratum_key(value)
+            reservoir = strata.get(key)
+            if reservoir is None:
+                if len(strata) >= max_strata:
+                    raise ValueError(f"字段 {stratify_by} 的取值超过 {max_strata} 种，不适合分层采样")
+                reservoir = strata[key] = _Reservoir(size, rng)
+            reservoir.offer(item)
+
+        for index, source in enumerate(sources):
+            file = source['file']
+            if source['access'] == 'parquet':
+                # 只读取分层列，行内容在抽中后再按行组读取
+                parquet_file = self._open_parquet(file)
+                row = 0
+                for group in range(parquet_file.metadata.num_row_groups):
+                    column = parquet_file.read_row_group(group, columns=[stratify_by]).column(0)
+                    for value in column.to_pylist():
+                        offer(value, (index, row, None))
+                        row += 1
+                source['total_rows'] = row
+            else:
+                rows = 0
+                for number, record in line_index_service.scan_records(file):
+                    data = record.get('data')
+                    offer(data.get(stratify_by) if isinstance(data, dict) else None, (index, number, record))
+                    rows += 1
+                source['total_rows'] = rows
+
+        quotas = allocate({key: reservoir.count for key, reservoir in strata.items()}, size, allocation)
+        chosen = []
+        for key, reservoir in strata.items():
+            chosen.extend((key, item) for item in rng.sample(reservoir.items, quotas[key]))
+
+        # 抽中的 Parquet 行按文件批量读取
+        pending: Dict[int, List[int]] = {}
+        for _, (index, row, record) in chosen:
+            if record is None:
+                pending.setdefault(index, []).append(row)
+        fetched = {index: self._fetch_parquet_rows(sources[index]['file'], rows) for index, rows in pending.items()}
+
+        items = []
+        for key, (index, row, record) in chosen:
+            if record is None:
+                record = fetched[index].get(row)
+                if record is None:
+                    continue
+            items.append({**self._item(sources[index]['file'], row, record), 'stratum': key})
+
+        summary = [
+            {'value': key, 'total_rows': reservoir.count, 'sampled': quotas[key]}
+            for key, reservoir in sorted(strata.items(), key=lambda kv: -kv[1].count)
+        ]
+        return items, summary
+
+    def sample_version(self, version_id: str, size: int = 100, seed: int = None, stratify_by: str = None,
+                       allocation: str = 'equal', file_ids: List[str] = None) -> Dict[str, Any]:
+        """
+        对版本内的记录采样
+
+        Args:
+            version_id: 版本ID
+            size: 样本量，不超过 DATASET_SAMPLE_MAX_SIZE
+            seed: 随机种子，相同种子与数据得到相同样本；为空时随机生成并在结果中返回
+            stratify_by: 分层字段，为空时均匀采样
+            allocation: 分层样本分配方式，equal 或 proportional
+            file_ids: 只在这些文件中采样，默认版本内全部文件
+
+        Returns:
+            Dict: 采样结果，items 按文件与记录序号排序
+
+        Raises:
+            SamplingNotReadyError: 需要顺序扫描的数据量，或分层采样读取的分层列行数超过上限
+        """
+        version = EnhancedDatasetVersion.query.get(version_id)
+        if not version:
+            raise ValueError("版本不存在")
+        settings = self._settings()
+        if size < 1 or size > settings['max_size']:
+            raise ValueError(f"样本量必须在 1-{settings['max_size']} 之间")
+        if allocation not in ALLOCATIONS:
+            raise ValueError(f"不支持的分配方式: {allocation}")
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        rng = random.Random(seed)
+
+        files = sorted(version.files, key=lambda f: (f.file_path or '', f.id))
+        if file_ids:
+            wanted = set(file_ids)
+            files = [f for f in files if f.id in wanted]
+
+        sources, skipped = [], []
+        for file in files:
+            access, reason = self._plan_file(file, stratify_by)
+            if not access:
+                skipped.append({'file_id': file.id, 'filename': file.filename, 'reason': reason})
+                continue
+            sources.append({
+                'file': file,
+                'access': access,
+                'total_rows': self._row_count(file, access) if access != 'scan' else None
+            })
+
+        scan_files = [source['file'] for source in sources if source['access'] == 'scan']
+        scan_bytes = sum(f.file_size or 0 for f in scan_files)
+        if scan_bytes > settings['max_scan_bytes']:
+            self._prepare_sources(version_id, scan_files, stratify_by)
+            raise SamplingNotReadyError(
+                f"有 {len(scan_files)} 个文件需要顺序扫描（共 {scan_bytes} 字节），超过同步采样上限，"
+                f"已在后台{'生成 Parquet 副本' if stratify_by else '建立记录索引'}，请稍后重试"
+            )
+
+        if stratify_by:
+            # Parquet 副本上的分层采样要读取每一行的分层列，行数同样需要限制
+            stratify_rows = sum(source['total_rows'] or 0 for source in sources if source['access'] == 'parquet')
+            if stratify_rows > settings['max_stratify_rows']:
+                raise SamplingNotReadyError(
+                    f"分层采样需要读取 {stratify_rows} 行的字段 {stratify_by}，超过同步采样上限 "
+                    f"{settings['max_stratify_rows']} 行，请通过 file_ids 缩小采样范围"
+                )
+
+        strata = None
+        if stratify_by:
+            items, strata = self._sample_stratified(
+                sources, size, stratify_by, allocation, rng, settings['max_strata']
+            )
+        else:
+            items = self._sample_uniform(sources, size, rng)
+
+        order = {source['file'].id: i for i, source in enumerate(sources)}
+        items.sort(key=lambda item: (order[item['file_id']], item['record_index']))
+
+        logger.info(f"版本采样: {version_id}, {'分层 ' + stratify_by if stratify_by else '均匀'}, "
+                    f"样本 {len(items)}/{size}, 文件 {len(sources)} 个")
+        return {
+            'version_id': version_id,
+            'method': 'stratified' if stratify_by else 'uniform',
+            'seed': seed,
+            'requested_size': size,
+            'sample_size': len(items),
+            'total_rows': sum(source['total_rows'] or 0 for source in sources),
+            'stratify_by': stratify_by,
+            'allocation': allocation if stratify_by else None,
+            'strata': strata,
+            'files': [
+                {
+                    'file_id': source['file'].id,
+                    'filename': source['file'].filename,
+                    'access': source['access'],
+                    'total_rows': source['total_rows']
+                }
+                for source in sources
+            ],
+            'skipped_files': skipped,
+            'items': items
+        }
+
+# 创建全局数据集采样服务实例
+dataset_sampling_service = DatasetSamplingService()
@@ -2,7 +2,7 @@
 数据集服务层
 """
 import os
-import shutil
+import logging
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from sqlalchemy import desc, asc, or_, func
@@ -10,14 +10,16 @@ from werkzeug.datastructures import FileStorage
 
 from app.db import db
 from app.models.dataset import Dataset, DatasetVersion, DatasetTag, DatasetLike, DatasetDownload
-from app.services.storage_service import StorageService
+from app.services.storage_service import storage_service
+
+logger = logging.getLogger(__name__)
 
 
 class DatasetService:
     """数据集服务"""
     
     def __init__(self):
-        self.storage_service = StorageService()
+        self.storage_service = storage_service
     
     def get_datasets(self, 
                     page: int = 1, 
@@ -192,11 +194,14 @@ class DatasetService:
         """
         dataset = Dataset.query.get_or_404(dataset_id)
         
+        # 释放版本文件引用的内容块，归零后由垃圾回收删除（与删除记录在同一事务内）
+        self._release_dataset_blobs(dataset)
+        
         # 删除相关文件
         try:
             self._delete_dataset_files(dataset)
         except Exception as e:
-            print(f"删除数据集文件失败: {e}")
+            logger.warning(f"删除数据集文件失败: {e}")
         
         db.session.delete(dataset)
         db.session.commit()
@@ -379,32 +384,74 @@ class DatasetService:
         
         return f"{s}{size_names[i]}"
     
+    def _release_dataset_blobs(self, dataset: Dataset):
+        """释放数据集所有版本文件的内容块引用（不提交）"""
+        from app.models.dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile
+        from app.services.dataset_blob_service import dataset_blob_service
+        
+        rows = db.session.query(
+            EnhancedDatasetFile.blob_checksum, EnhancedDatasetFile.parquet_blob_checksum
+        ).join(
+            EnhancedDatasetVersion,
+            EnhancedDatasetFile.version_id == EnhancedDatasetVersion.id
+        ).filter(
+            EnhancedDatasetVersion.dataset_id == dataset.id
+        ).all()
+        dataset_blob_service.release_many(checksum for row in rows for checksum in row)
+    
     def _delete_dataset_files(self, dataset: Dataset):
-        """删除数据集相关文件"""
-        # 获取数据集文件目录
-        dataset_dir = os.path.join(
-            self.storage_service.base_path, 
-            "datasets",
-            self._safe_filename(dataset.owner),
-            self._safe_filename(dataset.name)
-        )
+        """删除数据集相关文件（批量删除对象存储中 datasets/{id}/ 前缀下的所有对象）"""
+        from flask import current_app
+        
+        # 仅按数据集前缀删除，引用自文件库等外部对象的版本文件不受影响
+        prefix = f"datasets/{dataset.id}/"
+        buckets = {
+            current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets'),
+            current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data')
+        }
+        for bucket_name in buckets:
+            results = self.storage_service.delete_prefix(bucket_name, prefix)
+            failed = [r for r in results if not r['success']]
+            if failed:
+                logger.warning(f"删除数据集文件失败: {len(failed)}/{len(results)} 个对象, 首个错误: {failed[0]['error']}")
+    
+    def reimport_dataset(self, dataset_id: int):
+        """
+        增量重新导入数据集：按默认版本记录的导入来源比对远端文件，只传输变化的文件并生成新版本
+        """
+        from app.models.dataset_version import EnhancedDatasetVersion
         
-        if os.path.exists(dataset_dir):
-            shutil.rmtree(dataset_dir)
+        dataset = Dataset.query.get_or_404(dataset_id)
+        version = EnhancedDatasetVersion.query.filter_by(
+            dataset_id=dataset.id, is_default=True
+        ).first() or EnhancedDatasetVersion.query.filter_by(
+            dataset_id=dataset.id
+        ).order_by(EnhancedDatasetVersion.created_at.desc()).first()
+        
+        pipeline_config = (version.pipeline_config or {}) if version else {}
+        if pipeline_config.get('import_method') not in ('huggingface', 'modelscope') \
+                or not pipeline_config.get('import_url'):
+            raise ValueError('该数据集不是从HuggingFace或魔搭社区导入的，无法重新导入')
+        
+        return self._start_import_task(dataset, {
+            'import_method': pipeline_config['import_method'],
+            'import_url': pipeline_config['import_url']
+        }, incremental=True)
     
-    def _start_import_task(self, dataset: Dataset, data: Dict):
+    def _start_import_task(self, dataset: Dataset, data: Dict, incremental: bool = False):
         """启动数据集导入任务"""
         from app.models import Task as TaskModel, TaskType
         from app.tasks.dataset_import_tasks import import_dataset_task
         
         # 创建任务记录
         task = TaskModel(
-            name=f"导入数据集: {data.get('import_url', 'Unknown')}",
+            name=f"{'增量导入' if incremental else '导入'}数据集: {data.get('import_url', 'Unknown')}",
             type=TaskType.DATA_IMPORT,
             config={
                 'dataset_id': dataset.id,
                 'import_method': data.get('import_method'),
                 'import_url': data.get('import_url'),
+                'incremental': incremental,
                 'created_by': 'system'
             }
         )
@@ -417,7 +464,8 @@ class DatasetService:
             dataset_id=dataset.id,
             import_method=data.get('import_method'),
             import_url=data.get('import_url'),
-            task_id=task.id
+            task_id=task.id,
+            incremental=incremental
         )
         
         # 更新任务的Celery ID
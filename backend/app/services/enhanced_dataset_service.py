@@ -1,18 +1,20 @@
 import os
-import hashlib
 import zipfile
 import tempfile
 from typing import List, Dict, Any, Optional, Tuple
 from werkzeug.datastructures import FileStorage
-from flask import current_app
 import logging
 
 from app.db import db
 from app.models.dataset import Dataset
 from app.models.dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile, VersionType
 from app.services.storage_service import storage_service
+from app.services.dataset_blob_service import dataset_blob_service
 from app.services.data_preview_service import DataPreviewService
-import uuid
+from app.services.line_index_service import line_index_service, sidecar_names
+from app.services.column_profile_service import column_profile_service
+from app.services.dataset_diff_service import dataset_diff_service
+from app.services.version_manifest_service import version_manifest_service, relative_path
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -85,20 +87,11 @@ class EnhancedDatasetService:
                         )
                         total_size += dataset_file.file_size or 0
                         file_count += 1
-                        
-                        # 生成预览数据
-                        try:
-                            preview_data = DataPreviewService.generate_preview(dataset_file)
-                            DataPreviewService.save_preview_data(dataset_file, preview_data)
-                        except Exception as e:
-                            logger.warning(f"生成预览失败: {str(e)}")
                 
                 # 更新版本统计信息
                 dataset_version.total_size = total_size
                 dataset_version.file_count = file_count
-                dataset_version.data_checksum = EnhancedDatasetService._calculate_version_checksum(
-                    dataset_version
-                )
+                version_manifest_service.build(dataset_version)
             
             # 如果是第一个版本，设为默认版本
             if not EnhancedDatasetVersion.query.filter_by(dataset_id=dataset_id).count():
@@ -106,6 +99,10 @@ class EnhancedDatasetService:
             
             db.session.commit()
             
+            # 后台为 JSONL/CSV/文本文件建立记录索引，并生成预览
+            line_index_service.schedule_files(dataset_version.files)
+            DataPreviewService.schedule_previews(dataset_version.files)
+            
             logger.info(f"数据集版本创建成功: {dataset.name} v{version}")
             return dataset_version
             
@@ -119,23 +116,10 @@ class EnhancedDatasetService:
         """上传数据集文件"""
         try:
             # 生成文件路径
-            file_extension = os.path.splitext(file.filename)[1]
             relative_path = f"datasets/{version.dataset_id}/versions/{version.id}/{file.filename}"
-            object_name = f"datasets/{version.dataset_id}/v{version.version}/{uuid.uuid4().hex}{file_extension}"
-            
-            # 获取实际使用的bucket名称（与storage_service保持一致）
-            actual_bucket = current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets')
-            
-            # 上传到MinIO
-            uploaded_object, file_size = storage_service.upload_file(
-                file_data=file,
-                original_filename=file.filename,
-                content_type=file.content_type
-            )
             
-            # 计算文件校验和
-            file.stream.seek(0)
-            checksum = hashlib.md5(file.stream.read()).hexdigest()
+            # 按内容寻址存储，相同内容只保存一份，已存在时只增加引用计数
+            blob = dataset_blob_service.store_stream(file.stream, file.content_type)
             file.stream.seek(0)
             
             # 确定文件类型
@@ -147,10 +131,11 @@ class EnhancedDatasetService:
                 filename=file.filename,
                 file_path=relative_path,
                 file_type=file_type,
-                file_size=file_size,
-                checksum=checksum,
-                minio_bucket=actual_bucket,  # 使用实际的bucket名称
-                minio_object_name=uploaded_object,
+                file_size=blob.size,
+                checksum=blob.md5,
+                minio_bucket=blob.bucket,
+                minio_object_name=blob.object_name,
+                blob_checksum=blob.checksum,
                 file_metadata=EnhancedDatasetService._extract_file_metadata(file, file_type)
             )
             
@@ -229,27 +214,6 @@ class EnhancedDatasetService:
         
         return metadata
     
-    @staticmethod
-    def _calculate_version_checksum(version: EnhancedDatasetVersion) -> str:
-        """计算版本数据校验和"""
-        try:
-            # 收集所有文件的校验和
-            file_checksums = []
-            for file in version.files:
-                if file.checksum:
-                    file_checksums.append(file.checksum)
-            
-            # 计算整体校验和
-            if file_checksums:
-                combined = ''.join(sorted(file_checksums))
-                return hashlib.sha256(combined.encode()).hexdigest()
-            
-            return ''
-            
-        except Exception as e:
-            logger.error(f"计算版本校验和失败: {str(e)}")
-            return ''
-    
     @staticmethod
     def get_dataset_preview(dataset_id: int, version_id: Optional[str] = None, max_items: int = 10) -> Dict[str, Any]:
         """获取数据集预览"""
@@ -282,34 +246,13 @@ class EnhancedDatasetService:
                     }
                 }
             
-            # 获取文件预览
-            file_previews = []
-            for file in version.files[:max_items]:
-                if file.preview_data:
-                    # 使用缓存的预览数据
-                    file_previews.append({
-                        'file': file.to_dict(),
-                        'preview': file.preview_data
-                    })
-                else:
-                    # 生成新的预览数据
-                    try:
-                        preview_data = DataPreviewService.generate_preview(file, max_items=5)
-                        DataPreviewService.save_preview_data(file, preview_data)
-                        file_previews.append({
-                            'file': file.to_dict(),
-                            'preview': preview_data
-                        })
-                    except Exception as e:
-                        logger.warning(f"生成文件预览失败: {str(e)}")
-                        file_previews.append({
-                            'file': file.to_dict(),
-                            'preview': {
-                                'type': 'error',
-                                'message': f'预览生成失败: {str(e)}',
-                                'items': []
-                            }
-                        })
+            # 缺少预览的文件转入后台生成，本次返回 pending 占位，请求耗时与文件大小无关
+            files = version.files[:max_items]
+            DataPreviewService.schedule_previews(files)
+            file_previews = [
+                {'file': file.to_dict(), 'preview': file.preview_data}
+                for file in files
+            ]
             
             return {
                 'dataset': dataset.to_dict(),
@@ -317,6 +260,7 @@ class EnhancedDatasetService:
                 'preview': {
                     'total_files': version.file_count,
                     'preview_files': len(file_previews),
+                    'pending_files': sum(1 for f in files if DataPreviewService.is_pending(f.preview_data)),
                     'files': file_previews
                 }
             }
@@ -364,22 +308,18 @@ class EnhancedDatasetService:
                     dataset_file = EnhancedDatasetService._upload_dataset_file(version, file)
                     added_files.append(dataset_file)
                     total_size_added += dataset_file.file_size or 0
-                    
-                    # 生成预览数据
-                    try:
-                        preview_data = DataPreviewService.generate_preview(dataset_file)
-                        DataPreviewService.save_preview_data(dataset_file, preview_data)
-                    except Exception as e:
-                        logger.warning(f"生成预览失败: {str(e)}")
             
             # 更新版本统计信息
             version.file_count += len(added_files)
             version.total_size += total_size_added
-            version.data_checksum = EnhancedDatasetService._calculate_version_checksum(version)
+            version_manifest_service.apply_changes(version, added=added_files)
             version.updated_at = datetime.utcnow()
             
             db.session.commit()
             
+            line_index_service.schedule_files(added_files)
+            DataPreviewService.schedule_previews(added_files)
+            
             return {
                 'version_id': version_id,
                 'added_files': [f.to_dict() for f in added_files],
@@ -421,21 +361,19 @@ class EnhancedDatasetService:
             if version.is_deprecated:
                 raise ValueError('不能从已废弃的版本删除文件')
             
-            # 从存储中删除文件
-            try:
-                storage_service.delete_file(file.minio_bucket, file.minio_object_name)
-            except Exception as e:
-                logger.warning(f"删除存储文件失败: {str(e)}")
+            # 释放存储引用，其他版本仍在使用的内容不会被删除
+            legacy_objects = EnhancedDatasetService._release_file_storage([file])
             
             # 更新版本统计信息
             version.file_count -= 1
             version.total_size -= (file.file_size or 0)
-            version.data_checksum = EnhancedDatasetService._calculate_version_checksum(version)
             version.updated_at = datetime.utcnow()
             
             # 删除数据库记录
             db.session.delete(file)
+            version_manifest_service.apply_changes(version, removed=[file])
             db.session.commit()
+            EnhancedDatasetService._delete_legacy_objects(legacy_objects)
             
             return {
                 'version_id': version_id,
@@ -524,6 +462,48 @@ class EnhancedDatasetService:
             logger.error(f"获取文件列表失败: {str(e)}")
             raise
 
+    @staticmethod
+    def _release_file_storage(files: List[EnhancedDatasetFile]) -> List[Tuple[str, str]]:
+        """
+        释放待删除文件占用的存储（在调用方事务内，不提交）
+        
+        内容寻址的文件只减少 blob 引用计数，由垃圾回收删除对象；
+        旧文件记录可能与克隆出的版本共享对象，仅在没有其他记录引用时才返回待删除对象
+        
+        Returns:
+            List[Tuple[str, str]]: 提交后需要删除的 (bucket, object_name)
+        """
+        dataset_blob_service.release_many(checksum for file in files for checksum in file.blob_checksums)
+        
+        file_ids = [file.id for file in files]
+        legacy_objects = []
+        for file in files:
+            if file.blob_checksum or not file.minio_object_name:
+                continue
+            shared = EnhancedDatasetFile.query.filter(
+                EnhancedDatasetFile.minio_bucket == file.minio_bucket,
+                EnhancedDatasetFile.minio_object_name == file.minio_object_name,
+                EnhancedDatasetFile.id.notin_(file_ids)
+            ).first()
+            if not shared:
+                legacy_objects.append((file.minio_bucket, file.minio_object_name))
+        return legacy_objects
+    
+    @staticmethod
+    def _delete_legacy_objects(objects: List[Tuple[str, str]]) -> None:
+        """删除不再被引用的旧存储对象，失败只记录日志"""
+        by_bucket = {}
+        for bucket, object_name in objects:
+            # 连同记录索引文件一起删除
+            by_bucket.setdefault(bucket, []).extend([object_name] + sidecar_names(object_name))
+        for bucket, object_names in by_bucket.items():
+            try:
+                for result in storage_service.delete_many(object_names, bucket):
+                    if not result['success']:
+                        logger.warning(f"删除存储文件失败: {result['object_name']}, {result['error']}")
+            except Exception as e:
+                logger.warning(f"删除存储文件失败: {str(e)}")
+
     @staticmethod
     def download_file(file_id: str):
         """
@@ -588,14 +568,9 @@ class EnhancedDatasetService:
             
             if operation == 'delete':
                 total_size_removed = 0
+                legacy_objects = EnhancedDatasetService._release_file_storage(files)
                 
                 for file in files:
-                    # 删除存储文件
-                    try:
-                        storage_service.delete_file(file.minio_bucket, file.minio_object_name)
-                    except Exception as e:
-                        logger.warning(f"删除存储文件失败: {str(e)}")
-                    
                     total_size_removed += (file.file_size or 0)
                     results.append(file.to_dict())
                     db.session.delete(file)
@@ -603,6 +578,7 @@ class EnhancedDatasetService:
                 # 更新版本统计
                 version.file_count -= len(files)
                 version.total_size -= total_size_removed
+                version_manifest_service.apply_changes(version, removed=files)
                 
             elif operation == 'update_metadata':
                 if not metadata:
@@ -620,11 +596,11 @@ class EnhancedDatasetService:
             else:
                 raise ValueError(f'不支持的操作类型: {operation}')
             
-            # 重新计算数据校验和
-            version.data_checksum = EnhancedDatasetService._calculate_version_checksum(version)
             version.updated_at = datetime.utcnow()
             
             db.session.commit()
+            if operation == 'delete':
+                EnhancedDatasetService._delete_legacy_objects(legacy_objects)
             
             return {
                 'version_id': version_id,
@@ -641,6 +617,78 @@ class EnhancedDatasetService:
             logger.error(f"批量操作失败: {str(e)}")
             raise
 
+    @staticmethod
+    def get_version_diff(
+        version1_id: str,
+        version2_id: str,
+        statuses: Optional[List[str]] = None,
+        page: int = 1,
+        page_size: int = 50
+    ) -> Dict[str, Any]:
+        """
+        获取两个版本的文件级差异
+        
+        Args:
+            version1_id: 旧版本ID
+            version2_id: 新版本ID
+            statuses: 明细中包含的文件状态（added/removed/modified/unchanged），默认只列出变化
+            page: 页码
+            page_size: 每页大小
+            
+        Returns:
+            汇总计数与分页文件明细
+        """
+        return dataset_diff_service.get_version_diff(version1_id, version2_id, statuses, page, page_size)
+
+    @staticmethod
+    def get_record_diff(
+        version1_id: str,
+        version2_id: str,
+        path: str,
+        key: Optional[str] = None,
+        changes: Optional[List[str]] = None,
+        page: int = 1,
+        page_size: int = 50
+    ) -> Dict[str, Any]:
+        """
+        获取两个版本中同一 JSONL/CSV 文件的记录级差异
+        
+        Args:
+            version1_id: 旧版本ID
+            version2_id: 新版本ID
+            path: 文件相对路径
+            key: 对齐记录的字段名，不指定时按整行内容比较
+            changes: 明细中包含的变化类型（removed/added/modified），默认全部
+            page: 页码
+            page_size: 每页大小
+            
+        Returns:
+            汇总计数与分页记录明细
+        """
+        return dataset_diff_service.get_record_diff(version1_id, version2_id, path, key, changes, page, page_size)
+
+    @staticmethod
+    def compare_versions(version1_id: str, version2_id: str, limit: int = 100) -> Dict[str, Any]:
+        """
+        按 Merkle 树比较两个版本：根哈希相同即内容相同，否则只展开哈希不同的子树
+        
+        Args:
+            version1_id: 旧版本ID
+            version2_id: 新版本ID
+            limit: 最多返回的变化文件数
+            
+        Returns:
+            是否相同、两个版本的根摘要及变化的文件
+        """
+        try:
+            result = version_manifest_service.compare(version1_id, version2_id, limit)
+            # 旧版本首次比较时会补建 Merkle 树
+            db.session.commit()
+            return result
+        except Exception:
+            db.session.rollback()
+            raise
+
     @staticmethod
     def get_file_analytics(version_id: str) -> Dict[str, Any]:
         """
@@ -693,6 +741,25 @@ class EnhancedDatasetService:
                     'count': count
                 })
             
+            # 表格文件列统计（由后台列统计任务写入）
+            column_profiles = []
+            unprofiled_files = 0
+            for file in EnhancedDatasetFile.query.filter_by(version_id=version_id).order_by(
+                EnhancedDatasetFile.file_path
+            ).all():
+                profile = column_profile_service.get_profile(file)
+                if profile:
+                    column_profiles.append({
+                        'file_id': file.id,
+                        'filename': file.filename,
+                        'file_path': file.file_path,
+                        'num_rows': profile.get('num_rows'),
+                        'profiled_at': profile.get('profiled_at'),
+                        'columns': profile.get('columns', [])
+                    })
+                elif column_profile_service.is_profilable(file):
+                    unprofiled_files += 1
+            
             return {
                 'version': version.to_dict(),
                 'type_statistics': [
@@ -707,6 +774,11 @@ class EnhancedDatasetService:
                     for stat in type_stats
                 ],
                 'size_distribution': size_distribution,
+                'column_profiles': {
+                    'files': column_profiles,
+                    'profiled_files': len(column_profiles),
+                    'unprofiled_files': unprofiled_files
+                },
                 'summary': {
                     'total_files': version.file_count,
                     'total_size': version.total_size,
@@ -927,6 +999,8 @@ class EnhancedDatasetService:
                         checksum=original_file.checksum,
                         minio_bucket=original_file.minio_bucket,
                         minio_object_name=original_file.minio_object_name,  # 引用相同的存储对象
+                        blob_checksum=original_file.blob_checksum,
+                        parquet_blob_checksum=original_file.parquet_blob_checksum,
                         file_metadata=original_file.file_metadata.copy() if original_file.file_metadata else {},
                         preview_data=original_file.preview_data.copy() if original_file.preview_data else {}
                     )
@@ -934,6 +1008,9 @@ class EnhancedDatasetService:
                     db.session.add(new_file_record)
                     total_size += new_file_record.file_size or 0
                     file_count += 1
+                
+                # 共享存储对象，只增加引用计数
+                dataset_blob_service.acquire_many(checksum for f in existing_files for checksum in f.blob_checksums)
             
             # 处理新上传的文件
             if new_files:
@@ -952,20 +1029,11 @@ class EnhancedDatasetService:
                         )
                         total_size += dataset_file.file_size or 0
                         file_count += 1
-                        
-                        # 生成预览数据
-                        try:
-                            preview_data = DataPreviewService.generate_preview(dataset_file)
-                            DataPreviewService.save_preview_data(dataset_file, preview_data)
-                        except Exception as e:
-                            logger.warning(f"生成预览失败: {str(e)}")
             
             # 更新版本统计信息
             dataset_version.total_size = total_size
             dataset_version.file_count = file_count
-            dataset_version.data_checksum = EnhancedDatasetService._calculate_version_checksum(
-                dataset_version
-            )
+            version_manifest_service.build(dataset_version)
             
             # 如果是第一个版本，设为默认版本
             if not EnhancedDatasetVersion.query.filter_by(dataset_id=dataset_id).count():
@@ -973,6 +1041,9 @@ class EnhancedDatasetService:
             
             db.session.commit()
             
+            line_index_service.schedule_files(dataset_version.files)
+            DataPreviewService.schedule_previews(dataset_version.files)
+            
             logger.info(f"数据集版本创建成功: {dataset.name} v{version} (现有文件: {len(existing_files)}, 新文件: {len(new_files) if new_files else 0})")
             return dataset_version
             
@@ -1024,7 +1095,8 @@ class EnhancedDatasetService:
                 version_metadata=source_version.version_metadata.copy() if source_version.version_metadata else {},
                 total_size=source_version.total_size,
                 file_count=source_version.file_count,
-                data_checksum=source_version.data_checksum
+                data_checksum=source_version.data_checksum,
+                data_schema=source_version.data_schema
             )
             
             db.session.add(cloned_version)
@@ -1036,6 +1108,7 @@ class EnhancedDatasetService:
             ).all()
             
             # 为新版本创建文件记录的副本
+            paths_preserved = True
             for source_file in source_files:
                 # 创建文件记录的副本，但指向新版本
                 cloned_file = EnhancedDatasetFile(
@@ -1047,11 +1120,26 @@ class EnhancedDatasetService:
                     checksum=source_file.checksum,
                     minio_bucket=source_file.minio_bucket,
                     minio_object_name=source_file.minio_object_name,  # 引用相同的存储对象
+                    blob_checksum=source_file.blob_checksum,
+                    parquet_blob_checksum=source_file.parquet_blob_checksum,
+                    merkle_bucket=source_file.merkle_bucket,
                     file_metadata=source_file.file_metadata.copy() if source_file.file_metadata else {},
                     preview_data=source_file.preview_data.copy() if source_file.preview_data else {}
                 )
                 
                 db.session.add(cloned_file)
+                paths_preserved = paths_preserved and (
+                    relative_path(cloned_file.file_path) == relative_path(source_file.file_path)
+                )
+            
+            # 克隆不复制存储对象，只增加引用计数
+            dataset_blob_service.acquire_many(checksum for f in source_files for checksum in f.blob_checksums)
+            
+            # 文件相对路径不变时直接复制源版本的 Merkle 树，否则重新构建
+            if paths_preserved:
+                version_manifest_service.derive(source_version, cloned_version)
+            else:
+                version_manifest_service.build(cloned_version)
             
             db.session.commit()
             
@@ -199,9 +199,16 @@ class LibraryService:
         file_type: str,
         file_size: int,
         minio_object_name: str,
-        minio_bucket: str = None
+        minio_bucket: str = None,
+        content_hash: str = None,
+        commit: bool = True
     ) -> LibraryFile:
-        """向文件库添加文件"""
+        """
+        向文件库添加文件
+
+        commit 为 False 时只 flush 得到文件ID，不提交也不更新文件库统计，
+        用于调用方需要在同一事务（如持有行锁）内完成其他修改的场景
+        """
         library = Library.query.filter_by(id=library_id).first()
         if not library:
             raise ValueError("文件库不存在")
@@ -218,10 +225,14 @@ class LibraryService:
             file_size=file_size,
             minio_object_name=minio_object_name,
             minio_bucket=minio_bucket,
+            content_hash=content_hash,
             library_id=library_id
         )
         
         db.session.add(library_file)
+        if not commit:
+            db.session.flush()
+            return library_file
         db.session.commit()
         
         # 更新文件库统计信息
@@ -0,0 +1,357 @@
+import os
+import csv
+import sys
+import json
+import codecs
+import struct
+import logging
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from flask import current_app
+
+from app.models.dataset_version import EnhancedDatasetFile
+from app.services.storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+# 可建立记录索引的扩展名及记录切分方式
+INDEX_FORMATS = {
+    '.jsonl': 'jsonl',
+    '.csv': 'csv',
+    '.txt': 'text',
+    '.md': 'text',
+}
+
+# 索引文件头：魔数、格式版本、保留、步长、总记录数；其后为小端 uint64 偏移数组
+INDEX_MAGIC = b'LIDX'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sHHIQ4x')
+OFFSET_SIZE = 8
+
+def detect_index_format(filename: str) -> Optional[str]:
+    """返回文件的记录切分方式，不支持的文件返回 None"""
+    return INDEX_FORMATS.get(os.path.splitext(filename or '')[1].lower())
+
+def sidecar_name(object_name: str, fmt: str) -> str:
+    """索引文件与数据对象放在一起；内容寻址对象的索引随内容共享"""
+    return f"{object_name}.{fmt}.lidx"
+
+def sidecar_names(object_name: str) -> List[str]:
+    """对象可能存在的全部索引文件名，删除对象时一并删除"""
+    return [sidecar_name(object_name, fmt) for fmt in sorted(set(INDEX_FORMATS.values()))]
+
+def iter_records(stream, fmt: str, base_offset: int = 0, skip_header: bool = False) -> Iterator[Tuple[int, bytes]]:
+    """
+    从字节流中逐条切分记录
+
+    JSONL 跳过空行；CSV 按引号配对合并跨行字段、跳过空行；纯文本每行一条记录
+
+    Yields:
+        (记录起始字节偏移, 记录原始字节，不含行尾换行符)
+    """
+    pos = base_offset
+    pending_start, pending, in_quotes = None, [], False
+    header_pending = skip_header
+    for line in stream:
+        start = pos
+        pos += len(line)
+        if fmt == 'csv':
+            if pending_start is None:
+                if not line.strip() and not header_pending:
+                    continue
+                pending_start = start
+            pending.append(line)
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            if in_quotes:
+                continue
+            record_start, record = pending_start, b''.join(pending)
+            pending_start, pending = None, []
+            if header_pending:
+                header_pending = False
+                continue
+            yield record_start, record.rstrip(b'\r\n')
+        elif fmt == 'jsonl':
+            if line.strip():
+                yield start, line.rstrip(b'\r\n')
+        else:
+            yield start, line.rstrip(b'\r\n')
+    if pending and not header_pending:
+        yield pending_start, b''.join(pending).rstrip(b'\r\n')
+
+class LineIndexService:
+    """
+    数据集文件记录偏移索引：每隔 stride 条记录保存一次起始字节偏移及总记录数，
+    以二进制索引文件保存在数据对象旁。定位第 K 条记录只需读取索引中的 8 个字节，
+    再从最近的索引点范围读取，分页、预览和随机采样都无需从头扫描
+    """
+
+    @staticmethod
+    def _bucket_name(file: EnhancedDatasetFile) -> str:
+        return file.minio_bucket or current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data')
+
+    @staticmethod
+    def _detect_encoding(sample: bytes) -> str:
+        for encoding in ('utf-8', 'gbk'):
+            try:
+                codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        return 'utf-8'
+
+    def _read_header(self, bucket: str, object_name: str) -> Optional[Dict]:
+        """读取已有索引文件头，不存在或格式不符时返回 None"""
+        try:
+            with storage_service.open_stream(bucket, object_name, offset=0, length=INDEX_HEADER.size) as stream:
+                data = stream.read()
+        except Exception:
+            return None
+        if len(data) < INDEX_HEADER.size:
+            return None
+        magic, version, _, stride, num_rows = INDEX_HEADER.unpack(data)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            return None
+        return {'stride': stride, 'num_rows': num_rows}
+
+    @staticmethod
+    def _scan(stream, fmt: str, stride: int) -> Tuple[array, int]:
+        """顺序扫描对象，记录每 stride 条记录的起始偏移"""
+        offsets = array('Q')
+        num_rows = 0
+        for start, _ in iter_records(stream, fmt, skip_header=(fmt == 'csv')):
+            if num_rows % stride == 0:
+                offsets.append(start)
+            num_rows += 1
+        return offsets, num_rows
+
+    def get_index(self, file: EnhancedDatasetFile) -> Optional[Dict]:
+        return (file.file_metadata or {}).get('line_index')
+
+    def build_for_file(self, file: EnhancedDatasetFile, force: bool = False) -> Optional[Dict]:
+        """
+        为文件建立记录索引并写入 file_metadata['line_index']（不提交）。
+        同一内容的索引文件已存在时直接复用
+
+        Returns:
+            Dict: 索引信息，不支持的文件返回 None
+        """
+        fmt = detect_index_format(file.filename)
+        if not fmt or file.file_size == 0:
+            return None
+        existing = self.get_index(file)
+        if existing and not force:
+            return existing
+
+        bucket = self._bucket_name(file)
+        index_object = sidecar_name(file.minio_object_name, fmt)
+        with storage_service.open_stream(bucket, file.minio_object_name, offset=0, length=64 * 1024) as stream:
+            sample = stream.read()
+        if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            # UTF-16 无法按字节换行切分
+            return None
+        encoding = self._detect_encoding(sample)
+
+        header = None if force else self._read_header(bucket, index_object)
+        if header is None:
+            stride = current_app.config.get('LINE_INDEX_STRIDE', 1024)
+            with storage_service.open_stream(bucket, file.minio_object_name) as stream:
+                offsets, num_rows = self._scan(stream, fmt, stride)
+            if sys.byteorder == 'big':
+                offsets.byteswap()
+            payload = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, stride, num_rows) + offsets.tobytes()
+            storage_service.upload_content(bucket, index_object, payload, 'application/octet-stream')
+            header = {'stride': stride, 'num_rows': num_rows}
+            logger.info(f"建立记录索引: {file.filename}, {num_rows} 条记录, 索引点 {len(offsets)} 个")
+
+        info = {
+            'format': fmt,
+            'encoding': encoding,
+            'num_rows': header['num_rows'],
+            'stride': header['stride'],
+            'minio_bucket': bucket,
+            'minio_object_name': index_object,
+            'built_at': datetime.utcnow().isoformat()
+        }
+        metadata = dict(file.file_metadata or {})
+        metadata['line_index'] = info
+        file.file_metadata = metadata
+        return info
+
+    def schedule_files(self, files: Iterable[EnhancedDatasetFile]) -> None:
+        """为尚未建立索引的文件启动后台建索引任务，失败只记录日志"""
+        file_ids = [
+            f.id for f in files
+            if detect_index_format(f.filename) and not self.get_index(f)
+        ]
+        if not file_ids:
+            return
+        try:
+            from app.tasks.dataset_file_tasks import build_line_indexes_task
+            build_line_indexes_task.delay(file_ids)
+        except Exception as e:
+            logger.warning(f"启动记录索引任务失败: {str(e)}")
+
+    def locate(self, file: EnhancedDatasetFile, record: int) -> Tuple[int, int]:
+        """
+        定位第 record 条记录（从 0 开始）
+
+        Returns:
+            (最近索引点的字节偏移, 从该点起需要跳过的记录数)
+        """
+        info = self.get_index(file)
+        block = record // info['stride']
+        with storage_service.open_stream(info['minio_bucket'], info['minio_object_name'],
+                                         offset=INDEX_HEADER.size + block * OFFSET_SIZE,
+                                         length=OFFSET_SIZE) as stream:
+            offset, = struct.unpack('<Q', stream.read(OFFSET_SIZE))
+        return offset, record - block * info['stride']
+
+    def _block_range(self, info: Dict, block: int) -> Tuple[int, Optional[int]]:
+        """读取相邻两个索引点，返回索引块的字节范围 [start, end)，最后一块 end 为 None"""
+        with storage_service.open_stream(info['minio_bucket'], info['minio_object_name'],
+                                         offset=INDEX_HEADER.size + block * OFFSET_SIZE,
+                                         length=2 * OFFSET_SIZE) as stream:
+            data = stream.read(2 * OFFSET_SIZE)
+        offsets = struct.unpack(f'<{len(data) // OFFSET_SIZE}Q', data[:len(data) // OFFSET_SIZE * OFFSET_SIZE])
+        return offsets[0], (offsets[1] if len(offsets) > 1 else None)
+
+    def fetch_records(self, file: EnhancedDatasetFile, records: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        按记录序号批量读取（需已建立索引）。同一索引块内的记录合并为一次有界范围读取，
+        读取量只与命中的块数有关，与文件大小无关
+
+        Returns:
+            Dict[int, Dict]: 记录序号 -> 解析后的记录（data 或 content）
+        """
+        info = self.get_index(file)
+        if not info:
+            raise ValueError(f"文件尚未建立记录索引: {file.filename}")
+        fmt, encoding, stride = info['format'], info['encoding'], info['stride']
+        bucket = self._bucket_name(file)
+        header = self._csv_header(bucket, file.minio_object_name, encoding) if fmt == 'csv' else []
+
+        blocks: Dict[int, List[int]] = {}
+        for record in sorted(set(records)):
+            if 0 <= record < info['num_rows']:
+                blocks.setdefault(record // stride, []).append(record)
+
+        result = {}
+        for block, wanted in blocks.items():
+            start, end = self._block_range(info, block)
+            length = end - start if end is not None else 0
+            last = wanted[-1] - block * stride
+            targets = {record - block * stride: record for record in wanted}
+            with storage_service.open_stream(bucket, file.minio_object_name, offset=start, length=length) as stream:
+                records_iter = iter_records(stream, fmt, base_offset=start,
+                                            skip_header=(fmt == 'csv' and start == 0))
+                for position, (_, record) in enumerate(records_iter):
+                    if position in targets:
+                        result[targets[position]] = self._decode_record(record, fmt, encoding, header)
+                    if position >= last:
+                        break
+        return result
+
+    def _file_encoding(self, file: EnhancedDatasetFile) -> str:
+        """文件编码：优先取索引中记录的编码，否则读取开头探测"""
+        info = self.get_index(file)
+        if info:
+            return info['encoding']
+        bucket = self._bucket_name(file)
+        with storage_service.open_stream(bucket, file.minio_object_name, offset=0, length=64 * 1024) as stream:
+            return self._detect_encoding(stream.read())
+
+    def read_csv_header(self, file: EnhancedDatasetFile) -> List[str]:
+        """读取 CSV 文件的表头列名"""
+        return self._csv_header(self._bucket_name(file), file.minio_object_name, self._file_encoding(file))
+
+    def _csv_header(self, bucket: str, object_name: str, encoding: str) -> List[str]:
+        with storage_service.open_stream(bucket, object_name) as stream:
+            for _, record in iter_records(stream, 'csv'):
+                return next(csv.reader([record.decode(encoding, errors='replace').lstrip('\ufeff')]), [])
+        return []
+
+    @staticmethod
+    def _decode_record(record: bytes, fmt: str, encoding: str, header: List[str]) -> Dict[str, Any]:
+        text = record.decode(encoding, errors='replace').lstrip('\ufeff')
+        if fmt == 'jsonl':
+            try:
+                return {'data': json.loads(text)}
+            except json.JSONDecodeError:
+                return {'content': text}
+        if fmt == 'csv':
+            row = next(csv.reader([text]), [])
+            return {'data': dict(zip(header, row))}
+        return {'content': text}
+
+    def scan_records(self, file: EnhancedDatasetFile, raw: bool = False) -> Iterator[Tuple[int, Any]]:
+        """
+        从头顺序读取文件的全部记录，不依赖索引
+
+        Args:
+            raw: 为 True 时产出记录原始字节，不做解码
+
+        Yields:
+            (记录序号, 解析后的记录或原始字节)
+        """
+        info = self.get_index(file)
+        fmt = info['format'] if info else detect_index_format(file.filename)
+        if not fmt:
+            raise ValueError(f"不支持按记录读取的文件: {file.filename}")
+        bucket = self._bucket_name(file)
+        encoding = self._file_encoding(file)
+        header = self._csv_header(bucket, file.minio_object_name, encoding) if fmt == 'csv' and not raw else []
+        with storage_service.open_stream(bucket, file.minio_object_name) as stream:
+            for number, (_, record) in enumerate(iter_records(stream, fmt, skip_header=(fmt == 'csv'))):
+                yield number, record if raw else self._decode_record(record, fmt, encoding, header)
+
+    def read_records(self, file: EnhancedDatasetFile, offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """
+        读取从第 offset 条开始的 limit 条记录。有索引时从最近的索引点范围读取，否则从头顺序扫描
+
+        Returns:
+            Dict: format, offset, limit, total_items, indexed, items
+        """
+        info = self.get_index(file)
+        fmt = info['format'] if info else detect_index_format(file.filename)
+        if not fmt:
+            raise ValueError(f"不支持按记录读取的文件: {file.filename}")
+        bucket = self._bucket_name(file)
+        total = info['num_rows'] if info else None
+
+        if info and offset >= total:
+            start_byte, skip = None, 0
+        elif info:
+            start_byte, skip = self.locate(file, offset)
+        else:
+            start_byte, skip = 0, offset
+
+        encoding = info['encoding'] if info else 'utf-8'
+        header = self._csv_header(bucket, file.minio_object_name, encoding) if fmt == 'csv' else []
+        items = []
+        if start_byte is not None:
+            with storage_service.open_stream(bucket, file.minio_object_name, offset=start_byte) as stream:
+                records = iter_records(stream, fmt, base_offset=start_byte,
+                                       skip_header=(fmt == 'csv' and start_byte == 0))
+                for _, record in records:
+                    if skip:
+                        skip -= 1
+                        continue
+                    items.append({'index': offset + len(items), **self._decode_record(record, fmt, encoding, header)})
+                    if len(items) >= limit:
+                        break
+
+        return {
+            'file_id': file.id,
+            'format': fmt,
+            'offset': offset,
+            'limit': limit,
+            'total_items': total,
+            'indexed': info is not None,
+            'items': items
+        }
+
+# 创建全局记录索引服务实例
+line_index_service = LineIndexService()
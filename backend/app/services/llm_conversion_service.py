@@ -18,6 +18,7 @@ from langchain.schema import HumanMessage, SystemMessage
 from langchain.schema.messages import BaseMessage
 
 from app.models import LLMConfig, ProviderType
+from app.services.markitdown_pool_service import markitdown_pool_service
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +27,7 @@ class LLMConversionService:
     
     def __init__(self):
         self.llm_cache = {}
+        self._markitdown = None
     
     def clear_cache(self, config_id: str = None):
         """清除LLM客户端缓存"""
@@ -152,13 +154,11 @@ class LLMConversionService:
             else:
                 logger.info(f"开始处理其他类型文件: {file_type}")
                 # 对于其他文件类型，先用markitdown转换，然后用LLM优化
-                import markitdown
-                md = markitdown.MarkItDown()
-                result = md.convert(file_path)
+                text_content = self._convert_with_markitdown(file_path, file_type)
                 
                 # 使用LLM优化markdown
                 system_prompt = self._get_system_prompt(custom_prompt)
-                user_prompt = f"请优化以下Markdown文档，确保格式正确、结构清晰：\n\n{result.text_content}"
+                user_prompt = f"请优化以下Markdown文档，确保格式正确、结构清晰：\n\n{text_content}"
                 
                 messages = [
                     SystemMessage(content=system_prompt),
@@ -182,6 +182,16 @@ class LLMConversionService:
             logger.error(f"LLM文档转换任务失败 - 耗时: {total_duration:.2f}秒, 错误: {str(e)}")
             raise
     
+    def _convert_with_markitdown(self, file_path: str, file_type: str) -> str:
+        """使用常驻 MarkItDown 进程池转换，守护进程中回退到进程内复用实例"""
+        if markitdown_pool_service.available:
+            return markitdown_pool_service.convert(file_path, file_type)
+        
+        if self._markitdown is None:
+            import markitdown
+            self._markitdown = markitdown.MarkItDown()
+        return self._markitdown.convert(file_path).text_content
+    
     def _convert_pdf_with_vision(
         self,
         pdf_path: str,
@@ -0,0 +1,402 @@
+import os
+import json
+import hmac
+import time
+import uuid
+import shutil
+import hashlib
+import mimetypes
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Dict, Iterator
+from urllib.parse import quote, urlencode
+from minio.datatypes import Object
+from minio.deleteobjects import DeleteError
+from minio.helpers import ObjectWriteResult
+from minio.error import S3Error
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 元数据与临时文件目录，S3 bucket 名不能以 . 开头，不会与 bucket 冲突
+_META_DIR = '.meta'
+_TMP_DIR = '.tmp'
+
+class _LocalObjectResponse:
+    """与 urllib3 响应相同的读取接口：read / stream / close / release_conn"""
+
+    def __init__(self, file_path: str, offset: int = 0, length: int = 0, headers: Dict = None):
+        self._file = open(file_path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        offset = min(offset, size)
+        self._file.seek(offset)
+        self._remaining = size - offset if not length else min(length, size - offset)
+        self.headers = headers or {}
+        self.status = 206 if offset or length else 200
+
+    def read(self, amt: int = None) -> bytes:
+        if self._remaining <= 0:
+            return b''
+        if amt is None or amt < 0 or amt > self._remaining:
+            amt = self._remaining
+        data = self._file.read(amt)
+        self._remaining -= len(data)
+        return data
+
+    def stream(self, amt: int = 64 * 1024) -> Iterator[bytes]:
+        while True:
+            data = self.read(amt)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        self._file.close()
+
+    def release_conn(self):
+        pass
+
+class LocalStorageClient:
+    """
+    本地文件系统存储后端，实现 StorageService 用到的 Minio 客户端接口子集。
+
+    目录结构：<root>/<bucket>/<object_name>，对象的 Content-Type 等元数据保存在
+    <root>/.meta/<bucket>/<object_name>.json。写入先落到 <root>/.tmp 再原子 rename，
+    整文件拷贝走 shutil（Linux 上使用 sendfile）。错误以 S3Error 抛出，错误码与 MinIO 一致。
+    """
+
+    def __init__(self, root: str, signing_key: str = None, url_base: str = ''):
+        self.root = os.path.abspath(root)
+        self.url_base = (url_base or '').rstrip('/')
+        # 空密钥会让任何人都能伪造预签名地址，未配置时拒绝启动
+        if not signing_key:
+            raise ValueError("本地存储后端需要配置 LOCAL_STORAGE_SIGNING_KEY 或 SECRET_KEY 用于预签名地址")
+        self._signing_key = signing_key.encode('utf-8')
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.root, _TMP_DIR), exist_ok=True)
+
+    # ------------------------------------------------------------------ 路径
+
+    def _error(self, code: str, message: str, bucket_name: str = None, object_name: str = None):
+        resource = f"/{bucket_name}/{object_name}" if object_name else f"/{bucket_name}"
+        return S3Error(code, message, resource, None, None, None,
+                       bucket_name=bucket_name, object_name=object_name)
+
+    def _bucket_path(self, bucket_name: str) -> str:
+        if not bucket_name or bucket_name.startswith('.') or '/' in bucket_name:
+            raise self._error('InvalidBucketName', f"非法的bucket名: {bucket_name}", bucket_name)
+        return os.path.join(self.root, bucket_name)
+
+    def _check_object_name(self, bucket_name: str, object_name: str):
+        parts = object_name.split('/') if object_name else []
+        if not parts or object_name.startswith('/') or any(p in ('', '.', '..') for p in parts):
+            raise self._error('XMinioInvalidObjectName', f"非法的对象名: {object_name}",
+                              bucket_name, object_name)
+
+    def local_path(self, bucket_name: str, object_name: str) -> str:
+        """对象在本地磁盘上的路径"""
+        self._check_object_name(bucket_name, object_name)
+        return os.path.join(self._bucket_path(bucket_name), *object_name.split('/'))
+
+    def _meta_path(self, bucket_name: str, object_name: str) -> str:
+        return os.path.join(self.root, _META_DIR, bucket_name, *object_name.split('/')) + '.json'
+
+    def _existing_path(self, bucket_name: str, object_name: str) -> str:
+        path = self.local_path(bucket_name, object_name)
+        if not os.path.isdir(self._bucket_path(bucket_name)):
+            raise self._error('NoSuchBucket', '存储桶不存在', bucket_name)
+        if not os.path.isfile(path):
+            raise self._error('NoSuchKey', '对象不存在', bucket_name, object_name)
+        return path
+
+    def _read_meta(self, bucket_name: str, object_name: str) -> Dict:
+        try:
+            with open(self._meta_path(bucket_name, object_name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, bucket_name: str, object_name: str, meta: Dict):
+        meta_path = self._meta_path(bucket_name, object_name)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def _tmp_path(self) -> str:
+        return os.path.join(self.root, _TMP_DIR, uuid.uuid4().hex)
+
+    def _commit(self, tmp_path: str, bucket_name: str, object_name: str, meta: Dict) -> ObjectWriteResult:
+        """将临时文件原子地提交为对象"""
+        path = self.local_path(bucket_name, object_name)
+        if not os.path.isdir(self._bucket_path(bucket_name)):
+            os.unlink(tmp_path)
+            raise self._error('NoSuchBucket', '存储桶不存在', bucket_name)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_meta(bucket_name, object_name, meta)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return ObjectWriteResult(bucket_name, object_name, None, meta.get('etag'), {})
+
+    def _prune_dirs(self, path: str, stop: str):
+        """删除对象后清理空目录，保持与 S3 一致的无空目录语义"""
+        parent = os.path.dirname(path)
+        while parent.startswith(stop + os.sep):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+
+    # ------------------------------------------------------------------ bucket
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return os.path.isdir(self._bucket_path(bucket_name))
+
+    def make_bucket(self, bucket_name: str, location: str = None, object_lock: bool = False):
+        path = self._bucket_path(bucket_name)
+        with self._lock:
+            if os.path.isdir(path):
+                raise self._error('BucketAlreadyOwnedByYou', '存储桶已存在', bucket_name)
+            os.makedirs(path)
+
+    # ------------------------------------------------------------------ 写入
+
+    def put_object(self, bucket_name: str, object_name: str, data: BinaryIO, length: int,
+                   content_type: str = 'application/octet-stream', metadata: Dict = None,
+                   part_size: int = 0, **kwargs) -> ObjectWriteResult:
+        self._check_object_name(bucket_name, object_name)
+        chunk_size = part_size or 8 * 1024 * 1024
+        md5 = hashlib.md5()
+        tmp_path = self._tmp_path()
+        remaining = length if length is not None and length >= 0 else None
+        with open(tmp_path, 'wb') as f:
+            while remaining is None or remaining > 0:
+                chunk = data.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                md5.update(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+        if remaining:
+            os.unlink(tmp_path)
+            raise self._error('IncompleteBody', f"数据长度不足, 缺少 {remaining} 字节",
+                              bucket_name, object_name)
+        meta = {'content_type': content_type, 'etag': md5.hexdigest(), 'metadata': metadata or {}}
+        return self._commit(tmp_path, bucket_name, object_name, meta)
+
+    def fput_object(self, bucket_name: str, object_name: str, file_path: str,
+                    content_type: str = 'application/octet-stream', metadata: Dict = None,
+                    **kwargs) -> ObjectWriteResult:
+        self._check_object_name(bucket_name, object_name)
+        tmp_path = self._tmp_path()
+        shutil.copyfile(file_path, tmp_path)
+        st = os.stat(tmp_path)
+        # 整文件拷贝不再逐字节计算 MD5，etag 取大小与修改时间
+        meta = {'content_type': content_type, 'etag': f"{st.st_size:x}-{st.st_mtime_ns:x}",
+                'metadata': metadata or {}}
+        return self._commit(tmp_path, bucket_name, object_name, meta)
+
+    def copy_object(self, bucket_name: str, object_name: str, source, **kwargs) -> ObjectWriteResult:
+        """服务端复制：source 为 minio.commonconfig.CopySource"""
+        self._check_object_name(bucket_name, object_name)
+        src_path = self._existing_path(source.bucket_name, source.object_name)
+        tmp_path = self._tmp_path()
+        shutil.copyfile(src_path, tmp_path)
+        meta = self._read_meta(source.bucket_name, source.object_name)
+        if kwargs.get('metadata') is not None:
+            meta['metadata'] = kwargs['metadata']
+        if not meta.get('etag'):
+            st = os.stat(tmp_path)
+            meta['etag'] = f"{st.st_size:x}-{st.st_mtime_ns:x}"
+        return self._commit(tmp_path, bucket_name, object_name, meta)
+
+    # ------------------------------------------------------------------ 分片上传
+
+    def _upload_dir(self, upload_id: str) -> str:
+        if not upload_id or not upload_id.isalnum():
+            raise self._error('NoSuchUpload', f"非法的上传ID: {upload_id}")
+        return os.path.join(self.root, _TMP_DIR, 'uploads', upload_id)
+
+    def _create_multipart_upload(self, bucket_name: str, object_name: str, headers: Dict) -> str:
+        self._check_object_name(bucket_name, object_name)
+        if not os.path.isdir(self._bucket_path(bucket_name)):
+            raise self._error('NoSuchBucket', '存储桶不存在', bucket_name)
+        upload_id = uuid.uuid4().hex
+        upload_dir = self._upload_dir(upload_id)
+        os.makedirs(upload_dir)
+        with open(os.path.join(upload_dir, 'upload.json'), 'w', encoding='utf-8') as f:
+            json.dump({'bucket': bucket_name, 'object_name': object_name,
+                       'content_type': (headers or {}).get('Content-Type')}, f)
+        return upload_id
+
+    def _upload_part(self, bucket_name: str, object_name: str, data: bytes, headers: Dict,
+                     upload_id: str, part_number: int) -> str:
+        upload_dir = self._upload_dir(upload_id)
+        if not os.path.isdir(upload_dir):
+            raise self._error('NoSuchUpload', '分片上传不存在', bucket_name, object_name)
+        tmp_path = self._tmp_path()
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(upload_dir, str(part_number)))
+        return hashlib.md5(data).hexdigest()
+
+    def _complete_multipart_upload(self, bucket_name: str, object_name: str, upload_id: str, parts):
+        upload_dir = self._upload_dir(upload_id)
+        if not os.path.isdir(upload_dir):
+            raise self._error('NoSuchUpload', '分片上传不存在', bucket_name, object_name)
+        with open(os.path.join(upload_dir, 'upload.json'), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        tmp_path = self._tmp_path()
+        part_md5s = []
+        with open(tmp_path, 'wb') as out:
+            for part in parts:
+                part_path = os.path.join(upload_dir, str(part.part_number))
+                if not os.path.isfile(part_path):
+                    os.unlink(tmp_path)
+                    raise self._error('InvalidPart', f"分片 {part.part_number} 不存在",
+                                      bucket_name, object_name)
+                with open(part_path, 'rb') as src:
+                    shutil.copyfileobj(src, out, 8 * 1024 * 1024)
+                part_md5s.append(bytes.fromhex(part.etag))
+        # 与 S3 一致：分片上传对象的 etag 为各分片 MD5 拼接后的 MD5 加分片数
+        etag = f"{hashlib.md5(b''.join(part_md5s)).hexdigest()}-{len(part_md5s)}"
+        meta = {'content_type': info.get('content_type') or 'application/octet-stream',
+                'etag': etag, 'metadata': {}}
+        result = self._commit(tmp_path, bucket_name, object_name, meta)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return result
+
+    def _abort_multipart_upload(self, bucket_name: str, object_name: str, upload_id: str):
+        upload_dir = self._upload_dir(upload_id)
+        if not os.path.isdir(upload_dir):
+            raise self._error('NoSuchUpload', '分片上传不存在', bucket_name, object_name)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+    # ------------------------------------------------------------------ 读取
+
+    def stat_object(self, bucket_name: str, object_name: str, **kwargs) -> Object:
+        path = self._existing_path(bucket_name, object_name)
+        st = os.stat(path)
+        meta = self._read_meta(bucket_name, object_name)
+        return Object(
+            bucket_name, object_name,
+            last_modified=datetime.fromtimestamp(st.st_mtime, tz=timezone.utc),
+            etag=meta.get('etag') or f"{st.st_size:x}-{st.st_mtime_ns:x}",
+            size=st.st_size,
+            metadata=meta.get('metadata'),
+            content_type=meta.get('content_type') or mimetypes.guess_type(object_name)[0]
+            or 'application/octet-stream'
+        )
+
+    def get_object(self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0,
+                   **kwargs) -> _LocalObjectResponse:
+        path = self._existing_path(bucket_name, object_name)
+        meta = self._read_meta(bucket_name, object_name)
+        headers = {'Content-Type': meta.get('content_type') or 'application/octet-stream'}
+        return _LocalObjectResponse(path, offset=offset, length=length, headers=headers)
+
+    def fget_object(self, bucket_name: str, object_name: str, file_path: str, **kwargs) -> Object:
+        path = self._existing_path(bucket_name, object_name)
+        dir_name = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(dir_name, exist_ok=True)
+        shutil.copyfile(path, file_path)
+        return self.stat_object(bucket_name, object_name)
+
+    def list_objects(self, bucket_name: str, prefix: str = None, recursive: bool = False,
+                     start_after: str = None, **kwargs) -> Iterator[Object]:
+        """按 S3 语义列出对象：键按字典序返回，非递归时子目录以 '/' 结尾的 is_dir 条目返回"""
+        bucket_path = self._bucket_path(bucket_name)
+        if not os.path.isdir(bucket_path):
+            raise self._error('NoSuchBucket', '存储桶不存在', bucket_name)
+        prefix = prefix or ''
+        base = prefix.rpartition('/')[0]
+        base_path = os.path.join(bucket_path, *base.split('/')) if base else bucket_path
+        if '..' in base.split('/') or not os.path.isdir(base_path):
+            return
+
+        entries = []
+        if recursive:
+            for dir_path, _, file_names in os.walk(base_path):
+                rel_dir = os.path.relpath(dir_path, bucket_path).replace(os.sep, '/')
+                for file_name in file_names:
+                    key = file_name if rel_dir == '.' else f"{rel_dir}/{file_name}"
+                    if key.startswith(prefix):
+                        entries.append((key, False))
+        else:
+            with os.scandir(base_path) as it:
+                for entry in it:
+                    key = f"{base}/{entry.name}" if base else entry.name
+                    if not key.startswith(prefix):
+                        continue
+                    if entry.is_dir():
+                        entries.append((key + '/', True))
+                    else:
+                        entries.append((key, False))
+
+        for key, is_dir in sorted(entries):
+            if start_after and key <= start_after:
+                continue
+            if is_dir:
+                yield Object(bucket_name, key)
+            else:
+                try:
+                    yield self.stat_object(bucket_name, key)
+                except S3Error:
+                    # 列举期间被删除
+                    continue
+
+    # ------------------------------------------------------------------ 删除
+
+    def remove_object(self, bucket_name: str, object_name: str, **kwargs):
+        path = self.local_path(bucket_name, object_name)
+        bucket_path = self._bucket_path(bucket_name)
+        # 与 S3 一致：删除不存在的对象不报错
+        for target, stop in ((path, bucket_path),
+                             (self._meta_path(bucket_name, object_name),
+                              os.path.join(self.root, _META_DIR, bucket_name))):
+            try:
+                os.unlink(target)
+            except FileNotFoundError:
+                continue
+            self._prune_dirs(target, stop)
+
+    def remove_objects(self, bucket_name: str, delete_object_list, **kwargs) -> Iterator[DeleteError]:
+        """批量删除，与 MinIO 一致返回删除失败项的迭代器"""
+        for delete_object in delete_object_list:
+            object_name = delete_object._name
+            try:
+                self.remove_object(bucket_name, object_name)
+            except (S3Error, OSError) as e:
+                yield DeleteError(getattr(e, 'code', 'InternalError'), str(e), object_name, None)
+
+    # ------------------------------------------------------------------ 预签名 URL
+
+    def _signature(self, bucket_name: str, object_name: str, expires_at: int) -> str:
+        message = f"{bucket_name}/{object_name}:{expires_at}".encode('utf-8')
+        return hmac.new(self._signing_key, message, hashlib.sha256).hexdigest()
+
+    def presigned_get_object(self, bucket_name: str, object_name: str,
+                             expires: timedelta = timedelta(days=7), **kwargs) -> str:
+        """生成带 HMAC 签名和过期时间的下载 URL，由 /storage/local 接口校验后直接发送文件"""
+        self._check_object_name(bucket_name, object_name)
+        seconds = expires.total_seconds() if isinstance(expires, timedelta) else expires
+        expires_at = int(time.time() + seconds)
+        query = urlencode({'expires': expires_at,
+                           'signature': self._signature(bucket_name, object_name, expires_at)})
+        return f"{self.url_base}/storage/local/{bucket_name}/{quote(object_name)}?{query}"
+
+    def verify_signature(self, bucket_name: str, object_name: str, expires_at, signature: str) -> bool:
+        """校验预签名 URL 的签名和有效期"""
+        try:
+            expires_at = int(expires_at)
+        except (TypeError, ValueError):
+            return False
+        if expires_at < time.time() or not signature:
+            return False
+        expected = self._signature(bucket_name, object_name, expires_at)
+        return hmac.compare_digest(expected, signature)
@@ -0,0 +1,241 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing
+from typing import Optional
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+# 有专用转换器的格式，worker 启动时预先初始化，转换时跳过格式探测
+FORMAT_CONVERTERS = {
+    'docx': 'DocxConverter',
+    'pptx': 'PptxConverter',
+    'xlsx': 'XlsxConverter',
+    'html': 'HtmlConverter',
+    'htm': 'HtmlConverter',
+}
+
+def _build_format_handlers():
+    """初始化各格式专用转换器，markitdown 版本不支持时返回空字典"""
+    handlers = {}
+    try:
+        from markitdown import converters
+        from markitdown import StreamInfo
+    except ImportError:
+        return handlers, None
+
+    for file_type, converter_name in FORMAT_CONVERTERS.items():
+        converter_cls = getattr(converters, converter_name, None)
+        if converter_cls is None:
+            continue
+        try:
+            handlers[file_type] = converter_cls()
+        except Exception as e:
+            # 缺少可选依赖时该格式回退到通用转换
+            logger.warning(f"初始化 {converter_name} 失败，{file_type} 将使用通用转换: {str(e)}")
+    return handlers, StreamInfo
+
+def _worker_main(conn):
+    """转换 worker 进程主循环：一次初始化，循环处理转换请求"""
+    import resource
+    import markitdown
+
+    md = markitdown.MarkItDown()
+    handlers, stream_info_cls = _build_format_handlers()
+    conn.send(('ready', None, 0))
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        file_path, file_type = request
+        try:
+            handler = handlers.get(file_type)
+            if handler is not None:
+                with open(file_path, 'rb') as f:
+                    result = handler.convert(f, stream_info_cls(extension=f'.{file_type}', local_path=file_path))
+            else:
+                result = md.convert(file_path)
+            response = ('ok', result.text_content)
+        except Exception as e:
+            response = ('error', f"{type(e).__name__}: {str(e)}")
+
+        # ru_maxrss 在 Linux 上以 KB 为单位
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        conn.send((response[0], response[1], max_rss))
+
+    conn.close()
+
+class _PoolWorker:
+    """单个常驻转换进程"""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks_done = 0
+        self.ready = False
+
+    def wait_ready(self, timeout: float) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            status, _, _ = self.conn.recv()
+            self.ready = status == 'ready'
+        return self.ready
+
+    def stop(self):
+        try:
+            if self.process.is_alive():
+                self.conn.send(None)
+                self.process.join(timeout=5)
+        except (OSError, BrokenPipeError):
+            pass
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        self.conn.close()
+
+class MarkItDownPoolService:
+    """MarkItDown 常驻进程池：预初始化转换器，单文档超时，按任务数/内存回收 worker"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._idle = None
+        self._workers = []
+        self._ctx = None
+        self.pool_size = 0
+        self.task_timeout = 300
+        self.max_tasks_per_worker = 200
+        self.max_worker_memory = 1024 * 1024 * 1024
+        self.startup_timeout = 60
+
+    @property
+    def available(self) -> bool:
+        """当前进程能否创建子进程（Celery prefork 子进程为守护进程，不能再派生子进程）"""
+        return not multiprocessing.current_process().daemon
+
+    def _load_config(self):
+        """从应用配置读取池参数"""
+        if not has_app_context():
+            return
+        config = current_app.config
+        self.pool_size = config.get('CONVERSION_MARKITDOWN_WORKERS') or 0
+        self.task_timeout = config.get('MARKITDOWN_TASK_TIMEOUT', self.task_timeout)
+        self.max_tasks_per_worker = config.get('MARKITDOWN_MAX_TASKS_PER_WORKER', self.max_tasks_per_worker)
+        self.max_worker_memory = config.get('MARKITDOWN_MAX_WORKER_MEMORY_MB', 1024) * 1024 * 1024
+
+    def _ensure_started(self):
+        """延迟启动进程池"""
+        if self._idle is not None:
+            return
+        with self._lock:
+            if self._idle is not None:
+                return
+            if not self.available:
+                raise RuntimeError("当前进程为守护进程，无法启动 MarkItDown 进程池")
+
+            self._load_config()
+            self.pool_size = self.pool_size or os.cpu_count() or 1
+            # 不使用 fork：调用线程持有的锁、数据库连接和 MinIO 客户端不能带入子进程；
+            # forkserver 预加载 markitdown，新 worker 无需重复导入
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                self._ctx = multiprocessing.get_context('forkserver')
+                self._ctx.set_forkserver_preload([__name__, 'markitdown'])
+            else:
+                self._ctx = multiprocessing.get_context('spawn')
+
+            idle = queue.Queue()
+            for _ in range(self.pool_size):
+                worker = self._spawn_worker()
+                idle.put(worker)
+            self._idle = idle
+            atexit.register(self.shutdown)
+            logger.info(f"MarkItDown 进程池已启动, worker数: {self.pool_size}, "
+                        f"单文档超时: {self.task_timeout}秒, 最大任务数: {self.max_tasks_per_worker}")
+
+    def _spawn_worker(self) -> _PoolWorker:
+        worker = _PoolWorker(self._ctx)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _retire_worker(self, worker: _PoolWorker, kill: bool = False):
+        """回收 worker 并补充新进程"""
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            if self._idle is not None:
+                self._idle.put(self._spawn_worker())
+
+    def warm_up(self):
+        """预先启动进程池并等待所有 worker 初始化完成"""
+        self._ensure_started()
+        for worker in list(self._workers):
+            worker.wait_ready(self.startup_timeout)
+
+    def convert(self, file_path: str, file_type: str = None, timeout: Optional[float] = None) -> str:
+        """
+        在常驻进程中将文档转换为 Markdown
+
+        Args:
+            file_path: 本地文件路径
+            file_type: 文件类型（扩展名，不含点）
+            timeout: 单文档超时时间（秒），默认使用配置
+
+        Returns:
+            str: Markdown 内容
+        """
+        self._ensure_started()
+        timeout = timeout or self.task_timeout
+        file_type = (file_type or os.path.splitext(file_path)[1].lstrip('.')).lower()
+
+        idle = self._idle
+        worker = idle.get()
+        try:
+            if not worker.wait_ready(self.startup_timeout) or not worker.process.is_alive():
+                raise RuntimeError("MarkItDown worker 启动失败")
+            worker.conn.send((file_path, file_type))
+            if not worker.conn.poll(timeout):
+                raise TimeoutError(f"MarkItDown 转换超时({timeout}秒): {os.path.basename(file_path)}")
+            status, payload, max_rss = worker.conn.recv()
+        except Exception:
+            # 超时或进程异常，直接终止并替换
+            self._retire_worker(worker, kill=True)
+            raise
+
+        worker.tasks_done += 1
+        if worker.tasks_done >= self.max_tasks_per_worker or max_rss > self.max_worker_memory:
+            logger.info(f"回收 MarkItDown worker: 已处理 {worker.tasks_done} 个文档, "
+                        f"峰值内存: {max_rss / 1024 / 1024:.1f}MB")
+            self._retire_worker(worker)
+        else:
+            idle.put(worker)
+
+        if status != 'ok':
+            raise Exception(f"Markitdown转换失败: {payload}")
+        return payload
+
+    def shutdown(self):
+        """关闭所有 worker 进程"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._idle = None
+        for worker in workers:
+            worker.stop()
+
+# 创建全局 MarkItDown 进程池实例
+markitdown_pool_service = MarkItDownPoolService()
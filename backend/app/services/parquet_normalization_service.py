@@ -0,0 +1,368 @@
+import io
+import os
+import shutil
+import tempfile
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+from flask import current_app
+
+from app.db import db
+from app.models.dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile
+from app.services.storage_service import storage_service
+from app.services.dataset_blob_service import dataset_blob_service
+
+logger = logging.getLogger(__name__)
+
+PARQUET_CONTENT_TYPE = 'application/vnd.apache.parquet'
+
+# 可规整化的扩展名及对应的读取方式（.json 按 JSON Lines 读取）
+NORMALIZABLE_FORMATS = {
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.jsonl': 'jsonl',
+    '.json': 'jsonl',
+    '.txt': 'text',
+}
+
+def detect_format(filename: str) -> Optional[str]:
+    """返回文件的规整化读取方式，不支持的文件返回 None"""
+    return NORMALIZABLE_FORMATS.get(os.path.splitext(filename or '')[1].lower())
+
+def _schema_fields(schema) -> List[Dict]:
+    return [
+        {'name': field.name, 'type': str(field.type), 'nullable': field.nullable}
+        for field in schema
+    ]
+
+class ParquetNormalizationService:
+    """
+    导入后的 Parquet 规整化：把 csv/tsv/jsonl/arrow/parquet/txt 文件流式转换为按固定行数切分行组的 Parquet，
+    记录字段结构与行数。转换结果作为内容块存储，并通过 parquet_blob_checksum 挂在原文件记录上，
+    预览、统计和采样可以直接按行组读取列式数据
+    """
+
+    @staticmethod
+    def _require_pyarrow():
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Parquet 规整化需要安装 pyarrow")
+
+    def _settings(self) -> Dict:
+        config = current_app.config
+        return {
+            'row_group_rows': config.get('PARQUET_ROW_GROUP_ROWS', 131072),
+            'block_size': config.get('PARQUET_READ_BLOCK_SIZE', 8 * 1024 * 1024),
+            'compression': config.get('PARQUET_COMPRESSION', 'zstd')
+        }
+
+    # ---------- 流式读取 ----------
+
+    def _iter_batches(self, path: str, fmt: str, block_size: int, csv_as_strings: bool = False) -> Iterator:
+        """按块读取源文件，产出 RecordBatch，内存占用与块大小成正比"""
+        import pyarrow as pa
+
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            yield from pq.ParquetFile(path).iter_batches()
+        elif fmt == 'arrow':
+            # Arrow IPC 有文件格式和流格式两种（HuggingFace datasets 缓存使用流格式）
+            with pa.memory_map(path) as source:
+                try:
+                    reader = pa.ipc.open_file(source)
+                except pa.ArrowInvalid:
+                    source.seek(0)
+                    yield from pa.ipc.open_stream(source)
+                else:
+                    for index in range(reader.num_record_batches):
+                        yield reader.get_batch(index)
+        elif fmt in ('csv', 'tsv'):
+            yield from self._iter_csv_batches(path, fmt, block_size, csv_as_strings)
+        elif fmt == 'jsonl':
+            yield from self._iter_json_batches(path, block_size)
+        elif fmt == 'text':
+            yield from self._iter_text_batches(path, block_size)
+        else:
+            raise ValueError(f"不支持的格式: {fmt}")
+
+    def iter_file_batches(self, path: str, fmt: str, csv_as_strings: bool = False) -> Iterator:
+        """按配置的块大小流式读取本地文件，产出 RecordBatch（列统计等单次扫描复用）"""
+        self._require_pyarrow()
+        yield from self._iter_batches(path, fmt, self._settings()['block_size'], csv_as_strings)
+
+    @staticmethod
+    def _iter_csv_batches(path: str, fmt: str, block_size: int, as_strings: bool) -> Iterator:
+        from pyarrow import csv
+        import pyarrow as pa
+
+        parse_options = csv.ParseOptions(delimiter='\t' if fmt == 'tsv' else ',')
+        convert_options = None
+        if as_strings:
+            # 列类型按首块推断，后续块类型冲突时整体退回字符串
+            header = csv.open_csv(path, read_options=csv.ReadOptions(block_size=block_size),
+                                  parse_options=parse_options)
+            convert_options = csv.ConvertOptions(column_types={name: pa.string() for name in header.schema.names})
+        reader = csv.open_csv(path, read_options=csv.ReadOptions(block_size=block_size),
+                              parse_options=parse_options, convert_options=convert_options)
+        yield from reader
+
+    @staticmethod
+    def _iter_json_batches(path: str, block_size: int) -> Iterator:
+        """
+        JSON Lines 按行对齐分块解析。字段结构取自第一块，之后新出现的字段被忽略
+        """
+        from pyarrow import json as pa_json
+
+        schema = None
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(block_size)
+                if not chunk:
+                    break
+                chunk += f.readline()
+                if not chunk.strip():
+                    continue
+                parse_options = pa_json.ParseOptions(
+                    explicit_schema=schema, unexpected_field_behavior='ignore'
+                ) if schema is not None else pa_json.ParseOptions()
+                table = pa_json.read_json(
+                    io.BytesIO(chunk),
+                    read_options=pa_json.ReadOptions(block_size=max(block_size, len(chunk))),
+                    parse_options=parse_options
+                )
+                if schema is None:
+                    schema = table.schema
+                yield from table.to_batches()
+
+    @staticmethod
+    def _iter_text_batches(path: str, block_size: int) -> Iterator:
+        """纯文本每行作为一条记录，列名为 text"""
+        import pyarrow as pa
+
+        with open(path, 'rb') as f:
+            while True:
+                lines = f.readlines(block_size)
+                if not lines:
+                    break
+                texts = [line.rstrip(b'\r\n').decode('utf-8', errors='replace') for line in lines]
+                yield pa.record_batch([pa.array(texts, type=pa.string())], names=['text'])
+
+    # ---------- 写入 ----------
+
+    @staticmethod
+    def _write_parquet(batches: Iterator, out_path: str, row_group_rows: int, compression: str) -> Dict:
+        """按固定行数切分行组写入 Parquet，只缓存不足一个行组的数据"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        pending, pending_rows = [], 0
+        num_rows, num_row_groups = 0, 0
+        try:
+            for batch in batches:
+                table = pa.Table.from_batches([batch])
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, table.schema, compression=compression)
+                elif not table.schema.equals(writer.schema):
+                    table = table.cast(writer.schema)
+                if table.num_rows == 0:
+                    continue
+                pending.append(table)
+                pending_rows += table.num_rows
+                while pending_rows >= row_group_rows:
+                    combined = pa.concat_tables(pending)
+                    writer.write_table(combined.slice(0, row_group_rows), row_group_size=row_group_rows)
+                    num_rows += row_group_rows
+                    num_row_groups += 1
+                    rest = combined.slice(row_group_rows)
+                    pending, pending_rows = ([rest] if rest.num_rows else []), rest.num_rows
+            if writer is None:
+                raise ValueError("文件中没有可转换的数据")
+            if pending_rows:
+                writer.write_table(pa.concat_tables(pending), row_group_size=row_group_rows)
+                num_rows += pending_rows
+                num_row_groups += 1
+            schema = writer.schema
+        finally:
+            if writer is not None:
+                writer.close()
+
+        return {
+            'num_rows': num_rows,
+            'num_row_groups': num_row_groups,
+            'schema': _schema_fields(schema)
+        }
+
+    @staticmethod
+    def _reusable_parquet(path: str, row_group_rows: int) -> Optional[Dict]:
+        """源文件已是行组不超过目标大小的 Parquet 时直接复用，不再重写"""
+        import pyarrow.parquet as pq
+
+        metadata = pq.ParquetFile(path).metadata
+        if metadata.num_row_groups == 0:
+            return None
+        if any(metadata.row_group(i).num_rows > row_group_rows for i in range(metadata.num_row_groups)):
+            return None
+        return {
+            'num_rows': metadata.num_rows,
+            'num_row_groups': metadata.num_row_groups,
+            'schema': _schema_fields(metadata.schema.to_arrow_schema())
+        }
+
+    def convert_file(self, path: str, fmt: str, out_path: str, settings: Dict = None) -> Dict:
+        """
+        把本地文件转换为 Parquet
+
+        Returns:
+            Dict: num_rows, num_row_groups, schema
+        """
+        import pyarrow as pa
+
+        settings = settings or self._settings()
+        try:
+            return self._write_parquet(
+                self._iter_batches(path, fmt, settings['block_size']),
+                out_path, settings['row_group_rows'], settings['compression']
+            )
+        except pa.ArrowInvalid:
+            if fmt not in ('csv', 'tsv'):
+                raise
+            logger.info(f"CSV 列类型不一致，按字符串重新转换: {path}")
+            return self._write_parquet(
+                self._iter_batches(path, fmt, settings['block_size'], csv_as_strings=True),
+                out_path, settings['row_group_rows'], settings['compression']
+            )
+
+    # ---------- 数据集文件 ----------
+
+    def normalize_file(self, file: EnhancedDatasetFile, settings: Dict = None) -> Dict:
+        """
+        规整化单个数据集文件（在调用方事务内登记 blob 引用，不提交）
+
+        Returns:
+            Dict: 写入 file_metadata['parquet'] 的信息
+        """
+        fmt = detect_format(file.filename)
+        if not fmt:
+            raise ValueError(f"不支持规整化的文件: {file.filename}")
+        settings = settings or self._settings()
+
+        work_dir = tempfile.mkdtemp(prefix='parquet_normalize_')
+        try:
+            source_path = os.path.join(work_dir, 'source')
+            storage_service.download_file(file.minio_bucket, file.minio_object_name, source_path)
+            info = self._reusable_parquet(source_path, settings['row_group_rows']) if fmt == 'parquet' else None
+            if info is not None:
+                # 内容相同，store_file 只会给原 blob 增加一次引用
+                out_path = source_path
+            else:
+                out_path = os.path.join(work_dir, 'normalized.parquet')
+                info = self.convert_file(source_path, fmt, out_path, settings)
+            blob = dataset_blob_service.store_file(out_path, PARQUET_CONTENT_TYPE)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        previous = file.parquet_blob_checksum
+        file.parquet_blob_checksum = blob.checksum
+        if previous:
+            dataset_blob_service.release_many([previous])
+
+        parquet_info = {
+            'minio_bucket': blob.bucket,
+            'minio_object_name': blob.object_name,
+            'size': blob.size,
+            'source_format': fmt,
+            'row_group_rows': settings['row_group_rows'],
+            'normalized_at': datetime.utcnow().isoformat(),
+            **info
+        }
+        metadata = dict(file.file_metadata or {})
+        metadata['parquet'] = parquet_info
+        file.file_metadata = metadata
+        return parquet_info
+
+    def normalize_version(self, version_id: str, force: bool = False,
+                          on_progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        规整化版本内所有可转换的文件，并把各表的字段结构与行数写入 version.data_schema
+
+        Args:
+            version_id: 版本ID
+            force: 是否重新转换已有 Parquet 副本的文件
+            on_progress: 进度回调 (已处理数, 总数)
+
+        Returns:
+            Dict: converted, skipped, failed, total_rows
+        """
+        self._require_pyarrow()
+        if not EnhancedDatasetVersion.query.get(version_id):
+            raise ValueError("版本不存在")
+        settings = self._settings()
+
+        candidates = [
+            f for f in EnhancedDatasetFile.query.filter_by(version_id=version_id).order_by(
+                EnhancedDatasetFile.file_path
+            ).all()
+            if detect_format(f.filename)
+        ]
+        converted, skipped, failed = 0, 0, {}
+        for index, file in enumerate(candidates):
+            file_path = file.file_path
+            if file.parquet_blob_checksum and not force:
+                skipped += 1
+            else:
+                try:
+                    self.normalize_file(file, settings)
+                    # 每个文件单独提交，任务中断后已完成的文件无需重做
+                    db.session.commit()
+                    converted += 1
+                except Exception as e:
+                    db.session.rollback()
+                    failed[file_path] = str(e)
+                    logger.warning(f"Parquet 规整化失败: {file_path}, 错误: {str(e)}")
+            if on_progress:
+                on_progress(index + 1, len(candidates))
+
+        version = EnhancedDatasetVersion.query.get(version_id)
+        version.data_schema = self._build_version_schema(version_id, failed)
+        version.stats = {**(version.stats or {}), 'total_rows': version.data_schema['total_rows']}
+        db.session.commit()
+
+        logger.info(f"版本 Parquet 规整化完成: {version_id}, 转换 {converted}, 跳过 {skipped}, 失败 {len(failed)}")
+        return {
+            'version_id': version_id,
+            'converted': converted,
+            'skipped': skipped,
+            'failed': failed,
+            'total_rows': version.data_schema['total_rows']
+        }
+
+    @staticmethod
+    def _build_version_schema(version_id: str, failed: Dict[str, str]) -> Dict:
+        tables = {}
+        for file in EnhancedDatasetFile.query.filter(
+            EnhancedDatasetFile.version_id == version_id,
+            EnhancedDatasetFile.parquet_blob_checksum.isnot(None)
+        ).order_by(EnhancedDatasetFile.file_path).all():
+            parquet = (file.file_metadata or {}).get('parquet') or {}
+            tables[file.file_path] = {
+                'file_id': file.id,
+                'fields': parquet.get('schema', []),
+                'num_rows': parquet.get('num_rows', 0),
+                'num_row_groups': parquet.get('num_row_groups', 0)
+            }
+        return {
+            'tables': tables,
+            'total_rows': sum(table['num_rows'] for table in tables.values()),
+            'failed': failed,
+            'normalized_at': datetime.utcnow().isoformat()
+        }
+
+# 创建全局 Parquet 规整化服务实例
+parquet_normalization_service = ParquetNormalizationService()
@@ -1,49 +1,369 @@
+import io
 import os
+import time
 import uuid
+import codecs
+import socket
+import mimetypes
+import threading
+import certifi
+import urllib3
+from urllib3.exceptions import EmptyPoolError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from io import BytesIO
+from urllib.parse import quote
 from minio import Minio
 from minio.error import S3Error
-from flask import current_app, has_app_context
-from typing import BinaryIO, Tuple, Optional
+from minio.commonconfig import CopySource
+from minio.deleteobjects import DeleteObject
+from minio.datatypes import Part
+from flask import Response, current_app, has_app_context, has_request_context, redirect, request, send_file
+from werkzeug.http import http_date
+from typing import BinaryIO, Tuple, Optional, Dict, Iterator
+from app.services.local_storage_client import LocalStorageClient
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
 
+class _HashingReader:
+    """包装文件流，读取时同步计算 MD5/SHA-256 与字节数"""
+    
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self._md5 = hashlib.md5()
+        self._sha256 = hashlib.sha256()
+        self.bytes_read = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        if data:
+            self._md5.update(data)
+            self._sha256.update(data)
+            self.bytes_read += len(data)
+        return data
+    
+    def checksums(self) -> Dict[str, str]:
+        return {
+            'md5': self._md5.hexdigest(),
+            'sha256': self._sha256.hexdigest()
+        }
+
+class _ObjectStream(io.RawIOBase):
+    """MinIO 对象响应的只读原始流，关闭时释放底层连接"""
+    
+    def __init__(self, response):
+        self._response = response
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        data = self._response.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        return size
+    
+    def close(self):
+        if not self.closed:
+            try:
+                self._response.close()
+                self._response.release_conn()
+            finally:
+                super().close()
+
+class _RangedObject(io.RawIOBase):
+    """可随机访问的 MinIO 对象只读流，每次 read 发起一次范围请求，供 Parquet 等按偏移读取的格式使用"""
+    
+    def __init__(self, service, bucket_name: str, object_name: str, size: int):
+        self._service = service
+        self._bucket_name = bucket_name
+        self._object_name = object_name
+        self._size = size
+        self._position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(0, min(offset, self._size))
+        return self._position
+    
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self._size - self._position)
+        if length <= 0:
+            return 0
+        response = self._service._get_client().get_object(
+            self._bucket_name, self._object_name, offset=self._position, length=length
+        )
+        data = self._service._read_and_release(response)
+        size = len(data)
+        buffer[:size] = data
+        self._position += size
+        return size
+
+def _content_disposition(filename: str) -> str:
+    """构建 attachment 的 Content-Disposition，非 ASCII 文件名使用 RFC 5987 编码"""
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(filename.encode('utf-8'))}"
+
+# 自动探测时依次尝试的文本编码
+_TEXT_ENCODINGS = ('utf-8', 'gbk')
+
+def _detect_text_encoding(sample: bytes) -> str:
+    """根据首块数据探测编码：依次尝试 UTF-8、GBK，均失败时返回 UTF-8"""
+    for candidate in _TEXT_ENCODINGS:
+        try:
+            # final=False 允许首块末尾出现被截断的多字节字符
+            codecs.getincrementaldecoder(candidate)().decode(sample, final=False)
+            return candidate
+        except UnicodeDecodeError:
+            continue
+    return 'utf-8'
+
+class _PoolWaitStats:
+    """MinIO 连接池取连接的等待时间统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.acquired = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.acquired += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            total = self.acquired + self.timeouts
+            return {
+                'acquired': self.acquired,
+                'timeouts': self.timeouts,
+                'total_wait_seconds': round(self.total_wait, 6),
+                'avg_wait_seconds': round(self.total_wait / total, 6) if total else 0.0,
+                'max_wait_seconds': round(self.max_wait, 6),
+            }
+
+_pool_wait_stats = _PoolWaitStats()
+
+# 连接池耗尽时等待空闲连接的上限（秒），由 MINIO_POOL_TIMEOUT 配置
+_pool_wait_timeout = 60
+
+class _TimedPoolMixin:
+    """记录取连接的等待时间；未指定 pool_timeout 时使用配置的等待上限，避免无限阻塞"""
+
+    def _get_conn(self, timeout=None):
+        if timeout is None:
+            timeout = _pool_wait_timeout
+        start = time.monotonic()
+        try:
+            conn = super()._get_conn(timeout=timeout)
+        except EmptyPoolError:
+            _pool_wait_stats.record(time.monotonic() - start, timed_out=True)
+            raise
+        _pool_wait_stats.record(time.monotonic() - start)
+        return conn
+
+class _TimedHTTPConnectionPool(_TimedPoolMixin, urllib3.HTTPConnectionPool):
+    pass
+
+class _TimedHTTPSConnectionPool(_TimedPoolMixin, urllib3.HTTPSConnectionPool):
+    pass
+
+# 进程内共享的 MinIO 客户端，fork 后按 pid 重建，避免父子进程共用 socket
+_shared_client = None
+_shared_client_pid = None
+_shared_http = None
+_shared_client_lock = threading.Lock()
+
+def _build_http_client(config) -> urllib3.PoolManager:
+    """按配置构建 MinIO 使用的 urllib3 连接池"""
+    socket_options = list(urllib3.connection.HTTPConnection.default_socket_options)
+    if config.get('MINIO_TCP_KEEPALIVE', True):
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+
+    http = urllib3.PoolManager(
+        num_pools=config.get('MINIO_POOL_NUM_POOLS', 10),
+        maxsize=config.get('MINIO_POOL_MAXSIZE', 32),
+        # 连接耗尽时排队等待而不是临时新建后丢弃的连接
+        block=True,
+        timeout=urllib3.util.Timeout(
+            connect=config.get('MINIO_CONNECT_TIMEOUT', 10),
+            read=config.get('MINIO_READ_TIMEOUT', 300)
+        ),
+        retries=urllib3.Retry(
+            total=config.get('MINIO_MAX_RETRIES', 5),
+            backoff_factor=config.get('MINIO_RETRY_BACKOFF', 0.2),
+            status_forcelist=[500, 502, 503, 504]
+        ),
+        socket_options=socket_options,
+        cert_reqs='CERT_REQUIRED',
+        ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where()
+    )
+    http.pool_classes_by_scheme = {
+        'http': _TimedHTTPConnectionPool,
+        'https': _TimedHTTPSConnectionPool,
+    }
+    return http
+
+def _build_local_client(config) -> LocalStorageClient:
+    """按配置构建本地文件系统存储后端"""
+    url_base = config.get('LOCAL_STORAGE_URL_BASE') or config.get('API_PREFIX') or '/api/v1'
+    return LocalStorageClient(
+        root=config.get('LOCAL_STORAGE_ROOT') or './storage',
+        signing_key=config.get('LOCAL_STORAGE_SIGNING_KEY') or config.get('SECRET_KEY'),
+        url_base=url_base
+    )
+
+def _get_shared_client(config):
+    """获取进程内共享的存储客户端（MinIO 或本地文件系统，由 STORAGE_BACKEND 决定）"""
+    global _shared_client, _shared_client_pid, _shared_http, _pool_wait_timeout
+    pid = os.getpid()
+    if _shared_client is not None and _shared_client_pid == pid:
+        return _shared_client
+    with _shared_client_lock:
+        if _shared_client is None or _shared_client_pid != pid:
+            if config.get('STORAGE_BACKEND', 'minio') == 'local':
+                _shared_client = _build_local_client(config)
+                _shared_client_pid = pid
+                logger.info(f"使用本地文件系统存储后端: {_shared_client.root}")
+                return _shared_client
+
+            _pool_wait_timeout = config.get('MINIO_POOL_TIMEOUT', _pool_wait_timeout)
+            _shared_http = _build_http_client(config)
+            _pool_wait_stats.reset()
+            _shared_client = Minio(
+                endpoint=config['MINIO_ENDPOINT'],
+                access_key=config['MINIO_ACCESS_KEY'],
+                secret_key=config['MINIO_SECRET_KEY'],
+                secure=config['MINIO_SECURE'],
+                http_client=_shared_http
+            )
+            _shared_client_pid = pid
+            logger.info(f"MinIO 客户端已创建, 连接池大小: {config.get('MINIO_POOL_MAXSIZE', 32)}")
+        return _shared_client
+
 class StorageService:
-    """MinIO 存储服务"""
+    """对象存储服务（MinIO 或本地文件系统后端）"""
     
     def __init__(self):
         self.client = None
+        self._client_pid = None
+        self._presign_client = None
+        # 已确认存在的 bucket，避免每次上传都请求 bucket_exists
+        self._known_buckets = set()
+        # 对象 -> bucket 的 LRU 索引，避免读取时逐个 bucket 探测
+        self._bucket_index = OrderedDict()
+        self._bucket_index_lock = threading.Lock()
+        self._bucket_index_size = 10000
     
     def _get_client(self):
-        """获取 MinIO 客户端（延迟初始化）"""
-        if self.client is None:
+        """获取 MinIO 客户端（延迟初始化，进程内共享连接池）"""
+        if self.client is None or self._client_pid != os.getpid():
             self._initialize_client()
         return self.client
     
     def _initialize_client(self):
-        """初始化 MinIO 客户端"""
+        """初始化存储客户端"""
         try:
             if not has_app_context():
                 raise Exception("需要在 Flask 应用上下文中初始化")
                 
-            self.client = Minio(
-                endpoint=current_app.config['MINIO_ENDPOINT'],
-                access_key=current_app.config['MINIO_ACCESS_KEY'],
-                secret_key=current_app.config['MINIO_SECRET_KEY'],
-                secure=current_app.config['MINIO_SECURE']
-            )
+            self.client = _get_shared_client(current_app.config)
+            self._client_pid = os.getpid()
+            
+            self._bucket_index_size = current_app.config.get('MINIO_BUCKET_INDEX_SIZE', self._bucket_index_size)
             
             # 确保存储桶存在
             bucket_name = current_app.config['MINIO_BUCKET_NAME']
             if not self.client.bucket_exists(bucket_name):
                 self.client.make_bucket(bucket_name)
                 logger.info(f"创建存储桶: {bucket_name}")
+            self._known_buckets.add(bucket_name)
                 
         except Exception as e:
             logger.error(f"初始化 MinIO 客户端失败: {str(e)}")
             raise
     
+    @property
+    def is_local(self) -> bool:
+        """当前是否使用本地文件系统存储后端"""
+        return isinstance(self._get_client(), LocalStorageClient)
+    
+    def get_local_path(self, bucket_name: str, object_name: str) -> Optional[str]:
+        """
+        本地存储后端下对象在磁盘上的路径，可直接交给 send_file 零拷贝发送
+        
+        Returns:
+            Optional[str]: 文件路径；MinIO 后端或对象不存在时返回 None
+        """
+        client = self._get_client()
+        if not isinstance(client, LocalStorageClient):
+            return None
+        try:
+            path = client.local_path(bucket_name, object_name)
+        except S3Error:
+            return None
+        return path if os.path.isfile(path) else None
+    
+    def verify_local_url(self, bucket_name: str, object_name: str, expires_at, signature: str) -> bool:
+        """校验本地存储后端生成的预签名 URL"""
+        client = self._get_client()
+        if not isinstance(client, LocalStorageClient):
+            return False
+        return client.verify_signature(bucket_name, object_name, expires_at, signature)
+    
+    def get_pool_stats(self) -> Dict:
+        """获取 MinIO 连接池状态及取连接等待时间统计"""
+        stats = {
+            'backend': 'local' if isinstance(_shared_client, LocalStorageClient) else 'minio',
+            'wait': _pool_wait_stats.snapshot(),
+            'pools': []
+        }
+        http = _shared_http
+        if http is None or _shared_client_pid != os.getpid():
+            return stats
+        stats['maxsize'] = http.connection_pool_kw.get('maxsize')
+        stats['pool_wait_timeout'] = _pool_wait_timeout
+        for key in http.pools.keys():
+            pool = http.pools.get(key)
+            if pool is None:
+                continue
+            stats['pools'].append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'connections_created': pool.num_connections,
+                'requests': pool.num_requests,
+                # 队列中为可取用的槽位（含尚未建立的连接），其余为正在使用的连接
+                'in_use': pool.pool.maxsize - pool.pool.qsize() if pool.pool is not None else 0
+            })
+        return stats
+    
     def get_file_content(self, bucket_name: str, object_name: str) -> str:
         """
         从 MinIO 获取文件内容并返回字符串
@@ -56,20 +376,15 @@ class StorageService:
             str: 文件内容字符串
         """
         try:
-            # 获取文件字节数据
-            file_bytes = self.get_file(object_name, bucket_name)
-            
-            # 尝试解码为字符串
-            try:
-                content = file_bytes.decode('utf-8')
-            except UnicodeDecodeError:
-                # 如果UTF-8解码失败，尝试其他编码
+            # 流式增量解码，避免同时持有完整的字节与字符串副本；
+            # 首块探测只看开头，后续内容解码失败时换下一个编码重新读取，全部失败才替换非法字节
+            for encoding in _TEXT_ENCODINGS:
                 try:
-                    content = file_bytes.decode('gbk')
+                    return ''.join(self.iter_text(bucket_name, object_name, encoding=encoding, errors='strict'))
                 except UnicodeDecodeError:
-                    content = file_bytes.decode('utf-8', errors='ignore')
-            
-            return content
+                    continue
+            logger.warning(f"文件不是 {'/'.join(_TEXT_ENCODINGS)} 编码，非法字节将被替换: {bucket_name}/{object_name}")
+            return ''.join(self.iter_text(bucket_name, object_name, encoding=_TEXT_ENCODINGS[0], errors='replace'))
             
         except Exception as e:
             logger.error(f"获取文件内容失败: {str(e)}")
@@ -89,9 +404,7 @@ class StorageService:
             client = self._get_client()
             
             # 确保bucket存在
-            if not self._bucket_exists(bucket):
-                client.make_bucket(bucket)
-                logger.info(f"创建bucket: {bucket}")
+            self._ensure_bucket(bucket)
             
             # 上传内容
             client.put_object(
@@ -102,12 +415,95 @@ class StorageService:
                 content_type=content_type
             )
             
+            self.remember_object_bucket(object_name, bucket)
             logger.info(f"内容上传成功: {object_name}, 大小: {len(content)} bytes")
             
         except Exception as e:
             logger.error(f"上传内容失败: {str(e)}")
             raise
     
+    def upload_stream(self, bucket: str, object_name: str, stream: BinaryIO,
+                      content_type: str = None, length: int = -1) -> None:
+        """
+        流式上传文件对象到 MinIO，长度未知时按 MINIO_UPLOAD_PART_SIZE 分片上传
+        
+        Args:
+            bucket: 存储桶名
+            object_name: 对象名
+            stream: 可读文件流（从当前位置读到结尾）
+            content_type: 内容类型
+            length: 内容长度，-1 表示未知
+        """
+        try:
+            client = self._get_client()
+            self._ensure_bucket(bucket)
+            client.put_object(
+                bucket,
+                object_name,
+                stream,
+                length,
+                content_type=content_type or 'application/octet-stream',
+                part_size=current_app.config.get('MINIO_UPLOAD_PART_SIZE', 16 * 1024 * 1024)
+            )
+            self.remember_object_bucket(object_name, bucket)
+            logger.info(f"文件流上传成功: {object_name}, bucket: {bucket}")
+        except Exception as e:
+            logger.error(f"上传文件流失败: {str(e)}")
+            raise
+    
+    def create_multipart_upload(self, bucket: str, object_name: str, content_type: str = None) -> str:
+        """
+        创建分片上传，返回 upload_id。分片由调用方逐个上传，可并行、可断点续传
+        
+        Args:
+            bucket: 存储桶名
+            object_name: 对象名
+            content_type: 内容类型
+        """
+        self._ensure_bucket(bucket)
+        headers = {'Content-Type': content_type or 'application/octet-stream'}
+        return self._get_client()._create_multipart_upload(bucket, object_name, headers)
+    
+    def upload_part(self, bucket: str, object_name: str, upload_id: str,
+                    part_number: int, data: bytes, md5_base64: str = None) -> str:
+        """
+        上传单个分片，返回分片 etag。传入 md5_base64 时由 MinIO 再次校验内容
+        
+        Args:
+            bucket: 存储桶名
+            object_name: 对象名
+            upload_id: 分片上传ID
+            part_number: 分片序号（1-10000）
+            data: 分片内容
+            md5_base64: 分片内容 MD5（base64），作为 Content-MD5 头发送
+        """
+        headers = {'Content-MD5': md5_base64} if md5_base64 else {}
+        return self._get_client()._upload_part(bucket, object_name, data, headers,
+                                               upload_id, part_number)
+    
+    def complete_multipart_upload(self, bucket: str, object_name: str, upload_id: str,
+                                  parts: list) -> None:
+        """
+        合并分片完成上传
+        
+        Args:
+            parts: [(part_number, etag)]，按序号升序
+        """
+        self._get_client()._complete_multipart_upload(
+            bucket, object_name, upload_id,
+            [Part(part_number, etag) for part_number, etag in parts]
+        )
+        self.remember_object_bucket(object_name, bucket)
+        logger.info(f"分片上传完成: {object_name}, 分片数: {len(parts)}, bucket: {bucket}")
+    
+    def abort_multipart_upload(self, bucket: str, object_name: str, upload_id: str) -> None:
+        """取消分片上传并释放已上传的分片，上传不存在时忽略"""
+        try:
+            self._get_client()._abort_multipart_upload(bucket, object_name, upload_id)
+        except S3Error as e:
+            if e.code != 'NoSuchUpload':
+                raise
+    
     def upload_file(self, file_data: BinaryIO, original_filename: str, 
                    content_type: str = None, library_id: str = None) -> Tuple[str, int]:
         """
@@ -122,6 +518,27 @@ class StorageService:
         Returns:
             Tuple[str, int]: (object_name, file_size)
         """
+        object_name, file_size, _ = self.upload_file_with_checksums(
+            file_data, original_filename, content_type=content_type, library_id=library_id
+        )
+        return object_name, file_size
+    
+    def upload_file_with_checksums(self, file_data: BinaryIO, original_filename: str,
+                                   content_type: str = None, library_id: str = None,
+                                   part_size: int = None) -> Tuple[str, int, Dict[str, str]]:
+        """
+        以分片流式上传文件到 MinIO，上传的同时计算 MD5/SHA-256，不在内存中缓存整个文件
+        
+        Args:
+            file_data: 文件数据流
+            original_filename: 原始文件名
+            content_type: 文件类型
+            library_id: 文件库ID
+            part_size: 分片大小（字节），默认使用 MINIO_UPLOAD_PART_SIZE
+            
+        Returns:
+            Tuple[str, int, Dict[str, str]]: (object_name, file_size, {'md5': ..., 'sha256': ...})
+        """
         try:
             client = self._get_client()
             
@@ -129,30 +546,32 @@ class StorageService:
             file_extension = os.path.splitext(original_filename)[1]
             object_name = f"{library_id}/{uuid.uuid4().hex}{file_extension}" if library_id else f"temp/{uuid.uuid4().hex}{file_extension}"
             
-            # 读取文件数据和大小
-            file_data.seek(0)
-            file_content = file_data.read()
-            file_size = len(file_content)
+            # 从头读取文件流
+            if hasattr(file_data, 'seekable') and file_data.seekable():
+                file_data.seek(0)
+            reader = _HashingReader(file_data)
+            part_size = part_size or current_app.config.get('MINIO_UPLOAD_PART_SIZE', 16 * 1024 * 1024)
             
             # 使用配置的 bucket，确保与其他方法一致
             bucket_name = current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data')
             
             # 确保bucket存在
-            if not self._bucket_exists(bucket_name):
-                client.make_bucket(bucket_name)
-                logger.info(f"创建bucket: {bucket_name}")
+            self._ensure_bucket(bucket_name)
             
-            # 上传到 MinIO
+            # 长度未知(-1)时 MinIO 按 part_size 分片上传
             client.put_object(
                 bucket_name,
                 object_name,
-                BytesIO(file_content),
-                file_size,
-                content_type=content_type
+                reader,
+                -1,
+                content_type=content_type,
+                part_size=part_size
             )
             
+            file_size = reader.bytes_read
+            self.remember_object_bucket(object_name, bucket_name)
             logger.info(f"文件上传成功: {object_name}, 大小: {file_size} bytes, bucket: {bucket_name}")
-            return object_name, file_size
+            return object_name, file_size, reader.checksums()
             
         except S3Error as e:
             logger.error(f"MinIO 上传文件失败: {str(e)}")
@@ -163,13 +582,81 @@ class StorageService:
     
     def _bucket_exists(self, bucket_name: str) -> bool:
         """检查bucket是否存在"""
+        if bucket_name in self._known_buckets:
+            return True
         try:
             client = self._get_client()
-            return client.bucket_exists(bucket_name)
+            exists = client.bucket_exists(bucket_name)
+            if exists:
+                self._known_buckets.add(bucket_name)
+            return exists
         except Exception as e:
             logger.error(f"检查bucket是否存在时出错: {str(e)}")
             return False
     
+    def _ensure_bucket(self, bucket_name: str):
+        """确保bucket存在，结果缓存在进程内"""
+        if self._bucket_exists(bucket_name):
+            return
+        client = self._get_client()
+        try:
+            client.make_bucket(bucket_name)
+            logger.info(f"创建bucket: {bucket_name}")
+        except S3Error as e:
+            # 并发创建时可能已被其他进程创建
+            if e.code not in ('BucketAlreadyOwnedByYou', 'BucketAlreadyExists'):
+                raise
+        self._known_buckets.add(bucket_name)
+    
+    def _candidate_buckets(self) -> list:
+        """未指定bucket时按优先级尝试的bucket列表"""
+        return [
+            current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data'),
+            current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets'),
+            current_app.config.get('MINIO_BUCKET_NAME', 'pindata-bucket')
+        ]
+    
+    def remember_object_bucket(self, object_name: str, bucket_name: str):
+        """记录对象所在的bucket"""
+        with self._bucket_index_lock:
+            self._bucket_index[object_name] = bucket_name
+            self._bucket_index.move_to_end(object_name)
+            while len(self._bucket_index) > self._bucket_index_size:
+                self._bucket_index.popitem(last=False)
+    
+    def forget_object_bucket(self, object_name: str):
+        """移除对象的bucket索引（对象被删除或索引失效时）"""
+        with self._bucket_index_lock:
+            self._bucket_index.pop(object_name, None)
+    
+    def _lookup_object_bucket(self, object_name: str) -> Optional[str]:
+        with self._bucket_index_lock:
+            bucket_name = self._bucket_index.get(object_name)
+            if bucket_name is not None:
+                self._bucket_index.move_to_end(object_name)
+            return bucket_name
+    
+    def resolve_bucket(self, object_name: str, candidate_buckets: list = None) -> Optional[str]:
+        """
+        确定对象所在的bucket：命中索引时不发请求，否则按优先级 stat 探测并写入索引
+        
+        Args:
+            object_name: 对象名
+            candidate_buckets: 候选bucket列表，默认使用配置的bucket顺序
+            
+        Returns:
+            Optional[str]: bucket名，对象不存在时返回 None
+        """
+        bucket_name = self._lookup_object_bucket(object_name)
+        if bucket_name:
+            return bucket_name
+        
+        for bucket in candidate_buckets or self._candidate_buckets():
+            if self.file_exists_in_bucket(bucket, object_name):
+                self.remember_object_bucket(object_name, bucket)
+                return bucket
+        return None
+    
     def get_file(self, object_name: str, bucket_name: str = None) -> bytes:
         """
         从 MinIO 获取文件
@@ -187,14 +674,22 @@ class StorageService:
             # 如果指定了bucket，直接使用
             if bucket_name:
                 response = client.get_object(bucket_name, object_name)
-                return response.read()
+                return self._read_and_release(response)
+            
+            # 索引命中时只需一次请求
+            indexed_bucket = self._lookup_object_bucket(object_name)
+            if indexed_bucket:
+                try:
+                    response = client.get_object(indexed_bucket, object_name)
+                    return self._read_and_release(response)
+                except S3Error as e:
+                    if e.code != 'NoSuchKey':
+                        raise
+                    # 索引已失效，重新探测
+                    self.forget_object_bucket(object_name)
             
             # 否则按优先级尝试不同的bucket
-            possible_buckets = [
-                current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data'),
-                current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets'),
-                current_app.config.get('MINIO_BUCKET_NAME', 'pindata-bucket')
-            ]
+            possible_buckets = self._candidate_buckets()
             
             last_error = None
             for bucket in possible_buckets:
@@ -202,7 +697,8 @@ class StorageService:
                     logger.info(f"尝试从bucket '{bucket}' 获取文件: {object_name}")
                     response = client.get_object(bucket, object_name)
                     logger.info(f"文件获取成功，来源bucket: {bucket}")
-                    return response.read()
+                    self.remember_object_bucket(object_name, bucket)
+                    return self._read_and_release(response)
                 except S3Error as e:
                     last_error = e
                     logger.warning(f"从bucket '{bucket}' 获取文件失败: {str(e)}")
@@ -251,6 +747,178 @@ class StorageService:
             logger.error(f"下载文件失败: {str(e)}")
             raise
     
+    @staticmethod
+    def _read_and_release(response) -> bytes:
+        """读取完整响应并归还连接"""
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+    
+    def open_stream(self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0,
+                    buffer_size: int = 1024 * 1024) -> BinaryIO:
+        """
+        以只读文件对象方式打开 MinIO 对象，支持范围读取，关闭时释放连接
+        
+        Args:
+            bucket_name: 存储桶名
+            object_name: 对象名
+            offset: 起始字节偏移
+            length: 读取长度，0 表示读到对象末尾
+            buffer_size: 读缓冲大小
+            
+        Returns:
+            BinaryIO: 可用于 with 语句的缓冲读取流
+        """
+        try:
+            client = self._get_client()
+            response = client.get_object(bucket_name, object_name, offset=offset, length=length)
+            return io.BufferedReader(_ObjectStream(response), buffer_size=buffer_size)
+        except S3Error as e:
+            logger.error(f"MinIO 打开对象流失败: {str(e)}")
+            raise Exception(f"文件获取失败: {str(e)}")
+    
+    def open_random_access(self, bucket_name: str, object_name: str, size: int = None) -> BinaryIO:
+        """
+        以可 seek 的只读文件对象方式打开 MinIO 对象，每次读取只请求所需的字节范围
+        
+        Args:
+            bucket_name: 存储桶名
+            object_name: 对象名
+            size: 对象大小，未提供时查询对象元数据
+            
+        Returns:
+            BinaryIO: 可 seek 的原始读取流
+        """
+        if size is None:
+            size = self._get_client().stat_object(bucket_name, object_name).size
+        return _RangedObject(self, bucket_name, object_name, size)
+    
+    def iter_chunks(self, bucket_name: str, object_name: str, chunk_size: int = 1024 * 1024,
+                    offset: int = 0, length: int = 0) -> Iterator[bytes]:
+        """
+        按块迭代 MinIO 对象内容
+        
+        Args:
+            bucket_name: 存储桶名
+            object_name: 对象名
+            chunk_size: 块大小
+            offset: 起始字节偏移
+            length: 读取长度，0 表示读到对象末尾
+        """
+        with self.open_stream(bucket_name, object_name, offset=offset, length=length) as stream:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    
+    def iter_text(self, bucket_name: str, object_name: str, encoding: str = None,
+                  chunk_size: int = 1024 * 1024, offset: int = 0, length: int = 0,
+                  errors: str = 'replace') -> Iterator[str]:
+        """
+        按块迭代解码后的文本，编码未指定时依据首块在 UTF-8/GBK 间探测
+        
+        Args:
+            bucket_name: 存储桶名
+            object_name: 对象名
+            encoding: 文本编码，None 表示自动探测
+            chunk_size: 块大小
+            offset: 起始字节偏移
+            length: 读取长度，0 表示读到对象末尾
+            errors: 'strict' 时解码失败抛出 UnicodeDecodeError；其他取值先严格解码，
+                失败后（已输出的文本无法撤回）剩余内容按该方式处理非法字节
+        """
+        decoder = None
+        
+        def decode(data: bytes, final: bool = False) -> str:
+            nonlocal decoder
+            try:
+                return decoder.decode(data, final)
+            except UnicodeDecodeError as e:
+                if errors == 'strict':
+                    raise
+                logger.warning(f"文本解码失败，剩余内容按 {errors} 处理: {bucket_name}/{object_name}, {str(e)}")
+                pending, _ = decoder.getstate()
+                decoder = codecs.getincrementaldecoder(text_encoding)(errors=errors)
+                return decoder.decode(pending + data, final)
+        
+        for chunk in self.iter_chunks(bucket_name, object_name, chunk_size=chunk_size, offset=offset, length=length):
+            if decoder is None:
+                text_encoding = encoding or _detect_text_encoding(chunk)
+                decoder = codecs.getincrementaldecoder(text_encoding)()
+            text = decode(chunk)
+            if text:
+                yield text
+        if decoder is not None:
+            tail = decode(b'', final=True)
+            if tail:
+                yield tail
+    
+    def iter_lines(self, bucket_name: str, object_name: str, encoding: str = None,
+                   chunk_size: int = 1024 * 1024, offset: int = 0, length: int = 0) -> Iterator[str]:
+        """
+        逐行迭代 MinIO 对象中的文本（不含行尾换行符），适用于大文本与 JSONL
+        
+        Args:
+            bucket_name: 存储桶名
+            object_name: 对象名
+            encoding: 文本编码，None 表示自动探测
+            chunk_size: 块大小
+            offset: 起始字节偏移
+            length: 读取长度，0 表示读到对象末尾
+        """
+        pending = ''
+        for text in self.iter_text(bucket_name, object_name, encoding=encoding, chunk_size=chunk_size,
+                                   offset=offset, length=length):
+            pending += text
+            lines = pending.split('\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line.rstrip('\r')
+        if pending:
+            yield pending.rstrip('\r')
+    
+    def download_to_fileobj(self, bucket_name: str, object_name: str, fileobj: BinaryIO,
+                            chunk_size: int = 1024 * 1024, hasher=None) -> int:
+        """
+        从 MinIO 流式下载文件到已打开的文件对象，不在内存中保留整个文件
+
+        Args:
+            bucket_name: 存储桶名
+            object_name: 对象名
+            fileobj: 可写的二进制文件对象
+            chunk_size: 每次读取的块大小
+            hasher: 可选的 hashlib 对象，下载的同时计算内容哈希
+
+        Returns:
+            int: 写入的字节数
+        """
+        response = None
+        try:
+            client = self._get_client()
+            response = client.get_object(bucket_name, object_name)
+            written = 0
+            for chunk in response.stream(chunk_size):
+                fileobj.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                written += len(chunk)
+            fileobj.flush()
+            logger.info(f"文件流式下载成功: {object_name}, 大小: {written} bytes")
+            return written
+        except S3Error as e:
+            logger.error(f"MinIO 下载文件失败: {str(e)}")
+            raise Exception(f"文件下载失败: {str(e)}")
+        except Exception as e:
+            logger.error(f"下载文件失败: {str(e)}")
+            raise
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
     def delete_file(self, object_name: str) -> bool:
         """
         从 MinIO 删除文件
@@ -265,6 +933,7 @@ class StorageService:
             client = self._get_client()
             bucket_name = current_app.config['MINIO_BUCKET_NAME']
             client.remove_object(bucket_name, object_name)
+            self.forget_object_bucket(object_name)
             logger.info(f"文件删除成功: {object_name}")
             return True
         except S3Error as e:
@@ -274,21 +943,28 @@ class StorageService:
             logger.error(f"删除文件失败: {str(e)}")
             return False
     
-    def get_file_url(self, object_name: str, expires: int = 3600) -> str:
+    def get_file_url(self, object_name: str, expires: int = 3600, bucket_name: str = None,
+                     filename: str = None) -> str:
         """
         获取文件的预签名 URL
         
         Args:
             object_name: 对象名
             expires: 过期时间（秒）
+            bucket_name: 存储桶名，默认 MINIO_BUCKET_NAME
+            filename: 下载时的文件名（写入 Content-Disposition）
             
         Returns:
             str: 预签名 URL
         """
         try:
-            client = self._get_client()
-            bucket_name = current_app.config['MINIO_BUCKET_NAME']
-            url = client.presigned_get_object(bucket_name, object_name, expires=expires)
+            client = self._get_presign_client()
+            bucket_name = bucket_name or current_app.config['MINIO_BUCKET_NAME']
+            response_headers = None
+            if filename:
+                response_headers = {'response-content-disposition': _content_disposition(filename)}
+            url = client.presigned_get_object(bucket_name, object_name, expires=timedelta(seconds=expires),
+                                              response_headers=response_headers)
             return url
         except S3Error as e:
             logger.error(f"MinIO 获取预签名URL失败: {str(e)}")
@@ -297,6 +973,129 @@ class StorageService:
             logger.error(f"获取文件URL失败: {str(e)}")
             raise
     
+    def _get_presign_client(self):
+        """
+        生成预签名 URL 使用的客户端。配置了 MINIO_PUBLIC_ENDPOINT 时使用面向浏览器的地址签名，
+        并固定 region，签名过程不访问 MinIO
+        """
+        client = self._get_client()
+        public_endpoint = current_app.config.get('MINIO_PUBLIC_ENDPOINT')
+        if isinstance(client, LocalStorageClient) or not public_endpoint:
+            return client
+        if self._presign_client is None:
+            self._presign_client = Minio(
+                endpoint=public_endpoint,
+                access_key=current_app.config['MINIO_ACCESS_KEY'],
+                secret_key=current_app.config['MINIO_SECRET_KEY'],
+                secure=current_app.config.get('MINIO_PUBLIC_SECURE', current_app.config['MINIO_SECURE']),
+                region=current_app.config.get('MINIO_REGION') or 'us-east-1'
+            )
+        return self._presign_client
+    
+    def get_download_response(self, bucket: str, object_name: str, filename: str = None,
+                              content_type: str = None, mode: str = None) -> Response:
+        """
+        构建文件下载响应，不经由 API 进程缓冲整个文件
+        
+        redirect 模式返回 302 跳转到短期有效的预签名 URL，只在配置了浏览器可访问的
+        MINIO_PUBLIC_ENDPOINT 时生效；未配置或签名失败时回退为流式响应，支持单段 Range 请求。
+        本地存储后端直接 send_file。
+        
+        Args:
+            bucket: 存储桶名
+            object_name: 对象名
+            filename: 下载文件名，默认取对象名的 basename
+            content_type: 响应的 Content-Type，默认使用对象元数据
+            mode: stream 或 redirect，默认使用 STORAGE_DOWNLOAD_MODE 配置
+            
+        Returns:
+            Response: Flask 响应
+        """
+        filename = filename or os.path.basename(object_name)
+        mode = mode or current_app.config.get('STORAGE_DOWNLOAD_MODE', 'stream')
+        
+        local_path = self.get_local_path(bucket, object_name)
+        if local_path:
+            return send_file(local_path, mimetype=content_type or mimetypes.guess_type(filename)[0],
+                             as_attachment=True, download_name=filename, conditional=True)
+        
+        # 内部 MinIO 地址（如 docker-compose 中的 minio:9000）浏览器无法访问，不做跳转
+        if mode == 'redirect' and current_app.config.get('MINIO_PUBLIC_ENDPOINT'):
+            try:
+                expires = current_app.config.get('STORAGE_PRESIGNED_URL_EXPIRES', 300)
+                response = redirect(self.get_file_url(object_name, expires=expires,
+                                                      bucket_name=bucket, filename=filename), 302)
+                response.headers['Cache-Control'] = 'no-store'
+                return response
+            except Exception as e:
+                logger.warning(f"生成预签名URL失败，改为流式下载: {str(e)}")
+        
+        return self._stream_download_response(bucket, object_name, filename, content_type)
+    
+    @staticmethod
+    def _if_range_matches(if_range, etag: str, last_modified) -> bool:
+        """If-Range 条件是否成立；不成立时忽略 Range 返回完整内容"""
+        if if_range.etag is None and if_range.date is None:
+            return True
+        if if_range.etag is not None:
+            return if_range.etag == etag
+        return last_modified is not None and if_range.date == last_modified.replace(microsecond=0)
+    
+    def _stream_download_response(self, bucket: str, object_name: str, filename: str,
+                                  content_type: str = None) -> Response:
+        """以生成器流式返回对象内容，支持单段 Range 与 If-Range"""
+        client = self._get_client()
+        try:
+            stat = client.stat_object(bucket, object_name)
+        except S3Error as e:
+            logger.error(f"MinIO 获取对象信息失败: {str(e)}")
+            raise Exception(f"文件获取失败: {str(e)}")
+        
+        size = stat.size
+        etag = (stat.etag or '').strip('"')
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Content-Disposition': _content_disposition(filename),
+            'ETag': f'"{etag}"',
+        }
+        if stat.last_modified:
+            headers['Last-Modified'] = http_date(stat.last_modified)
+        
+        status = 200
+        offset, length = 0, size
+        byte_range = request.range if has_request_context() else None
+        if byte_range and self._if_range_matches(request.if_range, etag, stat.last_modified):
+            span = byte_range.range_for_length(size) if len(byte_range.ranges) == 1 else None
+            if span is None:
+                headers['Content-Range'] = f'bytes */{size}'
+                return Response(status=416, headers=headers)
+            offset, length = span[0], span[1] - span[0]
+            headers['Content-Range'] = f'bytes {offset}-{offset + length - 1}/{size}'
+            status = 206
+        headers['Content-Length'] = str(length)
+        
+        if length == 0:
+            return Response(b'', status=status, headers=headers,
+                            mimetype=content_type or stat.content_type)
+        
+        # 先打开对象流，使对象不存在等错误在返回响应头之前抛出
+        stream = self.open_stream(bucket, object_name, offset=offset, length=length)
+        chunk_size = current_app.config.get('STORAGE_STREAM_CHUNK_SIZE', 1024 * 1024)
+        
+        def generate():
+            try:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                stream.close()
+        
+        return Response(generate(), status=status, headers=headers,
+                        mimetype=content_type or stat.content_type or 'application/octet-stream',
+                        direct_passthrough=True)
+    
     def file_exists(self, object_name: str) -> bool:
         """
         检查文件是否存在
@@ -362,9 +1161,7 @@ class StorageService:
                 bucket_name = current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets')
             
             # 确保bucket存在
-            if not client.bucket_exists(bucket_name):
-                client.make_bucket(bucket_name)
-                logger.info(f"创建bucket: {bucket_name}")
+            self._ensure_bucket(bucket_name)
             
             # 上传到 MinIO
             client.fput_object(
@@ -374,6 +1171,7 @@ class StorageService:
                 content_type=content_type
             )
             
+            self.remember_object_bucket(object_name, bucket_name)
             logger.info(f"文件上传成功: {object_name}, 大小: {file_size} bytes")
             return file_size
             
@@ -411,5 +1209,171 @@ class StorageService:
             logger.error(f"列出对象失败: {str(e)}")
             raise
 
+    # ------------------------------------------------------------------ 批量操作
+    
+    def _bulk_settings(self, workers: int = None) -> Tuple[int, int]:
+        """批量操作的并发数与重试次数，并发数不超过连接池大小以免排队等待连接"""
+        config = current_app.config if has_app_context() else {}
+        workers = workers or config.get('STORAGE_BULK_WORKERS', 16)
+        pool_size = config.get('MINIO_POOL_MAXSIZE')
+        if pool_size:
+            workers = min(workers, pool_size)
+        return max(1, workers), config.get('STORAGE_BULK_RETRIES', 3)
+    
+    def _run_bulk(self, func, items: list, workers: int = None, label: str = '') -> list:
+        """
+        在线程池中并行执行单项操作，失败按指数退避重试，结果按输入顺序返回
+        
+        Args:
+            func: 单项操作，接收 item 返回结果字典
+            items: 操作项列表
+            workers: 并发数，默认 STORAGE_BULK_WORKERS
+            label: 日志中的操作名称
+        """
+        workers, retries = self._bulk_settings(workers)
+        # 在调用线程初始化客户端，工作线程不依赖应用上下文
+        self._get_client()
+        
+        def run(item):
+            for attempt in range(retries + 1):
+                try:
+                    result = func(item)
+                    result['success'] = True
+                    return result
+                except S3Error as e:
+                    # 对象/存储桶不存在等确定性错误不重试
+                    if e.code in ('NoSuchKey', 'NoSuchBucket', 'AccessDenied') or attempt >= retries:
+                        return {'item': item, 'success': False, 'error': str(e)}
+                except Exception as e:
+                    if attempt >= retries:
+                        return {'item': item, 'success': False, 'error': str(e)}
+                time.sleep(0.5 * (2 ** attempt))
+        
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(workers, len(items)),
+                                thread_name_prefix='storage-bulk') as executor:
+            results = list(executor.map(run, items))
+        
+        failed = sum(1 for r in results if not r['success'])
+        logger.info(f"批量{label}完成: 共 {len(items)} 项, 失败 {failed} 项")
+        return results
+    
+    def upload_many(self, items: list, bucket_name: str = None, workers: int = None) -> list:
+        """
+        并行上传多个本地文件
+        
+        Args:
+            items: 每项包含 file_path, object_name，可选 content_type
+            bucket_name: 目标存储桶，默认 MINIO_DATASETS_BUCKET
+            workers: 并发数
+            
+        Returns:
+            list: 每项结果，包含 object_name, file_path, size, success, error
+        """
+        bucket_name = bucket_name or current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets')
+        self._ensure_bucket(bucket_name)
+        client = self._get_client()
+        
+        def upload(item):
+            client.fput_object(bucket_name, item['object_name'], item['file_path'],
+                               content_type=item.get('content_type') or 'application/octet-stream')
+            self.remember_object_bucket(item['object_name'], bucket_name)
+            return {'item': item, 'size': os.path.getsize(item['file_path'])}
+        
+        return [self._flatten_result(r) for r in self._run_bulk(upload, items, workers, '上传')]
+    
+    def download_many(self, items: list, bucket_name: str = None, workers: int = None) -> list:
+        """
+        并行下载多个对象到本地文件
+        
+        Args:
+            items: 每项包含 object_name, file_path，可选 bucket（覆盖 bucket_name）
+            bucket_name: 默认存储桶
+            workers: 并发数
+            
+        Returns:
+            list: 每项结果，包含 object_name, file_path, size, success, error
+        """
+        client = self._get_client()
+        
+        def download(item):
+            stat = client.fget_object(item.get('bucket') or bucket_name, item['object_name'], item['file_path'])
+            return {'item': item, 'size': stat.size}
+        
+        return [self._flatten_result(r) for r in self._run_bulk(download, items, workers, '下载')]
+    
+    def copy_many(self, items: list, source_bucket: str, dest_bucket: str = None, workers: int = None) -> list:
+        """
+        并行服务端复制对象，数据不经过本服务
+        
+        Args:
+            items: 每项包含 source_object, object_name（目标对象名）
+            source_bucket: 源存储桶
+            dest_bucket: 目标存储桶，默认与源相同
+            workers: 并发数
+            
+        Returns:
+            list: 每项结果，包含 source_object, object_name, success, error
+        """
+        dest_bucket = dest_bucket or source_bucket
+        self._ensure_bucket(dest_bucket)
+        client = self._get_client()
+        
+        def copy(item):
+            client.copy_object(dest_bucket, item['object_name'], CopySource(source_bucket, item['source_object']))
+            self.remember_object_bucket(item['object_name'], dest_bucket)
+            return {'item': item}
+        
+        return [self._flatten_result(r) for r in self._run_bulk(copy, items, workers, '复制')]
+    
+    def delete_many(self, object_names: list, bucket_name: str, workers: int = None) -> list:
+        """
+        使用 MinIO 多对象删除接口批量删除，每批最多 1000 个对象，多批并行
+        
+        Args:
+            object_names: 对象名列表
+            bucket_name: 存储桶名
+            workers: 并发数
+            
+        Returns:
+            list: 每个对象的结果，包含 object_name, success, error
+        """
+        client = self._get_client()
+        batches = [object_names[i:i + 1000] for i in range(0, len(object_names), 1000)]
+        
+        def delete_batch(batch):
+            # remove_objects 惰性执行，必须消费完迭代器
+            errors = {
+                error.name: f"{error.code}: {error.message}"
+                for error in client.remove_objects(bucket_name, [DeleteObject(name) for name in batch])
+            }
+            return {'item': batch, 'errors': errors}
+        
+        results = []
+        for batch_result in self._run_bulk(delete_batch, batches, workers, '删除'):
+            batch = batch_result['item']
+            errors = batch_result.get('errors', {})
+            for name in batch:
+                error = errors.get(name) if batch_result['success'] else batch_result['error']
+                if not error:
+                    self.forget_object_bucket(name)
+                results.append({'object_name': name, 'success': not error, 'error': error})
+        return results
+    
+    def delete_prefix(self, bucket_name: str, prefix: str, workers: int = None) -> list:
+        """删除指定前缀下的所有对象"""
+        if not self._bucket_exists(bucket_name):
+            return []
+        client = self._get_client()
+        object_names = [obj.object_name for obj in client.list_objects(bucket_name, prefix=prefix, recursive=True)]
+        return self.delete_many(object_names, bucket_name, workers=workers)
+    
+    @staticmethod
+    def _flatten_result(result: Dict) -> Dict:
+        """将单项结果与其输入项合并为扁平字典"""
+        item = result.pop('item')
+        return {**item, **result}
+
 # 创建全局存储服务实例
 storage_service = StorageService() 
\ No newline at end of file
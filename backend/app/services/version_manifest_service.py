@@ -0,0 +1,330 @@
+import re
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, literal, select
+
+from app.db import db
+from app.models.dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile, DatasetVersionTreeNode
+
+logger = logging.getLogger(__name__)
+
+# 树深度（十六进制位数）：叶子桶数为 16^TREE_DEPTH。改变深度会改变所有版本的根哈希
+TREE_DEPTH = 3
+
+HEX_DIGITS = '0123456789abcdef'
+
+# 上传文件路径中的版本前缀，去掉后得到版本内的相对路径
+VERSION_PATH_PREFIX = r'^datasets/[^/]+/versions/[^/]+/'
+_VERSION_PATH_PREFIX_RE = re.compile(VERSION_PATH_PREFIX)
+
+def relative_path(file_path: str) -> str:
+    return _VERSION_PATH_PREFIX_RE.sub('', file_path or '', count=1)
+
+def path_bucket(path: str) -> str:
+    """相对路径所在的叶子桶"""
+    return hashlib.sha256(path.encode('utf-8')).hexdigest()[:TREE_DEPTH]
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+# (hash, file_count, total_size)
+Summary = Tuple[str, int, int]
+
+class VersionManifestService:
+    """
+    版本内容清单的 Merkle 树。
+
+    文件按相对路径哈希的前 TREE_DEPTH 个十六进制位分到叶子桶，叶子哈希覆盖桶内按路径排序的
+    (路径, 内容校验和)，内部节点哈希覆盖 16 个子节点，根哈希即版本的 data_checksum。
+    增删文件只重算所在叶子桶及其到根路径上的节点；两个版本比较时从根向下只展开哈希不同的子树
+    """
+
+    # ---------- 哈希 ----------
+
+    @staticmethod
+    def _leaf(entries: List[Tuple[str, str, int]]) -> Optional[Summary]:
+        """entries: (相对路径, 内容校验和, 大小)"""
+        if not entries:
+            return None
+        entries = sorted(entries)
+        digest = _sha256('\n'.join(f"{path}\0{content}" for path, content, _ in entries))
+        return digest, len(entries), sum(size for _, _, size in entries)
+
+    @staticmethod
+    def _internal(children: Dict[str, Optional[Summary]]) -> Optional[Summary]:
+        """children: 子节点的最后一位十六进制数 -> 摘要（空子树为 None）"""
+        present = [(digit, summary) for digit, summary in sorted(children.items()) if summary]
+        if not present:
+            return None
+        digest = _sha256(''.join(f"{digit}{summary[0]}" for digit, summary in present))
+        return digest, sum(s[1] for _, s in present), sum(s[2] for _, s in present)
+
+    @staticmethod
+    def _entry(file_path: str, blob_checksum: Optional[str], checksum: Optional[str], size: Optional[int]):
+        return relative_path(file_path), blob_checksum or checksum or '', size or 0
+
+    # ---------- 读写节点 ----------
+
+    @staticmethod
+    def _load_nodes(version_id: str, prefixes: Iterable[str]) -> Dict[str, DatasetVersionTreeNode]:
+        prefixes = list(set(prefixes))
+        if not prefixes:
+            return {}
+        return {
+            node.prefix: node
+            for node in DatasetVersionTreeNode.query.filter(
+                DatasetVersionTreeNode.version_id == version_id,
+                DatasetVersionTreeNode.prefix.in_(prefixes)
+            )
+        }
+
+    def _write_nodes(self, version_id: str, summaries: Dict[str, Optional[Summary]]) -> None:
+        existing = self._load_nodes(version_id, summaries)
+        for prefix, summary in summaries.items():
+            node = existing.get(prefix)
+            if summary is None:
+                if node is not None:
+                    db.session.delete(node)
+            elif node is None:
+                db.session.add(DatasetVersionTreeNode(
+                    version_id=version_id, prefix=prefix,
+                    hash=summary[0], file_count=summary[1], total_size=summary[2]
+                ))
+            else:
+                node.hash, node.file_count, node.total_size = summary
+
+    def get_root(self, version_id: str) -> Optional[DatasetVersionTreeNode]:
+        return DatasetVersionTreeNode.query.get((version_id, ''))
+
+    # ---------- 构建与增量更新 ----------
+
+    def build(self, version: EnhancedDatasetVersion) -> str:
+        """
+        全量构建版本的 Merkle 树（不提交），并为所有文件记录所在叶子桶
+
+        Returns:
+            str: 根哈希，空版本为空串
+        """
+        db.session.flush()
+        files = EnhancedDatasetFile.query.filter_by(version_id=version.id).all()
+        leaves = defaultdict(list)
+        for file in files:
+            entry = self._entry(file.file_path, file.blob_checksum, file.checksum, file.file_size)
+            file.merkle_bucket = path_bucket(entry[0])
+            leaves[file.merkle_bucket].append(entry)
+
+        summaries: Dict[str, Optional[Summary]] = {bucket: self._leaf(entries) for bucket, entries in leaves.items()}
+        level = set(summaries)
+        for depth in range(TREE_DEPTH - 1, -1, -1):
+            children = defaultdict(dict)
+            for prefix in level:
+                children[prefix[:depth]][prefix[depth]] = summaries[prefix]
+            for parent, group in children.items():
+                summaries[parent] = self._internal(group)
+            level = set(children)
+
+        DatasetVersionTreeNode.query.filter_by(version_id=version.id).delete(synchronize_session=False)
+        db.session.add_all(
+            DatasetVersionTreeNode(version_id=version.id, prefix=prefix,
+                                   hash=summary[0], file_count=summary[1], total_size=summary[2])
+            for prefix, summary in summaries.items() if summary
+        )
+        root = summaries.get('')
+        version.data_checksum = root[0] if root else ''
+        return version.data_checksum
+
+    def _update_buckets(self, version: EnhancedDatasetVersion, buckets: Iterable[str]) -> str:
+        """重算指定叶子桶及其祖先节点，每层只读取受影响父节点的 16 个子节点"""
+        buckets = set(buckets)
+        if not buckets:
+            return version.data_checksum or ''
+        db.session.flush()
+
+        leaves = defaultdict(list)
+        rows = db.session.query(
+            EnhancedDatasetFile.merkle_bucket, EnhancedDatasetFile.file_path,
+            EnhancedDatasetFile.blob_checksum, EnhancedDatasetFile.checksum, EnhancedDatasetFile.file_size
+        ).filter(
+            EnhancedDatasetFile.version_id == version.id,
+            EnhancedDatasetFile.merkle_bucket.in_(buckets)
+        )
+        for bucket, file_path, blob_checksum, checksum, size in rows:
+            leaves[bucket].append(self._entry(file_path, blob_checksum, checksum, size))
+
+        changed: Dict[str, Optional[Summary]] = {bucket: self._leaf(leaves.get(bucket, [])) for bucket in buckets}
+        level = buckets
+        for depth in range(TREE_DEPTH - 1, -1, -1):
+            parents = {prefix[:depth] for prefix in level}
+            siblings = self._load_nodes(version.id, (parent + digit for parent in parents for digit in HEX_DIGITS))
+            for parent in parents:
+                children = {}
+                for digit in HEX_DIGITS:
+                    prefix = parent + digit
+                    if prefix in changed:
+                        children[digit] = changed[prefix]
+                    elif prefix in siblings:
+                        node = siblings[prefix]
+                        children[digit] = (node.hash, node.file_count, node.total_size)
+                changed[parent] = self._internal(children)
+            level = parents
+
+        self._write_nodes(version.id, changed)
+        root = changed.get('')
+        version.data_checksum = root[0] if root else ''
+        return version.data_checksum
+
+    def apply_changes(self, version: EnhancedDatasetVersion,
+                      added: Iterable[EnhancedDatasetFile] = (),
+                      removed: Iterable[EnhancedDatasetFile] = ()) -> str:
+        """
+        增量更新版本的 Merkle 树（不提交）。added 包括新增和内容变化的文件，
+        removed 中的文件应已从会话中删除
+
+        Returns:
+            str: 新的根哈希
+        """
+        if not self.get_root(version.id):
+            # 尚未建树的旧版本（或空版本）直接全量构建
+            return self.build(version)
+        buckets = set()
+        for file in added:
+            file.merkle_bucket = path_bucket(relative_path(file.file_path))
+            buckets.add(file.merkle_bucket)
+        for file in removed:
+            buckets.add(file.merkle_bucket or path_bucket(relative_path(file.file_path)))
+        return self._update_buckets(version, buckets)
+
+    def derive(self, source: EnhancedDatasetVersion, version: EnhancedDatasetVersion,
+               added: Iterable[EnhancedDatasetFile] = (), removed_paths: Iterable[str] = ()) -> str:
+        """
+        由源版本派生新版本的树（不提交）：复制源版本的节点，再只重算变化的叶子桶。
+        新版本中沿用的文件须保留源文件的相对路径和 merkle_bucket
+
+        Args:
+            source: 源版本
+            version: 新版本
+            added: 新版本中新增或替换的文件
+            removed_paths: 源版本中被删除文件的 file_path
+
+        Returns:
+            str: 新版本的根哈希
+        """
+        source_root = self.get_root(source.id)
+        if not source_root:
+            return self.build(version)
+        db.session.flush()
+        DatasetVersionTreeNode.query.filter_by(version_id=version.id).delete(synchronize_session=False)
+        N = DatasetVersionTreeNode
+        db.session.execute(insert(N).from_select(
+            ['version_id', 'prefix', 'hash', 'file_count', 'total_size'],
+            select(literal(version.id), N.prefix, N.hash, N.file_count, N.total_size).where(N.version_id == source.id)
+        ))
+        version.data_checksum = source_root.hash
+        buckets = {path_bucket(relative_path(path)) for path in removed_paths}
+        for file in added:
+            file.merkle_bucket = path_bucket(relative_path(file.file_path))
+            buckets.add(file.merkle_bucket)
+        return self._update_buckets(version, buckets)
+
+    def ensure(self, version: EnhancedDatasetVersion) -> Optional[DatasetVersionTreeNode]:
+        """返回版本的根节点，尚未建树且有文件的旧版本先全量构建（不提交）"""
+        root = self.get_root(version.id)
+        if root is None and EnhancedDatasetFile.query.filter_by(version_id=version.id).first():
+            self.build(version)
+            db.session.flush()
+            root = self.get_root(version.id)
+        return root
+
+    # ---------- 比较 ----------
+
+    def compare(self, version1_id: str, version2_id: str, limit: int = 100) -> Dict[str, Any]:
+        """
+        比较两个版本：根哈希相同即内容相同；否则逐层只展开哈希不同的子树，
+        最后只读取不同叶子桶中的文件得到变化的路径
+
+        Returns:
+            Dict: identical, 两个版本的根摘要, 不同叶子桶数, 比较的节点数, 变化的文件（最多 limit 个）
+        """
+        old = EnhancedDatasetVersion.query.get(version1_id)
+        new = EnhancedDatasetVersion.query.get(version2_id)
+        if not old or not new:
+            raise ValueError("版本不存在")
+        old_root, new_root = self.ensure(old), self.ensure(new)
+
+        def describe(version, root):
+            return {
+                'id': version.id,
+                'version': version.version,
+                'root_hash': root.hash if root else '',
+                'file_count': root.file_count if root else 0,
+                'total_size': root.total_size if root else 0
+            }
+
+        result = {
+            'version1': describe(old, old_root),
+            'version2': describe(new, new_root),
+            'identical': (old_root.hash if old_root else '') == (new_root.hash if new_root else ''),
+            'nodes_compared': 1,
+            'differing_buckets': 0,
+            'changes': [],
+            'truncated': False
+        }
+        if result['identical']:
+            return result
+
+        frontier = ['']
+        for depth in range(TREE_DEPTH):
+            prefixes = [prefix + digit for prefix in frontier for digit in HEX_DIGITS]
+            old_nodes = self._load_nodes(old.id, prefixes)
+            new_nodes = self._load_nodes(new.id, prefixes)
+            result['nodes_compared'] += len(set(old_nodes) | set(new_nodes))
+            frontier = sorted(
+                prefix for prefix in set(old_nodes) | set(new_nodes)
+                if (old_nodes[prefix].hash if prefix in old_nodes else None)
+                != (new_nodes[prefix].hash if prefix in new_nodes else None)
+            )
+        result['differing_buckets'] = len(frontier)
+
+        # 按桶读取文件，收集到 limit 个变化为止
+        changes = result['changes']
+        for start in range(0, len(frontier), 64):
+            batch = frontier[start:start + 64]
+            sides = []
+            for version in (old, new):
+                rows = db.session.query(
+                    EnhancedDatasetFile.file_path, EnhancedDatasetFile.blob_checksum,
+                    EnhancedDatasetFile.checksum, EnhancedDatasetFile.file_size
+                ).filter(
+                    EnhancedDatasetFile.version_id == version.id,
+                    EnhancedDatasetFile.merkle_bucket.in_(batch)
+                )
+                sides.append({entry[0]: entry for entry in (self._entry(*row) for row in rows)})
+            old_entries, new_entries = sides
+            for path in sorted(set(old_entries) | set(new_entries)):
+                before, after = old_entries.get(path), new_entries.get(path)
+                if before is None:
+                    status = 'added'
+                elif after is None:
+                    status = 'removed'
+                elif before[1] != after[1]:
+                    status = 'modified'
+                else:
+                    continue
+                if len(changes) >= limit:
+                    result['truncated'] = True
+                    return result
+                changes.append({
+                    'path': path,
+                    'status': status,
+                    'old_checksum': before[1] if before else None,
+                    'new_checksum': after[1] if after else None,
+                    'old_size': before[2] if before else None,
+                    'new_size': after[2] if after else None
+                })
+        return result
+
+# 创建全局版本清单服务实例
+version_manifest_service = VersionManifestService()
@@ -0,0 +1,184 @@
+import os
+import time
+import zipfile
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List
+from flask import Response, current_app, has_app_context, stream_with_context
+from app.services.storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+# 本身已压缩的格式，以 DEFLATE 0 级（仅分块存储）写入，避免无意义的压缩开销。
+# 不用 ZIP_STORED：输出不可 seek 时条目大小写在数据描述符中，很多流式解压工具无法解析 STORED 条目
+COMPRESSED_EXTENSIONS = {
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar', '.lz4',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic',
+    '.mp3', '.m4a', '.aac', '.ogg', '.flac', '.opus',
+    '.mp4', '.mkv', '.avi', '.mov', '.webm',
+    '.docx', '.xlsx', '.pptx', '.pdf', '.parquet', '.arrow',
+}
+
+class _ZipOutput:
+    """不可 seek 的写出缓冲，ZipFile 写入的数据由生成器取走后清空"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+class ZipStreamService:
+    """流式 ZIP 打包：并行预取 MinIO 对象，边打包边输出，内存占用与文件数无关"""
+
+    def __init__(self):
+        self.prefetch_workers = 8
+        self.prefetch_bytes = 1024 * 1024
+        self.chunk_size = 1024 * 1024
+
+    def _load_config(self):
+        if not has_app_context():
+            return
+        config = current_app.config
+        self.prefetch_workers = config.get('ZIP_EXPORT_PREFETCH_WORKERS', self.prefetch_workers)
+        self.prefetch_bytes = config.get('ZIP_EXPORT_PREFETCH_BYTES', self.prefetch_bytes)
+        self.chunk_size = config.get('STORAGE_STREAM_CHUNK_SIZE', self.chunk_size)
+
+    def _prefetch(self, entry: Dict):
+        """
+        打开对象并预读开头部分。小文件在此完整读入，大文件保留流由打包线程继续读取，
+        内存占用上限为 预取并发数 × prefetch_bytes
+        """
+        stream = storage_service.open_stream(entry['bucket'], entry['object_name'])
+        try:
+            head = stream.read(self.prefetch_bytes)
+            if len(head) < self.prefetch_bytes:
+                stream.close()
+                return head, None
+            return head, stream
+        except Exception:
+            stream.close()
+            raise
+
+    @staticmethod
+    def _set_compression(zinfo: zipfile.ZipInfo):
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        if os.path.splitext(zinfo.filename)[1].lower() in COMPRESSED_EXTENSIONS:
+            # Python 3.13 起压缩级别为公开属性 compress_level
+            level_attr = 'compress_level' if hasattr(zinfo, 'compress_level') else '_compresslevel'
+            setattr(zinfo, level_attr, 0)
+
+    def iter_zip(self, entries: Iterable[Dict]) -> Iterator[bytes]:
+        """
+        按顺序生成 ZIP 字节流
+
+        Args:
+            entries: 条目列表，每项包含 bucket, object_name, arcname（zip 内文件名）
+
+        Yields:
+            bytes: ZIP 数据块
+        """
+        output = _ZipOutput()
+        pending = deque()
+        entries = iter(entries)
+        added = 0
+
+        with ThreadPoolExecutor(max_workers=self.prefetch_workers,
+                                thread_name_prefix='zip-prefetch') as executor:
+            def submit_next() -> bool:
+                entry = next(entries, None)
+                if entry is None:
+                    return False
+                pending.append((entry, executor.submit(self._prefetch, entry)))
+                return True
+
+            # 预取窗口大小为并发数的两倍，保证打包线程不空等
+            for _ in range(self.prefetch_workers * 2):
+                if not submit_next():
+                    break
+
+            try:
+                with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+                    while pending:
+                        entry, future = pending.popleft()
+                        submit_next()
+                        try:
+                            head, stream = future.result()
+                        except Exception as e:
+                            logger.error(f"下载文件失败: {entry['object_name']}, 错误: {str(e)}")
+                            continue
+
+                        zinfo = zipfile.ZipInfo(entry['arcname'], date_time=time.localtime()[:6])
+                        self._set_compression(zinfo)
+                        zinfo.external_attr = 0o644 << 16
+                        if stream is None:
+                            zinfo.file_size = len(head)
+                        try:
+                            # 大文件大小未知，强制 ZIP64 以支持超过 4GB 的条目
+                            with zip_file.open(zinfo, 'w', force_zip64=stream is not None) as dest:
+                                dest.write(head)
+                                while stream is not None:
+                                    data = output.drain()
+                                    if data:
+                                        yield data
+                                    chunk = stream.read(self.chunk_size)
+                                    if not chunk:
+                                        break
+                                    dest.write(chunk)
+                        finally:
+                            if stream is not None:
+                                stream.close()
+                        added += 1
+                        data = output.drain()
+                        if data:
+                            yield data
+                # 中央目录在 ZipFile 关闭时写出
+                data = output.drain()
+                if data:
+                    yield data
+                logger.info(f"ZIP打包完成, 共 {added} 个文件")
+            finally:
+                # 客户端中断下载时关闭尚未消费的预取流
+                for _, future in pending:
+                    if future.cancel():
+                        continue
+                    try:
+                        _, stream = future.result()
+                        if stream is not None:
+                            stream.close()
+                    except Exception:
+                        pass
+
+    def build_response(self, entries: List[Dict], download_filename: str) -> Response:
+        """
+        构建流式 ZIP 下载响应，首个文件预取完成即开始输出
+
+        Args:
+            entries: 条目列表，每项包含 bucket, object_name, arcname
+            download_filename: 下载文件名（ASCII）
+        """
+        self._load_config()
+        # 在请求线程内初始化存储客户端，预取线程无需应用上下文
+        storage_service._get_client()
+        return Response(
+            stream_with_context(self.iter_zip(entries)),
+            mimetype='application/zip',
+            headers={
+                'Content-Disposition': f'attachment; filename="{download_filename}"',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+
+# 创建全局流式 ZIP 服务实例
+zip_stream_service = ZipStreamService()
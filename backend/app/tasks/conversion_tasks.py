@@ -1,17 +1,24 @@
 import os
+import json
+import hashlib
 import tempfile
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from typing import Optional, Dict, Any
 from celery import Task
 from flask import current_app
+from sqlalchemy.exc import IntegrityError
 from app.celery_app import celery
 from app.models import (
     ConversionJob, ConversionStatus, ConversionFileDetail,
     LibraryFile, ProcessStatus, Task as TaskModel, TaskStatus,
-    LLMConfig
+    LLMConfig, ConversionCache, ConversionJobLog
 )
 from app.services.storage_service import storage_service
 from app.services.llm_conversion_service import llm_conversion_service
+from app.services.markitdown_pool_service import markitdown_pool_service
 from app.db import db
 import markitdown
 import time
@@ -30,13 +37,206 @@ class ConversionTask(Task):
             from app import create_app
             self._flask_app = create_app()
         return self._flask_app
-    
+
     @property
     def markitdown(self):
         if self._markitdown is None:
             self._markitdown = markitdown.MarkItDown()
         return self._markitdown
 
+class _PageProgressTracker:
+    """线程安全的页面进度收集器，工作线程只写内存，由主线程统一落库"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, tuple] = {}
+
+    def callback_for(self, file_detail_id: str):
+        """为指定文件生成进度回调"""
+        def progress_callback(current_page: int, total_pages: int):
+            with self._lock:
+                self._pending[file_detail_id] = (current_page, total_pages)
+        return progress_callback
+
+    def drain(self) -> Dict[str, tuple]:
+        """取出并清空待落库的页面进度"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+class _ConversionJobAggregator:
+    """任务级进度汇总器，只在主线程中访问数据库会话
+
+    日志先缓存在内存中，进度与日志按时间间隔或条数批量落库，避免每个文件/每页都重写任务行。
+    """
+
+    def __init__(self, celery_task, job: ConversionJob, total_files: int,
+                 flush_interval: float = 2.0, flush_count: int = 50):
+        self.celery_task = celery_task
+        self.job = job
+        self.total_files = total_files
+        self.processed_files = 0
+        self.total_processing_time = 0
+        self.start_time = time.time()
+        self.flush_interval = flush_interval
+        self.flush_count = flush_count
+        self.llm_usage_count = 0
+        self._pending_logs = []
+        self._pending_updates = 0
+        self._last_flush = time.time()
+
+    def log(self, message: str, level: str = 'INFO'):
+        """缓存一条任务日志，等待批量写入"""
+        self._pending_logs.append(ConversionJobLog.build_entry(self.job.id, message, level))
+
+    def flush(self, force: bool = False):
+        """满足时间或条数阈值时批量提交进度与日志"""
+        if not force and self._pending_updates == 0 and not self._pending_logs:
+            return
+        if not force and len(self._pending_logs) < self.flush_count \
+                and time.time() - self._last_flush < self.flush_interval:
+            return
+
+        if self._pending_logs:
+            db.session.bulk_insert_mappings(ConversionJobLog, self._pending_logs)
+            self._pending_logs = []
+        if self.llm_usage_count and self.job.llm_config_id:
+            _update_llm_usage(self.job.llm_config_id, self.llm_usage_count)
+            self.llm_usage_count = 0
+        db.session.commit()
+
+        self._pending_updates = 0
+        self._last_flush = time.time()
+
+        remaining_files = self.total_files - self.processed_files
+        self.celery_task.update_state(
+            state='PROGRESS',
+            meta={
+                'current': self.processed_files,
+                'total': self.total_files,
+                'progress': self.job.progress_percentage,
+                'current_file': self.job.current_file_name,
+                'completed_count': self.job.completed_count,
+                'failed_count': self.job.failed_count,
+                'avg_time_per_file': self.avg_time_per_file,
+                'estimated_remaining_time': remaining_files * self.avg_time_per_file
+            }
+        )
+
+    @property
+    def avg_time_per_file(self) -> float:
+        return self.total_processing_time / self.processed_files if self.processed_files > 0 else 0
+
+    def apply_page_progress(self, page_progress: Dict[str, tuple], details_by_id: Dict[str, ConversionFileDetail]):
+        """把工作线程上报的页面进度写入文件详情"""
+        if not page_progress:
+            return
+        for detail_id, (current_page, total_pages) in page_progress.items():
+            file_detail = details_by_id.get(detail_id)
+            if not file_detail:
+                continue
+            file_detail.processed_pages = current_page
+            file_detail.total_pages = total_pages
+            if total_pages > 0:
+                file_progress = (current_page / total_pages) * 100
+                self.log(f"页面进度 - {file_detail.library_file.original_filename}: "
+                         f"{current_page}/{total_pages} 页 ({file_progress:.1f}%)")
+        self._pending_updates += 1
+
+    def record_success(self, file_index: int, file_detail: ConversionFileDetail, result: Dict[str, Any]):
+        """记录单个文件转换成功"""
+        library_file = file_detail.library_file
+        file_name = library_file.original_filename
+
+        file_detail.converted_object_name = result['converted_object_name']
+        file_detail.converted_file_size = result['converted_file_size']
+        file_detail.status = ConversionStatus.COMPLETED
+        file_detail.completed_at = datetime.utcnow()
+
+        library_file.process_status = ProcessStatus.COMPLETED
+        library_file.converted_format = 'markdown'
+        library_file.converted_object_name = result['converted_object_name']
+        library_file.converted_file_size = result['converted_file_size']
+        library_file.conversion_method = self.job.method
+        library_file.processed_at = datetime.utcnow()
+        if result.get('content_hash'):
+            library_file.content_hash = result['content_hash']
+        self._save_conversion_cache(result)
+
+        self.job.completed_count += 1
+        self.job.current_file_name = file_name
+        self.total_processing_time += result['duration']
+
+        if result.get('reused'):
+            logger.info(f"复用已有转换结果 {file_index}/{self.total_files}: {file_name} -> {result['converted_object_name']}")
+            self.log(f"复用已有转换结果 {file_index}/{self.total_files}: {file_name}")
+        else:
+            logger.info(f"文件处理完成 {file_index}/{self.total_files}: {file_name}, 耗时: {result['duration']:.2f}秒")
+            self.log(f"文件处理完成 {file_index}/{self.total_files}: {file_name}, 耗时: {result['duration']:.2f}秒")
+        self._advance()
+
+    def _save_conversion_cache(self, result: Dict[str, Any]):
+        """登记新的转换结果，或更新被复用结果的命中统计"""
+        cache_key = result.get('cache_key')
+        if not cache_key:
+            return
+        cache_object_name = _cache_object_name(cache_key)
+        cache_entry = ConversionCache.query.get(cache_key)
+        if cache_entry:
+            if result.get('reused'):
+                cache_entry.hit_count = (cache_entry.hit_count or 0) + 1
+                cache_entry.last_used_at = datetime.utcnow()
+            elif cache_entry.converted_object_name != cache_object_name:
+                # 早期记录指向单个文件的输出，改为指向缓存自有对象
+                cache_entry.converted_bucket = result['converted_bucket']
+                cache_entry.converted_object_name = cache_object_name
+                cache_entry.converted_file_size = result['converted_file_size']
+            return
+        try:
+            # 其他任务可能并发写入同一缓存键，使用保存点避免影响本任务提交
+            with db.session.begin_nested():
+                db.session.add(ConversionCache(
+                    cache_key=cache_key,
+                    content_hash=result['content_hash'],
+                    method=self.job.method,
+                    llm_config_id=self.job.llm_config_id if self.job.method != 'markitdown' else None,
+                    converted_bucket=result['converted_bucket'],
+                    converted_object_name=cache_object_name,
+                    converted_file_size=result['converted_file_size'],
+                    hit_count=0
+                ))
+        except IntegrityError:
+            logger.info(f"转换缓存已由其他任务写入: {cache_key}")
+
+    def record_failure(self, file_index: int, file_detail: ConversionFileDetail, error: Exception):
+        """记录单个文件转换失败"""
+        file_name = file_detail.library_file.original_filename if file_detail.library_file else 'unknown'
+        duration = getattr(error, 'duration', 0)
+
+        logger.error(f"转换文件失败 {file_index}/{self.total_files}: {file_name}, 耗时: {duration:.2f}秒, 错误: {str(error)}")
+        self.log(f"转换文件失败 {file_index}/{self.total_files}: {file_name}, 错误: {str(error)}", level='ERROR')
+        file_detail.status = ConversionStatus.FAILED
+        file_detail.error_message = str(error)
+        self.job.failed_count += 1
+        self.job.current_file_name = file_name
+        self.total_processing_time += duration
+        self._advance()
+
+    def _advance(self):
+        """更新任务进度，由 flush 统一落库并同步到 Celery"""
+        self.processed_files += 1
+        self.job.update_progress()
+        self.job.task.progress = int(self.job.progress_percentage)
+
+        remaining_files = self.total_files - self.processed_files
+        estimated_remaining_time = remaining_files * self.avg_time_per_file
+
+        logger.info(f"进度统计 - 已完成: {self.processed_files}/{self.total_files} ({self.job.progress_percentage:.1f}%), "
+                    f"平均耗时: {self.avg_time_per_file:.2f}秒/文件, 预计剩余: {estimated_remaining_time:.2f}秒")
+        self.log(f"进度更新: {self.processed_files}/{self.total_files} 文件 ({self.job.progress_percentage:.1f}%), "
+                 f"预计剩余: {estimated_remaining_time/60:.1f}分钟")
+        self._pending_updates += 1
+
 @celery.task(base=ConversionTask, bind=True, name='tasks.process_conversion_job')
 def process_conversion_job(self, job_id: str):
     """处理转换任务的Celery任务"""
@@ -44,103 +244,106 @@ def process_conversion_job(self, job_id: str):
         try:
             start_time = time.time()
             logger.info(f"开始处理转换任务: {job_id}")
-            
+
             # 获取任务信息
             job = ConversionJob.query.get(job_id)
             if not job:
                 logger.error(f"转换任务不存在: {job_id}")
                 return {'success': False, 'error': '任务不存在'}
-            
+
             # 记录任务详情
             logger.info(f"任务详情 - 方法: {job.method}, 文件数: {len(job.file_details)}, 库ID: {job.library_id}")
             if job.llm_config_id:
                 logger.info(f"使用LLM配置: {job.llm_config_id}")
-            
+
             # 添加开始日志
             job.add_log(f"开始处理转换任务 - 方法: {job.method}, 文件数: {len(job.file_details)}")
-            
+
             # 更新任务状态
             job.status = ConversionStatus.PROCESSING
             job.started_at = datetime.utcnow()
             job.task.status = TaskStatus.RUNNING
             job.task.started_at = datetime.utcnow()
             db.session.commit()
-            
-            # 处理每个文件
-            total_files = len(job.file_details)
-            processed_files = 0
-            total_processing_time = 0
-            
-            logger.info(f"开始处理 {total_files} 个文件")
-            
-            for file_index, file_detail in enumerate(job.file_details, 1):
-                file_start_time = time.time()
-                
-                try:
-                    # 记录开始处理的文件
-                    file_name = file_detail.library_file.original_filename
-                    logger.info(f"处理文件 {file_index}/{total_files}: {file_name}")
-                    job.add_log(f"开始处理文件 {file_index}/{total_files}: {file_name}")
-                    
-                    # 转换单个文件
-                    _convert_single_file(self, file_detail, job)
-                    job.completed_count += 1
-                    processed_files += 1
-                    
-                    file_duration = time.time() - file_start_time
-                    total_processing_time += file_duration
-                    
-                    logger.info(f"文件处理完成 {file_index}/{total_files}: {file_name}, 耗时: {file_duration:.2f}秒")
-                    job.add_log(f"文件处理完成 {file_index}/{total_files}: {file_name}, 耗时: {file_duration:.2f}秒")
-                    
-                except Exception as e:
-                    file_duration = time.time() - file_start_time
-                    file_name = file_detail.library_file.original_filename if file_detail.library_file else 'unknown'
-                    
-                    logger.error(f"转换文件失败 {file_index}/{total_files}: {file_name}, 耗时: {file_duration:.2f}秒, 错误: {str(e)}")
-                    job.add_log(f"转换文件失败 {file_index}/{total_files}: {file_name}, 错误: {str(e)}", level='ERROR')
-                    file_detail.status = ConversionStatus.FAILED
-                    file_detail.error_message = str(e)
-                    job.failed_count += 1
-                    processed_files += 1
-                
-                # 更新进度
-                job.update_progress()
-                job.task.progress = int(job.progress_percentage)
-                db.session.commit()
-                
-                # 计算平均处理时间和预估剩余时间
-                if processed_files > 0:
-                    avg_time_per_file = total_processing_time / processed_files
-                    remaining_files = total_files - processed_files
-                    estimated_remaining_time = remaining_files * avg_time_per_file
-                    
-                    logger.info(f"进度统计 - 已完成: {processed_files}/{total_files} ({job.progress_percentage:.1f}%), "
-                              f"平均耗时: {avg_time_per_file:.2f}秒/文件, 预计剩余: {estimated_remaining_time:.2f}秒")
-                    
-                    # 添加进度日志
-                    if processed_files % 1 == 0:  # 每个文件都记录
-                        job.add_log(f"进度更新: {processed_files}/{total_files} 文件 ({job.progress_percentage:.1f}%), "
-                                  f"预计剩余: {estimated_remaining_time/60:.1f}分钟")
-                
-                # 更新Celery任务进度
-                self.update_state(
-                    state='PROGRESS',
-                    meta={
-                        'current': processed_files,
-                        'total': total_files,
-                        'progress': job.progress_percentage,
-                        'current_file': job.current_file_name,
-                        'completed_count': job.completed_count,
-                        'failed_count': job.failed_count,
-                        'avg_time_per_file': avg_time_per_file if processed_files > 0 else 0,
-                        'estimated_remaining_time': estimated_remaining_time if processed_files > 0 else 0
+
+            file_details = list(job.file_details)
+            total_files = len(file_details)
+            max_workers = _get_conversion_workers(job.method, total_files)
+
+            # vision_llm 需要在工作线程中读取LLM配置，先加载并脱离会话
+            llm_config = _load_detached_llm_config(job.llm_config_id) if job.method != 'markitdown' else None
+
+            # 相同内容、方法与配置的转换结果可直接复用
+            conversion_fingerprint = _get_conversion_fingerprint(job.method, job.conversion_config or {}, llm_config)
+
+            logger.info(f"开始处理 {total_files} 个文件, 并发数: {max_workers}")
+            job.add_log(f"并行转换 {total_files} 个文件, 并发数: {max_workers}")
+
+            # 标记所有文件为处理中
+            for file_detail in file_details:
+                file_detail.status = ConversionStatus.PROCESSING
+                file_detail.started_at = datetime.utcnow()
+            db.session.commit()
+
+            flush_interval = current_app.config.get('CONVERSION_PROGRESS_FLUSH_INTERVAL', 2.0)
+            aggregator = _ConversionJobAggregator(
+                self, job, total_files,
+                flush_interval=flush_interval,
+                flush_count=current_app.config.get('CONVERSION_PROGRESS_FLUSH_COUNT', 50)
+            )
+            page_tracker = _PageProgressTracker()
+            details_by_id = {file_detail.id: file_detail for file_detail in file_details}
+
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='conversion') as executor:
+                futures = {}
+                for file_index, file_detail in enumerate(file_details, 1):
+                    library_file = file_detail.library_file
+                    file_info = {
+                        'file_detail_id': file_detail.id,
+                        'library_id': library_file.library_id,
+                        'library_file_id': library_file.id,
+                        'original_filename': library_file.original_filename,
+                        'file_type': library_file.file_type,
+                        'minio_object_name': library_file.minio_object_name,
+                        'content_hash': library_file.content_hash
                     }
-                )
-            
+                    future = executor.submit(
+                        _run_file_conversion,
+                        self.flask_app,
+                        self,
+                        file_info,
+                        job.method,
+                        job.conversion_config or {},
+                        conversion_fingerprint,
+                        llm_config,
+                        page_tracker.callback_for(file_detail.id)
+                    )
+                    futures[future] = (file_index, file_detail)
+
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=flush_interval, return_when=FIRST_COMPLETED)
+                    aggregator.apply_page_progress(page_tracker.drain(), details_by_id)
+
+                    for future in done:
+                        file_index, file_detail = futures[future]
+                        try:
+                            result = future.result()
+                            aggregator.record_success(file_index, file_detail, result)
+                            if llm_config is not None and not result.get('reused'):
+                                aggregator.llm_usage_count += 1
+                        except Exception as e:
+                            aggregator.record_failure(file_index, file_detail, e)
+
+                    aggregator.flush()
+
+            aggregator.flush(force=True)
+
             # 更新任务完成状态
             total_duration = time.time() - start_time
-            
+            processed_files = aggregator.processed_files
+            total_processing_time = aggregator.total_processing_time
+
             if job.failed_count == 0:
                 job.status = ConversionStatus.COMPLETED
                 job.task.status = TaskStatus.COMPLETED
@@ -150,35 +353,37 @@ def process_conversion_job(self, job_id: str):
                 job.task.status = TaskStatus.COMPLETED
                 job.error_message = f"{job.failed_count} 个文件转换失败"
                 message = f"转换完成: 成功 {job.completed_count} 个, 失败 {job.failed_count} 个"
-            
+
             job.completed_at = datetime.utcnow()
             job.task.completed_at = datetime.utcnow()
-            db.session.commit()
-            
-            logger.info(f"转换任务完成: {job_id}, {message}, 总耗时: {total_duration:.2f}秒")
-            logger.info(f"性能统计 - 平均处理时间: {total_processing_time/processed_files:.2f}秒/文件, "
-                       f"总处理时间: {total_processing_time:.2f}秒")
-            
+
             # 添加完成日志
             job.add_log(f"任务完成: {message}, 总耗时: {total_duration/60:.1f}分钟")
             if processed_files > 0:
                 job.add_log(f"性能统计: 平均 {total_processing_time/processed_files:.1f}秒/文件")
-            
+            db.session.commit()
+
+            logger.info(f"转换任务完成: {job_id}, {message}, 总耗时: {total_duration:.2f}秒")
+            if processed_files > 0:
+                logger.info(f"性能统计 - 平均处理时间: {total_processing_time/processed_files:.2f}秒/文件, "
+                           f"总处理时间: {total_processing_time:.2f}秒")
+
             return {
                 'success': True,
                 'job_id': job_id,
                 'completed_count': job.completed_count,
                 'failed_count': job.failed_count,
                 'total_duration': total_duration,
-                'avg_time_per_file': total_processing_time / processed_files if processed_files > 0 else 0,
+                'avg_time_per_file': aggregator.avg_time_per_file,
                 'message': message
             }
-            
+
         except Exception as e:
             total_duration = time.time() - start_time if 'start_time' in locals() else 0
             logger.error(f"处理转换任务失败 {job_id}: {str(e)}, 总耗时: {total_duration:.2f}秒")
-            
+
             try:
+                db.session.rollback()
                 job = ConversionJob.query.get(job_id)
                 if job:
                     job.status = ConversionStatus.FAILED
@@ -188,145 +393,216 @@ def process_conversion_job(self, job_id: str):
                     db.session.commit()
             except Exception as commit_error:
                 logger.error(f"更新任务失败状态时出错: {str(commit_error)}")
-            
+
             return {'success': False, 'error': str(e), 'duration': total_duration}
 
-def _convert_single_file(celery_task, file_detail: ConversionFileDetail, job: ConversionJob):
-    """转换单个文件"""
-    file_detail.status = ConversionStatus.PROCESSING
-    file_detail.started_at = datetime.utcnow()
-    job.current_file_name = file_detail.library_file.original_filename
-    db.session.commit()
-    
-    library_file = file_detail.library_file
-    
-    # 下载原始文件
-    with tempfile.NamedTemporaryFile(suffix=f".{library_file.file_type}", delete=False) as tmp_file:
-        storage_service.download_file(
-            current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data'),
-            library_file.minio_object_name,
-            tmp_file.name
-        )
-        
-        # 执行转换
-        if job.method == 'markitdown':
-            markdown_content = _convert_with_markitdown(
-                celery_task,
-                tmp_file.name,
-                library_file.file_type,
-                job.conversion_config
-            )
-        else:  # vision_llm
-            markdown_content = _convert_with_llm(
-                tmp_file.name,
-                library_file.file_type,
-                job.conversion_config,
-                job.llm_config_id,
-                file_detail
-            )
-        
-        # 保存转换后的文件
-        markdown_filename = f"{os.path.splitext(library_file.original_filename)[0]}.md"
-        markdown_object_name = f"converted/{library_file.library_id}/{library_file.id}/{markdown_filename}"
-        
-        # 上传到MinIO
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.md', encoding='utf-8', delete=False) as md_file:
-            md_file.write(markdown_content)
-            md_file.flush()
-            
-            storage_service.upload_file_from_path(
-                md_file.name,
-                markdown_object_name,
-                content_type='text/markdown; charset=utf-8',
-                bucket_name=current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets')
-            )
-            
-            # 获取文件大小
-            file_size = os.path.getsize(md_file.name)
-        
-        # 更新文件详情
-        file_detail.converted_object_name = markdown_object_name
-        file_detail.converted_file_size = file_size
-        file_detail.status = ConversionStatus.COMPLETED
-        file_detail.completed_at = datetime.utcnow()
-        
-        # 更新原始文件记录
-        library_file.process_status = ProcessStatus.COMPLETED
-        library_file.converted_format = 'markdown'
-        library_file.converted_object_name = markdown_object_name
-        library_file.converted_file_size = file_size
-        library_file.conversion_method = job.method
-        library_file.processed_at = datetime.utcnow()
-        
-        db.session.commit()
-        
-        # 清理临时文件
-        os.unlink(tmp_file.name)
-        if 'md_file' in locals():
-            os.unlink(md_file.name)
+def _get_conversion_workers(method: str, total_files: int) -> int:
+    """根据转换方法确定并发数"""
+    if method == 'markitdown':
+        # 线程数与 MarkItDown 进程池大小一致，线程只负责 I/O 并等待转换结果
+        workers = current_app.config.get('CONVERSION_MARKITDOWN_WORKERS') or os.cpu_count() or 1
+    else:
+        workers = current_app.config.get('CONVERSION_LLM_WORKERS') or 4
+    return max(1, min(workers, total_files))
+
+def _load_detached_llm_config(llm_config_id: str) -> LLMConfig:
+    """加载LLM配置并从会话中分离，供工作线程只读使用"""
+    llm_config = LLMConfig.query.get(llm_config_id)
+    if not llm_config:
+        raise ValueError(f"LLM配置不存在: {llm_config_id}")
+
+    logger.info(f"转换任务中获取到的LLM配置: ID={llm_config.id}, Name={llm_config.name}, Provider={llm_config.provider}")
+    logger.info(f"API Key前缀: {llm_config.api_key[:10]}... (长度: {len(llm_config.api_key)})")
+
+    # 强制清除LLM客户端缓存，确保使用最新配置
+    if hasattr(llm_conversion_service, 'llm_cache') and llm_config.id in llm_conversion_service.llm_cache:
+        logger.info(f"清除LLM客户端缓存: {llm_config.id}")
+        del llm_conversion_service.llm_cache[llm_config.id]
+
+    db.session.expunge(llm_config)
+    return llm_config
+
+def _update_llm_usage(llm_config_id: str, usage_count: int):
+    """在主线程中批量更新LLM使用统计，随汇总器提交"""
+    llm_config = LLMConfig.query.get(llm_config_id)
+    if llm_config:
+        llm_config.usage_count = (llm_config.usage_count or 0) + usage_count
+        llm_config.last_used_at = datetime.utcnow()
+
+def _get_conversion_fingerprint(method: str, conversion_config: dict, llm_config: Optional[LLMConfig]) -> str:
+    """转换方法、LLM配置与转换配置的指纹，与内容哈希共同组成转换缓存键"""
+    fingerprint = {
+        'method': method,
+        'conversion_config': {k: v for k, v in conversion_config.items() if k != 'llmConfigId'}
+    }
+    if llm_config is not None:
+        provider = llm_config.provider.value if hasattr(llm_config.provider, 'value') else llm_config.provider
+        fingerprint['llm_config'] = {
+            'provider': provider,
+            'model_name': llm_config.model_name,
+            'base_url': llm_config.base_url,
+            'temperature': llm_config.temperature,
+            'max_tokens': llm_config.max_tokens,
+            'provider_config': llm_config.provider_config
+        }
+    return json.dumps(fingerprint, sort_keys=True, ensure_ascii=False, default=str)
+
+def _get_cache_key(content_hash: str, conversion_fingerprint: str) -> str:
+    """计算转换缓存键"""
+    return hashlib.sha256(f"{content_hash}:{conversion_fingerprint}".encode('utf-8')).hexdigest()
+
+def _cache_object_name(cache_key: str) -> str:
+    """缓存自有的转换结果对象，按缓存键命名且写入后不再修改，不随单个文件的转换输出变化"""
+    return f"converted/cache/{cache_key}.md"
+
+def _find_cached_conversion(cache_key: str) -> Optional[Dict[str, Any]]:
+    """查询已有的转换结果（只读，使用当前线程应用上下文的会话）"""
+    cache_entry = ConversionCache.query.get(cache_key)
+    # 早期缓存记录指向单个文件的输出路径，该对象可能已被覆盖或删除，视为未命中
+    if not cache_entry or cache_entry.converted_object_name != _cache_object_name(cache_key):
+        return None
+    return {
+        'converted_bucket': cache_entry.converted_bucket,
+        'cache_object_name': cache_entry.converted_object_name,
+        'converted_file_size': cache_entry.converted_file_size
+    }
+
+def _reuse_cached_conversion(cached: Dict[str, Any], markdown_object_name: str) -> bool:
+    """将缓存对象服务端复制为该文件自己的转换输出，缓存对象缺失时返回 False"""
+    result = storage_service.copy_many(
+        [{'source_object': cached['cache_object_name'], 'object_name': markdown_object_name}],
+        cached['converted_bucket']
+    )[0]
+    if not result['success']:
+        logger.warning(f"转换缓存对象不可用，重新转换: {cached['cache_object_name']}, 错误: {result['error']}")
+    return result['success']
+
+def _run_file_conversion(app, celery_task, file_info: Dict[str, Any], method: str, conversion_config: dict,
+                         conversion_fingerprint: str, llm_config: Optional[LLMConfig],
+                         progress_callback) -> Dict[str, Any]:
+    """在工作线程中下载、转换并上传单个文件，只读查询转换缓存，不写数据库"""
+    with app.app_context():
+        file_start_time = time.time()
+        try:
+            logger.info(f"开始处理文件: {file_info['original_filename']}")
+
+            # 每个文件有自己的转换输出对象，命中缓存时从缓存对象复制
+            markdown_filename = f"{os.path.splitext(file_info['original_filename'])[0]}.md"
+            markdown_object_name = f"converted/{file_info['library_id']}/{file_info['library_file_id']}/{markdown_filename}"
+
+            def reuse(cached, content_hash, cache_key):
+                if not _reuse_cached_conversion(cached, markdown_object_name):
+                    return None
+                return {
+                    'converted_bucket': cached['converted_bucket'],
+                    'converted_object_name': markdown_object_name,
+                    'converted_file_size': cached['converted_file_size'],
+                    'content_hash': content_hash,
+                    'cache_key': cache_key,
+                    'reused': True,
+                    'duration': time.time() - file_start_time
+                }
+
+            # 已知内容哈希时，命中缓存可跳过下载
+            content_hash = file_info.get('content_hash')
+            if content_hash:
+                cache_key = _get_cache_key(content_hash, conversion_fingerprint)
+                cached = _find_cached_conversion(cache_key)
+                reused = reuse(cached, content_hash, cache_key) if cached else None
+                if reused:
+                    return reused
+
+            # 将原始文件流式写入内存盘暂存文件，退出时自动删除
+            with tempfile.NamedTemporaryFile(suffix=f".{file_info['file_type']}",
+                                             dir=_get_spool_dir()) as source_file:
+                hasher = hashlib.sha256()
+                storage_service.download_to_fileobj(
+                    current_app.config.get('MINIO_RAW_DATA_BUCKET', 'raw-data'),
+                    file_info['minio_object_name'],
+                    source_file,
+                    hasher=hasher
+                )
+
+                # 下载时顺带计算内容哈希，再查一次缓存
+                if not content_hash:
+                    content_hash = hasher.hexdigest()
+                    cache_key = _get_cache_key(content_hash, conversion_fingerprint)
+                    cached = _find_cached_conversion(cache_key)
+                    reused = reuse(cached, content_hash, cache_key) if cached else None
+                    if reused:
+                        return reused
+
+                # 执行转换
+                if method == 'markitdown':
+                    markdown_content = _convert_with_markitdown(
+                        celery_task,
+                        source_file.name,
+                        file_info['file_type'],
+                        conversion_config
+                    )
+                else:  # vision_llm
+                    markdown_content = _convert_with_llm(
+                        source_file.name,
+                        file_info['file_type'],
+                        conversion_config,
+                        llm_config,
+                        progress_callback
+                    )
+
+            # 直接从内存上传到MinIO：文件自己的输出，以及供其他文件复用的缓存对象
+            converted_bucket = current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets')
+            markdown_bytes = markdown_content.encode('utf-8')
+            for object_name in (markdown_object_name, _cache_object_name(cache_key)):
+                storage_service.upload_content(
+                    converted_bucket,
+                    object_name,
+                    markdown_bytes,
+                    content_type='text/markdown; charset=utf-8'
+                )
+
+            return {
+                'converted_bucket': converted_bucket,
+                'converted_object_name': markdown_object_name,
+                'converted_file_size': len(markdown_bytes),
+                'content_hash': content_hash,
+                'cache_key': cache_key,
+                'reused': False,
+                'duration': time.time() - file_start_time
+            }
+        except Exception as e:
+            # 附带耗时信息，供汇总器记录
+            e.duration = time.time() - file_start_time
+            raise
+
+def _get_spool_dir() -> Optional[str]:
+    """转换暂存目录：优先使用配置，其次使用内存盘 /dev/shm，否则使用系统临时目录"""
+    spool_dir = current_app.config.get('CONVERSION_SPOOL_DIR')
+    if spool_dir:
+        return spool_dir
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return None
 
 def _convert_with_markitdown(celery_task, file_path: str, file_type: str, config: dict) -> str:
-    """使用markitdown转换文档"""
+    """使用markitdown转换文档，优先使用常驻进程池"""
     try:
+        if markitdown_pool_service.available:
+            return markitdown_pool_service.convert(file_path, file_type)
+        # 守护进程（如 prefork 子进程）无法派生子进程，回退到进程内转换
         result = celery_task.markitdown.convert(file_path)
         return result.text_content
     except Exception as e:
         logger.error(f"Markitdown转换失败: {str(e)}")
         raise
 
-def _convert_with_llm(file_path: str, file_type: str, config: dict, llm_config_id: str, file_detail: ConversionFileDetail) -> str:
+def _convert_with_llm(file_path: str, file_type: str, config: dict, llm_config: LLMConfig, progress_callback) -> str:
     """使用LLM转换文档"""
     try:
-        # 获取LLM配置
-        llm_config = LLMConfig.query.get(llm_config_id)
-        if not llm_config:
-            raise ValueError(f"LLM配置不存在: {llm_config_id}")
-        
-        # 添加调试信息
-        logger.info(f"转换任务中获取到的LLM配置: ID={llm_config.id}, Name={llm_config.name}, Provider={llm_config.provider}")
-        logger.info(f"API Key前缀: {llm_config.api_key[:10]}... (长度: {len(llm_config.api_key)})")
-        
-        # 强制清除LLM客户端缓存，确保使用最新配置
-        if hasattr(llm_conversion_service, 'llm_cache') and llm_config.id in llm_conversion_service.llm_cache:
-            logger.info(f"清除LLM客户端缓存: {llm_config.id}")
-            del llm_conversion_service.llm_cache[llm_config.id]
-        
         # 记录文件转换开始
         file_name = os.path.basename(file_path)
         logger.info(f"开始LLM转换 - 文件: {file_name}, 类型: {file_type}")
         logger.info(f"转换配置: enableOCR={config.get('enableOCR', True)}, extractImages={config.get('extractImages', False)}")
-        
-        # 定义增强的进度回调函数
-        def progress_callback(current_page: int, total_pages: int):
-            try:
-                # 更新文件级别的进度
-                file_detail.processed_pages = current_page
-                file_detail.total_pages = total_pages
-                
-                # 计算文件内部进度百分比
-                if total_pages > 0:
-                    file_progress = (current_page / total_pages) * 100
-                    logger.info(f"文件内部进度 - {file_name}: {current_page}/{total_pages} 页 ({file_progress:.1f}%)")
-                    
-                    # 添加页面进度日志到数据库
-                    if hasattr(progress_callback, '_job_ref'):
-                        job = progress_callback._job_ref
-                        job.add_log(f"页面进度 - {file_name}: {current_page}/{total_pages} 页 ({file_progress:.1f}%)")
-                else:
-                    file_progress = 0
-                
-                # 更新数据库
-                db.session.commit()
-                
-                # 记录进度更新
-                logger.debug(f"进度回调更新成功 - 文件: {file_name}, 当前页: {current_page}, 总页数: {total_pages}")
-                
-            except Exception as e:
-                logger.warning(f"进度回调失败 - 文件: {file_name}, 错误: {str(e)}")
-        
-        # 将job引用传递给回调函数（通过属性）
-        progress_callback._job_ref = ConversionJob.query.get(file_detail.conversion_job_id)
-        
+
         # 调用LLM转换服务
         start_time = time.time()
         markdown_content = llm_conversion_service.convert_document_with_vision(
@@ -337,18 +613,14 @@ def _convert_with_llm(file_path: str, file_type: str, config: dict, llm_config_i
             progress_callback=progress_callback
         )
         conversion_duration = time.time() - start_time
-        
+
         # 记录转换完成信息
         logger.info(f"LLM转换完成 - 文件: {file_name}, 耗时: {conversion_duration:.2f}秒, 输出长度: {len(markdown_content)} 字符")
-        
-        # 更新LLM使用统计
-        llm_config.update_usage()
-        
+
         return markdown_content
-        
+
     except Exception as e:
         logger.error(f"LLM转换失败 - 文件: {file_name if 'file_name' in locals() else 'unknown'}: {str(e)}")
         # 记录详细错误信息用于调试
-        if 'llm_config' in locals():
-            logger.error(f"LLM配置详情: Provider={llm_config.provider}, Model={llm_config.model_name}")
-        raise 
\ No newline at end of file
+        logger.error(f"LLM配置详情: Provider={llm_config.provider}, Model={llm_config.model_name}")
+        raise
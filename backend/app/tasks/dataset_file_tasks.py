@@ -0,0 +1,116 @@
+import logging
+from typing import List
+from celery import Task
+from app.celery_app import celery
+from app.db import db
+from app.models.dataset_version import EnhancedDatasetFile
+from app.services.line_index_service import line_index_service
+from app.services.data_preview_service import DataPreviewService
+from app.services.column_profile_service import column_profile_service
+
+logger = logging.getLogger(__name__)
+
+class DatasetFileTask(Task):
+    """数据集文件后台处理任务基类"""
+    _flask_app = None
+
+    @property
+    def flask_app(self):
+        if self._flask_app is None:
+            from app import create_app
+            self._flask_app = create_app()
+        return self._flask_app
+
+@celery.task(base=DatasetFileTask, bind=True, name='tasks.build_line_indexes')
+def build_line_indexes_task(self, file_ids: List[str], force: bool = False):
+    """
+    为数据集文件建立记录偏移索引
+
+    Args:
+        file_ids: 文件ID列表
+        force: 是否重建已有索引
+    """
+    with self.flask_app.app_context():
+        built, failed = 0, {}
+        for file_id in file_ids:
+            file = EnhancedDatasetFile.query.get(file_id)
+            if not file:
+                continue
+            try:
+                if line_index_service.build_for_file(file, force=force):
+                    built += 1
+                # 每个文件单独提交
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                failed[file_id] = str(e)
+                logger.warning(f"建立记录索引失败: {file_id}, 错误: {str(e)}")
+        logger.info(f"记录索引任务完成: 建立 {built} 个, 失败 {len(failed)} 个")
+        return {'built': built, 'failed': failed}
+
+@celery.task(base=DatasetFileTask, bind=True, name='tasks.generate_previews')
+def generate_previews_task(self, file_ids: List[str], max_items: int = 10):
+    """
+    后台生成数据集文件预览（文本片段、缩略图等）
+
+    生成前在行锁内认领文件，生成期间不持有锁；写回时只在认领仍属于本任务时覆盖占位，
+    重复排队或并发执行的任务不会重复生成
+
+    Args:
+        file_ids: 文件ID列表
+        max_items: 最大预览条目数
+    """
+    with self.flask_app.app_context():
+        worker_id = self.request.id or 'local'
+        generated, skipped = 0, 0
+        for file_id in file_ids:
+            # 不跳过已锁定的行：行锁可能来自无关的事务（如更新文件元数据），认领本身只持锁很短时间
+            file = EnhancedDatasetFile.query.filter_by(id=file_id).with_for_update().first()
+            if not file or not DataPreviewService.claim(file, worker_id):
+                # 文件不存在、已有预览，或其他任务正在生成
+                db.session.commit()
+                skipped += 1
+                continue
+            db.session.commit()
+
+            preview_data = DataPreviewService.generate_preview(file, max_items=max_items)
+
+            file = EnhancedDatasetFile.query.filter_by(id=file_id).with_for_update().populate_existing().first()
+            if file and DataPreviewService.is_claimed_by(file, worker_id):
+                DataPreviewService.save_preview_data(file, preview_data)
+                generated += 1
+            else:
+                skipped += 1
+            db.session.commit()
+        logger.info(f"预览生成任务完成: 生成 {generated} 个, 跳过 {skipped} 个")
+        return {'generated': generated, 'skipped': skipped}
+
+@celery.task(base=DatasetFileTask, bind=True, name='tasks.profile_columns')
+def profile_columns_task(self, file_ids: List[str], force: bool = False):
+    """
+    统计表格文件各列（空值率、去重估计、分位数、长度分布、高频值）
+
+    Args:
+        file_ids: 文件ID列表
+        force: 是否重新统计已有结果的文件
+    """
+    with self.flask_app.app_context():
+        profiled, failed = 0, {}
+        for index, file_id in enumerate(file_ids):
+            file = EnhancedDatasetFile.query.get(file_id)
+            if not file:
+                continue
+            try:
+                if column_profile_service.profile_file(file, force=force):
+                    profiled += 1
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                failed[file_id] = str(e)
+                logger.warning(f"列统计失败: {file_id}, 错误: {str(e)}")
+            self.update_state(
+                state='PROGRESS',
+                meta={'current': index + 1, 'total': len(file_ids), 'status': f'正在统计列: {index + 1}/{len(file_ids)}'}
+            )
+        logger.info(f"列统计任务完成: 统计 {profiled} 个, 失败 {len(failed)} 个")
+        return {'profiled': profiled, 'failed': failed}
@@ -7,7 +7,6 @@ import uuid
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from celery import Task
-from flask import current_app
 from werkzeug.datastructures import FileStorage
 
 from app.celery_app import celery
@@ -18,8 +17,11 @@ from app.models import (
 )
 from app.models.dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile, VersionType
 from app.services.storage_service import storage_service
+from app.services.dataset_blob_service import dataset_blob_service
 from app.services.enhanced_dataset_service import EnhancedDatasetService
 from app.services.llm_conversion_service import llm_conversion_service
+from app.services.line_index_service import line_index_service
+from app.services.version_manifest_service import version_manifest_service
 
 logger = logging.getLogger(__name__)
 
@@ -192,6 +194,9 @@ def generate_dataset_task(
             task.result = result
             db.session.commit()
             
+            # 后台为生成的 JSONL/CSV 文件建立记录索引
+            line_index_service.schedule_files(version.files)
+            
             logger.info(f"数据集生成完成: {dataset.name}, 耗时: {total_duration:.2f}秒, "
                        f"处理文件: {processed_files}, 生成条目: {total_generated_entries}")
             
@@ -1569,19 +1574,8 @@ def _save_generated_data(version: EnhancedDatasetVersion, original_filename: str
             tmp_file_path = tmp_file.name
         
         try:
-            # 上传到MinIO
-            object_name = f"datasets/{version.dataset_id}/{version.version}/generated/{generated_filename}"
-            
-            # 使用upload_file_from_path方法
-            bucket_name = current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets')
-            file_size = storage_service.upload_file_from_path(
-                tmp_file_path, object_name, content_type, bucket_name
-            )
-            uploaded_object = object_name
-            
-            # 计算文件校验和
-            with open(tmp_file_path, 'rb') as f:
-                checksum = hashlib.md5(f.read()).hexdigest()
+            # 按内容寻址存储，相同内容只保存一份
+            blob = dataset_blob_service.store_file(tmp_file_path, content_type)
             
             # 创建文件记录
             dataset_file = EnhancedDatasetFile(
@@ -1589,10 +1583,11 @@ def _save_generated_data(version: EnhancedDatasetVersion, original_filename: str
                 filename=generated_filename,
                 file_path=f"datasets/{version.dataset_id}/versions/{version.id}/{generated_filename}",
                 file_type='json' if file_extension == '.jsonl' else 'csv',
-                file_size=file_size,
-                checksum=checksum,
-                minio_bucket=current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets'),
-                minio_object_name=uploaded_object,
+                file_size=blob.size,
+                checksum=blob.md5,
+                minio_bucket=blob.bucket,
+                minio_object_name=blob.object_name,
+                blob_checksum=blob.checksum,
                 file_metadata={
                     'original_file': original_filename,
                     'generation_type': 'auto_generated',
@@ -1617,7 +1612,7 @@ def _save_generated_data(version: EnhancedDatasetVersion, original_filename: str
             db.session.flush()
             
             logger.info(f"保存生成数据文件: {generated_filename}, 格式: {output_format}, "
-                       f"大小: {file_size} 字节, 条目数: {len(converted_data)}")
+                       f"大小: {blob.size} 字节, 条目数: {len(converted_data)}")
             
             return dataset_file
             
@@ -1834,9 +1829,7 @@ def _update_version_stats(version: EnhancedDatasetVersion, conversion_results: L
         # 更新版本信息
         version.file_count = total_files
         version.total_size = total_size
-        version.data_checksum = hashlib.sha256(
-            f"{total_files}{total_size}{total_generated_entries}".encode()
-        ).hexdigest()[:16]
+        version_manifest_service.build(version)
         
         # 更新统计信息
         version.stats = {
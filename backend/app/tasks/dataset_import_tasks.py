@@ -1,5 +1,5 @@
 import os
-import shutil
+import re
 import tempfile
 import logging
 import requests
@@ -7,14 +7,12 @@ import time
 import zipfile
 import subprocess
 from datetime import datetime
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any
 from urllib.parse import urlparse
 from celery import Task
 from flask import current_app
-from huggingface_hub import hf_hub_download, snapshot_download, HfApi
-from modelscope.hub.snapshot_download import snapshot_download as ms_snapshot_download
+from huggingface_hub import HfApi
 from modelscope.hub.api import HubApi
-from modelscope.hub.file_download import model_file_download
 from app.celery_app import celery
 from app.db import db
 from app.models import (
@@ -22,6 +20,9 @@ from app.models import (
     Task as TaskModel, TaskStatus, TaskType
 )
 from app.services.storage_service import storage_service
+from app.services.dataset_import_pipeline import create_import_source, dataset_import_pipeline
+from app.services.line_index_service import line_index_service
+from app.services.version_manifest_service import version_manifest_service
 
 logger = logging.getLogger(__name__)
 
@@ -37,7 +38,8 @@ class DatasetImportTask(Task):
         return self._flask_app
 
 @celery.task(base=DatasetImportTask, bind=True, name='tasks.import_dataset')
-def import_dataset_task(self, dataset_id: int, import_method: str, import_url: str, task_id: int):
+def import_dataset_task(self, dataset_id: int, import_method: str, import_url: str, task_id: int,
+                        incremental: bool = False):
     """
     导入数据集的Celery任务
     
@@ -46,6 +48,7 @@ def import_dataset_task(self, dataset_id: int, import_method: str, import_url: s
         import_method: 导入方法 ('huggingface' 或 'modelscope')
         import_url: 导入URL或路径
         task_id: 关联的任务ID
+        incremental: 是否增量重新导入，只传输与上次导入清单相比有变化的文件
     """
     with self.flask_app.app_context():
         start_time = time.time()
@@ -80,7 +83,9 @@ def import_dataset_task(self, dataset_id: int, import_method: str, import_url: s
             )
             
             # 根据导入方法执行不同的导入逻辑
-            if import_method == 'huggingface':
+            if incremental:
+                result = _reimport_incremental(self, import_method, import_url, dataset, task)
+            elif import_method == 'huggingface':
                 result = _import_from_huggingface(self, import_url, dataset, task)
             elif import_method == 'modelscope':
                 result = _import_from_modelscope(self, import_url, dataset, task)
@@ -98,6 +103,10 @@ def import_dataset_task(self, dataset_id: int, import_method: str, import_url: s
             
             db.session.commit()
             
+            # 可选的 Parquet 规整化阶段，在独立任务中执行
+            if current_app.config.get('DATASET_PARQUET_NORMALIZE') and not result.get('up_to_date'):
+                _schedule_normalization(dataset)
+            
             # 最终状态更新
             self.update_state(
                 state='SUCCESS',
@@ -286,7 +295,8 @@ def _import_from_huggingface(celery_task, import_url: str, dataset: Dataset, tas
                 'import_method': 'huggingface',
                 'import_url': import_url,
                 'original_dataset_id': dataset_info.id,
-                'downloaded_at': datetime.utcnow().isoformat()
+                'downloaded_at': datetime.utcnow().isoformat(),
+                'import_manifest': _build_import_manifest('huggingface', dataset_path, download_info)
             },
             stats={
                 'original_downloads': dataset_info.downloads if hasattr(dataset_info, 'downloads') else 0,
@@ -301,38 +311,26 @@ def _import_from_huggingface(celery_task, import_url: str, dataset: Dataset, tas
         # 为每个上传的文件创建记录
         uploaded_files = download_info.get('uploaded_files', [])
         for file_info in uploaded_files:
-            # 检测文件类型
-            file_ext = os.path.splitext(file_info['filename'])[1].lower()
-            if file_ext in ['.txt', '.md']:
-                file_type = 'text'
-            elif file_ext in ['.csv']:
-                file_type = 'csv' 
-            elif file_ext in ['.json', '.jsonl']:
-                file_type = 'json'
-            elif file_ext in ['.jpg', '.jpeg', '.png', '.bmp', '.gif']:
-                file_type = 'image'
-            elif file_ext in ['.wav', '.mp3', '.flac']:
-                file_type = 'audio'
-            elif file_ext in ['.mp4', '.avi', '.mov']:
-                file_type = 'video'
-            else:
-                file_type = 'other'
-            
             enhanced_file = EnhancedDatasetFile(
                 id=str(uuid.uuid4()),
                 version_id=version_id,
                 filename=file_info['filename'],
                 file_path=file_info['file_path'],
-                file_type=file_type,
+                file_type=_detect_import_file_type(file_info['filename']),
                 file_size=file_info['file_size'],
-                minio_bucket=current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets'),
-                minio_object_name=file_info['minio_object_name']
+                checksum=file_info['checksum'],
+                minio_bucket=file_info['minio_bucket'],
+                minio_object_name=file_info['minio_object_name'],
+                blob_checksum=file_info['blob_checksum']
             )
             db.session.add(enhanced_file)
+        version_manifest_service.build(enhanced_version)
         
         task.progress = 100
         db.session.commit()
         
+        line_index_service.schedule_files(enhanced_version.files)
+        
         return {
             'source': 'huggingface',
             'original_id': dataset_info.id,
@@ -521,7 +519,8 @@ def _import_from_modelscope(celery_task, import_url: str, dataset: Dataset, task
                 'import_method': 'modelscope',
                 'import_url': import_url,
                 'original_dataset_id': dataset_path,
-                'downloaded_at': datetime.utcnow().isoformat()
+                'downloaded_at': datetime.utcnow().isoformat(),
+                'import_manifest': _build_import_manifest('modelscope', dataset_path, download_info)
             },
             stats={
                 'original_downloads': dataset_info.get('DownloadCount', 0),
@@ -536,38 +535,26 @@ def _import_from_modelscope(celery_task, import_url: str, dataset: Dataset, task
         # 为每个上传的文件创建记录
         uploaded_files = download_info.get('uploaded_files', [])
         for file_info in uploaded_files:
-            # 检测文件类型
-            file_ext = os.path.splitext(file_info['filename'])[1].lower()
-            if file_ext in ['.txt', '.md']:
-                file_type = 'text'
-            elif file_ext in ['.csv']:
-                file_type = 'csv' 
-            elif file_ext in ['.json', '.jsonl']:
-                file_type = 'json'
-            elif file_ext in ['.jpg', '.jpeg', '.png', '.bmp', '.gif']:
-                file_type = 'image'
-            elif file_ext in ['.wav', '.mp3', '.flac']:
-                file_type = 'audio'
-            elif file_ext in ['.mp4', '.avi', '.mov']:
-                file_type = 'video'
-            else:
-                file_type = 'other'
-            
             enhanced_file = EnhancedDatasetFile(
                 id=str(uuid.uuid4()),
                 version_id=version_id,
                 filename=file_info['filename'],
                 file_path=file_info['file_path'],
-                file_type=file_type,
+                file_type=_detect_import_file_type(file_info['filename']),
                 file_size=file_info['file_size'],
-                minio_bucket=current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets'),
-                minio_object_name=file_info['minio_object_name']
+                checksum=file_info['checksum'],
+                minio_bucket=file_info['minio_bucket'],
+                minio_object_name=file_info['minio_object_name'],
+                blob_checksum=file_info['blob_checksum']
             )
             db.session.add(enhanced_file)
+        version_manifest_service.build(enhanced_version)
         
         task.progress = 100
         db.session.commit()
         
+        line_index_service.schedule_files(enhanced_version.files)
+        
         return {
             'source': 'modelscope',
             'original_id': dataset_path,
@@ -608,130 +595,369 @@ def _parse_ms_url(import_url: str) -> str:
     # 直接返回作为数据集/模型路径
     return import_url.strip()
 
-def _download_hf_dataset(celery_task, dataset_path: str, dataset_id: int, task: TaskModel) -> Dict[str, Any]:
-    """下载HuggingFace数据集"""
+def _schedule_normalization(dataset: Dataset):
+    """为数据集默认版本启动 Parquet 规整化任务，失败不影响导入结果"""
+    from app.models.dataset_version import EnhancedDatasetVersion
+    from app.tasks.dataset_normalization_tasks import normalize_dataset_version_task
+    
     try:
-        # 创建临时目录用于下载
-        temp_dir = tempfile.mkdtemp(prefix=f'hf_dataset_{dataset_id}_')
-        local_dir = os.path.join(temp_dir, 'dataset')
-        os.makedirs(local_dir, exist_ok=True)
-        
-        logger.info(f"使用临时目录下载数据集: {temp_dir}")
-        
-        # 使用snapshot_download下载整个数据集
-        downloaded_path = snapshot_download(
-            repo_id=dataset_path,
-            repo_type="dataset",
-            local_dir=local_dir,
-            local_dir_use_symlinks=False
-        )
+        version = EnhancedDatasetVersion.query.filter_by(dataset_id=dataset.id, is_default=True).first()
+        if version and version.file_count:
+            normalize_dataset_version_task.delay(version.id)
+    except Exception as e:
+        logger.warning(f"启动 Parquet 规整化任务失败: {dataset.id}, 错误: {str(e)}")
+
+def _detect_import_file_type(filename: str) -> str:
+    """根据扩展名检测导入文件类型"""
+    file_ext = os.path.splitext(filename)[1].lower()
+    if file_ext in ['.txt', '.md']:
+        return 'text'
+    elif file_ext in ['.csv']:
+        return 'csv'
+    elif file_ext in ['.json', '.jsonl']:
+        return 'json'
+    elif file_ext in ['.jpg', '.jpeg', '.png', '.bmp', '.gif']:
+        return 'image'
+    elif file_ext in ['.wav', '.mp3', '.flac']:
+        return 'audio'
+    elif file_ext in ['.mp4', '.avi', '.mov']:
+        return 'video'
+    return 'other'
+
+def _manifest_entry(remote: Dict[str, Any], blob_checksum: Optional[str], file_size: Optional[int]) -> Dict[str, Any]:
+    """导入清单中的单个文件条目"""
+    return {
+        'size': remote.get('size') if remote.get('size') is not None else file_size,
+        'sha256': remote.get('sha256'),
+        'etag': remote.get('etag'),
+        'revision': remote.get('revision'),
+        'blob_checksum': blob_checksum
+    }
+
+def _build_import_manifest(source_name: str, repo_id: str, download_info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    生成导入清单：记录每个文件的远端 revision、etag/sha256 及对应的 blob，
+    重新导入时据此判断哪些文件需要重新传输
+    """
+    return {
+        'source': source_name,
+        'repo_id': repo_id,
+        'revision': download_info.get('revision'),
+        'files': {
+            file_info['file_path']: _manifest_entry(
+                file_info.get('remote') or {}, file_info['blob_checksum'], file_info['file_size']
+            )
+            for file_info in download_info.get('uploaded_files', [])
+        }
+    }
+
+def _remote_file_unchanged(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> bool:
+    """按 sha256、etag 的优先级判断远端文件自上次导入后是否未变化，大小不同时直接视为变化"""
+    if not previous:
+        return False
+    if previous.get('size') is not None and current.get('size') is not None \
+            and previous['size'] != current['size']:
+        return False
+    if previous.get('sha256') and current.get('sha256'):
+        return previous['sha256'] == current['sha256']
+    if previous.get('etag') and current.get('etag'):
+        return previous['etag'] == current['etag']
+    # 没有可比较的内容标识时保守地重新传输
+    return False
+
+def _next_import_version(dataset_id: int, base_version: str) -> str:
+    """在基础版本上递增次版本号，跳过已存在的版本号"""
+    from app.models.dataset_version import EnhancedDatasetVersion
+    
+    match = re.match(r'^v?(\d+)(?:\.(\d+))?', base_version or '')
+    major, minor = (int(match.group(1)), int(match.group(2) or 0)) if match else (1, 0)
+    existing = {
+        version for (version,) in db.session.query(EnhancedDatasetVersion.version).filter_by(dataset_id=dataset_id)
+    }
+    while True:
+        minor += 1
+        candidate = f'v{major}.{minor}'
+        if candidate not in existing:
+            return candidate
+
+def _reimport_incremental(celery_task, import_method: str, import_url: str, dataset: Dataset,
+                          task: TaskModel) -> Dict[str, Any]:
+    """
+    增量重新导入：列出远端文件并与默认版本的导入清单比对，只传输新增或变化的文件；
+    未变化的文件复用原记录（增加 blob 引用），结果写入新的默认版本。远端没有变化时不创建版本
+    """
+    from app.models.dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile, VersionType
+    from app.services.dataset_blob_service import dataset_blob_service
+    import uuid
+    
+    if import_method == 'huggingface':
+        repo_id = _parse_hf_url(import_url)
+    elif import_method == 'modelscope':
+        repo_id = _parse_ms_url(import_url)
+    else:
+        raise Exception(f"不支持的导入方法: {import_method}")
+    
+    base_version = EnhancedDatasetVersion.query.filter_by(
+        dataset_id=dataset.id, is_default=True
+    ).first() or EnhancedDatasetVersion.query.filter_by(
+        dataset_id=dataset.id
+    ).order_by(EnhancedDatasetVersion.created_at.desc()).first()
+    if not base_version:
+        # 从未成功导入过，退回完整导入
+        if import_method == 'huggingface':
+            return _import_from_huggingface(celery_task, import_url, dataset, task)
+        return _import_from_modelscope(celery_task, import_url, dataset, task)
+    
+    manifest = (base_version.pipeline_config or {}).get('import_manifest') or {}
+    # 导入来源变更后旧清单不再可信，全部文件按新增处理（内容相同的 blob 仍会去重）
+    previous_files = manifest.get('files', {}) if manifest.get('repo_id') == repo_id else {}
+    base_files = {
+        f.file_path: f for f in EnhancedDatasetFile.query.filter_by(version_id=base_version.id).all()
+    }
+    
+    celery_task.update_state(
+        state='PROGRESS',
+        meta={
+            'current': 10,
+            'total': 100,
+            'status': f'正在比对远端文件: {repo_id}',
+            'dataset_name': dataset.name
+        }
+    )
+    
+    source = create_import_source(import_method, repo_id)
+    remote_files = source.list_files()
+    if not remote_files:
+        raise Exception("数据集中没有文件")
+    
+    changed = [
+        f for f in remote_files
+        if f['path'] not in base_files or not _remote_file_unchanged(previous_files.get(f['path']), f)
+    ]
+    remote_paths = {f['path'] for f in remote_files}
+    # 有清单时只删除上次导入过的文件，保留用户手动加入版本的文件
+    removed = sorted(
+        path for path in base_files
+        if path not in remote_paths and (not previous_files or path in previous_files)
+    )
+    summary = {
+        'source': import_method,
+        'original_id': repo_id,
+        'incremental': True,
+        'base_version': base_version.version,
+        'revision': source.revision,
+        'changed_files': len(changed),
+        'removed_files': len(removed),
+        'unchanged_files': len(remote_files) - len(changed)
+    }
+    
+    if not changed and not removed:
+        logger.info(f"数据集无变化，跳过重新导入: {dataset.id} ({repo_id})")
+        return {**summary, 'version': base_version.version, 'transferred_bytes': 0, 'up_to_date': True}
+    
+    logger.info(f"增量重新导入: {dataset.id} ({repo_id}), 变化 {len(changed)} 个文件, 删除 {len(removed)} 个文件")
+    
+    try:
+        results = dataset_import_pipeline.run(
+            source, changed, on_progress=_make_progress_reporter(celery_task, task, repo_id)
+        ) if changed else []
         
-        # 统计下载的文件
-        file_count = 0
-        total_size = 0
+        version_id = str(uuid.uuid4())
+        skipped = {f['path'] for f in changed} | set(removed)
+        kept_files = [f for path, f in base_files.items() if path not in skipped]
+        new_files = [
+            EnhancedDatasetFile(
+                id=str(uuid.uuid4()),
+                version_id=version_id,
+                filename=f.filename,
+                file_path=f.file_path,
+                file_type=f.file_type,
+                file_size=f.file_size,
+                checksum=f.checksum,
+                minio_bucket=f.minio_bucket,
+                minio_object_name=f.minio_object_name,
+                blob_checksum=f.blob_checksum,
+                parquet_blob_checksum=f.parquet_blob_checksum,
+                merkle_bucket=f.merkle_bucket,
+                file_metadata=f.file_metadata.copy() if f.file_metadata else {},
+                preview_data=f.preview_data.copy() if f.preview_data else {}
+            )
+            for f in kept_files
+        ]
+        kept_count = len(new_files)
+        # 未变化的文件不重新传输，只增加引用计数
+        dataset_blob_service.acquire_many(checksum for f in kept_files for checksum in f.blob_checksums)
         
-        for root, dirs, files in os.walk(downloaded_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                if os.path.exists(file_path):
-                    file_count += 1
-                    total_size += os.path.getsize(file_path)
+        for file_info in results:
+            new_files.append(EnhancedDatasetFile(
+                id=str(uuid.uuid4()),
+                version_id=version_id,
+                filename=file_info['filename'],
+                file_path=file_info['file_path'],
+                file_type=_detect_import_file_type(file_info['filename']),
+                file_size=file_info['file_size'],
+                checksum=file_info['checksum'],
+                minio_bucket=file_info['minio_bucket'],
+                minio_object_name=file_info['minio_object_name'],
+                blob_checksum=file_info['blob_checksum']
+            ))
         
-        # 格式化大小
-        size_str = _format_size(total_size)
+        # 新清单：未变化文件沿用原 blob，记录最新的远端元数据
+        new_manifest = _build_import_manifest(import_method, repo_id, {
+            'uploaded_files': results,
+            'revision': source.revision
+        })
+        for remote in remote_files:
+            path = remote['path']
+            if path not in new_manifest['files'] and path in base_files:
+                base_file = base_files[path]
+                new_manifest['files'][path] = _manifest_entry(remote, base_file.blob_checksum, base_file.file_size)
         
-        logger.info(f"HuggingFace数据集下载完成: {file_count}个文件, 总大小: {size_str}")
+        total_size = sum(f.file_size or 0 for f in new_files)
+        transferred_bytes = sum(f['file_size'] for f in results)
+        pipeline_config = dict(base_version.pipeline_config or {})
+        pipeline_config.update({
+            'import_method': import_method,
+            'import_url': import_url,
+            'original_dataset_id': repo_id,
+            'downloaded_at': datetime.utcnow().isoformat(),
+            'import_manifest': new_manifest,
+            'incremental_import': {
+                'base_version_id': base_version.id,
+                'changed_files': [f['path'] for f in changed],
+                'removed_files': removed,
+                'transferred_bytes': transferred_bytes
+            }
+        })
         
-        # 将下载的数据集上传到MinIO（每个文件分别上传）
-        uploaded_files = _upload_dataset_files_to_minio(downloaded_path, dataset_id, 'huggingface')
+        base_version.is_default = False
+        new_version = EnhancedDatasetVersion(
+            id=version_id,
+            dataset_id=dataset.id,
+            version=_next_import_version(dataset.id, base_version.version),
+            version_type=VersionType.MINOR,
+            parent_version_id=base_version.id,
+            commit_hash=uuid.uuid4().hex[:8],
+            commit_message=f'增量更新: {repo_id}，变化 {len(changed)} 个文件，删除 {len(removed)} 个文件',
+            author=dataset.owner,
+            total_size=total_size,
+            file_count=len(new_files),
+            pipeline_config=pipeline_config,
+            stats={
+                **(base_version.stats or {}),
+                'file_count': len(new_files),
+                'total_size': total_size
+            },
+            is_default=True
+        )
+        db.session.add(new_version)
+        db.session.add_all(new_files)
+        db.session.flush()
+        # 复制基础版本的 Merkle 树，只重算变化文件所在的叶子桶
+        version_manifest_service.derive(base_version, new_version, added=new_files[kept_count:], removed_paths=removed)
         
-        # 清理临时目录
-        try:
-            shutil.rmtree(temp_dir)
-            logger.info(f"已清理临时目录: {temp_dir}")
-        except Exception as cleanup_error:
-            logger.warning(f"清理临时目录失败: {str(cleanup_error)}")
+        dataset.size = _format_size(total_size)
+        task.progress = 100
+        db.session.commit()
         
-        return {
-            'uploaded_files': uploaded_files,
-            'file_count': file_count,
-            'total_size': total_size,
-            'size': size_str
-        }
+        line_index_service.schedule_files(new_files)
         
-    except Exception as e:
-        logger.error(f"下载HuggingFace数据集失败: {str(e)}")
-        raise e
-
-def _download_ms_dataset(celery_task, dataset_path: str, dataset_id: int, task: TaskModel) -> Dict[str, Any]:
-    """下载魔搭社区数据集 (使用 modelscope-cli)"""
-    try:
-        # 创建临时目录用于下载
-        temp_dir = tempfile.mkdtemp(prefix=f'ms_dataset_{dataset_id}_')
-        
-        logger.info(f"使用shell命令下载数据集 '{dataset_path}' 到临时目录: {temp_dir}")
-        
-        # 构建 shell 命令 (指定为数据集)
-        command = [
-            'modelscope',
-            'download',
-            '--dataset',
-            dataset_path,
-            '--local_dir',
-            temp_dir
-        ]
+    except Exception:
+        # 丢弃尚未提交的 blob 引用
+        db.session.rollback()
+        raise
+    
+    logger.info(f"增量重新导入完成: {dataset.id} -> {new_version.version}, 传输 {_format_size(transferred_bytes)}")
+    return {
+        **summary,
+        'version': new_version.version,
+        'version_id': new_version.id,
+        'file_count': len(new_files),
+        'total_size': total_size,
+        'transferred_bytes': transferred_bytes,
+        'up_to_date': False
+    }
 
-        logger.info(f"执行下载命令: {' '.join(command)}")
-        
-        # 执行命令
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True  # Raise exception on non-zero exit code
+def _make_progress_reporter(celery_task, task: TaskModel, dataset_path: str,
+                            start: int = 30, end: int = 90, interval: float = 1.0):
+    """
+    按字节上报导入进度：Celery 状态带字节数，任务表进度映射到 [start, end]。
+    任务进度通过独立连接更新，不提交会话中尚未完成的 blob 引用
+    """
+    task_id = task.id
+    task_table = TaskModel.__table__
+    last_report = [0.0]
+    
+    def report(progress: Dict[str, int]):
+        now = time.time()
+        finished = progress['files_done'] >= progress['file_count']
+        if now - last_report[0] < interval and not finished:
+            return
+        last_report[0] = now
+        
+        total = progress['total_bytes'] or 1
+        # 下载与上传各占一半
+        ratio = (progress['downloaded_bytes'] + progress['uploaded_bytes']) / (2 * total)
+        percent = start + int((end - start) * min(ratio, 1.0))
+        celery_task.update_state(
+            state='PROGRESS',
+            meta={
+                'current': percent,
+                'total': 100,
+                'status': f"正在导入数据集: {dataset_path} "
+                          f"({_format_size(progress['uploaded_bytes'])}/{_format_size(progress['total_bytes'])})",
+                **progress
+            }
         )
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(task_table.update().where(task_table.c.id == task_id).values(progress=percent))
+        except Exception as e:
+            logger.warning(f"更新任务进度失败: {str(e)}")
+    
+    return report
 
-        logger.info(f"ModelScope CLI下载成功. STDOUT: {result.stdout}")
-
-        # 下载的内容在临时目录中，将其作为下载路径
-        downloaded_path = temp_dir
+def _download_dataset_pipelined(celery_task, source_name: str, dataset_path: str,
+                                task: TaskModel) -> Dict[str, Any]:
+    """逐文件下载并立即上传到内容寻址存储，上传后删除本地副本"""
+    try:
+        source = create_import_source(source_name, dataset_path)
+        files = source.list_files()
+        if not files:
+            raise Exception("数据集中没有文件")
         
-        if not os.listdir(downloaded_path):
-            raise Exception("下载目录为空，可能下载失败。")
-
-        # 统计下载的文件
-        file_count = 0
-        total_size = 0
-        
-        for root, dirs, files in os.walk(downloaded_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                if os.path.exists(file_path):
-                    file_count += 1
-                    total_size += os.path.getsize(file_path)
-        
-        # 格式化大小
+        uploaded_files = dataset_import_pipeline.run(
+            source, files, on_progress=_make_progress_reporter(celery_task, task, dataset_path)
+        )
+        total_size = sum(f['file_size'] for f in uploaded_files)
         size_str = _format_size(total_size)
-        
-        logger.info(f"魔搭社区数据集下载完成: {file_count}个文件, 总大小: {size_str}")
-        
-        # 将下载的数据集上传到MinIO（每个文件分别上传）
-        uploaded_files = _upload_dataset_files_to_minio(downloaded_path, dataset_id, 'modelscope')
-        
-        # 清理临时目录
-        try:
-            shutil.rmtree(temp_dir)
-            logger.info(f"已清理临时目录: {temp_dir}")
-        except Exception as cleanup_error:
-            logger.warning(f"清理临时目录失败: {str(cleanup_error)}")
+        logger.info(f"数据集导入完成: {source_name}/{dataset_path}, {len(uploaded_files)}个文件, 总大小: {size_str}")
         
         return {
             'uploaded_files': uploaded_files,
-            'file_count': file_count,
+            'file_count': len(uploaded_files),
             'total_size': total_size,
-            'size': size_str
+            'size': size_str,
+            'revision': source.revision
         }
         
+    except Exception:
+        # 丢弃尚未提交的 blob 引用
+        db.session.rollback()
+        raise
+
+def _download_hf_dataset(celery_task, dataset_path: str, dataset_id: int, task: TaskModel) -> Dict[str, Any]:
+    """下载HuggingFace数据集（流水线：边下载边上传）"""
+    try:
+        return _download_dataset_pipelined(celery_task, 'huggingface', dataset_path, task)
+    except Exception as e:
+        logger.error(f"下载HuggingFace数据集失败: {str(e)}")
+        raise e
+
+def _download_ms_dataset(celery_task, dataset_path: str, dataset_id: int, task: TaskModel) -> Dict[str, Any]:
+    """下载魔搭社区数据集（流水线：边下载边上传）"""
+    try:
+        return _download_dataset_pipelined(celery_task, 'modelscope', dataset_path, task)
     except subprocess.CalledProcessError as e:
         error_message = f"ModelScope CLI下载失败 (exit code {e.returncode}):\nSTDOUT: {e.stdout}\nSTDERR: {e.stderr}"
         logger.error(error_message)
@@ -794,66 +1020,6 @@ def _extract_task_type_from_ms(dataset_info: Dict) -> str:
     
     return 'Natural Language Processing'
 
-def _upload_dataset_files_to_minio(local_path: str, dataset_id: int, source: str) -> List[Dict[str, Any]]:
-    """将数据集中的每个文件分别上传到MinIO存储"""
-    try:
-        logger.info(f"开始上传数据集文件到MinIO: dataset_id={dataset_id}, source={source}")
-        
-        uploaded_files = []
-        
-        # 遍历所有文件
-        for root, dirs, files in os.walk(local_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                # 计算相对路径
-                rel_path = os.path.relpath(file_path, local_path)
-                
-                # 生成MinIO对象名
-                object_name = f"datasets/{dataset_id}/files/{rel_path}"
-                
-                # 获取文件信息
-                file_size = os.path.getsize(file_path)
-                file_ext = os.path.splitext(file)[1].lower()
-                
-                # 根据文件扩展名确定content_type
-                content_type = 'application/octet-stream'
-                if file_ext in ['.txt', '.md', '.csv']:
-                    content_type = 'text/plain'
-                elif file_ext in ['.json', '.jsonl']:
-                    content_type = 'application/json'
-                elif file_ext in ['.jpg', '.jpeg']:
-                    content_type = 'image/jpeg'
-                elif file_ext in ['.png']:
-                    content_type = 'image/png'
-                elif file_ext in ['.zip']:
-                    content_type = 'application/zip'
-                
-                # 上传文件到MinIO的datasets bucket
-                actual_size = storage_service.upload_file_from_path(
-                    file_path, 
-                    object_name,
-                    content_type=content_type,
-                    bucket_name=current_app.config.get('MINIO_DATASETS_BUCKET', 'datasets')
-                )
-                
-                # 记录上传的文件信息
-                uploaded_files.append({
-                    'filename': file,
-                    'file_path': rel_path,
-                    'minio_object_name': object_name,
-                    'file_size': file_size,
-                    'content_type': content_type
-                })
-                
-                logger.info(f"文件上传成功: {object_name}, 大小: {actual_size} bytes")
-        
-        logger.info(f"数据集所有文件上传完成: {len(uploaded_files)} 个文件")
-        return uploaded_files
-        
-    except Exception as e:
-        logger.error(f"上传数据集文件到MinIO失败: {str(e)}")
-        raise e
-
 def _upload_dataset_to_minio(local_path: str, dataset_id: int, source: str) -> str:
     """将数据集上传到MinIO存储"""
     try:
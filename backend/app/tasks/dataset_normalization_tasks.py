@@ -0,0 +1,52 @@
+import logging
+from celery import Task
+from flask import current_app
+from app.celery_app import celery
+from app.models.dataset_version import EnhancedDatasetVersion
+from app.services.parquet_normalization_service import parquet_normalization_service
+from app.services.column_profile_service import column_profile_service
+
+logger = logging.getLogger(__name__)
+
+class DatasetNormalizationTask(Task):
+    """数据集规整化任务基类"""
+    _flask_app = None
+
+    @property
+    def flask_app(self):
+        if self._flask_app is None:
+            from app import create_app
+            self._flask_app = create_app()
+        return self._flask_app
+
+@celery.task(base=DatasetNormalizationTask, bind=True, name='tasks.normalize_dataset_version')
+def normalize_dataset_version_task(self, version_id: str, force: bool = False):
+    """
+    把数据集版本中的表格/文本文件转换为 Parquet，并记录字段结构与行数
+
+    Args:
+        version_id: 版本ID
+        force: 是否重新转换已有 Parquet 副本的文件
+    """
+    with self.flask_app.app_context():
+        def report(done: int, total: int):
+            self.update_state(
+                state='PROGRESS',
+                meta={
+                    'current': done,
+                    'total': total,
+                    'status': f'正在转换为 Parquet: {done}/{total}',
+                    'version_id': version_id
+                }
+            )
+
+        result = parquet_normalization_service.normalize_version(version_id, force=force, on_progress=report)
+        logger.info(f"数据集版本规整化完成: {result}")
+
+        # Parquet 副本按列读取，规整化后顺带计算列统计
+        if current_app.config.get('DATASET_COLUMN_PROFILE', True):
+            version = EnhancedDatasetVersion.query.get(version_id)
+            column_profile_service.schedule_files(
+                [f for f in version.files if f.parquet_blob_checksum], force=force
+            )
+        return result
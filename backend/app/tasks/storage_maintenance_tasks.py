@@ -0,0 +1,58 @@
+import logging
+from celery import Task
+from flask import current_app
+from app.celery_app import celery
+from app.services.dataset_blob_service import dataset_blob_service
+from app.services.chunked_upload_service import chunked_upload_service
+
+logger = logging.getLogger(__name__)
+
+class StorageMaintenanceTask(Task):
+    """存储维护任务基类"""
+    _flask_app = None
+
+    @property
+    def flask_app(self):
+        if self._flask_app is None:
+            from app import create_app
+            self._flask_app = create_app()
+        return self._flask_app
+
+@celery.task(base=StorageMaintenanceTask, bind=True, name='tasks.collect_dataset_blobs')
+def collect_dataset_blobs_task(self, batch_size: int = 1000):
+    """
+    回收引用计数归零且超过宽限期的数据集内容块
+
+    Args:
+        batch_size: 每批处理的 blob 数量
+    """
+    with self.flask_app.app_context():
+        grace_seconds = current_app.config.get('DATASET_BLOB_GC_GRACE_SECONDS', 3600)
+        total = {'scanned': 0, 'deleted': 0, 'failed': 0, 'freed_bytes': 0}
+        while True:
+            result = dataset_blob_service.collect_garbage(grace_seconds, limit=batch_size)
+            for key in total:
+                total[key] += result[key]
+            # 本批未满或全部失败时结束，避免对无法删除的对象反复重试
+            if result['scanned'] < batch_size or result['deleted'] == 0:
+                break
+        logger.info(f"数据集 blob 回收完成: {total}")
+        return total
+
+@celery.task(base=StorageMaintenanceTask, bind=True, name='tasks.cleanup_upload_sessions')
+def cleanup_upload_sessions_task(self, batch_size: int = 100):
+    """
+    清理过期的分片上传会话，释放 MinIO 中未完成的分片
+
+    Args:
+        batch_size: 每批处理的会话数量
+    """
+    with self.flask_app.app_context():
+        total = 0
+        while True:
+            cleaned = chunked_upload_service.cleanup_expired(limit=batch_size)
+            total += cleaned
+            if cleaned < batch_size:
+                break
+        logger.info(f"分片上传会话清理完成: {total} 个")
+        return total
@@ -0,0 +1,137 @@
+"""
+流式统计用的概率数据结构：HyperLogLog（去重计数）、t-digest（分位数）、Misra-Gries（高频值）。
+内存占用固定，与数据量无关，均支持按批（numpy 数组）更新
+"""
+import math
+from typing import Any, Dict, List
+
+import numpy as np
+
+class HyperLogLog:
+    """HyperLogLog 去重计数，输入为 64 位哈希值，标准误差约 1.04 / sqrt(2^precision)"""
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        if len(hashes) == 0:
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # rank = 剩余位中第一个 1 的位置（从高位数起，从 1 开始）
+        rank = np.full(len(rest), bits + 1, dtype=np.uint8)
+        nonzero = rest > 0
+        rank[nonzero] = bits - np.floor(np.log2(rest[nonzero].astype(np.float64))).astype(np.int64)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # 小基数时使用线性计数
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+class TDigest:
+    """
+    合并式 t-digest 分位数估计。按 k1 尺度函数把排序后的点分箱合并，
+    两端的质心更小，尾部分位数更准确；质心数约为 compression
+    """
+
+    def __init__(self, compression: int = 200, buffer_size: int = 8192):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self._buffer: List[np.ndarray] = []
+        self._buffered = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        buffered = np.concatenate(self._buffer)
+        means = np.concatenate([self.means, buffered])
+        weights = np.concatenate([self.weights, np.ones(len(buffered))])
+        self._buffer, self._buffered = [], 0
+
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / total
+        bins = np.floor(self.compression * (np.arcsin(2 * q - 1) / math.pi + 0.5)).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def count(self) -> float:
+        return float(self.weights.sum()) + self._buffered
+
+    def quantile(self, q: float) -> float:
+        self._compress()
+        if len(self.means) == 0:
+            return math.nan
+        if len(self.means) == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        # 以质心中心为插值节点，两端补上最小值和最大值
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.r_[0.0, centers, total]
+        values = np.r_[self.min, self.means, self.max]
+        return float(np.interp(q * total, positions, values))
+
+    def quantiles(self, qs: List[float]) -> Dict[str, float]:
+        return {f'p{round(q * 100):g}': self.quantile(q) for q in qs}
+
+class MisraGries:
+    """
+    Misra-Gries 高频值摘要：最多保留 capacity 个计数器，
+    计数为真实频次的下界，误差不超过 error
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.counters: Dict[Any, int] = {}
+        self.error = 0
+
+    def update_counts(self, values: List[Any], counts) -> None:
+        counts = np.asarray(counts, dtype=np.int64)
+        if len(counts) > self.capacity:
+            # 先把本批压缩为同容量的摘要，再与已有摘要合并
+            cut = int(np.partition(counts, len(counts) - self.capacity - 1)[len(counts) - self.capacity - 1])
+            keep = np.flatnonzero(counts > cut)
+            self.error += cut
+            values, counts = [values[i] for i in keep], counts[keep] - cut
+        for value, count in zip(values, counts):
+            self.counters[value] = self.counters.get(value, 0) + int(count)
+        if len(self.counters) > self.capacity:
+            # 所有计数减去第 capacity+1 大的计数，丢弃不再为正的计数器
+            cut = sorted(self.counters.values(), reverse=True)[self.capacity]
+            self.error += cut
+            self.counters = {value: count - cut for value, count in self.counters.items() if count > cut}
+
+    def top(self, k: int = 10) -> List[Dict[str, Any]]:
+        ranked = sorted(self.counters.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [{'value': value, 'count': count} for value, count in ranked]
@@ -49,6 +49,74 @@ class Config:
     MINIO_RAW_DATA_BUCKET = os.getenv('MINIO_RAW_DATA_BUCKET', 'raw-data')
     MINIO_DATASETS_BUCKET = os.getenv('MINIO_DATASETS_BUCKET', 'datasets')
     MINIO_DEFAULT_BUCKET = os.getenv('MINIO_DEFAULT_BUCKET', 'pindata-bucket')
+    MINIO_UPLOAD_PART_SIZE = int(os.getenv('MINIO_UPLOAD_PART_SIZE', str(16 * 1024 * 1024)))  # 流式上传分片大小，最小5MB
+    MINIO_BUCKET_INDEX_SIZE = int(os.getenv('MINIO_BUCKET_INDEX_SIZE', '10000'))  # 对象->bucket 索引缓存条数
+    # 存储后端：minio 或 local（本地文件系统，单机部署/CI 使用）
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'minio').lower()
+    LOCAL_STORAGE_ROOT = os.getenv('LOCAL_STORAGE_ROOT', './storage')
+    LOCAL_STORAGE_URL_BASE = os.getenv('LOCAL_STORAGE_URL_BASE')  # 预签名地址前缀，默认使用 API_PREFIX
+    LOCAL_STORAGE_SIGNING_KEY = os.getenv('LOCAL_STORAGE_SIGNING_KEY')  # 预签名密钥，默认使用 SECRET_KEY
+    # 文件下载：stream 由API流式返回；redirect 跳转到预签名URL，仅在配置了 MINIO_PUBLIC_ENDPOINT 时生效
+    STORAGE_DOWNLOAD_MODE = os.getenv('STORAGE_DOWNLOAD_MODE', 'stream').lower()
+    STORAGE_PRESIGNED_URL_EXPIRES = int(os.getenv('STORAGE_PRESIGNED_URL_EXPIRES', '300'))  # 预签名URL有效期（秒）
+    STORAGE_STREAM_CHUNK_SIZE = int(os.getenv('STORAGE_STREAM_CHUNK_SIZE', str(1024 * 1024)))
+    ZIP_EXPORT_PREFETCH_WORKERS = int(os.getenv('ZIP_EXPORT_PREFETCH_WORKERS', '8'))  # 流式ZIP打包的并行预取数
+    ZIP_EXPORT_PREFETCH_BYTES = int(os.getenv('ZIP_EXPORT_PREFETCH_BYTES', str(1024 * 1024)))  # 每个文件预读字节数
+    MINIO_PUBLIC_ENDPOINT = os.getenv('MINIO_PUBLIC_ENDPOINT')  # 浏览器可访问的 MinIO 地址，用于生成预签名URL
+    MINIO_PUBLIC_SECURE = os.getenv('MINIO_PUBLIC_SECURE', os.getenv('MINIO_SECURE', 'false')).lower() == 'true'
+    MINIO_REGION = os.getenv('MINIO_REGION', 'us-east-1')
+    # 批量对象操作（upload_many/download_many/copy_many/delete_many）
+    STORAGE_BULK_WORKERS = int(os.getenv('STORAGE_BULK_WORKERS', '16'))  # 并发数，不超过 MINIO_POOL_MAXSIZE
+    STORAGE_BULK_RETRIES = int(os.getenv('STORAGE_BULK_RETRIES', '3'))  # 单项失败重试次数
+    # 数据集内容块（内容寻址存储）垃圾回收
+    DATASET_BLOB_GC_GRACE_SECONDS = int(os.getenv('DATASET_BLOB_GC_GRACE_SECONDS', '3600'))  # 引用归零后保留的秒数
+    DATASET_BLOB_GC_INTERVAL = int(os.getenv('DATASET_BLOB_GC_INTERVAL', '3600'))  # 定时回收间隔（秒）
+    # 文件库分片上传（断点续传）
+    UPLOAD_PART_SIZE = int(os.getenv('UPLOAD_PART_SIZE', str(16 * 1024 * 1024)))  # 默认分片大小，不超过 MAX_CONTENT_LENGTH
+    UPLOAD_SESSION_EXPIRES = int(os.getenv('UPLOAD_SESSION_EXPIRES', str(24 * 3600)))  # 无分片上传多久后会话过期（秒）
+    UPLOAD_SESSION_CLEANUP_INTERVAL = int(os.getenv('UPLOAD_SESSION_CLEANUP_INTERVAL', '3600'))
+    # 数据集导入流水线（边下载边上传）
+    DATASET_IMPORT_DOWNLOAD_WORKERS = int(os.getenv('DATASET_IMPORT_DOWNLOAD_WORKERS', '4'))
+    DATASET_IMPORT_UPLOAD_WORKERS = int(os.getenv('DATASET_IMPORT_UPLOAD_WORKERS', '4'))
+    DATASET_IMPORT_MIRROR_ROOT = os.getenv('DATASET_IMPORT_MIRROR_ROOT')  # 本地镜像目录，配置后不访问远程仓库
+    # 数据集 Parquet 规整化（导入后把表格/文本文件转换为按行组切分的 Parquet）
+    DATASET_PARQUET_NORMALIZE = os.getenv('DATASET_PARQUET_NORMALIZE', 'false').lower() == 'true'  # 导入完成后自动执行
+    PARQUET_ROW_GROUP_ROWS = int(os.getenv('PARQUET_ROW_GROUP_ROWS', '131072'))  # 每个行组的行数
+    PARQUET_READ_BLOCK_SIZE = int(os.getenv('PARQUET_READ_BLOCK_SIZE', str(8 * 1024 * 1024)))  # CSV/JSONL 流式读取块大小
+    PARQUET_COMPRESSION = os.getenv('PARQUET_COMPRESSION', 'zstd')
+    # 表格文件列统计：规整化后自动执行；HyperLogLog 精度、t-digest 压缩参数、高频值计数器个数
+    DATASET_COLUMN_PROFILE = os.getenv('DATASET_COLUMN_PROFILE', 'true').lower() == 'true'
+    COLUMN_PROFILE_HLL_PRECISION = int(os.getenv('COLUMN_PROFILE_HLL_PRECISION', '14'))
+    COLUMN_PROFILE_TDIGEST_COMPRESSION = int(os.getenv('COLUMN_PROFILE_TDIGEST_COMPRESSION', '200'))
+    COLUMN_PROFILE_TOP_K_CAPACITY = int(os.getenv('COLUMN_PROFILE_TOP_K_CAPACITY', '256'))
+    # 文本/CSV/JSONL 预览：范围读取文件开头的字节数，完整行不足时最多扩大到 PREVIEW_MAX_HEAD_BYTES
+    PREVIEW_HEAD_BYTES = int(os.getenv('PREVIEW_HEAD_BYTES', str(256 * 1024)))
+    PREVIEW_MAX_HEAD_BYTES = int(os.getenv('PREVIEW_MAX_HEAD_BYTES', str(4 * 1024 * 1024)))
+    # 预览后台生成：pending 占位或任务认领超过该秒数视为任务丢失，重新排队
+    PREVIEW_PENDING_TIMEOUT = int(os.getenv('PREVIEW_PENDING_TIMEOUT', '600'))
+    # 预览生成失败（如存储暂时不可用）超过该秒数后允许重新生成
+    PREVIEW_ERROR_RETRY_AFTER = int(os.getenv('PREVIEW_ERROR_RETRY_AFTER', '3600'))
+    # 数据集文件记录索引：每隔多少条记录保存一个字节偏移
+    LINE_INDEX_STRIDE = int(os.getenv('LINE_INDEX_STRIDE', '1024'))
+    # 数据集版本采样：单次最大样本量、分层字段最多取值数
+    DATASET_SAMPLE_MAX_SIZE = int(os.getenv('DATASET_SAMPLE_MAX_SIZE', '1000'))
+    DATASET_SAMPLE_MAX_STRATA = int(os.getenv('DATASET_SAMPLE_MAX_STRATA', '100'))
+    # 同步采样请求最多顺序扫描的字节数，超过时返回 409 并在后台建立记录索引或 Parquet 副本
+    DATASET_SAMPLE_MAX_SCAN_BYTES = int(os.getenv('DATASET_SAMPLE_MAX_SCAN_BYTES', str(64 * 1024 * 1024)))
+    # 同步分层采样在 Parquet 副本上最多读取的分层列行数，超过时返回 409
+    DATASET_SAMPLE_MAX_STRATIFY_ROWS = int(os.getenv('DATASET_SAMPLE_MAX_STRATIFY_ROWS', '5000000'))
+    # 记录级版本差异：落盘分区数（单个分区需能放入内存）、每次落盘的记录数
+    DATASET_DIFF_PARTITIONS = int(os.getenv('DATASET_DIFF_PARTITIONS', '64'))
+    DATASET_DIFF_CHUNK_RECORDS = int(os.getenv('DATASET_DIFF_CHUNK_RECORDS', '100000'))
+    # MinIO 共享连接池
+    MINIO_POOL_MAXSIZE = int(os.getenv('MINIO_POOL_MAXSIZE', '32'))  # 每个主机的最大连接数
+    MINIO_POOL_NUM_POOLS = int(os.getenv('MINIO_POOL_NUM_POOLS', '10'))
+    MINIO_POOL_TIMEOUT = float(os.getenv('MINIO_POOL_TIMEOUT', '60'))  # 连接耗尽时等待空闲连接的秒数
+    MINIO_CONNECT_TIMEOUT = float(os.getenv('MINIO_CONNECT_TIMEOUT', '10'))
+    MINIO_READ_TIMEOUT = float(os.getenv('MINIO_READ_TIMEOUT', '300'))
+    MINIO_MAX_RETRIES = int(os.getenv('MINIO_MAX_RETRIES', '5'))
+    MINIO_RETRY_BACKOFF = float(os.getenv('MINIO_RETRY_BACKOFF', '0.2'))
+    MINIO_TCP_KEEPALIVE = os.getenv('MINIO_TCP_KEEPALIVE', 'true').lower() == 'true'
     
     # Celery配置
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
@@ -76,6 +144,18 @@ class Config:
     
     # 健康检查配置
     HEALTH_CHECK_ENABLED = os.getenv('HEALTH_CHECK_ENABLED', 'true').lower() == 'true'
+    
+    # 文档转换并发配置
+    CONVERSION_MARKITDOWN_WORKERS = int(os.getenv('CONVERSION_MARKITDOWN_WORKERS', '0'))  # 0 表示使用CPU核数
+    CONVERSION_LLM_WORKERS = int(os.getenv('CONVERSION_LLM_WORKERS', '4'))
+    CONVERSION_SPOOL_DIR = os.getenv('CONVERSION_SPOOL_DIR')  # 原始文件暂存目录，默认优先使用 /dev/shm
+    CONVERSION_PROGRESS_FLUSH_INTERVAL = float(os.getenv('CONVERSION_PROGRESS_FLUSH_INTERVAL', '2'))  # 进度批量落库间隔（秒）
+    CONVERSION_PROGRESS_FLUSH_COUNT = int(os.getenv('CONVERSION_PROGRESS_FLUSH_COUNT', '50'))  # 缓存日志达到该条数时立即落库
+    
+    # MarkItDown 常驻进程池配置
+    MARKITDOWN_TASK_TIMEOUT = int(os.getenv('MARKITDOWN_TASK_TIMEOUT', '300'))  # 单文档超时（秒）
+    MARKITDOWN_MAX_TASKS_PER_WORKER = int(os.getenv('MARKITDOWN_MAX_TASKS_PER_WORKER', '200'))
+    MARKITDOWN_MAX_WORKER_MEMORY_MB = int(os.getenv('MARKITDOWN_MAX_WORKER_MEMORY_MB', '1024'))
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
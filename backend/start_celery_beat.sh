@@ -0,0 +1,15 @@
+#!/bin/bash
+
+# 启动 Celery Beat 脚本（定时任务调度：数据集 blob 回收、过期上传会话清理）
+# 全局只需运行一个 beat 实例，定时任务由 worker 执行
+
+echo "Starting Celery Beat..."
+
+# 设置环境变量
+export FLASK_APP=run.py
+export FLASK_ENV=development
+
+# 启动 Celery Beat
+# -A: 指定 Celery 应用
+# -l: 日志级别
+celery -A celery_worker.celery beat --loglevel=info
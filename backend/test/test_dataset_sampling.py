@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+分层采样样本量分配（dataset_sampling_service.allocate）的不变式测试
+"""
+
+import random
+
+import pytest
+
+from app.services.dataset_sampling_service import allocate, ALLOCATIONS
+
+def _random_counts(rng):
+    return {f's{i}': rng.choice([0, 1, 2, rng.randint(1, 50), rng.randint(1, 5000)])
+            for i in range(rng.randint(1, 30))}
+
+@pytest.mark.parametrize('allocation', ALLOCATIONS)
+def test_allocate_invariants(allocation):
+    """配额总和等于 min(样本量, 总行数)，每层配额在 [0, 行数] 之间"""
+    rng = random.Random(allocation)
+    for _ in range(500):
+        counts = _random_counts(rng)
+        size = rng.randint(1, 2000)
+        quotas = allocate(counts, size, allocation)
+        assert set(quotas) == set(counts)
+        assert sum(quotas.values()) == min(size, sum(counts.values()))
+        assert all(0 <= quotas[key] <= counts[key] for key in counts)
+
+def test_allocate_takes_everything_when_size_covers_total():
+    counts = {'a': 3, 'b': 0, 'c': 7}
+    for allocation in ALLOCATIONS:
+        assert allocate(counts, 10, allocation) == counts
+        assert allocate(counts, 100, allocation) == counts
+
+def test_allocate_equal_is_balanced():
+    """equal：未取满的层配额相差不超过 1，取满的层配额不少于未取满的层"""
+    rng = random.Random(0)
+    for _ in range(500):
+        counts = _random_counts(rng)
+        size = rng.randint(1, 2000)
+        quotas = allocate(counts, size, 'equal')
+        if size >= sum(counts.values()):
+            continue
+        open_quotas = [quotas[key] for key in counts if quotas[key] < counts[key]]
+        assert open_quotas
+        assert max(open_quotas) - min(open_quotas) <= 1
+        full = [quotas[key] for key in counts if quotas[key] == counts[key] and counts[key] > 0]
+        assert all(quota <= max(open_quotas) for quota in full)
+
+def test_allocate_proportional_rounding():
+    """proportional：每层配额与精确比例相差小于 1"""
+    rng = random.Random(1)
+    for _ in range(500):
+        counts = _random_counts(rng)
+        total = sum(counts.values())
+        size = rng.randint(1, 2000)
+        if size >= total:
+            continue
+        quotas = allocate(counts, size, 'proportional')
+        for key, count in counts.items():
+            assert abs(quotas[key] - size * count / total) < 1
+
+def test_allocate_examples():
+    assert allocate({'a': 1, 'b': 100, 'c': 100}, 31, 'equal') == {'a': 1, 'b': 15, 'c': 15}
+    assert allocate({'a': 10, 'b': 30}, 4, 'proportional') == {'a': 1, 'b': 3}
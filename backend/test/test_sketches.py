@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+流式统计概率数据结构的误差边界测试：HyperLogLog、t-digest、Misra-Gries
+"""
+
+import numpy as np
+
+from app.utils.sketches import HyperLogLog, TDigest, MisraGries
+
+def _random_hashes(rng, size):
+    return rng.integers(0, np.iinfo(np.uint64).max, size=size, dtype=np.uint64, endpoint=True)
+
+def test_hyperloglog_relative_error():
+    """大基数时相对误差在 4 倍标准误差以内"""
+    rng = np.random.default_rng(0)
+    precision = 14
+    standard_error = 1.04 / np.sqrt(2 ** precision)
+    for cardinality in (50_000, 500_000):
+        hll = HyperLogLog(precision)
+        hashes = _random_hashes(rng, cardinality)
+        for batch in np.array_split(hashes, 10):
+            hll.add_hashes(batch)
+        assert abs(hll.estimate() - cardinality) / cardinality < 4 * standard_error
+
+def test_hyperloglog_small_cardinality_and_duplicates():
+    """小基数走线性计数；重复值不改变估计"""
+    rng = np.random.default_rng(1)
+    hashes = _random_hashes(rng, 1000)
+    hll = HyperLogLog(14)
+    hll.add_hashes(hashes)
+    estimate = hll.estimate()
+    assert abs(estimate - 1000) <= 20
+
+    hll.add_hashes(np.tile(hashes, 5))
+    assert hll.estimate() == estimate
+    assert HyperLogLog(14).estimate() == 0
+
+def test_hyperloglog_merge_equals_union():
+    """合并两个摘要与直接统计并集结果相同"""
+    rng = np.random.default_rng(2)
+    left, right = _random_hashes(rng, 30_000), _random_hashes(rng, 30_000)
+    a, b, union = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    a.add_hashes(left)
+    b.add_hashes(right)
+    union.add_hashes(np.concatenate([left, right]))
+    a.merge(b)
+    assert np.array_equal(a.registers, union.registers)
+    assert a.estimate() == union.estimate()
+
+def test_tdigest_rank_error():
+    """分位数估计值在真实分布中的秩误差：中位数 < 0.5%，尾部 < 0.2%"""
+    rng = np.random.default_rng(3)
+    values = np.concatenate([rng.normal(0, 1, 150_000), rng.exponential(5, 50_000)])
+    rng.shuffle(values)
+    digest = TDigest(compression=200, buffer_size=4096)
+    for batch in np.array_split(values, 37):
+        digest.update(batch)
+
+    ordered = np.sort(values)
+    assert digest.count() == len(values)
+    for q, bound in ((0.001, 0.002), (0.01, 0.002), (0.25, 0.005), (0.5, 0.005),
+                     (0.75, 0.005), (0.99, 0.002), (0.999, 0.002)):
+        rank = np.searchsorted(ordered, digest.quantile(q)) / len(ordered)
+        assert abs(rank - q) < bound, (q, rank)
+    assert digest.quantile(0) == ordered[0]
+    assert digest.quantile(1) == ordered[-1]
+    # 质心数受 compression 限制
+    assert len(digest.means) <= 200
+
+def test_tdigest_ignores_non_finite_values():
+    digest = TDigest()
+    digest.update(np.array([1.0, np.nan, np.inf, -np.inf, 3.0]))
+    assert digest.count() == 2
+    assert digest.quantile(0.5) == 2.0
+    assert np.isnan(TDigest().quantile(0.5))
+
+def test_misra_gries_error_bounds():
+    """计数为真实频次的下界，差值不超过 error，error 不超过 N / (capacity + 1)"""
+    rng = np.random.default_rng(4)
+    stream = rng.zipf(1.3, 200_000) % 5000
+    capacity = 64
+    summary = MisraGries(capacity)
+    for batch in np.array_split(stream, 20):
+        values, counts = np.unique(batch, return_counts=True)
+        summary.update_counts(values.tolist(), counts)
+
+    values, counts = np.unique(stream, return_counts=True)
+    truth = dict(zip(values.tolist(), counts.tolist()))
+    assert len(summary.counters) <= capacity
+    assert summary.error <= len(stream) / (capacity + 1)
+    for value, count in truth.items():
+        estimate = summary.counters.get(value, 0)
+        assert count - summary.error <= estimate <= count
+
+    # 频次超过 error 的值一定被保留，最高频值排在首位
+    assert all(value in summary.counters for value, count in truth.items() if count > summary.error)
+    assert summary.top(1)[0]['value'] == max(truth, key=truth.get)
+
+def test_misra_gries_exact_below_capacity():
+    summary = MisraGries(capacity=10)
+    summary.update_counts(['a', 'b', 'c'], [5, 3, 1])
+    summary.update_counts(['a', 'd'], [1, 2])
+    assert summary.error == 0
+    assert summary.top(2) == [{'value': 'a', 'count': 6}, {'value': 'b', 'count': 3}]
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+版本 Merkle 树测试：增量更新（apply_changes）与派生（derive）得到的根哈希
+与全量构建（build）一致
+"""
+
+import hashlib
+
+import pytest
+from flask import Flask
+
+from app.db import db
+from app.models.dataset_version import EnhancedDatasetVersion, EnhancedDatasetFile, DatasetVersionTreeNode
+from app.services.version_manifest_service import version_manifest_service, path_bucket, relative_path
+
+@pytest.fixture
+def session():
+    """内存 SQLite，只建 Merkle 树用到的表"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        tables = [EnhancedDatasetVersion.__table__, EnhancedDatasetFile.__table__, DatasetVersionTreeNode.__table__]
+        db.metadata.create_all(db.engine, tables=tables)
+        yield db.session
+        db.session.remove()
+
+def _version(session, name):
+    version = EnhancedDatasetVersion(dataset_id=1, version=name)
+    session.add(version)
+    session.flush()
+    return version
+
+def _file(version, name, content=None, size=1):
+    return EnhancedDatasetFile(
+        version_id=version.id,
+        filename=name,
+        file_path=f'datasets/1/versions/{version.id}/data/{name}',
+        file_type='text',
+        file_size=size,
+        checksum=content or hashlib.md5(name.encode()).hexdigest(),
+        minio_object_name=f'datasets/1/{name}'
+    )
+
+def _rebuilt_root(version):
+    return version_manifest_service.build(version)
+
+def _node_rows(session, version):
+    return sorted(
+        (node.prefix, node.hash, node.file_count, node.total_size)
+        for node in DatasetVersionTreeNode.query.filter_by(version_id=version.id)
+    )
+
+def test_root_depends_only_on_content(session):
+    """相同的相对路径与内容在不同版本中得到相同的根哈希，与插入顺序无关"""
+    v1, v2 = _version(session, 'v1'), _version(session, 'v2')
+    names = [f'f{i}.jsonl' for i in range(300)]
+    session.add_all(_file(v1, name) for name in names)
+    session.add_all(_file(v2, name) for name in reversed(names))
+    root1 = version_manifest_service.build(v1)
+    root2 = version_manifest_service.build(v2)
+    assert root1 and root1 == root2
+    assert version_manifest_service.get_root(v1.id).file_count == 300
+
+    changed = EnhancedDatasetFile.query.filter_by(version_id=v2.id, filename='f5.jsonl').one()
+    changed.checksum = 'changed'
+    assert version_manifest_service.build(v2) != root1
+
+def test_apply_changes_matches_build(session):
+    version = _version(session, 'v1')
+    session.add_all(_file(version, f'f{i}.jsonl', size=i) for i in range(500))
+    version_manifest_service.build(version)
+    session.commit()
+
+    added = [_file(version, f'new{i}.jsonl', size=7) for i in range(5)]
+    session.add_all(added)
+    removed = EnhancedDatasetFile.query.filter(
+        EnhancedDatasetFile.version_id == version.id,
+        EnhancedDatasetFile.filename.in_(['f3.jsonl', 'f42.jsonl'])
+    ).all()
+    for file in removed:
+        session.delete(file)
+    modified = EnhancedDatasetFile.query.filter_by(version_id=version.id, filename='f7.jsonl').one()
+    modified.checksum = 'modified'
+
+    incremental = version_manifest_service.apply_changes(version, added=added + [modified], removed=removed)
+    incremental_nodes = _node_rows(session, version)
+    session.commit()
+
+    assert incremental == _rebuilt_root(version)
+    session.flush()
+    assert incremental_nodes == _node_rows(session, version)
+    root = version_manifest_service.get_root(version.id)
+    assert root.file_count == 503
+    assert root.total_size == sum(range(500)) - 3 - 42 + 5 * 7
+
+def test_apply_changes_to_empty_version(session):
+    """删除全部文件后根哈希为空串，不保留节点"""
+    version = _version(session, 'v1')
+    files = [_file(version, f'f{i}.jsonl') for i in range(20)]
+    session.add_all(files)
+    version_manifest_service.build(version)
+    for file in files:
+        session.delete(file)
+    assert version_manifest_service.apply_changes(version, removed=files) == ''
+    session.flush()
+    assert _node_rows(session, version) == []
+
+def test_derive_matches_build(session):
+    source = _version(session, 'v1')
+    session.add_all(_file(source, f'f{i}.jsonl', size=i) for i in range(400))
+    version_manifest_service.build(source)
+    session.commit()
+
+    version = _version(session, 'v2')
+    removed_paths = []
+    for file in EnhancedDatasetFile.query.filter_by(version_id=source.id):
+        if file.filename in ('f10.jsonl', 'f11.jsonl'):
+            removed_paths.append(file.file_path)
+            continue
+        # 沿用的文件保留源文件的路径与叶子桶
+        session.add(EnhancedDatasetFile(
+            version_id=version.id, filename=file.filename, file_path=file.file_path,
+            file_type=file.file_type, file_size=file.file_size, checksum=file.checksum,
+            minio_object_name=file.minio_object_name, merkle_bucket=file.merkle_bucket
+        ))
+    added = [_file(version, 'extra.jsonl', size=3)]
+    session.add_all(added)
+
+    derived = version_manifest_service.derive(source, version, added=added, removed_paths=removed_paths)
+    derived_nodes = _node_rows(session, version)
+    session.commit()
+
+    assert derived != source.data_checksum
+    assert derived == _rebuilt_root(version)
+    session.flush()
+    assert derived_nodes == _node_rows(session, version)
+    assert version_manifest_service.get_root(version.id).file_count == 399
+
+def test_derive_without_changes_keeps_source_root(session):
+    source = _version(session, 'v1')
+    session.add_all(_file(source, f'f{i}.jsonl') for i in range(50))
+    root = version_manifest_service.build(source)
+    version = _version(session, 'v2')
+    assert version_manifest_service.derive(source, version) == root
+
+def test_path_bucket_uses_version_relative_path():
+    assert relative_path('datasets/1/versions/abc/data/x.jsonl') == 'data/x.jsonl'
+    assert path_bucket('data/x.jsonl') == hashlib.sha256(b'data/x.jsonl').hexdigest()[:3]